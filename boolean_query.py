@@ -0,0 +1,162 @@
+import re
+from typing import NamedTuple
+
+from log import get_logger
+
+logger = get_logger(__file__)
+
+AND_OPERATOR = "AND"
+OR_OPERATOR = "OR"
+NOT_OPERATOR = "NOT"
+OPERATORS = (AND_OPERATOR, OR_OPERATOR, NOT_OPERATOR)
+OPENING_PARENTHESIS = "("
+CLOSING_PARENTHESIS = ")"
+QUOTE = '"'
+
+_TOKEN_PATTERN = re.compile(r'"[^"]*"|\(|\)|"|[^\s()"]+')
+_NEAR_PATTERN = re.compile(r"NEAR/(\d+)")
+
+
+class TermQuery(NamedTuple):
+    """Match the records that contain a word."""
+
+    word: str
+
+
+class PhraseQuery(NamedTuple):
+    """Match the records that contain the words of a text next to each other, in order."""
+
+    text: str
+
+
+class NearQuery(NamedTuple):
+    """Match the records where every word is at most its distance away from the previous word, in either order."""
+
+    words: tuple[str, ...]
+    distances: tuple[int, ...]
+
+
+class AndQuery(NamedTuple):
+    """Match the records that match every operand."""
+
+    operands: tuple["BooleanQuery", ...]
+
+
+class OrQuery(NamedTuple):
+    """Match the records that match any operand."""
+
+    operands: tuple["BooleanQuery", ...]
+
+
+class NotQuery(NamedTuple):
+    """Match the records that do not match the operand."""
+
+    operand: "BooleanQuery"
+
+
+BooleanQuery = TermQuery | PhraseQuery | NearQuery | AndQuery | OrQuery | NotQuery
+
+
+def parse_boolean_query(query: str) -> BooleanQuery:
+    """Parse a boolean search query.
+
+    Operators are upper case and bind NEAR/n > NOT > AND > OR. Words next to each other without an operator are
+    combined with AND, parentheses group operands and double quotes match an exact phrase, e.g.
+    `"machine learning" (numpy OR pandas) NOT java` or `python NEAR/3 tutorial`.
+
+    Args:
+    ----
+        query (str): The query text.
+
+    Raises:
+    ------
+        ValueError: If the query is empty or malformed.
+
+    Returns:
+    -------
+        BooleanQuery: The root of the query tree.
+    """
+    tokens = _TOKEN_PATTERN.findall(query)
+    if not tokens:
+        msg = "Boolean query must not be empty."
+        raise ValueError(msg)
+
+    parser = _Parser(tokens)
+    root = parser.parse_or()
+    if parser.position != len(tokens):
+        msg = f"Unexpected {tokens[parser.position]!r} in boolean query."
+        raise ValueError(msg)
+
+    return root
+
+
+class _Parser:
+    def __init__(self, tokens: list[str]) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> str | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            msg = "Boolean query ended unexpectedly."
+            raise ValueError(msg)
+        self.position += 1
+        return token
+
+    def parse_or(self) -> BooleanQuery:
+        operands = [self.parse_and()]
+        while self.peek() == OR_OPERATOR:
+            self.take()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else OrQuery(tuple(operands))
+
+    def parse_and(self) -> BooleanQuery:
+        operands = [self.parse_unary()]
+        while (token := self.peek()) is not None and token not in (OR_OPERATOR, CLOSING_PARENTHESIS):
+            if token == AND_OPERATOR:
+                self.take()
+            operands.append(self.parse_unary())
+        return operands[0] if len(operands) == 1 else AndQuery(tuple(operands))
+
+    def parse_unary(self) -> BooleanQuery:
+        token = self.take()
+        if token == NOT_OPERATOR:
+            return NotQuery(self.parse_unary())
+
+        if token == OPENING_PARENTHESIS:
+            operand = self.parse_or()
+            if self.take() != CLOSING_PARENTHESIS:
+                msg = "Missing closing parenthesis in boolean query."
+                raise ValueError(msg)
+            return operand
+
+        if token == QUOTE:
+            msg = "Missing closing quote in boolean query."
+            raise ValueError(msg)
+
+        if token.startswith(QUOTE):
+            return PhraseQuery(token[1:-1])
+
+        self._validate_word(token)
+        words = [token]
+        distances = []
+        while (near := self.peek()) is not None and (match := _NEAR_PATTERN.fullmatch(near)):
+            self.take()
+            word = self.take()
+            self._validate_word(word)
+            words.append(word)
+            distances.append(int(match[1]))
+
+        return NearQuery(tuple(words), tuple(distances)) if distances else TermQuery(token)
+
+    def _validate_word(self, token: str) -> None:
+        if token in (AND_OPERATOR, OR_OPERATOR, NOT_OPERATOR, OPENING_PARENTHESIS, CLOSING_PARENTHESIS, QUOTE):
+            msg = f"Unexpected {token!r} in boolean query."
+            raise ValueError(msg)
+
+        if token.startswith(QUOTE) or _NEAR_PATTERN.fullmatch(token):
+            msg = f"Unexpected {token!r} in boolean query, NEAR only accepts single words."
+            raise ValueError(msg)
@@ -0,0 +1,569 @@
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Iterator
+from threading import Lock
+
+from columnar_records import ColumnarRecords
+from index_build import IndexBuild
+from internal_types import ColumnName
+from log import get_logger
+from positional_index import PositionalIndex
+from posting_list import PostingList
+from record_codec import decode, decode_column_type, encode, encode_column_type
+from search import DocumentLengths
+from segmented_records import BLOCK_ALIGNMENT, Segment, SegmentedRecords, encode_segment
+from sorted_index import SortedIndex
+from table import Table
+from term_dictionary import TermDictionary
+from tokenizer import DEFAULT_TOKENIZER, Tokenizer
+from write_ahead_log import WriteAheadLog
+
+logger = get_logger(__file__)
+
+CHECKPOINT_MAGIC = b"ATOMCKP1"
+# bumped on every incompatible change of the table file layout
+CHECKPOINT_VERSION = 2
+# length of the encoded header that follows the magic of a table file
+HEADER_LENGTH = struct.Struct("<Q")
+
+MANIFEST_FILE_NAME = "MANIFEST"
+TABLE_FILE_EXTENSION = ".table"
+
+# sections of a table file, every index section is suffixed with the name of its column
+RECORDS_SECTION = "records"
+# the records of row storage, as a segment that is read in place instead of being decoded on load
+RECORDS_SEGMENT_SECTION = "records_segment"
+STATISTICS_SECTION = "statistics"
+UNIQUE_INDEX_SECTION = "unique_index"
+INDEX_SECTION = "index"
+SORTED_INDEX_SECTION = "sorted_index"
+INVERTED_INDEX_SECTION = "inverted_index"
+DOCUMENT_LENGTHS_SECTION = "document_lengths"
+POSITIONAL_INDEX_SECTION = "positional_index"
+SECTION_SEPARATOR = ":"
+
+
+def _get_section_name(section: str, column_name: ColumnName) -> str:
+    return f"{section}{SECTION_SEPARATOR}{column_name}"
+
+
+def _write_atomically(path: str, chunks: list[bytes]) -> None:
+    # readers only ever see the previous file or the complete new one
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+
+
+def _get_records_segment(table: Table) -> list[bytes]:
+    if not isinstance(table.records, SegmentedRecords):
+        records = dict(table.records)
+    else:
+        records = {}
+        base = table.records.base
+        if base is not None:
+            # read before the hot records, so a record updated in the meantime is replaced by its hot version
+            records.update(
+                (record_id, record) for record_id in base if (record := base.get(record_id)) is not None
+            )
+        # frozen records are already on disk, their segment files are referenced from the header
+        records.update(table.records.hot_records)
+    return encode_segment(table.columns, min(records, default=1), max(records, default=0), sorted(records.items()))
+
+
+def _get_table_sections(table: Table, building_indexes: list[ColumnName]) -> dict[str, object]:
+    sections: dict[str, object] = {}
+    if isinstance(table.records, ColumnarRecords):
+        # the column vectors are written as they are, so loading them does not materialize any record
+        sections[RECORDS_SECTION] = table.records.__getstate__()
+    else:
+        sections[RECORDS_SEGMENT_SECTION] = _get_records_segment(table)
+    sections[STATISTICS_SECTION] = table.statistics.__getstate__()
+
+    for column_name, unique_index in table.unique_indexes.items():
+        values = list(unique_index.items())
+        sections[_get_section_name(UNIQUE_INDEX_SECTION, column_name)] = [
+            [value for value, _ in values], array("q", (record_id for _, record_id in values)).tobytes(),
+        ]
+    # records waiting for the index worker would be missing from the hash indexes
+    table.index_worker.flush()
+    for column_name, index in list(table.indexes.items()):
+        if column_name in building_indexes:
+            continue
+        with table.column_locks[column_name].read_all():
+            values = [(value, record_ids) for value, record_ids in index.items() if record_ids]
+            counts = array("q", (len(record_ids) for _, record_ids in values))
+            record_ids = array("q")
+            for _, value_record_ids in values:
+                record_ids.extend(value_record_ids)
+        sections[_get_section_name(INDEX_SECTION, column_name)] = [
+            [value for value, _ in values], counts.tobytes(), record_ids.tobytes(),
+        ]
+    for column_name, sorted_index in table.sorted_indexes.items():
+        sections[_get_section_name(SORTED_INDEX_SECTION, column_name)] = sorted_index.__getstate__()
+
+    with table.inverted_index_lock:
+        for column_name, inverted_index in table.inverted_indexes.items():
+            words = list(inverted_index)
+            sections[_get_section_name(INVERTED_INDEX_SECTION, column_name)] = [
+                words, [inverted_index[word].__getstate__() for word in words],
+            ]
+            sections[_get_section_name(DOCUMENT_LENGTHS_SECTION, column_name)] = (
+                table.document_lengths[column_name].__getstate__()
+            )
+    for column_name, positional_index in table.positional_indexes.items():
+        sections[_get_section_name(POSITIONAL_INDEX_SECTION, column_name)] = positional_index.__getstate__()
+
+    return sections
+
+
+def write_table_file(table: Table, path: str) -> None:
+    """Write the records and every index structure of a table to a file.
+
+    The file holds the magic and format version, an encoded header with the table definition and the offset of
+    every section, and then the sections, each a single value of the binary record codec. Indexes are stored in
+    their in-memory encoding, e.g. posting lists as their varint deltas and skip pointers, so loading them does
+    not tokenize or sort anything. The records of row storage are a segment (see `encode_segment`) at an
+    aligned offset instead, which the loaded table reads in place, and the column statistics are stored too, so
+    loading does not scan the records.
+
+    Args:
+    ----
+        table (Table): The table.
+        path (str): The path of the file, replaced atomically if it exists.
+
+    Raises:
+    ------
+        CodecError: If a value of the table can not be encoded.
+
+    Returns:
+    -------
+        None
+    """
+    # read before the sections, so a change made while they are encoded is replayed from the log
+    count = table.count
+    change_count = table.change_count
+
+    # only part of the records are in an index that is being created, so it is created again on load
+    building_indexes = [column_name for column_name in table.indexes if not table.is_column_indexed(column_name)]
+
+    section_offsets = {}
+    encoded_sections = []
+    offset = 0
+    for section, value in _get_table_sections(table, building_indexes).items():
+        if section == RECORDS_SEGMENT_SECTION:
+            padding = _align(offset) - offset
+            encoded_sections.append(bytes(padding))
+            offset += padding
+            encoded_section = b"".join(value)
+        else:
+            encoded_section = encode(value)
+        section_offsets[section] = [offset, len(encoded_section)]
+        encoded_sections.append(encoded_section)
+        offset += len(encoded_section)
+
+    # read after the records, so records frozen in the meantime are in a segment if they are not in the records
+    segments = []
+    if isinstance(table.records, SegmentedRecords):
+        segments = [[segment.path, array("q", segment.deleted).tobytes()] for segment in table.records.segments]
+
+    header = encode({
+        "version": CHECKPOINT_VERSION,
+        "name": table.name,
+        "columns": {
+            column_name: encode_column_type(column_type) for column_name, column_type in table.columns.items()
+        },
+        "storage": table.storage,
+        "tokenizer": table.tokenizer.get_config() if table.tokenizer is not DEFAULT_TOKENIZER else None,
+        "count": count,
+        "change_count": change_count,
+        "foreign_keys": dict(table.foreign_keys),
+        "building_indexes": building_indexes,
+        "segments": segments,
+        "sections": section_offsets,
+    })
+    # the sections start at an aligned offset, so the records segment can cast its blocks in place
+    header_end = len(CHECKPOINT_MAGIC) + HEADER_LENGTH.size + len(header)
+    _write_atomically(
+        path,
+        [
+            CHECKPOINT_MAGIC,
+            HEADER_LENGTH.pack(len(header)),
+            header,
+            bytes(_align(header_end) - header_end),
+            *encoded_sections,
+        ],
+    )
+
+
+class _TableFile:
+    """Read-only memory map of a table file whose sections are decoded on demand.
+
+    Only the pages of the sections that are decoded are read from disk. The map is shared by the loaded table,
+    which reads its records from it, and the builds of its hash indexes, each of which holds a reference
+    (see `acquire`) and closes it when done; the file is unmapped when the last reference is closed. It can be
+    removed in the meantime, e.g. by a newer checkpoint, since a mapped file stays readable until it is unmapped.
+
+    Args:
+    ----
+        path (str): The path of the table file.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, path: str) -> None:
+        """Map the file and decode its header.
+
+        Args:
+        ----
+        self: The current object.
+        path (str): The path of the table file.
+
+        Raises:
+        ------
+        ValueError: If the file is not a table file of a supported version.
+
+        Returns:
+        -------
+        None
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mapped_file)
+        self._reference_count = 1
+        self._reference_lock = Lock()
+
+        magic_end = len(CHECKPOINT_MAGIC)
+        if self._view[:magic_end] != CHECKPOINT_MAGIC:
+            self.close()
+            msg = f"{path} is not a table checkpoint."
+            raise ValueError(msg)
+
+        (header_length,) = HEADER_LENGTH.unpack_from(self._view, magic_end)
+        header_start = magic_end + HEADER_LENGTH.size
+        self.header: dict = decode(self._view[header_start : header_start + header_length])
+        if self.header["version"] != CHECKPOINT_VERSION:
+            self.close()
+            msg = f"{path} has checkpoint version {self.header['version']}, expected {CHECKPOINT_VERSION}."
+            raise ValueError(msg)
+        self._sections_start = _align(header_start + header_length)
+
+    def acquire(self) -> "_TableFile":
+        """Add a reference to the map, closed by its own call to `close`.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        _TableFile: The current object.
+        """
+        with self._reference_lock:
+            self._reference_count += 1
+        return self
+
+    def sections(self, section: str) -> Iterator[tuple[ColumnName, str]]:
+        """Iterate over the per column sections of a kind.
+
+        Args:
+        ----
+        self: The current object.
+        section (str): The kind of section, e.g. INVERTED_INDEX_SECTION.
+
+        Returns:
+        -------
+        Iterator[tuple[ColumnName, str]]: The column names and their section names.
+        """
+        prefix = f"{section}{SECTION_SEPARATOR}"
+        for section_name in self.header["sections"]:
+            if section_name.startswith(prefix):
+                yield section_name[len(prefix) :], section_name
+
+    def read(self, section_name: str) -> object:
+        """Decode a section.
+
+        Args:
+        ----
+        self: The current object.
+        section_name (str): The name of the section.
+
+        Returns:
+        -------
+        object: The value of the section.
+        """
+        return decode(self.view(section_name))
+
+    def view(self, section_name: str) -> memoryview:
+        """Get a section without decoding it.
+
+        Args:
+        ----
+        self: The current object.
+        section_name (str): The name of the section.
+
+        Returns:
+        -------
+        memoryview: The encoded section, released by the caller before it closes its reference.
+        """
+        offset, length = self.header["sections"][section_name]
+        start = self._sections_start + offset
+        return self._view[start : start + length]
+
+    def close(self) -> None:
+        """Close a reference to the map, and unmap the file if it was the last one.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._reference_lock:
+            self._reference_count -= 1
+            if self._reference_count:
+                return
+        self._view.release()
+        self._mapped_file.close()
+
+
+def _load_index(build: IndexBuild, table: Table, table_file: _TableFile, section_name: str) -> None:
+    # the caller acquired a reference to the table file for the build, so it is still mapped
+    column_name = build.column_name
+    try:
+        values, counts, record_ids = table_file.read(section_name)
+        record_ids = array("q", record_ids)
+        build.start(len(record_ids))
+        index = table.indexes[column_name]
+        start = 0
+        # the row ids are grouped by value, so no record is known to be in the index before all of them are
+        with table.column_locks[column_name].write_all():
+            changed_record_ids = build.changed_record_ids
+            for value, count in zip(values, array("q", counts), strict=True):
+                value_record_ids = record_ids[start : start + count]
+                if changed_record_ids:
+                    value_record_ids = [
+                        record_id for record_id in value_record_ids if record_id not in changed_record_ids
+                    ]
+                index[value].update(value_record_ids)
+                start += count
+            build.advance(0, len(record_ids))
+    except Exception as error:
+        logger.exception(f"failed to load the index of {column_name} from {table_file.path}")
+        build.finish(error)
+    else:
+        build.finish()
+    finally:
+        table_file.close()
+
+
+def _load_text_indexes(table: Table, table_file: _TableFile) -> None:
+    for column_name, section_name in table_file.sections(INVERTED_INDEX_SECTION):
+        words, states = table_file.read(section_name)
+        inverted_index = {}
+        for word, state in zip(words, states, strict=True):
+            posting_list = PostingList()
+            posting_list.__setstate__(state)
+            inverted_index[word] = posting_list
+        table.inverted_indexes[column_name] = inverted_index
+        table.term_dictionaries[column_name] = TermDictionary(
+            {word: len(posting_list) for word, posting_list in inverted_index.items()},
+        )
+
+    for column_name, section_name in table_file.sections(DOCUMENT_LENGTHS_SECTION):
+        document_lengths = DocumentLengths()
+        document_lengths.__setstate__(table_file.read(section_name))
+        table.document_lengths[column_name] = document_lengths
+
+    for column_name, section_name in table_file.sections(POSITIONAL_INDEX_SECTION):
+        positional_index = PositionalIndex()
+        positional_index.__setstate__(table_file.read(section_name))
+        table.positional_indexes[column_name] = positional_index
+
+
+def load_table_file(path: str) -> Table:
+    """Load a table written by `write_table_file`.
+
+    The unique, sorted and text indexes and the column statistics are loaded before returning. The records of
+    row storage are not decoded: the table reads them in place from the mapped file, like frozen records, until
+    they change. Hash indexes are loaded by the index threads of the table afterwards, as builds of the index
+    (see `IndexBuild`), so until they are, lookups on their columns are read like while an index is being
+    created. The file stays mapped until the table is shut down.
+
+    Args:
+    ----
+        path (str): The path of the table file.
+
+    Raises:
+    ------
+        ValueError: If the file is not a table file of a supported version.
+
+    Returns:
+    -------
+        Table: The table.
+    """
+    table_file = _TableFile(path)
+    try:
+        header = table_file.header
+        columns = {column_name: decode_column_type(name) for column_name, name in header["columns"].items()}
+        tokenizer = Tokenizer(*header["tokenizer"]) if header["tokenizer"] is not None else None
+        table = Table(header["name"], columns, storage=header["storage"], tokenizer=tokenizer)
+
+        if isinstance(table.records, ColumnarRecords):
+            table.records.__setstate__(table_file.read(RECORDS_SECTION))
+        else:
+            # a record that is also in a frozen segment hides its version there, which is deleted already
+            table_file.acquire()
+            base = Segment(path, table_file.view(RECORDS_SEGMENT_SECTION), on_close=table_file.close)
+            table.records = SegmentedRecords({}, base)
+            for segment_path, deleted_record_ids in header["segments"]:
+                segment = Segment(segment_path)
+                segment.deleted.update(array("q", deleted_record_ids))
+                table.records.add_segment(segment)
+        table.statistics.__setstate__(table_file.read(STATISTICS_SECTION))
+        table.count = header["count"]
+        table.change_count = header["change_count"]
+        table.foreign_keys.update(header["foreign_keys"])
+
+        for column_name, section_name in table_file.sections(UNIQUE_INDEX_SECTION):
+            values, value_record_ids = table_file.read(section_name)
+            table.unique_indexes[column_name] = dict(zip(values, array("q", value_record_ids), strict=True))
+
+        for column_name, section_name in table_file.sections(SORTED_INDEX_SECTION):
+            sorted_index = SortedIndex()
+            sorted_index.__setstate__(table_file.read(section_name))
+            table.sorted_indexes[column_name] = sorted_index
+
+        _load_text_indexes(table, table_file)
+
+        for column_name, section_name in table_file.sections(INDEX_SECTION):
+            table.start_index_build(column_name, _load_index, table, table_file.acquire(), section_name)
+        for column_name in header["building_indexes"]:
+            table.create_index(column_name)
+    finally:
+        table_file.close()
+
+    return table
+
+
+def read_manifest(directory: str) -> dict | None:
+    """Read the manifest of the latest checkpoint in a directory.
+
+    Args:
+    ----
+        directory (str): The checkpoint directory.
+
+    Returns:
+    -------
+        dict | None: The table files, their change counts and the write-ahead log offset the checkpoint covers,
+            or None if no checkpoint was written yet.
+    """
+    path = os.path.join(directory, MANIFEST_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as file:
+        manifest = decode(file.read())
+    if manifest["version"] != CHECKPOINT_VERSION:
+        msg = f"{path} has checkpoint version {manifest['version']}, expected {CHECKPOINT_VERSION}."
+        raise ValueError(msg)
+    return manifest
+
+
+def load_checkpoint(directory: str, manifest: dict) -> dict[str, Table]:
+    """Load the tables of a checkpoint.
+
+    Args:
+    ----
+        directory (str): The checkpoint directory.
+        manifest (dict): The manifest returned by `read_manifest`.
+
+    Returns:
+    -------
+        dict[str, Table]: The tables by name.
+    """
+    tables = {}
+    for table_name, (file_name, _) in manifest["tables"].items():
+        tables[table_name] = load_table_file(os.path.join(directory, file_name))
+    logger.info(f"loaded {len(tables)} tables from the checkpoint in {directory}")
+    return tables
+
+
+def write_checkpoint(
+    tables: dict[str, Table],
+    directory: str,
+    write_ahead_log: WriteAheadLog | None = None,
+    previous_manifest: dict | None = None,
+) -> dict:
+    """Write a checkpoint of every table, then switch the manifest over to it.
+
+    The checkpoint is incremental: a table whose change count is the same as in the previous manifest keeps its
+    file. The write-ahead log is flushed first and its offset is stored in the manifest, so opening the database
+    loads the checkpoint and only replays the log entries after that offset. Tables are not locked while they
+    are written, so a change made in the meantime can be both in the checkpoint and after the offset; replaying
+    it again leaves the same state, since the log stores the row id of every change.
+
+    Args:
+    ----
+        tables (dict[str, Table]): The tables by name.
+        directory (str): The checkpoint directory, created if it does not exist.
+        write_ahead_log (WriteAheadLog, optional): The write-ahead log of the tables.
+        previous_manifest (dict, optional): The manifest of the previous checkpoint.
+
+    Returns:
+    -------
+        dict: The new manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    write_ahead_log_offset = 0
+    if write_ahead_log is not None:
+        write_ahead_log.flush()
+        write_ahead_log_offset = write_ahead_log.durable_offset
+
+    previous_tables = previous_manifest["tables"] if previous_manifest is not None else {}
+    generation = previous_manifest["generation"] + 1 if previous_manifest is not None else 1
+    manifest_tables = {}
+    written_count = 0
+    for table_name, table in list(tables.items()):
+        previous_table = previous_tables.get(table_name)
+        if previous_table is not None and previous_table[1] == table.change_count:
+            manifest_tables[table_name] = previous_table
+            continue
+
+        change_count = table.change_count
+        file_name = f"{table_name}-{generation}{TABLE_FILE_EXTENSION}"
+        write_table_file(table, os.path.join(directory, file_name))
+        manifest_tables[table_name] = [file_name, change_count]
+        written_count += 1
+
+    manifest = {
+        "version": CHECKPOINT_VERSION,
+        "generation": generation,
+        "write_ahead_log_offset": write_ahead_log_offset,
+        "tables": manifest_tables,
+    }
+    _write_atomically(os.path.join(directory, MANIFEST_FILE_NAME), [encode(manifest)])
+
+    # a table loaded from a file that is removed keeps reading it until it is unmapped, see `_TableFile`
+    live_file_names = {file_name for file_name, _ in manifest_tables.values()}
+    for file_name in os.listdir(directory):
+        if file_name.endswith(TABLE_FILE_EXTENSION) and file_name not in live_file_names:
+            os.remove(os.path.join(directory, file_name))
+
+    logger.info(f"checkpoint {generation} wrote {written_count} of {len(manifest_tables)} tables to {directory}")
+    return manifest
@@ -1,15 +1,547 @@
 import asyncio
+import contextlib
+import itertools
+from typing import Any
 
+from errors import InvalidQueryError
 from log import get_logger
+from record_codec import encode_column_type
+from wire_protocol import (
+    CREATE_INDEX,
+    CREATE_TABLE,
+    EXECUTE,
+    GET,
+    GET_BY_COLUMN,
+    INSERT,
+    INSERT_MANY,
+    PREPARE,
+    QUERY,
+    SEARCH,
+    ProtocolError,
+    encode_frame,
+    read_response,
+)
 
 logger = get_logger(__file__)
 
+DEFAULT_POOL_SIZE = 4
+# requests a connection has in flight before the pool opens another connection, matches the server's limit
+DEFAULT_MAX_PIPELINED_REQUESTS = 128
+DEFAULT_CONNECT_ATTEMPTS = 5
+DEFAULT_RECONNECT_DELAY = 0.05
+# seconds inserts into the same table are collected for before they are sent as one INSERT_MANY request
+DEFAULT_BATCH_WINDOW = 0.002
+DEFAULT_MAX_BATCH_SIZE = 1_000
+
+# request ids are unsigned 32 bit integers in the frame header
+MAX_REQUEST_ID = (1 << 32) - 1
+
+
+class _Connection:
+    """A pipelined connection, whose reader task resolves the pending requests by request id."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_pipelined: int) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.pending: dict[int, asyncio.Future] = {}
+        self.slots = asyncio.Semaphore(max_pipelined)
+        self.request_ids = itertools.cycle(range(1, MAX_REQUEST_ID + 1))
+        self.read_task = asyncio.create_task(self._read_responses())
+
+    @property
+    def is_closed(self) -> bool:
+        return self.read_task.done()
+
+    async def request(self, opcode: int, payload: object) -> object:
+        async with self.slots:
+            if self.is_closed:
+                msg = "Connection is closed."
+                raise ConnectionError(msg)
+
+            request_id = next(self.request_ids)
+            future = asyncio.get_running_loop().create_future()
+            self.pending[request_id] = future
+            try:
+                self.writer.write(encode_frame(request_id, opcode, payload))
+                await self.writer.drain()
+                result = await future
+            finally:
+                self.pending.pop(request_id, None)
+
+        if isinstance(result, InvalidQueryError):
+            raise result
+        return result
+
+    async def _read_responses(self) -> None:
+        error = ConnectionError("Connection closed.")
+        try:
+            while True:
+                request_id, result = await read_response(self.reader)
+                future = self.pending.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result(result)
+        except (ProtocolError, ConnectionError) as exception:
+            error = ConnectionError(f"Connection lost: {exception}")
+        finally:
+            # the outcome of the requests in flight is unknown, so they fail instead of being sent again
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    async def close(self) -> None:
+        self.writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self.writer.wait_closed()
+        self.read_task.cancel()
+        await asyncio.gather(self.read_task, return_exceptions=True)
+
+
+class AtomLinkerClient:
+    """Asyncio client of the atom-linker server.
+
+    Requests are pipelined over a bounded pool of connections: a request goes to the connection with the fewest
+    requests in flight, and another connection is only opened while every open one is busy and the pool has fewer
+    than `pool_size` connections. Lost connections are dropped from the pool and replaced by the next request,
+    retrying the connect with a backoff. Requests that were in flight on a lost connection raise ConnectionError,
+    since whether the server applied them is unknown.
+
+    Concurrent `insert` calls into the same table within `batch_window` seconds are coalesced into one INSERT_MANY
+    request. If a batch fails, e.g. because one record has a duplicate unique value, its records are sent again
+    one by one, so only the inserts that fail on their own raise.
+
+    Args:
+    ----
+        host (str): The host of the server.
+        port (int): The port of the server.
+        pool_size (int): The maximum number of connections.
+        max_pipelined_requests (int): The requests in flight on a connection before another one is opened.
+        connect_attempts (int): The attempts to connect before giving up.
+        reconnect_delay (float): The seconds waited before the second attempt, doubled for every further one.
+        batch_window (float): The seconds inserts are collected for before being sent. Zero disables batching.
+        max_batch_size (int): The number of collected inserts that are sent right away.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        host: str = "localhost",
+        port: int = 5432,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_pipelined_requests: int = DEFAULT_MAX_PIPELINED_REQUESTS,
+        connect_attempts: int = DEFAULT_CONNECT_ATTEMPTS,
+        reconnect_delay: float = DEFAULT_RECONNECT_DELAY,
+        batch_window: float = DEFAULT_BATCH_WINDOW,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ) -> None:
+        """Initialize the client, connections are opened by the first requests.
+
+        Args:
+        ----
+        self: The instance of the class.
+        host (str): The host of the server.
+        port (int): The port of the server.
+        pool_size (int): The maximum number of connections.
+        max_pipelined_requests (int): The requests in flight on a connection before another one is opened.
+        connect_attempts (int): The attempts to connect before giving up.
+        reconnect_delay (float): The seconds waited before the second attempt, doubled for every further one.
+        batch_window (float): The seconds inserts are collected for before being sent. Zero disables batching.
+        max_batch_size (int): The number of collected inserts that are sent right away.
+
+        Raises:
+        ------
+        ValueError: If the pool size, pipelined requests, connect attempts or batch size are not positive.
+
+        Returns:
+        -------
+        None
+        """
+        if min(pool_size, max_pipelined_requests, connect_attempts, max_batch_size) <= 0:
+            msg = "Pool size, pipelined requests, connect attempts and batch size must be positive."
+            raise ValueError(msg)
+
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.max_pipelined_requests = max_pipelined_requests
+        self.connect_attempts = connect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        self._connections: list[_Connection] = []
+        self._connect_lock = asyncio.Lock()
+        # (database name, table name) -> records waiting to be sent and the futures of their ids
+        self._batches: dict[tuple[str, str], list[tuple[dict[str, Any], asyncio.Future]]] = {}
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._is_closed = False
+
+    async def __aenter__(self) -> "AtomLinkerClient":
+        """Enter the context, the client is closed on exit.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        AtomLinkerClient: The client.
+        """
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        """Close the client.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        None
+        """
+        await self.close()
+
+    async def close(self) -> None:
+        """Send the collected inserts, wait for them and close every connection.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        None
+        """
+        self._is_closed = True
+        for key in list(self._batches):
+            self._send_batch(key)
+        await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+
+        connections, self._connections = self._connections, []
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+    async def request(self, opcode: int, payload: object) -> object:
+        """Send a request of the wire protocol and wait for its result.
+
+        Args:
+        ----
+        self: The instance of the class.
+        opcode (int): The opcode of the request.
+        payload (object): The payload of the request.
+
+        Raises:
+        ------
+        InvalidQueryError: If the server rejects the request.
+        ConnectionError: If the server can not be reached or the connection is lost before the response.
+
+        Returns:
+        -------
+        object: The result.
+        """
+        connection = await self._get_connection()
+        return await connection.request(opcode, payload)
+
+    async def _get_connection(self) -> _Connection:
+        if self._is_closed:
+            msg = "Client is closed."
+            raise ConnectionError(msg)
+
+        self._connections = [connection for connection in self._connections if not connection.is_closed]
+        connection = min(self._connections, key=lambda connection: len(connection.pending), default=None)
+        if connection is not None and (
+            len(connection.pending) < self.max_pipelined_requests or len(self._connections) >= self.pool_size
+        ):
+            return connection
+
+        async with self._connect_lock:
+            # another request may have opened a connection while this one waited for the lock
+            self._connections = [connection for connection in self._connections if not connection.is_closed]
+            is_idle = any(not connection.pending for connection in self._connections)
+            if is_idle or len(self._connections) >= self.pool_size:
+                return min(self._connections, key=lambda connection: len(connection.pending))
+
+            connection = await self._connect()
+            self._connections.append(connection)
+            return connection
+
+    async def _connect(self) -> _Connection:
+        delay = self.reconnect_delay
+        for attempt in range(1, self.connect_attempts + 1):
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as error:  # noqa: PERF203
+                if attempt == self.connect_attempts:
+                    msg = f"Could not connect to {self.host}:{self.port}: {error}"
+                    raise ConnectionError(msg) from error
+                logger.warning(f"Connecting to {self.host}:{self.port} failed, retrying in {delay}s: {error}")
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                return _Connection(reader, writer, self.max_pipelined_requests)
+
+        msg = f"Could not connect to {self.host}:{self.port}."
+        raise ConnectionError(msg)
+
+    async def query(self, query: str) -> object:
+        """Execute a query, e.g. "SELECT * FROM test.users WHERE age >= 18".
+
+        Args:
+        ----
+        self: The instance of the class.
+        query (str): The query.
+
+        Returns:
+        -------
+        object: The result, e.g. the selected records or the ids of inserted records.
+        """
+        return await self.request(QUERY, query)
+
+    async def prepare(self, name: str, query: str) -> None:
+        """Prepare an INSERT, SELECT or SEARCH with parameters, e.g. "SELECT * FROM test.users WHERE id = $1".
+
+        Preparing the same query under the same name again does nothing, so every client can prepare the
+        statements it uses.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+        query (str): The statement.
+
+        Returns:
+        -------
+        None
+        """
+        await self.request(PREPARE, [name, query])
+
+    async def execute(self, name: str, *parameters: object) -> object:
+        """Execute a prepared statement.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+        *parameters (object): The values of its parameters, `$1` first.
+
+        Returns:
+        -------
+        object: The result, e.g. the selected records or the ids of inserted records.
+        """
+        return await self.request(EXECUTE, [name, list(parameters)])
+
+    async def create_database(self, database_name: str) -> None:
+        """Create a database.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+
+        Returns:
+        -------
+        None
+        """
+        await self.query(f"CREATE DATABASE {database_name}")
+
+    async def create_table(self, database_name: str, table_name: str, columns: dict[str, type]) -> None:
+        """Create a table.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        columns (dict[str, type]): The column names and types, e.g. {"name": str, "age": int | None}.
+
+        Returns:
+        -------
+        None
+        """
+        column_types = {column_name: encode_column_type(column_type) for column_name, column_type in columns.items()}
+        await self.request(CREATE_TABLE, [database_name, table_name, column_types])
+
+    async def insert(self, database_name: str, table_name: str, record: dict[str, Any]) -> int:
+        """Insert a record, batched with the other inserts into the table within the batch window.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        record (dict): The record.
+
+        Returns:
+        -------
+        int: The id of the record.
+        """
+        if self.batch_window <= 0:
+            return await self.request(INSERT, [database_name, table_name, record])
+
+        key = (database_name, table_name)
+        future = asyncio.get_running_loop().create_future()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = []
+            asyncio.get_running_loop().call_later(self.batch_window, self._send_batch, key, batch)
+        batch.append((record, future))
+        if len(batch) >= self.max_batch_size:
+            self._send_batch(key, batch)
+        return await future
+
+    def _send_batch(self, key: tuple[str, str], batch: list | None = None) -> None:
+        # the timer of a batch that was already sent because it was full must not send the next batch early
+        if batch is None:
+            batch = self._batches.get(key)
+        if batch is None or self._batches.get(key) is not batch:
+            return
+        del self._batches[key]
+
+        task = asyncio.create_task(self._insert_batch(key, batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _insert_batch(self, key: tuple[str, str], batch: list[tuple[dict[str, Any], asyncio.Future]]) -> None:
+        database_name, table_name = key
+        if len(batch) == 1:
+            await self._insert_one(database_name, table_name, *batch[0])
+            return
+
+        try:
+            record_ids = await self.request(INSERT_MANY, [database_name, table_name, [record for record, _ in batch]])
+        except InvalidQueryError:
+            # a batch is inserted entirely or not at all, so the records can be tried again one by one
+            await asyncio.gather(*(self._insert_one(database_name, table_name, *entry) for entry in batch))
+            return
+        except Exception as error:  # noqa: BLE001
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), record_id in zip(batch, record_ids, strict=True):
+            if not future.done():
+                future.set_result(record_id)
+
+    async def _insert_one(
+        self, database_name: str, table_name: str, record: dict[str, Any], future: asyncio.Future,
+    ) -> None:
+        try:
+            record_id = await self.request(INSERT, [database_name, table_name, record])
+        except Exception as error:  # noqa: BLE001
+            if not future.done():
+                future.set_exception(error)
+        else:
+            if not future.done():
+                future.set_result(record_id)
+
+    async def insert_many(self, database_name: str, table_name: str, records: list[dict[str, Any]]) -> list[int]:
+        """Insert records in one request, all of them or none.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        records (list[dict]): The records.
+
+        Returns:
+        -------
+        list[int]: The ids of the records, in the same order as the records.
+        """
+        return await self.request(INSERT_MANY, [database_name, table_name, records])
+
+    async def get(self, database_name: str, table_name: str, record_id: int) -> dict[str, Any] | None:
+        """Get a record by id.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        record_id (int): The id of the record.
+
+        Returns:
+        -------
+        dict | None: The record, or None if there is no record with the id.
+        """
+        return await self.request(GET, [database_name, table_name, record_id])
+
+    async def get_by_column(  # noqa: PLR0913
+        self,
+        database_name: str,
+        table_name: str,
+        column_name: str,
+        column_value: object,
+        read_mode: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Get the records with a value in a column.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        column_name (str): The name of the column.
+        column_value (object): The value.
+        read_mode (str, optional): How the server reads a hash index of the column that is being built,
+            "partial", "wait" or "scan". Defaults to the read mode of the table.
+
+        Returns:
+        -------
+        list[dict]: The matching records.
+        """
+        payload = [database_name, table_name, column_name, column_value]
+        if read_mode is not None:
+            payload.append(read_mode)
+        return await self.request(GET_BY_COLUMN, payload)
+
+    async def search(  # noqa: PLR0913
+        self, database_name: str, table_name: str, column_name: str, search_text: str, limit: int = 10,
+    ) -> list:
+        """Search a text column.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        column_name (str): The name of the column.
+        search_text (str): The text to search for.
+        limit (int, optional): The maximum number of results. Defaults to 10.
+
+        Returns:
+        -------
+        list: The results of the search.
+        """
+        return await self.request(SEARCH, [database_name, table_name, column_name, search_text, limit])
+
+    async def create_index(self, database_name: str, table_name: str, column_name: str) -> None:
+        """Create an index on a column.
+
+        Args:
+        ----
+        self: The instance of the class.
+        database_name (str): The name of the database.
+        table_name (str): The name of the table.
+        column_name (str): The name of the column.
+
+        Returns:
+        -------
+        None
+        """
+        await self.request(CREATE_INDEX, [database_name, table_name, column_name])
+
+
 async def main() -> None:
     """Connect to the server, send a message, and receive the response.
 
-    Establishes a connection to the server at "localhost" on port 5432 using asyncio.
+    Connects to the server at "localhost" on port 5432 using an AtomLinkerClient.
     Sends the command "CREATE DATABASE test" to the server and waits for the response.
-    If the response contains "InvalidQueryError", logs an error message and closes the connection.
+    If the server rejects the query, logs an error message and closes the client.
 
     Args:
     ----
@@ -19,23 +551,15 @@ async def main() -> None:
     -------
     None
     """
-    reader, writer = await asyncio.open_connection("localhost", 5432)
-
-    logger.info("Sending: 'CREATE DATABASE test'")
-    writer.write(b"CREATE DATABASE test")
-
-    data = await reader.read(100)
-
-    response = data.decode()
-    logger.info(f"Received: {response!r}")
-
-    if "InvalidQueryError" in response:
-        logger.error(response)
-        return
+    async with AtomLinkerClient() as client:
+        logger.info("Sending: 'CREATE DATABASE test'")
+        try:
+            await client.query("CREATE DATABASE test")
+        except InvalidQueryError as error:
+            logger.error(error)
+            return
 
-    logger.info("Closing the connection")
-    writer.close()
-    await writer.wait_closed()
+        logger.info("Closing the connection")
 
 if __name__ == "__main__":
     asyncio.run(main())
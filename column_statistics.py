@@ -0,0 +1,586 @@
+import math
+import random
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from threading import Lock
+from typing import get_args
+
+from internal_types import ColumnName, Columns, Record
+
+# registers of the distinct count sketch, 2 ** precision of them, about 3% standard error
+DISTINCT_SKETCH_PRECISION = 10
+# values tracked as most common values, and how many of them are reported
+DEFAULT_MOST_COMMON_VALUE_COUNT = 8
+_TRACKED_VALUE_FACTOR = 4
+# values sampled for the histogram, and its number of buckets
+DEFAULT_SAMPLE_SIZE = 1_024
+DEFAULT_BUCKET_COUNT = 16
+# share of the rows that may change before the histogram is built again from the sample
+HISTOGRAM_REBUILD_FRACTION = 0.1
+# selectivities when a value is unknown, e.g. a parameter of a prepared statement, or can not be estimated
+DEFAULT_EQUAL_SELECTIVITY = 0.005
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+
+_HASH_MASK = (1 << 64) - 1
+# columns with these types hold values that can not be hashed
+_UNHASHABLE_TYPES = (list, dict)
+
+
+class ColumnStatistics:
+    """Statistics of the values of a column that estimate how many rows a condition matches.
+
+    The statistics are kept up to date on every insert, update and delete without scanning the column:
+
+    - The number of rows and of None values are exact.
+    - The number of distinct values is estimated by a HyperLogLog sketch. A sketch can not forget values, so
+      after deletes the estimate is capped by the number of rows.
+    - The most common values are the heavy hitters of a Misra-Gries summary, whose counts are decremented when
+      a row with the value is deleted.
+    - The equi-depth histogram is built from a reservoir sample of the inserted values whenever enough rows
+      changed since it was last built. Deleted values stay in the sample until the column is analyzed again
+      (see `Table.analyze`).
+
+    Args:
+    ----
+        is_hashable (bool): Whether the values can be hashed, only the row counts are kept if they can not.
+        most_common_value_count (int): The number of most common values.
+        sample_size (int): The number of values sampled for the histogram.
+        bucket_count (int): The number of buckets of the histogram.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(
+        self,
+        is_hashable: bool = True,
+        most_common_value_count: int = DEFAULT_MOST_COMMON_VALUE_COUNT,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+        bucket_count: int = DEFAULT_BUCKET_COUNT,
+    ) -> None:
+        """Initialize the statistics of an empty column.
+
+        Args:
+        ----
+        self: The current object.
+        is_hashable (bool): Whether the values can be hashed.
+        most_common_value_count (int): The number of most common values.
+        sample_size (int): The number of values sampled for the histogram.
+        bucket_count (int): The number of buckets of the histogram.
+
+        Returns:
+        -------
+        None
+        """
+        self.is_hashable = is_hashable
+        self.most_common_value_count = most_common_value_count
+        self.sample_size = sample_size
+        self.bucket_count = bucket_count
+
+        self.row_count = 0
+        self.null_count = 0
+
+        self._registers = bytearray(1 << DISTINCT_SKETCH_PRECISION)
+        self._distinct_estimate: float | None = 0.0
+        self._tracked_values: dict[object, int] = {}
+
+        self._sample: list[object] = []
+        self._sampled_count = 0
+        self._random = random.Random(0)
+        self._histogram: list[object] | None = None
+        self._changes_since_histogram = 0
+        # the statistics are changed by writers and read by the planner in the query scheduler threads
+        self._lock = Lock()
+
+    def add(self, value: object) -> None:
+        """Count an inserted value.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The value.
+
+        Returns:
+        -------
+        None
+        """
+        self.add_many((value,))
+
+    def add_many(self, values: Iterable[object]) -> None:  # noqa: C901
+        """Count inserted values.
+
+        Args:
+        ----
+        self: The current object.
+        values (Iterable[object]): The values.
+
+        Returns:
+        -------
+        None
+        """
+        registers = self._registers
+        index_mask = len(registers) - 1
+        rank_bits = 64 - DISTINCT_SKETCH_PRECISION
+        tracked_values = self._tracked_values
+        max_tracked_count = self.most_common_value_count * _TRACKED_VALUE_FACTOR
+        sample, sample_size, draw = self._sample, self.sample_size, self._random.random
+        with self._lock:
+            row_count, null_count, sampled_count = self.row_count, self.null_count, self._sampled_count
+            is_sketch_changed = False
+            for value in values:
+                row_count += 1
+                if value is None:
+                    null_count += 1
+                    continue
+                if not self.is_hashable:
+                    continue
+
+                # hash() of an int is the int itself, so its bits are mixed (splitmix64) to spread them evenly
+                hashed = hash(value) & _HASH_MASK
+                hashed = ((hashed ^ (hashed >> 30)) * 0xBF58476D1CE4E5B9) & _HASH_MASK
+                hashed = ((hashed ^ (hashed >> 27)) * 0x94D049BB133111EB) & _HASH_MASK
+                hashed ^= hashed >> 31
+                rank = rank_bits - (hashed >> DISTINCT_SKETCH_PRECISION).bit_length() + 1
+                register_index = hashed & index_mask
+                if rank > registers[register_index]:
+                    registers[register_index] = rank
+                    is_sketch_changed = True
+
+                count = tracked_values.get(value)
+                if count is not None:
+                    tracked_values[value] = count + 1
+                elif len(tracked_values) < max_tracked_count:
+                    tracked_values[value] = 1
+                else:
+                    # Misra-Gries: a value that does not fit makes every tracked value one less frequent
+                    for tracked_value, tracked_count in list(tracked_values.items()):
+                        if tracked_count == 1:
+                            del tracked_values[tracked_value]
+                        else:
+                            tracked_values[tracked_value] = tracked_count - 1
+
+                # reservoir sampling, every value has the same chance of being in the sample
+                sampled_count += 1
+                if sampled_count <= sample_size:
+                    sample.append(value)
+                elif (position := int(draw() * sampled_count)) < sample_size:
+                    sample[position] = value
+
+            self._changes_since_histogram += row_count - self.row_count
+            self.row_count, self.null_count, self._sampled_count = row_count, null_count, sampled_count
+            if is_sketch_changed:
+                self._distinct_estimate = None
+
+    def remove(self, value: object) -> None:
+        """Count a deleted value.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The value.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self.row_count -= 1
+            self._changes_since_histogram += 1
+            if value is None:
+                self.null_count -= 1
+            elif self.is_hashable and value in self._tracked_values:
+                self._tracked_values[value] -= 1
+                if not self._tracked_values[value]:
+                    del self._tracked_values[value]
+
+    def __getstate__(self) -> list:
+        """Get the statistics without the histogram, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The row and None counts, the distinct count sketch, the tracked values and their counts, the sample
+            and the number of values it was drawn from.
+        """
+        with self._lock:
+            tracked_values = list(self._tracked_values.items())
+            return [
+                self.row_count,
+                self.null_count,
+                bytes(self._registers),
+                [value for value, _ in tracked_values],
+                [count for _, count in tracked_values],
+                list(self._sample),
+                self._sampled_count,
+            ]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the statistics returned by `__getstate__`, the histogram is built from the sample when needed.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        row_count, null_count, registers, tracked_values, tracked_counts, sample, sampled_count = state
+        with self._lock:
+            self.row_count, self.null_count = row_count, null_count
+            self._registers = bytearray(registers)
+            self._distinct_estimate = None
+            self._tracked_values = dict(zip(tracked_values, tracked_counts, strict=True))
+            self._sample = sample
+            self._sampled_count = sampled_count
+            self._histogram = None
+            self._changes_since_histogram = 0
+
+    @property
+    def distinct_count(self) -> int:
+        """Get the estimated number of distinct values, None not included.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The estimated number of distinct values.
+        """
+        non_null_count = self.row_count - self.null_count
+        if non_null_count <= 0:
+            return 0
+        if not self.is_hashable:
+            return non_null_count
+
+        estimate = self._distinct_estimate
+        if estimate is None:
+            estimate = self._distinct_estimate = self._estimate_distinct_count()
+        return max(1, min(round(estimate), non_null_count))
+
+    def _estimate_distinct_count(self) -> float:
+        registers = self._registers
+        register_count = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count * register_count / sum(2.0 ** -register for register in registers)
+        zero_count = registers.count(0)
+        if estimate <= 2.5 * register_count and zero_count:
+            # linear counting is more accurate while most registers are empty
+            estimate = register_count * math.log(register_count / zero_count)
+        return estimate
+
+    def most_common_values(self) -> list[tuple[object, int]]:
+        """Get the most common values with their estimated number of rows, most common first.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list[tuple[object, int]]: The values and their estimated number of rows.
+        """
+        with self._lock:
+            tracked_values = list(self._tracked_values.items())
+        tracked_values.sort(key=lambda item: item[1], reverse=True)
+        # a value is only reported if it is more common than an average value
+        average_count = (self.row_count - self.null_count) / max(self.distinct_count, 1)
+        return [item for item in tracked_values[: self.most_common_value_count] if item[1] > average_count]
+
+    def histogram(self) -> list[object] | None:
+        """Get the bounds of the equi-depth histogram, every bucket holds about as many values as the others.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list[object] | None: The bucket bounds, the first is the lowest and the last the highest sampled value,
+            or None if there are no values or they can not be ordered.
+        """
+        with self._lock:
+            is_stale = self._changes_since_histogram > max(self.row_count, 1) * HISTOGRAM_REBUILD_FRACTION
+            if self._histogram is None or is_stale:
+                self._histogram = self._build_histogram()
+                self._changes_since_histogram = 0
+            return self._histogram or None
+
+    def _build_histogram(self) -> list[object]:
+        try:
+            sample = sorted(self._sample)
+        except TypeError:
+            return []
+        if not sample:
+            return []
+
+        bucket_count = min(self.bucket_count, len(sample))
+        bounds = [sample[len(sample) * bucket // bucket_count] for bucket in range(bucket_count)]
+        bounds.append(sample[-1])
+        return bounds
+
+    def equal_selectivity(self, value: object) -> float:
+        """Estimate the share of the rows whose value equals a value.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The value.
+
+        Returns:
+        -------
+        float: The estimated share of the rows.
+        """
+        if not self.row_count:
+            return 0.0
+        if value is None:
+            return self.null_count / self.row_count
+        if not self.is_hashable:
+            return DEFAULT_EQUAL_SELECTIVITY
+
+        most_common_values = self.most_common_values()
+        for common_value, count in most_common_values:
+            if common_value == value:
+                return count / self.row_count
+
+        # the rows that are not one of the most common values are spread evenly over the other values
+        other_count = self.row_count - self.null_count - sum(count for _, count in most_common_values)
+        other_distinct_count = self.distinct_count - len(most_common_values)
+        if other_count <= 0 or other_distinct_count <= 0:
+            return 0.0
+        return other_count / other_distinct_count / self.row_count
+
+    def generic_equal_selectivity(self) -> float:
+        """Estimate the share of the rows equal to a value that is not known yet, e.g. a parameter.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        float: The estimated share of the rows.
+        """
+        if not self.row_count or not self.is_hashable:
+            return DEFAULT_EQUAL_SELECTIVITY
+        return (self.row_count - self.null_count) / max(self.distinct_count, 1) / self.row_count
+
+    def range_selectivity(
+        self, low: object = None, high: object = None, inclusive: tuple[bool, bool] = (True, True),
+    ) -> float:
+        """Estimate the share of the rows whose value falls between two bounds, None values never do.
+
+        Args:
+        ----
+        self: The current object.
+        low (object, optional): The lower bound. Defaults to no lower bound.
+        high (object, optional): The upper bound. Defaults to no upper bound.
+        inclusive (tuple[bool, bool], optional): Whether the lower and upper bounds are included.
+
+        Returns:
+        -------
+        float: The estimated share of the rows.
+        """
+        if not self.row_count:
+            return 0.0
+        non_null_share = (self.row_count - self.null_count) / self.row_count
+        bounds = self.histogram()
+        if bounds is None:
+            bound_count = (low is not None) + (high is not None)
+            return non_null_share * DEFAULT_RANGE_SELECTIVITY**bound_count
+
+        try:
+            share_below_high = 1.0 if high is None else _share_below(bounds, high, inclusive[1])
+            share_below_low = 0.0 if low is None else _share_below(bounds, low, not inclusive[0])
+        except TypeError:
+            return non_null_share * DEFAULT_RANGE_SELECTIVITY
+        # a range holds at least the rows of one value
+        share = max(share_below_high - share_below_low, self.generic_equal_selectivity() / non_null_share)
+        return non_null_share * min(share, 1.0)
+
+    def get_summary(self) -> dict[str, object]:
+        """Get the statistics, e.g. to show them.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        dict[str, object]: The number of rows, None values and distinct values, the most common values with
+            their number of rows and the histogram bounds.
+        """
+        return {
+            "rows": self.row_count,
+            "nulls": self.null_count,
+            "distinct": self.distinct_count,
+            "most_common_values": [[value, count] for value, count in self.most_common_values()],
+            "histogram": self.histogram(),
+        }
+
+
+def _share_below(bounds: list[object], value: object, include_value: bool) -> float:
+    """Estimate the share of the values below a value, or up to it if it is included, from histogram bounds."""
+    bucket_count = len(bounds) - 1
+    if value < bounds[0] or (value == bounds[0] and not include_value):
+        return 0.0
+    if value > bounds[-1] or (value == bounds[-1] and include_value):
+        return 1.0
+
+    bucket = min(bisect_right(bounds, value) - 1, bucket_count - 1) if include_value else bisect_left(bounds, value) - 1
+    bucket = max(bucket, 0)
+    low, high = bounds[bucket], bounds[bucket + 1]
+    is_number = isinstance(value, int | float) and not isinstance(value, bool)
+    if is_number and isinstance(low, int | float) and isinstance(high, int | float) and high > low:
+        # numbers are assumed to be spread evenly within a bucket
+        within = (value - low) / (high - low)
+    else:
+        within = 0.5
+    return min((bucket + min(max(within, 0.0), 1.0)) / bucket_count, 1.0)
+
+
+class TableStatistics:
+    """The statistics of every column of a table, see `ColumnStatistics`.
+
+    Args:
+    ----
+        columns (Columns): The columns of the table.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, columns: Columns) -> None:
+        """Initialize the statistics of an empty table.
+
+        Args:
+        ----
+        self: The current object.
+        columns (Columns): The columns of the table.
+
+        Returns:
+        -------
+        None
+        """
+        self.columns: dict[ColumnName, ColumnStatistics] = {
+            column_name: ColumnStatistics(is_hashable=_is_hashable_type(column_type))
+            for column_name, column_type in columns.items()
+        }
+
+    @property
+    def row_count(self) -> int:
+        """Get the number of rows.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of rows.
+        """
+        return next((statistics.row_count for statistics in self.columns.values()), 0)
+
+    def __getstate__(self) -> dict[ColumnName, list]:
+        """Get the statistics of every column, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        dict[ColumnName, list]: The state of the statistics of every column.
+        """
+        return {column_name: statistics.__getstate__() for column_name, statistics in self.columns.items()}
+
+    def __setstate__(self, state: dict[ColumnName, list]) -> None:
+        """Restore the statistics of the columns returned by `__getstate__`.
+
+        Args:
+        ----
+        self: The current object.
+        state (dict[ColumnName, list]): The state of the statistics of every column.
+
+        Returns:
+        -------
+        None
+        """
+        for column_name, column_state in state.items():
+            self.columns[column_name].__setstate__(column_state)
+
+    def add_record(self, record: Record) -> None:
+        """Count an inserted record.
+
+        Args:
+        ----
+        self: The current object.
+        record (Record): The record.
+
+        Returns:
+        -------
+        None
+        """
+        for column_name, statistics in self.columns.items():
+            statistics.add(record[column_name])
+
+    def add_column_values(self, column_values: dict[ColumnName, list[object]]) -> None:
+        """Count inserted records, given as the values of every column.
+
+        Args:
+        ----
+        self: The current object.
+        column_values (dict[ColumnName, list[object]]): The values of every column.
+
+        Returns:
+        -------
+        None
+        """
+        for column_name, statistics in self.columns.items():
+            statistics.add_many(column_values[column_name])
+
+    def remove_record(self, record: Record) -> None:
+        """Count a deleted record.
+
+        Args:
+        ----
+        self: The current object.
+        record (Record): The record.
+
+        Returns:
+        -------
+        None
+        """
+        for column_name, statistics in self.columns.items():
+            statistics.remove(record[column_name])
+
+    def replace_record(self, old_record: Record, new_record: Record) -> None:
+        """Count an updated record, only the columns whose values changed.
+
+        Args:
+        ----
+        self: The current object.
+        old_record (Record): The record before the update.
+        new_record (Record): The record after the update.
+
+        Returns:
+        -------
+        None
+        """
+        for column_name, statistics in self.columns.items():
+            old_value, new_value = old_record[column_name], new_record[column_name]
+            if old_value is not new_value and old_value != new_value:
+                statistics.remove(old_value)
+                statistics.add(new_value)
+
+
+def _is_hashable_type(column_type: object) -> bool:
+    member_types = get_args(column_type) or (column_type,)
+    return not any(member_type in _UNHASHABLE_TYPES for member_type in member_types)
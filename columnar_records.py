@@ -0,0 +1,804 @@
+from array import array
+from collections.abc import Iterator, MutableMapping
+from itertools import islice
+from types import NoneType
+from typing import Union, get_args, get_origin
+
+from internal_types import ColumnName, Columns, Record, RowId
+
+# array typecodes for the column types that have a fixed width encoding
+FIXED_WIDTH_TYPECODES = {
+    int: "q",
+    float: "d",
+    bool: "b",
+}
+
+# a string column rewrites its buffer once at least this many bytes and half of it are overwritten strings
+MIN_STRING_GARBAGE_SIZE = 1 << 16
+
+
+def _set_bit(bitmap: bytearray, slot: int, is_set: bool) -> None:
+    if is_set:
+        bitmap[slot >> 3] |= 1 << (slot & 7)
+    else:
+        bitmap[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+
+
+def _get_bit(bitmap: bytearray, slot: int) -> bool:
+    return bool(bitmap[slot >> 3] >> (slot & 7) & 1)
+
+
+def _grow_bitmap(bitmap: bytearray, size: int) -> None:
+    missing = (size + 7) // 8 - len(bitmap)
+    if missing > 0:
+        bitmap.extend(bytes(missing))
+
+
+class UnsupportedValueError(Exception):
+    """Raised when a value can not be stored by a compact column encoding."""
+
+
+class FixedWidthColumn:
+    """Column stored as a typed array, e.g. array('q') for ints and array('d') for floats.
+
+    Nullable columns keep a validity bitmap with one bit per slot; a cleared bit means the value is None.
+    """
+
+    def __init__(self, column_type: type, is_nullable: bool) -> None:
+        """Initialize an empty column.
+
+        Args:
+        ----
+        self: The current object.
+        column_type (type): The type of the values.
+        is_nullable (bool): Whether the column accepts None.
+
+        Returns:
+        -------
+        None
+        """
+        self.column_type = column_type
+        self.values = array(FIXED_WIDTH_TYPECODES[column_type])
+        self.validity: bytearray | None = bytearray() if is_nullable else None
+
+    def __getstate__(self) -> list:
+        """Get the raw column, e.g. to write it to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The array typecode, the raw values and the validity bitmap.
+        """
+        validity = bytes(self.validity) if self.validity is not None else None
+        return [self.values.typecode, self.values.tobytes(), validity]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the column returned by `__getstate__`.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        typecode, values, validity = state
+        self.column_type = next(
+            column_type for column_type, column_typecode in FIXED_WIDTH_TYPECODES.items() if column_typecode == typecode
+        )
+        self.values = array(typecode, values)
+        self.validity = bytearray(validity) if validity is not None else None
+
+    def resize(self, size: int) -> None:
+        """Pad the column with empty slots up to size.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The new number of slots.
+
+        Returns:
+        -------
+        None
+        """
+        missing = size - len(self.values)
+        if missing > 0:
+            self.values.extend(array(self.values.typecode, bytes(missing * self.values.itemsize)))
+        if self.validity is not None:
+            _grow_bitmap(self.validity, size)
+
+    def put(self, slot: int, value: object) -> None:
+        """Store a value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to store the value in.
+        value (object): The value.
+
+        Raises:
+        ------
+        UnsupportedValueError: If the value does not fit the array.
+
+        Returns:
+        -------
+        None
+        """
+        if value is None:
+            if self.validity is None:
+                raise UnsupportedValueError
+            self.values[slot] = 0
+            _set_bit(self.validity, slot, is_set=False)
+            return
+
+        # bools are ints, so an exact type check keeps them from being read back as 0 and 1
+        if type(value) is not self.column_type:
+            raise UnsupportedValueError
+
+        try:
+            self.values[slot] = value
+        except OverflowError as error:
+            raise UnsupportedValueError from error
+
+        if self.validity is not None:
+            _set_bit(self.validity, slot, is_set=True)
+
+    def get(self, slot: int) -> object:
+        """Read the value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to read.
+
+        Returns:
+        -------
+        object: The value.
+        """
+        if self.validity is not None and not _get_bit(self.validity, slot):
+            return None
+        value = self.values[slot]
+        return bool(value) if self.column_type is bool else value
+
+    def iter_values(self, size: int) -> Iterator[object]:
+        """Iterate over the values of the first slots.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The number of slots, slots added while iterating are not read.
+
+        Returns:
+        -------
+        Iterator[object]: The values, in slot order.
+        """
+        if self.validity is None and self.column_type is not bool:
+            return islice(self.values, size)
+        return (self.get(slot) for slot in range(size))
+
+    def compact(self) -> None:
+        """Release unused space. Fixed width columns never have any.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+
+
+class StringColumn:
+    """Column of strings stored as one utf-8 buffer plus per slot offsets and lengths.
+
+    Overwritten and cleared strings leave garbage in the buffer, which `compact` reclaims. The column compacts
+    itself once at least `MIN_STRING_GARBAGE_SIZE` bytes and half of the buffer are garbage.
+    """
+
+    def __init__(self, is_nullable: bool) -> None:
+        """Initialize an empty column.
+
+        Args:
+        ----
+        self: The current object.
+        is_nullable (bool): Whether the column accepts None.
+
+        Returns:
+        -------
+        None
+        """
+        self.data = bytearray()
+        self.offsets = array("q")
+        self.lengths = array("q")
+        self.validity: bytearray | None = bytearray() if is_nullable else None
+        self.garbage_size = 0
+
+    def __getstate__(self) -> list:
+        """Get the raw column, e.g. to write it to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The utf-8 buffer, the raw offsets and lengths and the validity bitmap.
+        """
+        validity = bytes(self.validity) if self.validity is not None else None
+        return [bytes(self.data), self.offsets.tobytes(), self.lengths.tobytes(), validity]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the column returned by `__getstate__`.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        data, offsets, lengths, validity = state
+        self.data = bytearray(data)
+        self.offsets = array("q", offsets)
+        self.lengths = array("q", lengths)
+        self.validity = bytearray(validity) if validity is not None else None
+        self.garbage_size = len(self.data) - sum(self.lengths)
+
+    def resize(self, size: int) -> None:
+        """Pad the column with empty slots up to size.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The new number of slots.
+
+        Returns:
+        -------
+        None
+        """
+        missing = size - len(self.offsets)
+        if missing > 0:
+            padding = array("q", bytes(missing * self.offsets.itemsize))
+            self.offsets.extend(padding)
+            self.lengths.extend(padding)
+        if self.validity is not None:
+            _grow_bitmap(self.validity, size)
+
+    def put(self, slot: int, value: object) -> None:
+        """Store a value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to store the value in.
+        value (object): The value.
+
+        Raises:
+        ------
+        UnsupportedValueError: If the value is not a string.
+
+        Returns:
+        -------
+        None
+        """
+        if value is None:
+            if self.validity is None:
+                raise UnsupportedValueError
+            self.clear(slot)
+            _set_bit(self.validity, slot, is_set=False)
+            return
+
+        if not isinstance(value, str):
+            raise UnsupportedValueError
+
+        encoded = value.encode()
+        offset = len(self.data)
+        # appended before the slot points at it, so a reader never slices past the end of the buffer
+        self.data += encoded
+        self.garbage_size += self.lengths[slot]
+        self.offsets[slot] = offset
+        self.lengths[slot] = len(encoded)
+
+        if self.validity is not None:
+            _set_bit(self.validity, slot, is_set=True)
+
+        self._compact_if_mostly_garbage()
+
+    def clear(self, slot: int) -> None:
+        """Drop the string of a slot, e.g. of a deleted record.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot.
+
+        Returns:
+        -------
+        None
+        """
+        self.garbage_size += self.lengths[slot]
+        self.lengths[slot] = 0
+
+    def get(self, slot: int) -> object:
+        """Read the value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to read.
+
+        Returns:
+        -------
+        object: The value.
+        """
+        if self.validity is not None and not _get_bit(self.validity, slot):
+            return None
+        offset = self.offsets[slot]
+        return self.data[offset : offset + self.lengths[slot]].decode()
+
+    def iter_values(self, size: int) -> Iterator[object]:
+        """Iterate over the values of the first slots.
+
+        The buffer is sliced rather than exported, so strings can still be stored while iterating, and a
+        compaction swaps in new arrays so the ones read here stay consistent.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The number of slots, slots added while iterating are not read.
+
+        Returns:
+        -------
+        Iterator[object]: The values, in slot order.
+        """
+        data = self.data
+        validity = self.validity
+        for slot, offset, length in zip(range(size), self.offsets, self.lengths, strict=False):
+            if validity is not None and not _get_bit(validity, slot):
+                yield None
+            else:
+                yield data[offset : offset + length].decode()
+
+    def compact(self) -> None:
+        """Rewrite the buffer without the strings that were overwritten or cleared.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        data = bytearray()
+        offsets = array("q")
+        for offset, length in zip(self.offsets, self.lengths, strict=True):
+            offsets.append(len(data))
+            data += self.data[offset : offset + length]
+        # new arrays rather than changed ones, scans that already started keep reading the previous ones
+        self.offsets, self.lengths, self.data = offsets, array("q", self.lengths), data
+        self.garbage_size = 0
+
+    def _compact_if_mostly_garbage(self) -> None:
+        if self.garbage_size >= MIN_STRING_GARBAGE_SIZE and self.garbage_size * 2 >= len(self.data):
+            self.compact()
+
+
+class ObjectColumn:
+    """Column of arbitrary Python objects, used for types without a compact encoding such as datetime."""
+
+    def __init__(self) -> None:
+        """Initialize an empty column.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self.cells: list[object] = []
+
+    def __getstate__(self) -> list:
+        """Get the values, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The values, in slot order.
+        """
+        return list(self.cells)
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the column returned by `__getstate__`.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        self.cells = state
+
+    def resize(self, size: int) -> None:
+        """Pad the column with empty slots up to size.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The new number of slots.
+
+        Returns:
+        -------
+        None
+        """
+        missing = size - len(self.cells)
+        if missing > 0:
+            self.cells.extend([None] * missing)
+
+    def put(self, slot: int, value: object) -> None:
+        """Store a value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to store the value in.
+        value (object): The value.
+
+        Returns:
+        -------
+        None
+        """
+        self.cells[slot] = value
+
+    def get(self, slot: int) -> object:
+        """Read the value in a slot.
+
+        Args:
+        ----
+        self: The current object.
+        slot (int): The slot to read.
+
+        Returns:
+        -------
+        object: The value.
+        """
+        return self.cells[slot]
+
+    def iter_values(self, size: int) -> Iterator[object]:
+        """Iterate over the values of the first slots.
+
+        Args:
+        ----
+        self: The current object.
+        size (int): The number of slots, slots added while iterating are not read.
+
+        Returns:
+        -------
+        Iterator[object]: The values, in slot order.
+        """
+        return islice(self.cells, size)
+
+    def compact(self) -> None:
+        """Release unused space. Object columns never have any.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+
+
+ColumnVector = Union[FixedWidthColumn, StringColumn, ObjectColumn]
+# every kind of column vector by name, to restore the vectors of a checkpoint
+COLUMN_VECTOR_TYPES: dict[str, type] = {
+    vector_type.__name__: vector_type for vector_type in (FixedWidthColumn, StringColumn, ObjectColumn)
+}
+
+
+def create_column_vector(column_type: object) -> ColumnVector:
+    """Create the most compact column vector for a column type.
+
+    Args:
+    ----
+        column_type (object): The type of the column, a type or a union of types.
+
+    Returns:
+    -------
+        ColumnVector: The column vector.
+    """
+    is_nullable = False
+    if get_origin(column_type) is Union:
+        column_types = [t for t in get_args(column_type) if t is not NoneType]
+        is_nullable = len(column_types) != len(get_args(column_type))
+        if len(column_types) != 1:
+            return ObjectColumn()
+        column_type = column_types[0]
+
+    if column_type in FIXED_WIDTH_TYPECODES:
+        return FixedWidthColumn(column_type, is_nullable)
+    if column_type is str:
+        return StringColumn(is_nullable)
+    return ObjectColumn()
+
+
+class ColumnarRecords(MutableMapping):
+    """Column oriented storage for the records of a table.
+
+    Behaves like the `dict[RowId, Record]` used by row storage, but every column lives in its own compact
+    vector indexed by slot (row id - 1): typed arrays for ints, floats and bools, an offset encoded buffer for
+    strings, and validity bitmaps for nullable columns. Records are only materialized as dictionaries when they
+    are read, and `iter_column` scans a single column without materializing any record.
+
+    Args:
+    ----
+        columns (Columns): The columns of the table.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, columns: Columns) -> None:
+        """Initialize empty storage for the given columns.
+
+        Args:
+        ----
+        self: The current object.
+        columns (Columns): The columns of the table.
+
+        Returns:
+        -------
+        None
+        """
+        self.columns = columns
+        self.vectors: dict[ColumnName, ColumnVector] = {
+            column_name: create_column_vector(column_type) for column_name, column_type in columns.items()
+        }
+        self._size = 0
+        self._live = bytearray()
+        self._count = 0
+
+    def __getstate__(self) -> list:
+        """Get the raw column vectors, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The number of slots, the live bitmap, the number of live records and the kind and state of every
+            column vector.
+        """
+        return [
+            self._size,
+            bytes(self._live),
+            self._count,
+            {
+                column_name: [type(vector).__name__, vector.__getstate__()]
+                for column_name, vector in self.vectors.items()
+            },
+        ]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the column vectors returned by `__getstate__` without materializing any record.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        self._size, live, self._count, vectors = state
+        self._live = bytearray(live)
+        for column_name, (vector_type_name, vector_state) in vectors.items():
+            vector_type = COLUMN_VECTOR_TYPES[vector_type_name]
+            vector = vector_type.__new__(vector_type)
+            vector.__setstate__(vector_state)
+            self.vectors[column_name] = vector
+
+    def __len__(self) -> int:
+        """Get the number of live records.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of records.
+        """
+        return self._count
+
+    def __contains__(self, record_id: object) -> bool:
+        """Check if a record exists.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (object): The row id.
+
+        Returns:
+        -------
+        bool: True if the record exists, False otherwise.
+        """
+        slot = self._slot(record_id)
+        return slot is not None and _get_bit(self._live, slot)
+
+    def __getitem__(self, record_id: RowId) -> Record:
+        """Materialize a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Raises:
+        ------
+        KeyError: If the record does not exist.
+
+        Returns:
+        -------
+        Record: The record.
+        """
+        slot = self._slot(record_id)
+        if slot is None or not _get_bit(self._live, slot):
+            raise KeyError(record_id)
+        return {column_name: vector.get(slot) for column_name, vector in self.vectors.items()}
+
+    def __setitem__(self, record_id: RowId, record: Record) -> None:
+        """Store a record, overwriting the previous values if the row id already exists.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        record (Record): The record.
+
+        Raises:
+        ------
+        KeyError: If the row id is not a positive integer.
+
+        Returns:
+        -------
+        None
+        """
+        if not isinstance(record_id, int) or record_id <= 0:
+            raise KeyError(record_id)
+
+        slot = record_id - 1
+        if slot >= self._size:
+            self._resize(slot + 1)
+
+        for column_name, vector in self.vectors.items():
+            value = record[column_name]
+            try:
+                vector.put(slot, value)
+            except UnsupportedValueError:
+                self._fall_back_to_object_column(column_name).put(slot, value)
+
+        if not _get_bit(self._live, slot):
+            _set_bit(self._live, slot, is_set=True)
+            self._count += 1
+
+    def __delitem__(self, record_id: RowId) -> None:
+        """Delete a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Raises:
+        ------
+        KeyError: If the record does not exist.
+
+        Returns:
+        -------
+        None
+        """
+        if record_id not in self:
+            raise KeyError(record_id)
+
+        slot = record_id - 1
+        _set_bit(self._live, slot, is_set=False)
+        self._count -= 1
+
+        for vector in self.vectors.values():
+            if isinstance(vector, StringColumn):
+                vector.clear(slot)
+            elif isinstance(vector, ObjectColumn):
+                vector.cells[slot] = None
+
+    def __iter__(self) -> Iterator[RowId]:
+        """Iterate over the row ids of the live records in ascending order.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[RowId]: The row ids.
+        """
+        live = self._live
+        for slot in range(self._size):
+            if live[slot >> 3] >> (slot & 7) & 1:
+                yield slot + 1
+
+    def iter_column(self, column_name: ColumnName) -> Iterator[tuple[RowId, object]]:
+        """Scan a single column without materializing records.
+
+        Only the records that existed when the scan started are read, records can be inserted meanwhile.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Returns:
+        -------
+        Iterator[tuple[RowId, object]]: The row id and column value of every live record.
+        """
+        size = self._size
+        column = zip(range(1, size + 1), self.vectors[column_name].iter_values(size), strict=False)
+        if self._count == size:
+            # no deleted records, so every slot is live and the bitmap does not need to be checked
+            return column
+
+        live = self._live
+        return ((record_id, value) for record_id, value in column if _get_bit(live, record_id - 1))
+
+    def compact(self) -> None:
+        """Reclaim the space used by overwritten and deleted strings.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        for vector in self.vectors.values():
+            vector.compact()
+
+    def _slot(self, record_id: object) -> int | None:
+        if not isinstance(record_id, int) or not 0 < record_id <= self._size:
+            return None
+        return record_id - 1
+
+    def _resize(self, size: int) -> None:
+        for vector in self.vectors.values():
+            vector.resize(size)
+        _grow_bitmap(self._live, size)
+        self._size = size
+
+    def _fall_back_to_object_column(self, column_name: ColumnName) -> ObjectColumn:
+        vector = self.vectors[column_name]
+        object_column = ObjectColumn()
+        object_column.cells = [vector.get(slot) for slot in range(self._size)]
+        self.vectors[column_name] = object_column
+        return object_column
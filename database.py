@@ -1,8 +1,31 @@
+from collections.abc import Iterable
 from typing import Any, Union
 
+from checkpoint import load_checkpoint, read_manifest, write_checkpoint
 from internal_types import Columns
 from log import get_logger
-from table import Table
+from parallel_scan import shutdown_scan_executor
+from record_codec import decode_column_type, encode_column_type
+from segmented_records import SegmentedRecords
+from table import ROW_STORAGE, Table
+from tokenizer import Tokenizer
+from write_ahead_log import (
+    CREATE_FOREIGN_KEY,
+    CREATE_INDEX,
+    CREATE_INVERTED_INDEX,
+    CREATE_SORTED_INDEX,
+    CREATE_TABLE,
+    CREATE_UNIQUE_INDEX,
+    DEFAULT_COMMIT_DELAY,
+    DEFAULT_FLUSH_INTERVAL,
+    DELETE,
+    DROP_TABLE,
+    FREEZE_RECORDS,
+    INSERT,
+    INSERT_MANY,
+    UPDATE,
+    WriteAheadLog,
+)
 
 logger = get_logger(__file__)
 
@@ -10,9 +33,20 @@ logger = get_logger(__file__)
 class Database:
     """Represents a database.
 
+    With a write-ahead log, every table change is appended to the log once it is applied, and the log is
+    replayed when the database is opened again, so the data survives a restart or a crash.
+
     Args:
     ----
         name (str): The name of the database.
+        write_ahead_log_path (str, optional): The path of the write-ahead log. Defaults to an in-memory database.
+        flush_interval (float, optional): The maximum number of seconds a change waits to be written to the log
+            without synchronous commit.
+        synchronous_commit (bool, optional): To wait for every change to be on disk before returning.
+        checkpoint_directory (str, optional): The directory of the checkpoints, loaded on startup before the
+            write-ahead log entries that came after them are replayed.
+        commit_delay (float, optional): The number of seconds a change waited for stays buffered, so the changes
+            of other writers share its fsync.
 
     Raises:
     ------
@@ -23,13 +57,30 @@ class Database:
         None
     """
 
-    def __init__(self, name: str) -> None:
-        """Initialize a new instance of the class.
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        write_ahead_log_path: str | None = None,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        synchronous_commit: bool = True,
+        checkpoint_directory: str | None = None,
+        commit_delay: float = DEFAULT_COMMIT_DELAY,
+    ) -> None:
+        """Initialize a new instance of the class, loading its latest checkpoint and replaying its write-ahead log.
 
         Args:
         ----
         self: The current object.
         name (str): The name of the database.
+        write_ahead_log_path (str, optional): The path of the write-ahead log. Defaults to an in-memory
+            database.
+        flush_interval (float, optional): The maximum number of seconds a change waits to be written to the
+            log without synchronous commit. Defaults to 0.01.
+        synchronous_commit (bool, optional): To wait for every change to be on disk before returning, which
+            costs one fsync per change unless the changes are made in `group_commit`. Defaults to True.
+        checkpoint_directory (str, optional): The directory of the checkpoints. Defaults to no checkpoints.
+        commit_delay (float, optional): The number of seconds a change waited for stays buffered, so the
+            changes of other writers share its fsync. Defaults to 0.002.
 
         Raises:
         ------
@@ -48,6 +99,138 @@ class Database:
 
         self.name = name
         self.tables: dict[str, Table] = {}
+        self.write_ahead_log: WriteAheadLog | None = None
+        self.checkpoint_directory = checkpoint_directory
+        self._manifest: dict | None = None
+
+        write_ahead_log_offset = 0
+        if checkpoint_directory is not None:
+            self._manifest = read_manifest(checkpoint_directory)
+            if self._manifest is not None:
+                self.tables.update(load_checkpoint(checkpoint_directory, self._manifest))
+                write_ahead_log_offset = self._manifest["write_ahead_log_offset"]
+
+        if write_ahead_log_path is not None:
+            write_ahead_log = WriteAheadLog(
+                write_ahead_log_path,
+                flush_interval,
+                synchronous_commit,
+                start_offset=write_ahead_log_offset,
+                commit_delay=commit_delay,
+            )
+            self.replay(write_ahead_log.iter_entries(write_ahead_log_offset))
+            self.write_ahead_log = write_ahead_log
+            for table in self.tables.values():
+                table.write_ahead_log = write_ahead_log
+
+    def replay(self, entries: Iterable[list]) -> None:
+        """Apply the entries of a write-ahead log, in order.
+
+        An entry that can not be applied, e.g. a change to a table that was dropped by hand, is logged and skipped.
+
+        Args:
+        ----
+        self: The current object.
+        entries (Iterable[list]): The entries.
+
+        Returns:
+        -------
+        None
+        """
+        replayed_count = 0
+        for entry in entries:
+            try:
+                self._replay_entry(*entry)
+            except (ValueError, TypeError, KeyError):  # noqa: PERF203
+                logger.exception(f"failed to replay {entry[0]} on {entry[1]}")
+            else:
+                replayed_count += 1
+        logger.info(f"replayed {replayed_count} write-ahead log entries into {self.name}")
+
+    def checkpoint(self) -> None:
+        """Write the tables that changed since the previous checkpoint to the checkpoint directory.
+
+        Args:
+        ----
+        self: The current object.
+
+        Raises:
+        ------
+        ValueError: If the database has no checkpoint directory.
+
+        Returns:
+        -------
+        None
+        """
+        if self.checkpoint_directory is None:
+            msg = f"Database {self.name} has no checkpoint directory."
+            raise ValueError(msg)
+
+        self._manifest = write_checkpoint(
+            self.tables, self.checkpoint_directory, self.write_ahead_log, self._manifest,
+        )
+
+    def _replay_entry(self, operation: str, table_name: str, *arguments: Any) -> None:  # noqa: ANN401, C901, PLR0912
+        if operation == CREATE_TABLE:
+            if table_name in self.tables:
+                # created while the checkpoint was written
+                return
+            column_types, storage, tokenizer_config = arguments
+            columns = {column_name: decode_column_type(name) for column_name, name in column_types.items()}
+            tokenizer = Tokenizer(*tokenizer_config) if tokenizer_config is not None else None
+            self.create_table(table_name, columns, storage=storage, tokenizer=tokenizer)
+            return
+        if operation == DROP_TABLE:
+            self.drop_table(table_name)
+            return
+
+        table = self.get_table(table_name)
+        if operation == INSERT:
+            record_id, record = arguments
+            # the record is already there if it was inserted while the checkpoint was written
+            if record_id in table.records:
+                table.delete_record_by_id(record_id)
+            table.count = record_id - 1
+            table.insert_record(record)
+        elif operation == INSERT_MANY:
+            first_record_id, records = arguments
+            for record_id in range(first_record_id, first_record_id + len(records)):
+                if record_id in table.records:
+                    table.delete_record_by_id(record_id)
+            table.count = first_record_id - 1
+            table.insert_records(records)
+        elif operation == UPDATE:
+            table.update_record_by_id(*arguments)
+        elif operation == DELETE:
+            table.delete_record_by_id(*arguments)
+        elif operation in (CREATE_INDEX, CREATE_UNIQUE_INDEX, CREATE_SORTED_INDEX, CREATE_INVERTED_INDEX):
+            self._replay_create_index(table, operation, *arguments)
+        elif operation == FREEZE_RECORDS:
+            last_record_id, path = arguments
+            # the records are already frozen if the checkpoint was written after
+            if not isinstance(table.records, SegmentedRecords) or table.records.frozen_record_id < last_record_id:
+                table.freeze_records(last_record_id, path)
+        elif operation == CREATE_FOREIGN_KEY:
+            column_name, foreign_table_name = arguments
+            table.create_foreign_key_column(column_name, self.get_table(foreign_table_name))
+        else:
+            msg = f"Unknown write-ahead log operation {operation}."
+            raise ValueError(msg)
+
+    def _replay_create_index(self, table: Table, operation: str, column_name: str, *arguments: Any) -> None:  # noqa: ANN401
+        indexes, create_index = {
+            CREATE_INDEX: (table.indexes, table.create_index),
+            CREATE_UNIQUE_INDEX: (table.unique_indexes, table.create_unique_index),
+            CREATE_SORTED_INDEX: (table.sorted_indexes, table.create_sorted_index),
+            CREATE_INVERTED_INDEX: (table.inverted_indexes, table.create_inverted_index),
+        }[operation]
+        # the index is already there if it was created while the checkpoint was written
+        if column_name not in indexes:
+            create_index(column_name, *arguments)
+
+    def _log_operation(self, operation: str, *arguments: object) -> None:
+        if self.write_ahead_log is not None:
+            self.write_ahead_log.append([operation, *arguments])
 
     def is_type_or_union_of_types(self, x: object) -> bool:
         """Check if the given object is a type or a union of types.
@@ -145,7 +328,9 @@ class Database:
 
         self.__validate_create_table_columns(columns)
 
-    def create_table(self, name: str, columns: Columns) -> None:
+    def create_table(
+        self, name: str, columns: Columns, storage: str = ROW_STORAGE, tokenizer: Tokenizer | None = None,
+    ) -> None:
         """Create a new table in the database.
 
         Args:
@@ -153,6 +338,10 @@ class Database:
         self: The current object.
         name (str): The name of the table.
         columns (dict): A dictionary representing the columns of the table.
+        storage (str, optional): "row" to store a dictionary per record or "columnar" to store compact arrays
+            per column. Defaults to "row".
+        tokenizer (Tokenizer, optional): How the text columns are split into words, e.g. with diacritic folding
+            or stemming. Defaults to the shared default tokenizer.
 
         Raises:
         ------
@@ -165,6 +354,8 @@ class Database:
         ValueError: If a column does not have a type.
         TypeError: If a column name is not a string.
         TypeError: If a column type is not a type.
+        ValueError: If the storage is not supported.
+        CodecError: If a column type can not be written to the write-ahead log.
 
         Returns:
         -------
@@ -172,7 +363,17 @@ class Database:
         """
         self.__validate_create_table(name, columns)
 
-        self.tables[name] = Table(name, columns)
+        table = Table(name, columns, storage=storage, tokenizer=tokenizer)
+
+        if self.write_ahead_log is not None:
+            tokenizer_config = tokenizer.get_config() if tokenizer is not None else None
+            column_types = {
+                column_name: encode_column_type(column_type) for column_name, column_type in columns.items()
+            }
+            self.write_ahead_log.append([CREATE_TABLE, name, column_types, storage, tokenizer_config])
+            table.write_ahead_log = self.write_ahead_log
+
+        self.tables[name] = table
 
     def get_table(self, name: str) -> Table:
         """Retrieve a table from the database.
@@ -217,6 +418,25 @@ class Database:
             raise ValueError(msg)
 
         del self.tables[name]
+        self._log_operation(DROP_TABLE, name)
+
+    def shutdown_table(self, name: str) -> None:
+        """Shutdown a table, stopping its index threads and closing its frozen segments.
+
+        Args:
+        ----
+        self: The current object.
+        name (str): The name of the table to shut down.
+
+        Raises:
+        ------
+        ValueError: If the table does not exist.
+
+        Returns:
+        -------
+        None
+        """
+        self.get_table(name).shutdown()
 
     def create_foreign_key(
         self, table_name: str, column_name: str, foreign_table_name: str,
@@ -288,6 +508,43 @@ class Database:
 
         return table.insert_record(record)
 
+    def insert_records_into_table(self, table_name: str, records: list[dict[str, Any]]) -> list[int]:
+        """Insert a batch of records into a table.
+
+        Foreign keys are checked once per column for the whole batch before the records are inserted.
+
+        Args:
+        ----
+            table_name (str): The name of the table.
+            records (list[dict[str, Any]]): The records to insert.
+
+        Raises:
+        ------
+            ValueError: If the table does not exist.
+            ValueError: If a foreign key value does not exist in its foreign table.
+
+        Returns:
+        -------
+            list[int]: The ids of the inserted records.
+        """
+        if table_name not in self.tables:
+            msg = f"Table {table_name} does not exist."
+            raise ValueError(msg)
+
+        table = self.tables[table_name]
+
+        table.validate_records(records)
+
+        for column_name, foreign_table_name in table.foreign_keys.items():
+            foreign_table = self.tables[foreign_table_name]
+            column_values = {record[column_name] for record in records}
+            missing_values = column_values.difference(foreign_table.records.keys())
+            if missing_values:
+                msg = f"Value {min(missing_values)} does not exist in foreign table {foreign_table_name}."
+                raise ValueError(msg)
+
+        return table.insert_records(records)
+
     def update_record_by_id_into_table(self, table_name: str, record_id: int, record: dict[str, Any]) -> None:
         """_summary_.
 
@@ -334,6 +591,35 @@ class Database:
         records.sort(key=lambda x: x[sort_by], reverse=reverse)
         return None
 
+    def get_sorted_records_from_table(
+        self, table_name: str, sort_by: str, reverse: bool = False, limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Get the records of a table sorted by the given column.
+
+        Unlike sort_records, this reads the records in order from the sorted index of the column when it has one,
+        so neither a full scan nor a full sort is needed.
+
+        Args:
+        ----
+            table_name (str): The name of the table.
+            sort_by (str): The column to sort by.
+            reverse (bool, optional): To sort by descending. Defaults to False.
+            limit (int, optional): The maximum number of records to return. Defaults to every record.
+
+        Raises:
+        ------
+            ValueError: If the table does not exist.
+
+        Returns:
+        -------
+            list[dict[str, Any]]: The sorted records.
+        """
+        if table_name not in self.tables:
+            msg = f"Table {table_name} does not exist."
+            raise ValueError(msg)
+
+        return self.tables[table_name].get_records_sorted(sort_by, reverse=reverse, limit=limit)
+
     def shutdown(self) -> None:
         """Shutdown the database.
 
@@ -347,3 +633,9 @@ class Database:
         """
         for table in self.tables.values():
             table.shutdown()
+
+        # started again by the next scan that needs it, e.g. of another database of the process
+        shutdown_scan_executor()
+
+        if self.write_ahead_log is not None:
+            self.write_ahead_log.close()
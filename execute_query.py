@@ -1,5 +1,22 @@
 from database import Database
 from errors import InvalidQueryError
+from prepared_statement import PreparedStatement
+from query_parser import Deallocate, Execute, Explain, Prepare, ShowStatements, format_identifier
+from query_plan import PlanCache, QueryPlan
+from record_codec import CodecError, decode_column_type
+from wire_protocol import (
+    CREATE_INDEX,
+    CREATE_TABLE,
+    EXECUTE,
+    GET,
+    GET_BY_COLUMN,
+    INSERT,
+    INSERT_MANY,
+    PREPARE,
+    QUERY,
+    RANK_SEARCH,
+    SEARCH,
+)
 
 
 # TODO: rename this class to something more descriptive
@@ -9,11 +26,10 @@ from errors import InvalidQueryError
 class ExecuteQuery:
     """Execute a query.
 
-    Executes the given query based on its type.
-    If the query is a "CREATE DATABASE" query, it creates a new database with the specified name.
-    If the query is a "DELETE DATABASE" query, it deletes the specified database.
-    If the query is a "SHUTDOWN TABLE" query, it shuts down the specified table in the specified database.
-    Otherwise, it raises an InvalidQueryError.
+    Executes queries of the query language (see `query_parser`) and requests of the binary wire protocol on the
+    databases it stores. Queries are compiled into plans that are cached by their text, so a repeated query is not
+    parsed again, and INSERT, SELECT and SEARCH can be prepared with parameters (see `PreparedStatement`), so they
+    are not parsed or planned again for other values either. Prepared statements are shared by every client.
 
     Args:
     ----
@@ -32,7 +48,7 @@ class ExecuteQuery:
     def __init__(self) -> None:
         """Initialize the ExecuteQuery object.
 
-        Creates an empty dictionary to store databases.
+        Creates an empty dictionary to store databases, the cache of query plans and the prepared statements.
 
         Args:
         ----
@@ -43,15 +59,206 @@ class ExecuteQuery:
         None
         """
         self.databases = {}
+        self.plan_cache = PlanCache()
+        self.prepared_statements: dict[str, PreparedStatement] = {}
 
-    def execute_query(self, query: str) -> None:
+    def plan_query(self, query: str) -> QueryPlan:
+        """Get the plan of a query from the plan cache, parsing and compiling it if it is not cached.
+
+        Args:
+        ----
+        self: The instance of the class.
+        query (str): The query.
+
+        Returns:
+        -------
+        QueryPlan: The plan.
+
+        Raises:
+        ------
+        InvalidQueryError: If the query is malformed.
+        """
+        try:
+            return self.plan_cache.get_plan(query)
+        except ValueError as error:
+            raise InvalidQueryError(str(error)) from error
+
+    def execute_plan(self, plan: QueryPlan) -> object:
+        """Execute the plan of a query.
+
+        Args:
+        ----
+        self: The instance of the class.
+        plan (QueryPlan): The plan.
+
+        Returns:
+        -------
+        object: The result, e.g. the ids of inserted records or the selected records.
+
+        Raises:
+        ------
+        InvalidQueryError: If the query fails, e.g. because the specified database or table does not exist.
+        """
+        statement = plan.statement
+        if isinstance(statement, Prepare):
+            self.prepare(statement)
+            return None
+        if isinstance(statement, Execute):
+            return self.execute_prepared(statement.name, statement.parameters)
+        if isinstance(statement, Deallocate):
+            self.deallocate(statement.name)
+            return None
+        if isinstance(statement, ShowStatements):
+            return self.show_statements()
+
+        try:
+            if isinstance(statement, Explain) and isinstance(statement.statement, Execute):
+                return self.get_prepared_statement(statement.statement.name).explain(self.databases)
+            return plan.execute(self.databases)
+        except (ValueError, TypeError, KeyError) as error:
+            raise InvalidQueryError(str(error)) from error
+
+    def prepare(self, statement: Prepare) -> PreparedStatement:
+        """Prepare a statement, preparing the same query under the same name again does nothing.
+
+        The statement is validated against its table right away.
+
+        Args:
+        ----
+        self: The instance of the class.
+        statement (Prepare): The parsed PREPARE.
+
+        Returns:
+        -------
+        PreparedStatement: The prepared statement.
+
+        Raises:
+        ------
+        InvalidQueryError: If another query is prepared under the name, or the statement does not fit its table.
+        """
+        prepared_statement = self.prepared_statements.get(statement.name)
+        if prepared_statement is not None:
+            if prepared_statement.query != statement.query:
+                msg = f"prepared statement {statement.name} already exists"
+                raise InvalidQueryError(msg)
+            return prepared_statement
+
+        prepared_statement = PreparedStatement(
+            statement.name, statement.query, statement.statement, statement.parameter_count,
+        )
+        try:
+            prepared_statement.bind(self.databases)
+        except (ValueError, KeyError) as error:
+            raise InvalidQueryError(str(error)) from error
+        self.prepared_statements[statement.name] = prepared_statement
+        return prepared_statement
+
+    def prepare_query(self, name: str, query: str) -> PreparedStatement:
+        """Prepare the text of an INSERT, SELECT or SEARCH with parameters, like `PREPARE name AS query`.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+        query (str): The statement, e.g. `SELECT * FROM test.users WHERE id = $1`.
+
+        Returns:
+        -------
+        PreparedStatement: The prepared statement.
+
+        Raises:
+        ------
+        InvalidQueryError: If the query is malformed or can not be prepared, or another query is prepared under
+            the name.
+        """
+        return self.prepare(self.plan_query(f"PREPARE {format_identifier(name)} AS {query}").statement)
+
+    def get_prepared_statement(self, name: str) -> PreparedStatement:
+        """Get a prepared statement.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+
+        Returns:
+        -------
+        PreparedStatement: The prepared statement.
+
+        Raises:
+        ------
+        InvalidQueryError: If no statement is prepared under the name.
+        """
+        prepared_statement = self.prepared_statements.get(name)
+        if prepared_statement is None:
+            msg = f"prepared statement {name} does not exist"
+            raise InvalidQueryError(msg)
+        return prepared_statement
+
+    def execute_prepared(self, name: str, parameters: tuple | list) -> object:
+        """Execute a prepared statement.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+        parameters (tuple | list): The values of its parameters, `$1` first.
+
+        Returns:
+        -------
+        object: The result, like the result of the statement as a query.
+
+        Raises:
+        ------
+        InvalidQueryError: If no statement is prepared under the name, the number of values is wrong or the
+            statement fails.
+        """
+        prepared_statement = self.get_prepared_statement(name)
+        try:
+            return prepared_statement.execute(self.databases, parameters)
+        except (ValueError, TypeError, KeyError) as error:
+            raise InvalidQueryError(str(error)) from error
+
+    def deallocate(self, name: str) -> None:
+        """Remove a prepared statement.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+
+        Returns:
+        -------
+        None
+
+        Raises:
+        ------
+        InvalidQueryError: If no statement is prepared under the name.
+        """
+        self.get_prepared_statement(name)
+        del self.prepared_statements[name]
+
+    def show_statements(self) -> list[dict[str, object]]:
+        """Get the prepared statements with their execution stats, see `PreparedStatement.get_stats`.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        list[dict[str, object]]: The stats of every prepared statement, ordered by name.
+        """
+        return [self.prepared_statements[name].get_stats() for name in sorted(self.prepared_statements)]
+
+    def execute_query(self, query: str) -> object:
         """Execute a query.
 
-        Executes the given query based on its type.
-        If the query is a "CREATE DATABASE" query, it creates a new database with the specified name.
-        If the query is a "DELETE DATABASE" query, it deletes the specified database.
-        If the query is a "SHUTDOWN TABLE" query, it shuts down the specified table in the specified database.
-        Otherwise, it raises an InvalidQueryError.
+        Supported are CREATE DATABASE, DELETE DATABASE, CREATE TABLE, DROP TABLE, SHUTDOWN TABLE, INSERT, SELECT,
+        SEARCH and CREATE INDEX, e.g. `SELECT name FROM test.users WHERE age >= 18 ORDER BY name LIMIT 10`, and
+        PREPARE, EXECUTE, DEALLOCATE and SHOW STATEMENTS, e.g. `PREPARE adults AS SELECT name FROM test.users
+        WHERE age >= $1` and `EXECUTE adults(18)`. EXPLAIN SELECT and EXPLAIN EXECUTE return the steps of the
+        execution as lines of text, and ANALYZE database.table builds the statistics of a table again.
 
         Args:
         ----
@@ -60,43 +267,109 @@ class ExecuteQuery:
 
         Returns:
         -------
-        None
+        object: The result, None for statements that do not return anything.
 
         Raises:
         ------
         InvalidQueryError: If the query is invalid or the specified database or table does not exist.
         """
-        # TODO: make this a map maybe?
-        if query.startswith("CREATE DATABASE"):
-            database_name = query.split(" ")[2]
+        return self.execute_plan(self.plan_query(query))
 
-            if database_name in self.databases:
-                msg = f"database {database_name} already exists"
-                raise InvalidQueryError(msg)
+    def execute_request(self, opcode: int, payload: object) -> object:
+        """Execute a request of the binary wire protocol.
 
-            db = Database(database_name)
-            self.databases[database_name] = db
-        elif query.startswith("DELETE DATABASE"):
-            database_name = query.split(" ")[2]
+        PREPARE takes [name, query] and EXECUTE [name, parameters], like the PREPARE and EXECUTE queries but
+        without parsing the values of the parameters. Every other payload but the text of a QUERY is a list that
+        starts with the database and table names, followed
+        by the arguments of the operation:
+        CREATE_TABLE [columns as type names], INSERT [record], INSERT_MANY [records], GET [record id],
+        GET_BY_COLUMN [column, value] or [column, value, read mode] (see `Table.get_index_high_water`),
+        SEARCH [column, text, limit], CREATE_INDEX [column] and RANK_SEARCH [column, text, limit], whose result is
+        a list of [record, score] pairs.
 
-            db = self.databases.pop(database_name, None)
-            if not db:
-                msg = f"database {database_name} does not exist"
-                raise InvalidQueryError(msg)
+        Args:
+        ----
+        self: The instance of the class.
+        opcode (int): The opcode of the request.
+        payload (object): The decoded payload of the request.
 
-            db.shutdown()
-            # TODO: db.delete(): implement this
-            del db
-        elif query.startswith("SHUTDOWN TABLE"):
-            database_name = query.split(" ")[2]
-            table_name = query.split(" ")[4]
+        Returns:
+        -------
+        object: The result, e.g. the id of an inserted record or the matching records.
 
-            db = self.databases.get(database_name)
-            if not db:
-                msg = f"database {database_name} does not exist"
+        Raises:
+        ------
+        InvalidQueryError: If the request is invalid or fails.
+        """
+        if opcode == QUERY:
+            if not isinstance(payload, str):
+                msg = "query must be a string"
+                raise InvalidQueryError(msg)
+            return self.execute_query(payload)
+        is_pair = isinstance(payload, list) and len(payload) == 2  # noqa: PLR2004
+        if opcode == PREPARE:
+            if not (is_pair and all(isinstance(item, str) for item in payload)):
+                msg = "payload must be the name and query of the statement"
                 raise InvalidQueryError(msg)
+            self.prepare_query(*payload)
+            return None
+        if opcode == EXECUTE:
+            if not (is_pair and isinstance(payload[0], str) and isinstance(payload[1], list)):
+                msg = "payload must be the name of the statement and the values of its parameters"
+                raise InvalidQueryError(msg)
+            return self.execute_prepared(*payload)
+
+        if not isinstance(payload, list) or len(payload) < 2:  # noqa: PLR2004
+            msg = "payload must start with the database and table names"
+            raise InvalidQueryError(msg)
 
-            db.shutdown_table(table_name)
-        else:
-            msg = "failed to execute query"
+        database_name, table_name, *arguments = payload
+        database = self.databases.get(database_name)
+        if database is None:
+            msg = f"database {database_name} does not exist"
             raise InvalidQueryError(msg)
+
+        try:
+            return self._execute_table_request(database, opcode, table_name, arguments)
+        except (ValueError, TypeError, KeyError, CodecError) as error:
+            raise InvalidQueryError(str(error)) from error
+
+    def _execute_table_request(  # noqa: PLR0911
+        self, database: Database, opcode: int, table_name: str, arguments: list,
+    ) -> object:
+        if opcode == CREATE_TABLE:
+            (column_types,) = arguments
+            columns = {column_name: decode_column_type(name) for column_name, name in column_types.items()}
+            database.create_table(table_name, columns)
+            return None
+        if opcode == INSERT:
+            (record,) = arguments
+            return database.insert_record_into_table(table_name, record)
+        if opcode == INSERT_MANY:
+            (records,) = arguments
+            return database.insert_records_into_table(table_name, records)
+
+        table = database.get_table(table_name)
+        if opcode == GET:
+            (record_id,) = arguments
+            return table.records.get(record_id)
+        if opcode == GET_BY_COLUMN:
+            column_name, column_value, *read_mode = arguments
+            return table.get_records_by_column(column_name, column_value, *read_mode)
+        if opcode == SEARCH:
+            column_name, search_text, limit = arguments
+            return table.search(column_name, search_text, limit)
+        if opcode == RANK_SEARCH:
+            column_name, search_text, limit = arguments
+            return [
+                [record, score]
+                for record_id, score in table.rank_records(column_name, search_text, limit)
+                if (record := table.records.get(record_id)) is not None
+            ]
+        if opcode == CREATE_INDEX:
+            (column_name,) = arguments
+            table.create_index(column_name)
+            return None
+
+        msg = f"unknown opcode {opcode}"
+        raise InvalidQueryError(msg)
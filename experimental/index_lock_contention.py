@@ -0,0 +1,120 @@
+# Lookups on a hash index with reader threads, with and without a writer adding batches to the index like the index
+# worker, for one exclusive lock per column against striped read-write locks.
+# Run from the repository root with LOG_LEVEL=INFO, every lookup writes a debug log line otherwise:
+# LOG_LEVEL=INFO python experimental/index_lock_contention.py
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, ".")
+
+from read_write_lock import ColumnLock, StripedReadWriteLock  # noqa: E402
+from table import Table  # noqa: E402
+
+RECORD_COUNT = 200_000
+VALUE_COUNT = 1_000
+DURATION = 2.0
+READER_THREAD_COUNTS = (1, 2, 4, 8)
+WRITER_BATCH_SIZE = 10_000
+
+
+def create_table():
+    table = Table("contention", {"city": str})
+    rng = random.Random(0)
+    table.insert_records([{"city": f"city-{rng.randrange(VALUE_COUNT)}"} for _ in range(RECORD_COUNT)])
+    table.create_index("city")
+    table.wait_for_index("city")
+    table.flush_indexes()
+    return table
+
+
+def run(table, reader_thread_count, with_writer):
+    stop = threading.Event()
+    counts = [0] * reader_thread_count
+    latencies = [[] for _ in range(reader_thread_count)]
+
+    def reader(position):
+        rng = random.Random(position)
+        while not stop.is_set():
+            value = f"city-{rng.randrange(VALUE_COUNT)}"
+            start = time.perf_counter()
+            table.get_record_ids_by_column("city", value)
+            latencies[position].append(time.perf_counter() - start)
+            counts[position] += 1
+
+    def writer():
+        # what the index worker does for a batch of inserted records
+        rng = random.Random(-1)
+        while not stop.is_set():
+            first_record_id = rng.randrange(1, RECORD_COUNT - WRITER_BATCH_SIZE)
+            table._index_records(list(range(first_record_id, first_record_id + WRITER_BATCH_SIZE)))
+
+    threads = [threading.Thread(target=reader, args=(position,)) for position in range(reader_thread_count)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    all_latencies = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+    p99 = all_latencies[int(len(all_latencies) * 0.99)] if all_latencies else 0.0
+    return sum(counts) / DURATION, p99
+
+
+def main():
+    table = create_table()
+    default_lock_name = type(table.column_locks["city"]).__name__
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]}, gil enabled: {is_gil_enabled}, tables use: {default_lock_name}")
+    for with_writer in (False, True):
+        print(f"\n{'with' if with_writer else 'without'} a writer indexing batches of {WRITER_BATCH_SIZE} records")
+        for name, column_lock in (("exclusive", ColumnLock()), ("striped rw", StripedReadWriteLock())):
+            table.column_locks["city"] = column_lock
+            for reader_thread_count in READER_THREAD_COUNTS:
+                throughput, p99 = run(table, reader_thread_count, with_writer)
+                print(
+                    f"{name:>10} {reader_thread_count} readers: {throughput:>9,.0f} lookups/s, "
+                    f"p99 {p99 * 1_000:.3f}ms",
+                )
+    table.shutdown()
+
+
+if __name__ == "__main__":
+    main()
+
+
+
+# ➜  atom-linker git:(main) ✗ LOG_LEVEL=INFO python experimental/index_lock_contention.py
+# python 3.11.7, gil enabled: True, tables use: StripedReadWriteLock
+#
+# without a writer indexing batches of 10000 records
+#  exclusive 1 readers:    55,666 lookups/s, p99 0.022ms
+#  exclusive 2 readers:    54,926 lookups/s, p99 0.030ms
+#  exclusive 4 readers:    56,857 lookups/s, p99 0.042ms
+#  exclusive 8 readers:    57,466 lookups/s, p99 0.048ms
+# striped rw 1 readers:    48,711 lookups/s, p99 0.031ms
+# striped rw 2 readers:    49,656 lookups/s, p99 0.051ms
+# striped rw 4 readers:    59,853 lookups/s, p99 0.038ms
+# striped rw 8 readers:    60,831 lookups/s, p99 0.060ms
+#
+# with a writer indexing batches of 10000 records
+#  exclusive 1 readers:    24,334 lookups/s, p99 0.034ms
+#  exclusive 2 readers:    28,156 lookups/s, p99 0.042ms
+#  exclusive 4 readers:    48,717 lookups/s, p99 0.042ms
+#  exclusive 8 readers:    58,341 lookups/s, p99 4.087ms
+# striped rw 1 readers:    20,666 lookups/s, p99 0.072ms
+# striped rw 2 readers:    28,978 lookups/s, p99 0.046ms
+# striped rw 4 readers:    38,648 lookups/s, p99 0.044ms
+# striped rw 8 readers:    40,211 lookups/s, p99 0.077ms
+
+# NOTE: on a single core with the GIL no lookup runs in parallel with another, so the striped read-write locks
+# can not scale readers beyond what the single lock does. Their throughput is about the same without a writer and
+# lower with one (40k against 58k lookups/s with 8 readers), but the p99 of a lookup with 8 readers and a writer
+# stays at 0.08ms instead of 4ms, since a lookup only waits for the stripe of its value instead of a whole batch.
+# Tables use the striped locks by default; `Table(..., exclusive_column_locks=True)` opts into `ColumnLock` where
+# throughput on a single core matters more than the latency of lookups. On several cores with a free-threaded
+# build (python3.13t) lookups of different values also run in parallel with the striped locks.
@@ -1,7 +1,15 @@
 
+import heapq
+from collections.abc import Iterator
+from itertools import islice
+
+from columnar_records import ColumnarRecords
 from indexes import Indexes
-from internal_types import ColumnName, Record
+from internal_types import ColumnName, Record, RowId
 from log import get_logger
+from parallel_scan import scan_for_words
+from posting_list import union_sorted
+from segmented_records import SegmentedRecords
 
 logger = get_logger(__file__)
 
@@ -12,6 +20,48 @@ class GetRecords(Indexes):
     def __init__(self) -> None:
         """Initialize a new instance of Get."""
 
+    def iter_column_values(self, column_name: ColumnName) -> Iterator[tuple[RowId, object]]:
+        """Iterate over the values of a single column.
+
+        With columnar storage or frozen records only the requested column is read and no record is materialized.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Returns:
+        -------
+        Iterator[tuple[RowId, object]]: The row id and column value of every record.
+        """
+        if isinstance(self.records, ColumnarRecords | SegmentedRecords):
+            return self.records.iter_column(column_name)
+
+        return ((record_id, record[column_name]) for record_id, record in self.records.items())
+
+    def iter_column_values_after(self, column_name: ColumnName, record_id: RowId) -> Iterator[tuple[RowId, object]]:
+        """Iterate over the values of a single column for the records after a row id.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+        record_id (RowId): The row id, 0 for every record.
+
+        Returns:
+        -------
+        Iterator[tuple[RowId, object]]: The row id and column value of every record after the row id.
+        """
+        if not record_id:
+            return self.iter_column_values(column_name)
+
+        records = self.records
+        return (
+            (next_record_id, record[column_name])
+            for next_record_id in range(record_id + 1, self.count + 1)
+            if (record := records.get(next_record_id)) is not None
+        )
+
     def get_records(self) -> list[object]:
         """Get records from the instance.
 
@@ -25,7 +75,9 @@ class GetRecords(Indexes):
         """
         return list(self.records.values())
 
-    def get_records_by_column(self, column_name: str, column_value: object) -> list[object]:
+    def get_records_by_column(
+        self, column_name: str, column_value: object, read_mode: str | None = None,
+    ) -> list[object]:
         """Get records from the instance by column_name and column_value.
 
         Args:
@@ -33,6 +85,8 @@ class GetRecords(Indexes):
         self: The current object.
         column_name (str): The name of the column to get records by.
         column_value (object): The value of the column to get records by.
+        read_mode (str, optional): How a hash index that is being built is read, see `get_index_high_water`.
+            Defaults to the read mode of the table.
 
         Raises:
         ------
@@ -42,6 +96,36 @@ class GetRecords(Indexes):
         -------
         list: A list of records.
         """
+        return [
+            record
+            for record_id in self.get_record_ids_by_column(column_name, column_value, read_mode)
+            if (record := self.records.get(record_id)) is not None
+        ]
+
+    def get_record_ids_by_column(
+        self, column_name: str, column_value: object, read_mode: str | None = None,
+    ) -> set[RowId]:
+        """Get the row ids of the records with a column value, from an index of the column if there is one.
+
+        A hash index that does not have every record yet, because it is being built or inserted records are
+        waiting for the index worker, is read together with a scan of the records after its high-water row id.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (str): The name of the column.
+        column_value (object): The value of the column.
+        read_mode (str, optional): How a hash index that is being built is read, see `get_index_high_water`.
+            Defaults to the read mode of the table.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist or the read mode is not supported.
+
+        Returns:
+        -------
+        set[RowId]: The row ids.
+        """
         if column_name not in self.columns:
             msg = f"Column {column_name} does not exist."
             raise ValueError(msg)
@@ -49,12 +133,19 @@ class GetRecords(Indexes):
         is_indexed = False
         record_ids = set()
 
-        is_column_indexed =  self.is_column_indexed(column_name)
-        if is_column_indexed and column_name in self.indexes and column_value in self.indexes[column_name]:
+        if column_name in self.sorted_indexes:
+            is_indexed = True
+            record_ids = self.sorted_indexes[column_name].get(column_value)
+
+        # the high-water row id is read before the index, so a record indexed in between is not missed
+        high_water_record_id = self.get_index_high_water(column_name, read_mode) if not is_indexed else None
+        if high_water_record_id:
             is_indexed = True
-            column_lock = self.column_locks[column_name]
-            with column_lock:
-                record_ids = set(self.indexes[column_name][column_value])
+            with self.column_locks[column_name].read(column_value):
+                record_ids = set(self.indexes[column_name].get(column_value, ()))
+            for record_id, value in self.iter_column_values_after(column_name, high_water_record_id):
+                if value == column_value:
+                    record_ids.add(record_id)
 
         if column_name in self.unique_indexes and column_value in self.unique_indexes[column_name]:
             is_indexed = True
@@ -64,11 +155,163 @@ class GetRecords(Indexes):
         logger.debug(f"used index: {is_indexed}")
 
         if not is_indexed:
-            for record_id, record in self.records.items():
-                if record[column_name] == column_value:
+            for record_id, value in self.iter_column_values(column_name):
+                if value == column_value:
                     record_ids.add(record_id)
 
-        return [self.records[record_id] for record_id in record_ids]
+        return record_ids
+
+    def get_records_in_range(
+        self,
+        column_name: ColumnName,
+        low: object = None,
+        high: object = None,
+        inclusive: bool | tuple[bool, bool] = True,
+    ) -> list[Record]:
+        """Get records whose column value falls between low and high, ordered by that value.
+
+        Uses the sorted index of the column when there is one, otherwise scans and sorts the matching records.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to filter by.
+        low (object, optional): The lower bound. Defaults to no lower bound.
+        high (object, optional): The upper bound. Defaults to no upper bound.
+        inclusive (bool | tuple[bool, bool], optional): Whether the bounds are included, either for both bounds
+            or as a (low, high) pair. Defaults to True.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist.
+
+        Returns:
+        -------
+        list: A list of records.
+        """
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        include_low, include_high = (inclusive, inclusive) if isinstance(inclusive, bool) else inclusive
+
+        if column_name in self.sorted_indexes:
+            logger.debug("used index: True")
+            record_ids = self.sorted_indexes[column_name].range_record_ids(low, high, (include_low, include_high))
+            return [record for record_id in record_ids if (record := self.records.get(record_id)) is not None]
+
+        logger.debug("used index: False")
+        matches = []
+        for record_id, value in self.iter_column_values(column_name):
+            if value is None:
+                continue
+            if low is not None and (value < low or (value == low and not include_low)):
+                continue
+            if high is not None and (value > high or (value == high and not include_high)):
+                continue
+            matches.append((value, record_id))
+
+        matches.sort(key=lambda match: match[0])
+        return [self.records[record_id] for _, record_id in matches]
+
+    def get_records_sorted(
+        self, column_name: ColumnName, reverse: bool = False, limit: int | None = None,
+    ) -> list[Record]:
+        """Get records ordered by a column, with None values last.
+
+        Uses the sorted index of the column when there is one so only the returned records are touched,
+        otherwise sorts the table (or selects the first `limit` records with a heap).
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to sort by.
+        reverse (bool, optional): To sort by descending. Defaults to False.
+        limit (int, optional): The maximum number of records to return. Defaults to every record.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist.
+
+        Returns:
+        -------
+        list: A list of records.
+        """
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        if column_name in self.sorted_indexes:
+            logger.debug("used index: True")
+            record_ids = self.sorted_indexes[column_name].iter_record_ids(reverse=reverse)
+            records = (record for record_id in record_ids if (record := self.records.get(record_id)) is not None)
+            return list(islice(records, limit))
+
+        logger.debug("used index: False")
+        records = [record for record in self.records.values() if record[column_name] is not None]
+        null_records = [record for record in self.records.values() if record[column_name] is None]
+
+        def sort_key(record: Record) -> object:
+            return record[column_name]
+
+        if limit is None:
+            records.sort(key=sort_key, reverse=reverse)
+        elif reverse:
+            records = heapq.nlargest(limit, records, key=sort_key)
+        else:
+            records = heapq.nsmallest(limit, records, key=sort_key)
+
+        return list(islice(records + null_records, limit))
+
+    def get_column_min(self, column_name: ColumnName) -> object:
+        """Get the smallest non null value of a column.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist.
+
+        Returns:
+        -------
+        object: The smallest value, or None if the column has no values.
+        """
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        if column_name in self.sorted_indexes:
+            return self.sorted_indexes[column_name].min_value()
+
+        return min((value for _, value in self.iter_column_values(column_name) if value is not None), default=None)
+
+    def get_column_max(self, column_name: ColumnName) -> object:
+        """Get the largest non null value of a column.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist.
+
+        Returns:
+        -------
+        object: The largest value, or None if the column has no values.
+        """
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        if column_name in self.sorted_indexes:
+            return self.sorted_indexes[column_name].max_value()
+
+        return max((value for _, value in self.iter_column_values(column_name) if value is not None), default=None)
 
     def get_record_by_id(self, record_id: int) -> object:
         """Get a record from the instance by record_id.
@@ -106,6 +349,9 @@ class GetRecords(Indexes):
         # sourcery skip: merge-repeated-ifs
         """Get records from the instance by column_name and search_text.
 
+        Records match if their text contains any of the sanitized search words. Indexed columns merge the posting
+        lists of the words; other columns are scanned once for all the words, in parallel for large tables.
+
         Args:
         ----
         self: The current object.
@@ -128,22 +374,27 @@ class GetRecords(Indexes):
             msg = f"Column {column_name} is not a string."
             raise ValueError(msg)
 
-        record_ids = set()
-        for word in self.get_sanitized_words(search_text):
-            # with self.inverted_index_lock:  # Lock when accessing the inverted index
-            in_inverted_index = column_name in self.inverted_indexes and word in self.inverted_indexes[column_name]
-            if in_inverted_index:
-                _record_ids = self.inverted_indexes[column_name][word]
-
-            # Continue using the acquired _record_ids, if available, outside of the lock
-            if in_inverted_index:
-                record_ids.update(_record_ids)
-            else:
-                # manual search
-                for record_id, record in self.records.items():
-                    full_column_text = record[column_name]
-                    full_column_text_words = full_column_text.split()
-                    if word in full_column_text_words:
-                        record_ids.add(record_id)
-
-        return [self.records[record_id] for record_id in record_ids]
+        words = frozenset(self.get_sanitized_words(search_text))
+        if not words:
+            return []
+
+        if column_name in self.inverted_indexes:
+            # a word missing from the index is in no record, so only the posting lists of present words are merged
+            inverted_index = self.inverted_indexes[column_name]
+            posting_lists = [posting_list for word in words if (posting_list := inverted_index.get(word)) is not None]
+            record_ids = union_sorted(posting_lists)
+        else:
+            record_ids = self._scan_for_words(column_name, words)
+
+        return [record for record_id in record_ids if (record := self.records.get(record_id)) is not None]
+
+    def _scan_for_words(self, column_name: ColumnName, words: frozenset[str]) -> list[RowId]:
+        # a single pass tokenizes every text once for all the words, instead of once per word
+        record_ids = []
+        texts = []
+        for record_id, text in self.iter_column_values(column_name):
+            if text is not None:
+                record_ids.append(record_id)
+                texts.append(text)
+
+        return [record_ids[position] for position in scan_for_words(texts, words, self.tokenizer)]
@@ -0,0 +1,205 @@
+from concurrent.futures import Future, wait
+from threading import Lock
+from time import monotonic
+
+from internal_types import ColumnName, RowId
+
+# how a lookup on a column reads its hash index while the index is being built
+WAIT_INDEX_READ = "wait"
+SCAN_INDEX_READ = "scan"
+PARTIAL_INDEX_READ = "partial"
+INDEX_READS = (WAIT_INDEX_READ, SCAN_INDEX_READ, PARTIAL_INDEX_READ)
+
+DEFAULT_INDEX_WAIT_TIMEOUT = 1.0
+# number of records added to the index per acquisition of the column lock
+INDEX_BUILD_CHUNK_SIZE = 4_096
+
+
+class IndexBuild:
+    """The job that adds the existing records of a table to a new hash index of a column.
+
+    The records up to `last_record_id`, the last row id when the index was created, are added in ascending row
+    id order, and `high_water_record_id` is the row id up to which every record is in the index. Records
+    inserted afterwards are added by the index worker of the table. A lookup can therefore read the partial
+    index and only scan the records after the high-water row id.
+
+    Records that are updated or deleted before the build reaches them are in `changed_record_ids`. The update
+    already put their new value in the index, so the build skips them instead of adding the value it read
+    earlier.
+
+    Args:
+    ----
+        column_name (ColumnName): The name of the indexed column.
+        last_record_id (RowId): The last row id of the table when the index was created.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, column_name: ColumnName, last_record_id: RowId) -> None:
+        """Initialize a build that has not indexed any record yet.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the indexed column.
+        last_record_id (RowId): The last row id of the table when the index was created.
+
+        Returns:
+        -------
+        None
+        """
+        self.column_name = column_name
+        self.last_record_id = last_record_id
+        self.high_water_record_id: RowId = 0
+        self.changed_record_ids: set[RowId] = set()
+
+        self.total_count = 0
+        self.indexed_count = 0
+        self.started_at = monotonic()
+        self.finished_at: float | None = None
+        # resolved with None once every record is in the index, or with the error that stopped the build
+        self.future: Future = Future()
+        self._lock = Lock()
+
+    def is_done(self) -> bool:
+        """Check if the build finished, successfully or not.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if the build finished, False otherwise.
+        """
+        return self.future.done()
+
+    def is_complete(self) -> bool:
+        """Check if the build finished and every record is in the index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if the index has every record, False otherwise.
+        """
+        return self.future.done() and self.future.exception() is None
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until the build finished.
+
+        Args:
+        ----
+        self: The current object.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Returns:
+        -------
+        bool: True if the index has every record, False if the timeout expired first or the build failed.
+        """
+        wait((self.future,), timeout)
+        return self.is_complete()
+
+    def start(self, total_count: int) -> None:
+        """Set the number of records the build adds to the index.
+
+        Args:
+        ----
+        self: The current object.
+        total_count (int): The number of records.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self.total_count = total_count
+
+    def advance(self, high_water_record_id: RowId, indexed_count: int) -> None:
+        """Count records added to the index, called once they are in it so readers never miss one below it.
+
+        Args:
+        ----
+        self: The current object.
+        high_water_record_id (RowId): The row id up to which every record is in the index now.
+        indexed_count (int): The number of records added since the last call.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self.high_water_record_id = high_water_record_id
+            self.indexed_count += indexed_count
+
+    def mark_changed(self, record_id: RowId) -> None:
+        """Remember that a record the build has not reached yet was updated or deleted.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        if self.high_water_record_id < record_id <= self.last_record_id:
+            self.changed_record_ids.add(record_id)
+
+    def finish(self, error: BaseException | None = None) -> None:
+        """Resolve the future of the build.
+
+        Args:
+        ----
+        self: The current object.
+        error (BaseException, optional): The error that stopped the build. Defaults to a successful build.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self.finished_at = monotonic()
+            if error is None:
+                self.high_water_record_id = self.last_record_id
+            # the records only matter while the build has not reached them
+            self.changed_record_ids = set()
+
+        if error is None:
+            self.future.set_result(None)
+        else:
+            self.future.set_exception(error)
+
+    def get_progress(self) -> dict[str, object]:
+        """Get the progress of the build.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        dict[str, object]: The column, the state, the number of records indexed and to index, the high-water row
+            id, the last row id of the build and the number of seconds it took so far.
+        """
+        with self._lock:
+            if not self.future.done():
+                state = "building"
+            elif self.future.exception() is None:
+                state = "done"
+            else:
+                state = "failed"
+            return {
+                "column": self.column_name,
+                "state": state,
+                "indexed": self.indexed_count,
+                "total": self.total_count,
+                "high_water_record_id": self.high_water_record_id,
+                "last_record_id": self.last_record_id,
+                "seconds": (self.finished_at or monotonic()) - self.started_at,
+            }
@@ -0,0 +1,245 @@
+from collections.abc import Callable, Iterable
+from threading import Condition, Thread
+from time import monotonic
+
+from internal_types import RowId
+from log import get_logger
+
+logger = get_logger(__file__)
+
+DEFAULT_MAX_BATCH_SIZE = 10_000
+DEFAULT_MAX_BATCH_LATENCY = 0.05
+
+
+class IndexWorker:
+    """Background worker that coalesces pending row ids and indexes them in batches.
+
+    Inserts only append their row id to a pending list and notify a single condition. The worker thread wakes
+    up, waits until either `max_batch_size` row ids are pending or `max_batch_latency` seconds have passed since
+    the first pending row id, and then hands the whole batch to `index_records` in one call.
+
+    The row ids of a batch that fails to be indexed are kept and retried with the next batch, until then they
+    count as pending, so lookups do not trust the indexes from the first of them on and scan the records after
+    it.
+
+    Args:
+    ----
+        index_records (Callable): The function that indexes a batch of row ids.
+        name (str): The name of the worker thread.
+        max_batch_size (int): The maximum number of row ids handed to `index_records` at once.
+        max_batch_latency (float): The maximum number of seconds a row id waits before being indexed.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(
+        self,
+        index_records: Callable[[list[RowId]], None],
+        name: str = "index-worker",
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_latency: float = DEFAULT_MAX_BATCH_LATENCY,
+    ) -> None:
+        """Initialize the worker and start its thread.
+
+        Args:
+        ----
+        self: The current object.
+        index_records (Callable): The function that indexes a batch of row ids.
+        name (str): The name of the worker thread.
+        max_batch_size (int): The maximum number of row ids handed to `index_records` at once.
+        max_batch_latency (float): The maximum number of seconds a row id waits before being indexed.
+
+        Raises:
+        ------
+        ValueError: If the batch size is not positive or the latency is negative.
+
+        Returns:
+        -------
+        None
+        """
+        if max_batch_size <= 0:
+            msg = "Max batch size must be positive."
+            raise ValueError(msg)
+        if max_batch_latency < 0:
+            msg = "Max batch latency must not be negative."
+            raise ValueError(msg)
+
+        self.index_records = index_records
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+
+        self._pending: list[RowId] = []
+        self._first_pending_at = 0.0
+        self._in_flight = 0
+        self._first_in_flight_record_id: RowId = 0
+        # the row ids of the batches that failed, in ascending order, the indexes may miss any record from them on
+        self._failed: list[RowId] = []
+        self._is_running = True
+        # single "work pending" signal shared by producers, the worker and flush()
+        self._condition = Condition()
+
+        self._thread = Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def enqueue(self, record_id: RowId) -> None:
+        """Queue a single row id for indexing.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id to index.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            if not self._pending:
+                self._first_pending_at = monotonic()
+                self._condition.notify_all()
+            self._pending.append(record_id)
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify_all()
+
+    def enqueue_many(self, record_ids: Iterable[RowId]) -> None:
+        """Queue many row ids for indexing with a single lock acquisition.
+
+        Args:
+        ----
+        self: The current object.
+        record_ids (Iterable[RowId]): The row ids to index.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            if not self._pending:
+                self._first_pending_at = monotonic()
+            self._pending.extend(record_ids)
+            if self._pending:
+                self._condition.notify_all()
+
+    def pending_count(self) -> int:
+        """Get the number of row ids that are queued or currently being indexed.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of row ids not yet indexed.
+        """
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def failed_count(self) -> int:
+        """Get the number of row ids of failed batches that wait to be retried with the next batch.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of row ids to retry.
+        """
+        with self._condition:
+            return len(self._failed)
+
+    def first_pending_record_id(self) -> RowId | None:
+        """Get the first row id that is queued, currently being indexed or waiting to be retried.
+
+        Row ids are queued in ascending order and indexed in the order they were queued, so every row id before
+        it is in the indexes.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        RowId | None: The row id, or None if every queued row id has been indexed.
+        """
+        with self._condition:
+            if self._failed:
+                return self._failed[0]
+            if self._in_flight:
+                return self._first_in_flight_record_id
+            return self._pending[0] if self._pending else None
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued row id has been indexed.
+
+        Args:
+        ----
+        self: The current object.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Returns:
+        -------
+        bool: True if the queue was drained, False if the timeout expired first.
+        """
+        with self._condition:
+            self._first_pending_at = 0.0
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def shutdown(self) -> None:
+        """Index the remaining row ids and stop the worker thread.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+
+        self._thread.join()
+
+    def _take_batch(self) -> list[RowId]:
+        with self._condition:
+            while True:
+                if not self._pending:
+                    if not self._is_running:
+                        return []
+                    self._condition.wait()
+                    continue
+
+                remaining = self._first_pending_at + self.max_batch_latency - monotonic()
+                if len(self._pending) < self.max_batch_size and remaining > 0 and self._is_running:
+                    self._condition.wait(remaining)
+                    continue
+
+                # the row ids of failed batches come before the queued ones, so the batch stays in ascending order
+                batch = self._failed + self._pending[: self.max_batch_size]
+                self._failed = []
+                del self._pending[: self.max_batch_size]
+                self._first_pending_at = monotonic() if self._pending else 0.0
+                self._in_flight = len(batch)
+                self._first_in_flight_record_id = batch[0]
+                return batch
+
+    def _index_batch(self, batch: list[RowId]) -> None:
+        try:
+            self.index_records(batch)
+        except Exception:
+            logger.exception(f"failed to index {len(batch)} records from row id {batch[0]}, retrying with the next")
+            with self._condition:
+                self._failed = batch
+        finally:
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+
+    def _run(self) -> None:
+        while batch := self._take_batch():
+            self._index_batch(batch)
@@ -1,6 +1,6 @@
-import string
+from collections import Counter
 
-from stop_words import STOP_WORDS
+from tokenizer import DEFAULT_TOKENIZER, Tokenizer
 
 
 class Indexes:
@@ -8,50 +8,65 @@ class Indexes:
 
     The class contains methods for sanitizing text by removing punctuation,
     case and stop words. It also contains a method for extracting sanitized
-    words from a string of text.
+    words from a string of text. Every method goes through the same tokenizer,
+    so indexed words and searched words always match.
 
     Attributes
     ----------
-    None
+    tokenizer: The tokenizer shared by every text path, the default one unless overridden.
 
     Methods
     -------
-    __sanitize_words: Removes punctuation, case and stop words from a set of words.
     get_sanitized_words: Extracts sanitized words from a string of text.
+    get_sanitized_word_counts: Counts the sanitized words of a string of text.
+    get_sanitized_word_positions: Gets the token positions of the sanitized words of a string of text.
 
     """
 
-    def __sanitize_words(self, words: set[str], stop_words: list[str] = STOP_WORDS) -> set[str]:
-        """Remove case, punctuation, and stop words from words.
+    tokenizer: Tokenizer = DEFAULT_TOKENIZER
+
+    def get_sanitized_words(self, search_text: str) -> set[str]:
+        """Get sanitized words from search_text.
 
         Args:
         ----
-            words (list[str]): A set of words.
-            stop_words (set[str], optional): A set of stop words to remove. Defaults to an empty set.
+            search_text (str): The text to sanitize.
 
         Returns:
         -------
             set[str]: A set of sanitized words.
         """
-        return {
-            word.lower()
-            .strip()
-            .translate(str.maketrans("", "", string.punctuation))
-            for word in words
-            if word.lower() not in stop_words
-        }
+        return self.tokenizer.words(search_text)
 
-    def get_sanitized_words(self, search_text: str) -> set[str]:
-        """Get sanitized words from search_text.
+    def get_sanitized_word_counts(self, text: str) -> Counter[str]:
+        """Get sanitized words from text together with the number of times each one occurs.
 
         Args:
         ----
-            search_text (str): The text to sanitize.
+            text (str): The text to sanitize.
 
         Returns:
         -------
-            set[str]: A set of sanitized words.
+            Counter[str]: The number of occurrences of every sanitized word.
+        """
+        return self.tokenizer.word_counts(text)
+
+    def get_sanitized_word_positions(self, text: str, keep_stop_words: bool = False) -> dict[str, list[int]]:
+        """Get sanitized words from text together with their token positions.
+
+        Positions count every whitespace separated token, including stop words, so the gaps between words are
+        kept.
+
+        Args:
+        ----
+            text (str): The text to sanitize.
+            keep_stop_words (bool, optional): To also get the positions of the stop words, e.g. to match phrases
+                exactly. Defaults to False.
+
+        Returns:
+        -------
+            dict[str, list[int]]: The sorted positions of every sanitized word.
         """
-        return self.__sanitize_words(search_text.split())
+        return self.tokenizer.word_positions(text, keep_stop_words)
 
     # TODO: @apinanyogaratnam: move all of the index methods to this class
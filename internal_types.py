@@ -1,5 +1,7 @@
 from typing import Any
 
+from posting_list import PostingList
+
 # Record is a table row
 Record = dict[str, Any] # Dict[str, Union[str, int, float, bool, None]]
 
@@ -18,5 +20,5 @@ Columns = dict[ColumnName, type]
 # Index is a column index
 Index = dict[ColumnName, set[RowId]]
 
-# InvertedIndex is a word index that maps a specific word to a set of row ids
-InvertedIndex = dict[ColumnName, dict[Word, set[RowId]]]
+# InvertedIndex is a word index that maps a specific word to a compressed posting list of row ids
+InvertedIndex = dict[ColumnName, dict[Word, PostingList]]
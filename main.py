@@ -1,7 +1,15 @@
 import asyncio
+import os
 
 from protocol import TcpProtocol
+from sharded_server import serve_sharded
+
+# number of worker processes, each owning a shard of every table, 1 serves everything from this process
+WORKERS = int(os.environ.get("WORKERS", "1"))
 
 if __name__ == "__main__":
-    tcp_protocol = TcpProtocol()
-    asyncio.run(tcp_protocol.create_server())
+    if WORKERS > 1:
+        serve_sharded(WORKERS)
+    else:
+        tcp_protocol = TcpProtocol()
+        asyncio.run(tcp_protocol.create_server())
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from threading import Lock
+
+from log import get_logger
+from tokenizer import Tokenizer
+
+logger = get_logger(__file__)
+
+# number of texts tokenized by a worker process at once
+SCAN_CHUNK_SIZE = 50_000
+
+_scan_executor: ProcessPoolExecutor | None = None
+_scan_executor_lock = Lock()
+
+
+def get_scan_executor() -> ProcessPoolExecutor:
+    """Get the process pool shared by every scan, starting it on first use.
+
+    Workers are spawned rather than forked, since the parent process runs index threads whose locks would be
+    copied in whatever state they happen to be in.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        ProcessPoolExecutor: The process pool.
+    """
+    global _scan_executor  # noqa: PLW0603
+    with _scan_executor_lock:
+        if _scan_executor is None:
+            _scan_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info("started scan process pool")
+        return _scan_executor
+
+
+def shutdown_scan_executor() -> None:
+    """Stop the worker processes of the shared scan pool if it was started.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+    global _scan_executor  # noqa: PLW0603
+    with _scan_executor_lock:
+        if _scan_executor is not None:
+            _scan_executor.shutdown()
+            _scan_executor = None
+
+
+def match_words(texts: list[str], words: frozenset[str], tokenizer: Tokenizer) -> list[int]:
+    """Get the positions of the texts that contain any of words once tokenized.
+
+    Args:
+    ----
+        texts (list[str]): The texts to tokenize.
+        words (frozenset[str]): The normalized words to look for.
+        tokenizer (Tokenizer): The tokenizer the words were normalized with.
+
+    Returns:
+    -------
+        list[int]: The positions of the matching texts, in ascending order.
+    """
+    contains_any = tokenizer.contains_any
+    return [position for position, text in enumerate(texts) if contains_any(text, words)]
+
+
+def scan_for_words(texts: list[str], words: frozenset[str], tokenizer: Tokenizer) -> list[int]:
+    """Tokenize every text once and get the positions of the texts that contain any of words.
+
+    Up to SCAN_CHUNK_SIZE texts, or any number on a single core machine, are matched in the calling thread.
+    Larger scans are split in chunks that are tokenized in parallel by the shared process pool.
+
+    Args:
+    ----
+        texts (list[str]): The texts to tokenize.
+        words (frozenset[str]): The normalized words to look for.
+        tokenizer (Tokenizer): The tokenizer the words were normalized with.
+
+    Returns:
+    -------
+        list[int]: The positions of the matching texts, in ascending order.
+    """
+    if len(texts) <= SCAN_CHUNK_SIZE or (os.cpu_count() or 1) == 1:
+        return match_words(texts, words, tokenizer)
+
+    starts = range(0, len(texts), SCAN_CHUNK_SIZE)
+    chunks = [texts[start : start + SCAN_CHUNK_SIZE] for start in starts]
+    chunk_matches = get_scan_executor().map(match_words, chunks, repeat(words), repeat(tokenizer))
+    return [start + position for start, positions in zip(starts, chunk_matches, strict=True) for position in positions]
@@ -0,0 +1,231 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from itertools import accumulate
+from threading import Lock
+
+from internal_types import RowId, Word
+from posting_list import decode_deltas, encode_varint
+
+
+def encode_positions(positions: list[int]) -> bytes:
+    """Encode sorted token positions as varint deltas.
+
+    Args:
+    ----
+        positions (list[int]): The sorted positions.
+
+    Returns:
+    -------
+        bytes: The encoded positions.
+    """
+    encoded = bytearray()
+    previous = 0
+    for position in positions:
+        encode_varint(position - previous, encoded)
+        previous = position
+    return bytes(encoded)
+
+
+class PositionalIndex:
+    """Token positions of every word of a text column, per record.
+
+    Positions count every whitespace separated token of the original text, and unlike the inverted index the
+    positions of stop words are stored too, so a phrase such as "bank of america" requires "of" between "bank" and
+    "america" and "new york" does not match "york new". The positions of a word in a record are stored as varint
+    deltas, usually one or two bytes per occurrence, and are only decoded for the records that contain every word
+    of a query.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty positional index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self._postings: dict[Word, dict[RowId, bytes]] = {}
+        self._lock = Lock()
+
+    def __getstate__(self) -> dict[Word, list]:
+        """Get the encoded positions, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        dict[Word, list]: The row ids of every word, the length of their encoded positions, both as raw arrays,
+            and the encoded positions one after the other.
+        """
+        with self._lock:
+            return {
+                word: [
+                    array("q", record_positions).tobytes(),
+                    array("q", map(len, record_positions.values())).tobytes(),
+                    b"".join(record_positions.values()),
+                ]
+                for word, record_positions in self._postings.items()
+            }
+
+    def __setstate__(self, state: dict[Word, list]) -> None:
+        """Restore the positions returned by `__getstate__` without decoding them.
+
+        Args:
+        ----
+        self: The current object.
+        state (dict[Word, list]): The state.
+
+        Returns:
+        -------
+        None
+        """
+        self._postings = {}
+        for word, (record_ids, lengths, positions) in state.items():
+            ends = list(accumulate(array("q", lengths)))
+            starts = [0, *ends[:-1]]
+            self._postings[word] = {
+                record_id: positions[start:end]
+                for record_id, start, end in zip(array("q", record_ids), starts, ends, strict=True)
+            }
+        self._lock = Lock()
+
+    def add(self, record_id: RowId, word_positions: dict[Word, list[int]]) -> None:
+        """Add the positions of the words of a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        word_positions (dict[Word, list[int]]): The sorted positions of every word in the record.
+
+        Returns:
+        -------
+        None
+        """
+        encoded = {word: encode_positions(positions) for word, positions in word_positions.items()}
+        with self._lock:
+            for word, positions in encoded.items():
+                self._postings.setdefault(word, {})[record_id] = positions
+
+    def remove(self, record_id: RowId, words: Iterable[Word]) -> None:
+        """Remove the positions of the words of a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        words (Iterable[Word]): The words of the record.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            for word in words:
+                postings = self._postings.get(word)
+                if postings is None:
+                    continue
+                postings.pop(record_id, None)
+                if not postings:
+                    del self._postings[word]
+
+    def positions(self, word: Word, record_id: RowId) -> list[int]:
+        """Get the positions of a word in a record.
+
+        Args:
+        ----
+        self: The current object.
+        word (Word): The word.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        list[int]: The sorted positions, empty if the record does not contain the word.
+        """
+        with self._lock:
+            encoded = self._postings.get(word, {}).get(record_id, b"")
+        return list(decode_deltas(encoded))
+
+    def phrase_record_ids(self, terms: list[tuple[Word, int]]) -> list[RowId]:
+        """Get the row ids of the records that contain a phrase.
+
+        Args:
+        ----
+        self: The current object.
+        terms (list[tuple[Word, int]]): The words of the phrase with their offset from the start of the phrase.
+
+        Returns:
+        -------
+        list[RowId]: The sorted row ids.
+        """
+        words = [word for word, _ in terms]
+        record_ids = []
+        for record_id, positions in self._candidates(words):
+            first_offset = terms[0][1]
+            position_sets = [set(word_positions) for word_positions in positions]
+            if any(
+                all(start + offset in position_sets[i] for i, (_, offset) in enumerate(terms))
+                for start in (position - first_offset for position in positions[0])
+            ):
+                record_ids.append(record_id)
+        return record_ids
+
+    def near_record_ids(self, words: list[Word], distances: list[int]) -> list[RowId]:
+        """Get the row ids of the records where every word is close to the previous one, in either order.
+
+        Args:
+        ----
+        self: The current object.
+        words (list[Word]): The words.
+        distances (list[int]): The maximum number of positions between each word and the previous one.
+
+        Returns:
+        -------
+        list[RowId]: The sorted row ids.
+        """
+        record_ids = []
+        for record_id, positions in self._candidates(words):
+            reachable = positions[0]
+            for word_positions, distance in zip(positions[1:], distances, strict=True):
+                reachable = [
+                    position
+                    for position in word_positions
+                    if (index := bisect_left(reachable, position - distance)) < len(reachable)
+                    and reachable[index] <= position + distance
+                ]
+                if not reachable:
+                    break
+            else:
+                record_ids.append(record_id)
+        return record_ids
+
+    def _candidates(self, words: list[Word]) -> list[tuple[RowId, list[list[int]]]]:
+        # records that contain every word, smallest posting first, with the decoded positions in word order
+        with self._lock:
+            postings = [self._postings.get(word) for word in words]
+            if not all(postings):
+                return []
+
+            smallest = min(postings, key=len)
+            encoded = [
+                (record_id, [word_postings[record_id] for word_postings in postings])
+                for record_id in smallest
+                if all(record_id in word_postings for word_postings in postings)
+            ]
+
+        encoded.sort()
+        return [(record_id, [list(decode_deltas(data)) for data in datas]) for record_id, datas in encoded]
@@ -0,0 +1,905 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import groupby, repeat
+from operator import itemgetter
+from types import MappingProxyType
+
+# number of out of order inserts and deletes buffered before they are merged into the compressed postings
+MAX_TAIL_SIZE = 256
+
+# number of postings between two skip pointers
+SKIP_INTERVAL = 128
+
+# shared by every posting list until it needs its own, most lists never have a tail, deletes or skip pointers
+_EMPTY_TAIL: Mapping[int, int] = MappingProxyType({})
+_NO_DELETED: frozenset[int] = frozenset()
+_NO_SKIPS = array("q")
+
+VARINT_PAYLOAD_MASK = 0x7F
+VARINT_CONTINUATION_BIT = 0x80
+
+
+def encode_varint(value: int, output: bytearray) -> None:
+    """Append a non negative integer to output as a little endian base 128 varint.
+
+    Args:
+    ----
+        value (int): The integer to encode.
+        output (bytearray): The buffer to append to.
+
+    Returns:
+    -------
+        None
+    """
+    while value > VARINT_PAYLOAD_MASK:
+        output.append((value & VARINT_PAYLOAD_MASK) | VARINT_CONTINUATION_BIT)
+        value >>= 7
+    output.append(value)
+
+
+def decode_varints(data: bytes | bytearray) -> Iterator[int]:
+    """Decode a buffer of varints.
+
+    Args:
+    ----
+        data (bytes | bytearray): The encoded varints.
+
+    Returns:
+    -------
+        Iterator[int]: The integers in the order they were encoded.
+    """
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & VARINT_PAYLOAD_MASK) << shift
+        if byte & VARINT_CONTINUATION_BIT:
+            shift += 7
+        else:
+            yield value
+            value = 0
+            shift = 0
+
+
+def read_varint(data: bytes | bytearray, position: int) -> tuple[int, int]:
+    """Decode the varint that starts at position.
+
+    Args:
+    ----
+        data (bytes | bytearray): The encoded varints.
+        position (int): The offset of the first byte of the varint.
+
+    Returns:
+    -------
+        tuple[int, int]: The decoded integer and the offset of the next varint.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & VARINT_PAYLOAD_MASK) << shift
+        if not byte & VARINT_CONTINUATION_BIT:
+            return value, position
+        shift += 7
+
+
+def decode_deltas(data: bytes | bytearray) -> Iterator[int]:
+    """Decode a buffer of varint encoded deltas back into the sorted integers.
+
+    Args:
+    ----
+        data (bytes | bytearray): The encoded deltas.
+
+    Returns:
+    -------
+        Iterator[int]: The integers in ascending order.
+    """
+    current = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & VARINT_PAYLOAD_MASK) << shift
+        if byte & VARINT_CONTINUATION_BIT:
+            shift += 7
+        else:
+            current += value
+            yield current
+            value = 0
+            shift = 0
+
+
+class PostingList:
+    """Compressed, sorted set of row ids for one word of an inverted index.
+
+    Row ids are stored as varint encoded deltas in a byte array, which takes one or two bytes per posting for
+    typical tables instead of the 30+ bytes of a set entry. Because row ids are handed out in increasing order,
+    new postings are appended to the encoded form directly. Out of order inserts and deletes go to a small
+    mutable tail (`_tail` and `_deleted`) that is merged into the encoded form once it grows past
+    MAX_TAIL_SIZE.
+
+    Every posting also carries the number of times the word occurs in the record (its term frequency), stored
+    as a second varint stream next to the deltas and used to rank search results.
+
+    Every SKIP_INTERVAL postings a skip pointer records the row id before the block and the offsets of the block
+    in both streams, so a `PostingCursor` can jump close to a target row id with a binary search instead of
+    decoding every posting before it.
+
+    Most words of a vocabulary only occur in a few records, so the tail, the deleted row ids and the skip pointers
+    are only allocated once a list needs them and a list with a single posting takes about as much memory as a
+    set with one row id.
+
+    The list supports the set operations the inverted index relies on (add, update, discard, membership,
+    iteration and len) and intersects or unions several lists by merging their sorted streams, so no Python
+    set of row ids is built.
+
+    Args:
+    ----
+        record_ids (Iterable[int], optional): The initial row ids.
+
+    Returns:
+    -------
+        None
+    """
+
+    __slots__ = (
+        "_data",
+        "_frequencies",
+        "_size",
+        "_last",
+        "_tail",
+        "_deleted",
+        "_skip_record_ids",
+        "_skip_data_offsets",
+        "_skip_frequency_offsets",
+    )
+
+    def __init__(self, record_ids: Iterable[int] = ()) -> None:
+        """Initialize the posting list.
+
+        Args:
+        ----
+        self: The current object.
+        record_ids (Iterable[int], optional): The initial row ids.
+
+        Returns:
+        -------
+        None
+        """
+        self._data = bytearray()
+        self._frequencies = bytearray()
+        self._size = 0
+        self._last = 0
+        # row id -> term frequency of postings that are not in the encoded form yet
+        self._tail: Mapping[int, int] = _EMPTY_TAIL
+        self._deleted: set[int] | frozenset[int] = _NO_DELETED
+        self._skip_record_ids = self._skip_data_offsets = self._skip_frequency_offsets = _NO_SKIPS
+        self.update(record_ids)
+
+    @classmethod
+    def from_sorted(
+        cls: type["PostingList"], record_ids: Iterable[int], frequencies: Iterable[int] | None = None,
+    ) -> "PostingList":
+        """Build a posting list from row ids that are already sorted and unique.
+
+        Args:
+        ----
+        cls: The class.
+        record_ids (Iterable[int]): The sorted, unique row ids.
+        frequencies (Iterable[int], optional): The term frequency of every row id. Defaults to 1 for each.
+
+        Returns:
+        -------
+        PostingList: The posting list.
+        """
+        posting_list = cls()
+        posting_list.extend_sorted(record_ids, frequencies)
+        return posting_list
+
+    def __getstate__(self) -> list:
+        """Get the encoded postings, merging the mutable tail first, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The size, the last row id, the encoded row id deltas and frequencies and the skip pointers.
+        """
+        self.compact()
+        return [
+            self._size,
+            self._last,
+            bytes(self._data),
+            bytes(self._frequencies),
+            self._skip_record_ids.tobytes(),
+            self._skip_data_offsets.tobytes(),
+            self._skip_frequency_offsets.tobytes(),
+        ]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the encoded postings returned by `__getstate__` without decoding them.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        size, last, data, frequencies, skip_record_ids, skip_data_offsets, skip_frequency_offsets = state
+        self._data = bytearray(data)
+        self._frequencies = bytearray(frequencies)
+        self._size = size
+        self._last = last
+        self._tail = _EMPTY_TAIL
+        self._deleted = _NO_DELETED
+        if size > SKIP_INTERVAL:
+            self._skip_record_ids = array("q", skip_record_ids)
+            self._skip_data_offsets = array("q", skip_data_offsets)
+            self._skip_frequency_offsets = array("q", skip_frequency_offsets)
+        else:
+            self._skip_record_ids = self._skip_data_offsets = self._skip_frequency_offsets = _NO_SKIPS
+
+    def __len__(self) -> int:
+        """Get the number of row ids.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of row ids.
+        """
+        return self._size + len(self._tail) - len(self._deleted)
+
+    def __bool__(self) -> bool:
+        """Check if the posting list has any row ids.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if there is at least one row id.
+        """
+        return len(self) > 0
+
+    def __contains__(self, record_id: object) -> bool:
+        """Check if a row id is in the posting list.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (object): The row id.
+
+        Returns:
+        -------
+        bool: True if the row id is present.
+        """
+        if record_id in self._tail:
+            return True
+        if record_id in self._deleted:
+            return False
+        return self._compressed_contains(record_id)
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the row ids in ascending order.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[int]: The row ids.
+        """
+        compressed = decode_deltas(self._data)
+        if self._deleted:
+            deleted = set(self._deleted)
+            compressed = (record_id for record_id in compressed if record_id not in deleted)
+        if not self._tail:
+            return compressed
+        return heapq.merge(compressed, sorted(self._tail))
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        """Iterate over the postings in ascending row id order.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[tuple[int, int]]: The row id and term frequency of every posting.
+        """
+        # not strict: a concurrent add may have encoded the row id but not its frequency yet
+        compressed = zip(decode_deltas(self._data), decode_varints(self._frequencies), strict=False)
+        if self._deleted:
+            deleted = set(self._deleted)
+            compressed = (posting for posting in compressed if posting[0] not in deleted)
+        if not self._tail:
+            return compressed
+        return heapq.merge(compressed, sorted(self._tail.items()))
+
+    def frequency(self, record_id: int) -> int:
+        """Get the term frequency of a row id.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (int): The row id.
+
+        Returns:
+        -------
+        int: The term frequency, or 0 if the row id is not in the list.
+        """
+        if record_id in self._tail:
+            return self._tail[record_id]
+        if record_id in self._deleted or record_id > self._last:
+            return 0
+        cursor = self._compressed_cursor()
+        return cursor.frequency if cursor.seek(record_id) == record_id else 0
+
+    def __repr__(self) -> str:
+        """Get a string representation of the posting list.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        str: The representation.
+        """
+        return f"PostingList({list(self)})"
+
+    @property
+    def nbytes(self) -> int:
+        """Get the number of bytes used by the encoded postings.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The size of the encoded postings.
+        """
+        return len(self._data)
+
+    def add(self, record_id: int, frequency: int = 1) -> None:
+        """Add a row id, or replace its term frequency if it is already present.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (int): The row id.
+        frequency (int, optional): The number of times the word occurs in the record. Defaults to 1.
+
+        Returns:
+        -------
+        None
+        """
+        if record_id > self._last:
+            self.extend_sorted((record_id,), (frequency,))
+            return
+
+        if record_id not in self._tail and record_id not in self._deleted and self._compressed_contains(record_id):
+            # the encoded posting can not be changed in place, so it is shadowed by the tail until the next merge
+            self._add_deleted(record_id)
+
+        if self._tail is _EMPTY_TAIL:
+            self._tail = {}
+        self._tail[record_id] = frequency
+        self._maybe_merge()
+
+    def update(self, record_ids: Iterable[int]) -> None:
+        """Add many row ids.
+
+        Args:
+        ----
+        self: The current object.
+        record_ids (Iterable[int]): The row ids.
+
+        Returns:
+        -------
+        None
+        """
+        for record_id in record_ids:
+            self.add(record_id)
+
+    def discard(self, record_id: int) -> None:
+        """Remove a row id if it is present.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (int): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        if record_id in self._tail:
+            del self._tail[record_id]
+            if record_id not in self._deleted:
+                return
+
+            # the tail was shadowing a posting that is still encoded, which stays deleted
+            self._maybe_merge()
+            return
+
+        if record_id not in self._deleted and self._compressed_contains(record_id):
+            self._add_deleted(record_id)
+            self._maybe_merge()
+
+    def compact(self) -> None:
+        """Merge the mutable tail and the deleted row ids into the encoded postings.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        if not self._tail and not self._deleted:
+            return
+
+        postings = list(self.items())
+        self._data = bytearray()
+        self._frequencies = bytearray()
+        self._size = 0
+        self._last = 0
+        self._tail = _EMPTY_TAIL
+        self._deleted = _NO_DELETED
+        self._skip_record_ids = self._skip_data_offsets = self._skip_frequency_offsets = _NO_SKIPS
+        self.extend_sorted((record_id for record_id, _ in postings), (frequency for _, frequency in postings))
+
+    def intersection(self, *others: "PostingList") -> "PostingList":
+        """Get the row ids present in this and every other posting list.
+
+        Args:
+        ----
+        self: The current object.
+        *others (PostingList): The other posting lists.
+
+        Returns:
+        -------
+        PostingList: The intersection.
+        """
+        return PostingList.from_sorted(intersect_sorted([self, *others]))
+
+    def union(self, *others: "PostingList") -> "PostingList":
+        """Get the row ids present in this or any other posting list.
+
+        Args:
+        ----
+        self: The current object.
+        *others (PostingList): The other posting lists.
+
+        Returns:
+        -------
+        PostingList: The union.
+        """
+        return PostingList.from_sorted(union_sorted([self, *others]))
+
+    def extend_sorted(self, record_ids: Iterable[int], frequencies: Iterable[int] | None = None) -> None:
+        """Append row ids that are sorted, unique and larger than every row id in the list.
+
+        Args:
+        ----
+        self: The current object.
+        record_ids (Iterable[int]): The row ids.
+        frequencies (Iterable[int], optional): The term frequency of every row id. Defaults to 1 for each.
+
+        Returns:
+        -------
+        None
+        """
+        data = self._data
+        encoded_frequencies = self._frequencies
+        last = self._last
+        size = self._size
+        for record_id, frequency in zip(record_ids, repeat(1) if frequencies is None else frequencies, strict=False):
+            if size % SKIP_INTERVAL == 0 and size:
+                if self._skip_record_ids is _NO_SKIPS:
+                    # the pointer of the first block, allocated with the second one
+                    self._skip_frequency_offsets = array("q", (0,))
+                    self._skip_data_offsets = array("q", (0,))
+                    self._skip_record_ids = array("q", (0,))
+                self._skip_record_ids.append(last)
+                self._skip_data_offsets.append(len(data))
+                self._skip_frequency_offsets.append(len(encoded_frequencies))
+
+            encode_varint(record_id - last, data)
+            encode_varint(frequency, encoded_frequencies)
+            last = record_id
+            size += 1
+            # published last so readers never see a posting count ahead of the encoded bytes
+            self._last = last
+            self._size = size
+
+    def cursor(self) -> "PostingCursor":
+        """Get a cursor over a snapshot of the postings.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        PostingCursor: A cursor positioned on the first posting.
+        """
+        return PostingCursor(
+            self._data,
+            self._frequencies,
+            self._size,
+            (self._skip_record_ids, self._skip_data_offsets, self._skip_frequency_offsets),
+            sorted(self._tail.items()),
+            frozenset(self._deleted),
+        )
+
+    def _compressed_cursor(self) -> "PostingCursor":
+        return PostingCursor(
+            self._data,
+            self._frequencies,
+            self._size,
+            (self._skip_record_ids, self._skip_data_offsets, self._skip_frequency_offsets),
+            [],
+            _NO_DELETED,
+        )
+
+    def _compressed_contains(self, record_id: object) -> bool:
+        if not isinstance(record_id, int) or record_id > self._last:
+            return False
+        return self._compressed_cursor().seek(record_id) == record_id
+
+    def _add_deleted(self, record_id: int) -> None:
+        if self._deleted is _NO_DELETED:
+            self._deleted = set()
+        self._deleted.add(record_id)
+
+    def _maybe_merge(self) -> None:
+        if len(self._tail) + len(self._deleted) >= MAX_TAIL_SIZE:
+            self.compact()
+
+
+def union_sorted(posting_lists: list[Iterable[int]]) -> Iterator[int]:
+    """Merge sorted row id streams into one sorted stream without duplicates.
+
+    Args:
+    ----
+        posting_lists (list[Iterable[int]]): The sorted row id streams.
+
+    Returns:
+    -------
+        Iterator[int]: The sorted union.
+    """
+    previous = None
+    for record_id in heapq.merge(*posting_lists):
+        if record_id != previous:
+            yield record_id
+            previous = record_id
+
+
+def merge_postings(posting_lists: list[PostingList]) -> PostingList:
+    """Merge posting lists into one, keeping the highest term frequency of every row id.
+
+    Args:
+    ----
+        posting_lists (list[PostingList]): The posting lists.
+
+    Returns:
+    -------
+        PostingList: The merged posting list.
+    """
+    record_ids = []
+    frequencies = []
+    merged_items = heapq.merge(*(posting_list.items() for posting_list in posting_lists))
+    for record_id, postings in groupby(merged_items, key=itemgetter(0)):
+        record_ids.append(record_id)
+        frequencies.append(max(frequency for _, frequency in postings))
+    return PostingList.from_sorted(record_ids, frequencies)
+
+
+class PostingCursor:
+    """Forward only cursor over a snapshot of a posting list.
+
+    `seek` uses the skip pointers to jump to the block that can hold the target and only decodes postings from
+    there, which is what makes intersecting a rare word with a common word cost about as much as the rare word.
+
+    Args:
+    ----
+        data (bytearray): The encoded row id deltas.
+        frequencies (bytearray): The encoded term frequencies.
+        size (int): The number of encoded postings in the snapshot.
+        skips (tuple[array, array, array]): The skip row ids, data offsets and frequency offsets.
+        tail (list[tuple[int, int]]): The sorted row id and term frequency pairs of the mutable tail.
+        deleted (frozenset[int]): The encoded row ids that are deleted or shadowed by the tail.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        data: bytearray,
+        frequencies: bytearray,
+        size: int,
+        skips: tuple[array, array, array],
+        tail: list[tuple[int, int]],
+        deleted: frozenset[int],
+    ) -> None:
+        """Initialize the cursor on the first posting.
+
+        Args:
+        ----
+        self: The current object.
+        data (bytearray): The encoded row id deltas.
+        frequencies (bytearray): The encoded term frequencies.
+        size (int): The number of encoded postings in the snapshot.
+        skips (tuple[array, array, array]): The skip row ids, data offsets and frequency offsets.
+        tail (list[tuple[int, int]]): The sorted row id and term frequency pairs of the mutable tail.
+        deleted (frozenset[int]): The encoded row ids that are deleted or shadowed by the tail.
+
+        Returns:
+        -------
+        None
+        """
+        self._data = data
+        self._frequencies = frequencies
+        self._size = size
+        self._skip_record_ids, self._skip_data_offsets, self._skip_frequency_offsets = skips
+        self._tail = tail
+        self._tail_record_ids = [record_id for record_id, _ in tail]
+        self._deleted = deleted
+        self.estimated_size = size + len(tail) - len(deleted)
+
+        # position in the encoded streams
+        self._index = 0
+        self._data_offset = 0
+        self._frequency_offset = 0
+        self._previous_record_id = 0
+        self._compressed_record_id: int | None = None
+        self._compressed_frequency = 0
+        self._tail_index = 0
+
+        self.record_id: int | None = None
+        self.frequency = 0
+
+        self._next_compressed()
+        self._update_current()
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the remaining row ids.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[int]: The row ids, starting with the current one.
+        """
+        while self.record_id is not None:
+            yield self.record_id
+            self.advance()
+
+    def advance(self) -> int | None:
+        """Move to the next posting.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int | None: The new current row id, or None when the cursor is exhausted.
+        """
+        if self.record_id is None:
+            return None
+
+        if self.record_id == self._compressed_record_id:
+            self._next_compressed()
+        else:
+            self._tail_index += 1
+
+        return self._update_current()
+
+    def seek(self, target: int) -> int | None:
+        """Move to the first posting whose row id is at least target.
+
+        Args:
+        ----
+        self: The current object.
+        target (int): The row id to seek to.
+
+        Returns:
+        -------
+        int | None: The new current row id, or None when the cursor is exhausted.
+        """
+        if self.record_id is None or self.record_id >= target:
+            return self.record_id
+
+        if self._compressed_record_id is not None and self._compressed_record_id < target:
+            block = bisect_left(self._skip_record_ids, target) - 1
+            if block * SKIP_INTERVAL > self._index and block * SKIP_INTERVAL < self._size:
+                self._index = block * SKIP_INTERVAL
+                self._data_offset = self._skip_data_offsets[block]
+                self._frequency_offset = self._skip_frequency_offsets[block]
+                self._previous_record_id = self._skip_record_ids[block]
+                self._next_compressed()
+
+            while self._compressed_record_id is not None and self._compressed_record_id < target:
+                self._next_compressed()
+
+        self._tail_index = bisect_left(self._tail_record_ids, target, lo=self._tail_index)
+
+        return self._update_current()
+
+    def _next_compressed(self) -> None:
+        while self._index < self._size:
+            delta, self._data_offset = read_varint(self._data, self._data_offset)
+            frequency, self._frequency_offset = read_varint(self._frequencies, self._frequency_offset)
+            self._previous_record_id += delta
+            self._index += 1
+            if self._previous_record_id not in self._deleted:
+                self._compressed_record_id = self._previous_record_id
+                self._compressed_frequency = frequency
+                return
+
+        self._compressed_record_id = None
+
+    def _update_current(self) -> int | None:
+        tail_record_id = None
+        if self._tail_index < len(self._tail):
+            tail_record_id, tail_frequency = self._tail[self._tail_index]
+
+        compressed_record_id = self._compressed_record_id
+        if compressed_record_id is not None and (tail_record_id is None or compressed_record_id < tail_record_id):
+            self.record_id = compressed_record_id
+            self.frequency = self._compressed_frequency
+        elif tail_record_id is not None:
+            self.record_id = tail_record_id
+            self.frequency = tail_frequency
+        else:
+            self.record_id = None
+            self.frequency = 0
+
+        return self.record_id
+
+
+class IteratorCursor:
+    """Cursor with the PostingCursor interface over any sorted row id iterator, seeking linearly.
+
+    Args:
+    ----
+        record_ids (Iterable[int]): The sorted, unique row ids.
+        estimated_size (int): The expected number of row ids, used to order intersections.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, record_ids: Iterable[int], estimated_size: int) -> None:
+        """Initialize the cursor on the first row id.
+
+        Args:
+        ----
+        self: The current object.
+        record_ids (Iterable[int]): The sorted, unique row ids.
+        estimated_size (int): The expected number of row ids, used to order intersections.
+
+        Returns:
+        -------
+        None
+        """
+        self._record_ids = iter(record_ids)
+        self.estimated_size = estimated_size
+        self.frequency = 1
+        self.record_id: int | None = next(self._record_ids, None)
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the remaining row ids.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[int]: The row ids, starting with the current one.
+        """
+        while self.record_id is not None:
+            yield self.record_id
+            self.advance()
+
+    def advance(self) -> int | None:
+        """Move to the next row id.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int | None: The new current row id, or None when the cursor is exhausted.
+        """
+        self.record_id = next(self._record_ids, None)
+        return self.record_id
+
+    def seek(self, target: int) -> int | None:
+        """Move to the first row id that is at least target.
+
+        Args:
+        ----
+        self: The current object.
+        target (int): The row id to seek to.
+
+        Returns:
+        -------
+        int | None: The new current row id, or None when the cursor is exhausted.
+        """
+        while self.record_id is not None and self.record_id < target:
+            self.record_id = next(self._record_ids, None)
+        return self.record_id
+
+
+Cursor = PostingCursor | IteratorCursor
+
+
+def intersect_cursors(cursors: list[Cursor]) -> Iterator[tuple[int, list[int]]]:
+    """Intersect cursors smallest first, seeking the larger ones to the candidates of the smallest.
+
+    Args:
+    ----
+        cursors (list[Cursor]): The cursors to intersect.
+
+    Returns:
+    -------
+        Iterator[tuple[int, list[int]]]: Every common row id with its term frequency in each cursor, in the
+        order the cursors were given.
+    """
+    if not cursors:
+        return
+
+    ordered = sorted(cursors, key=lambda cursor: cursor.estimated_size)
+    lead, others = ordered[0], ordered[1:]
+    target = lead.record_id
+    while target is not None:
+        for cursor in others:
+            record_id = cursor.seek(target)
+            if record_id is None:
+                return
+            if record_id > target:
+                target = lead.seek(record_id)
+                break
+        else:
+            yield target, [cursor.frequency for cursor in cursors]
+            target = lead.advance()
+
+
+def intersect_sorted(posting_lists: list[PostingList]) -> Iterator[int]:
+    """Intersect posting lists smallest first using their skip pointers.
+
+    Args:
+    ----
+        posting_lists (list[PostingList]): The posting lists.
+
+    Returns:
+    -------
+        Iterator[int]: The sorted intersection.
+    """
+    for record_id, _ in intersect_cursors([posting_list.cursor() for posting_list in posting_lists]):
+        yield record_id
@@ -0,0 +1,236 @@
+import time
+from threading import Lock
+
+from database import Database
+from log import get_logger
+from query_parser import Insert, Search, Select
+from query_plan import (
+    Access,
+    build_records,
+    choose_access,
+    execute_select,
+    explain_select,
+    resolve_value,
+    validate_statement,
+)
+from table import Table
+
+logger = get_logger(__file__)
+
+
+class PreparedStatement:
+    """An INSERT, SELECT or SEARCH with parameters, prepared once and executed with different values.
+
+    The statement is parsed once, and validated against the columns of its table and its access (see
+    `choose_access`) chosen once, for average values of its parameters, so an execution only resolves its
+    parameters. The statement is bound again when its table is replaced, gets a new index or grows or shrinks
+    a lot, since that may change the columns or the cheapest access.
+
+    Every execution is counted with its duration and the number of rows it returned or inserted, see
+    `get_stats`.
+
+    Args:
+    ----
+        name (str): The name of the statement.
+        query (str): The normalized text of the statement.
+        statement (Insert | Select | Search): The parsed statement.
+        parameter_count (int): The number of parameters, `$1` to `$n`.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, name: str, query: str, statement: Insert | Select | Search, parameter_count: int) -> None:
+        """Initialize a statement, which is bound to its table by its first execution.
+
+        Args:
+        ----
+        self: The current object.
+        name (str): The name of the statement.
+        query (str): The normalized text of the statement.
+        statement (Insert | Select | Search): The parsed statement.
+        parameter_count (int): The number of parameters.
+
+        Returns:
+        -------
+        None
+        """
+        self.name = name
+        self.query = query
+        self.statement = statement
+        self.parameter_count = parameter_count
+        # the table the statement was validated against, its indexes and the access chosen for them
+        self._binding: tuple[Table, tuple[int, ...], Access | None] | None = None
+
+        self.executions = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # statements are executed by the event loop and the query scheduler threads
+        self._lock = Lock()
+
+    def bind(self, databases: dict[str, Database]) -> tuple[Table, Access | None]:
+        """Get the table of the statement and its access, validating the statement if the table changed.
+
+        Args:
+        ----
+        self: The current object.
+        databases (dict[str, Database]): The databases of the server.
+
+        Raises:
+        ------
+        ValueError: If the database or table does not exist, or the statement does not fit the table.
+
+        Returns:
+        -------
+        tuple[Table, Access | None]: The table and the access of a SELECT, None for other statements.
+        """
+        statement = self.statement
+        database = databases.get(statement.database)
+        if database is None:
+            msg = f"database {statement.database} does not exist"
+            raise ValueError(msg)
+
+        table = database.get_table(statement.table)
+        # the access is chosen again when the table gets an index or its number of rows doubles or halves
+        signature = (
+            len(table.indexes),
+            len(table.unique_indexes),
+            len(table.sorted_indexes),
+            table.statistics.row_count.bit_length(),
+        )
+        binding = self._binding
+        if binding is not None and binding[0] is table and binding[1] == signature:
+            return table, binding[2]
+
+        validate_statement(table, statement)
+        access = choose_access(table, statement) if isinstance(statement, Select) else None
+        logger.debug(f"Bound {self.name} to {statement.database}.{statement.table} with access {access}")
+        self._binding = (table, signature, access)
+        return table, access
+
+    def explain(self, databases: dict[str, Database]) -> list[str]:
+        """Describe how a prepared SELECT is executed, see `explain_select`.
+
+        Args:
+        ----
+        self: The current object.
+        databases (dict[str, Database]): The databases of the server.
+
+        Raises:
+        ------
+        ValueError: If the statement is not a SELECT, or does not fit its table.
+
+        Returns:
+        -------
+        list[str]: The steps of the execution.
+        """
+        if not isinstance(self.statement, Select):
+            msg = f"Only SELECT can be explained but {self.name} is a {type(self.statement).__name__.upper()}."
+            raise ValueError(msg)  # noqa: TRY004
+
+        _, access = self.bind(databases)
+        return explain_select(self.statement, access)
+
+    def check_parameters(self, parameters: tuple | list) -> None:
+        """Check that there is a value for every parameter of the statement.
+
+        Args:
+        ----
+        self: The current object.
+        parameters (tuple | list): The values of `$1` to `$n`.
+
+        Raises:
+        ------
+        ValueError: If the number of values is wrong.
+
+        Returns:
+        -------
+        None
+        """
+        if len(parameters) != self.parameter_count:
+            msg = f"{self.name} takes {self.parameter_count} parameters but got {len(parameters)}."
+            raise ValueError(msg)
+
+    def execute(self, databases: dict[str, Database], parameters: tuple | list) -> object:
+        """Execute the statement with the values of its parameters.
+
+        Args:
+        ----
+        self: The current object.
+        databases (dict[str, Database]): The databases of the server.
+        parameters (tuple | list): The values of `$1` to `$n`.
+
+        Raises:
+        ------
+        ValueError: If the number of values is wrong, or the statement fails.
+
+        Returns:
+        -------
+        object: The ids of the inserted records, the selected records or the found records.
+        """
+        start = time.perf_counter()
+        result = None
+        try:
+            self.check_parameters(parameters)
+            table, access = self.bind(databases)
+            statement = self.statement
+            if isinstance(statement, Insert):
+                result = databases[statement.database].insert_records_into_table(
+                    statement.table, build_records(statement, parameters),
+                )
+            elif isinstance(statement, Select):
+                result = execute_select(table, statement, access, parameters)
+            else:
+                text = resolve_value(statement.text, parameters)
+                result = table.search(statement.column, text, statement.limit)
+        finally:
+            self.record_execution(time.perf_counter() - start, 0 if result is None else len(result), result is None)
+        return result
+
+    def record_execution(self, seconds: float, rows: int, failed: bool = False) -> None:
+        """Count an execution of the statement.
+
+        Args:
+        ----
+        self: The current object.
+        seconds (float): The duration of the execution.
+        rows (int): The number of rows returned or inserted.
+        failed (bool, optional): Whether the execution failed. Defaults to False.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self.executions += 1
+            self.errors += failed
+            self.rows += rows
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def get_stats(self) -> dict[str, object]:
+        """Get the execution stats of the statement.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        dict[str, object]: The name, query, number of executions, failed executions and rows, and the total, mean
+            and maximum duration in milliseconds.
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "query": self.query,
+                "executions": self.executions,
+                "errors": self.errors,
+                "rows": self.rows,
+                "total_ms": self.total_seconds * 1_000,
+                "mean_ms": self.total_seconds * 1_000 / self.executions if self.executions else 0.0,
+                "max_ms": self.max_seconds * 1_000,
+            }
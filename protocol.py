@@ -1,19 +1,54 @@
 import asyncio
+from collections.abc import Callable
 
 from errors import InvalidQueryError
 from execute_query import ExecuteQuery
 from log import get_logger
+from query_parser import Execute, Statement
+from query_plan import READ_STATEMENTS, WRITE_STATEMENTS, QueryPlan
+from query_scheduler import QueryScheduler, current_client
+from record_codec import CodecError
+from wire_protocol import (
+    CREATE_INDEX,
+    EXECUTE,
+    FLAG_ERROR,
+    GET_BY_COLUMN,
+    INSERT,
+    INSERT_MANY,
+    QUERY,
+    RANK_SEARCH,
+    SEARCH,
+    Frame,
+    ProtocolError,
+    encode_frame,
+    encode_response,
+    read_frame,
+)
 
 logger = get_logger(__file__)
 
+# requests of a connection being executed or answered before no more frames are read from it
+MAX_PIPELINED_REQUESTS = 128
+# unsent response bytes of a connection above which responses wait for the client to read, and below which they resume
+HIGH_WATERMARK = 1 << 20
+LOW_WATERMARK = 256 << 10
+
+# requests that may scan a whole table, executed by the query scheduler so they do not block the event loop
+OFFLOADED_OPCODES = (GET_BY_COLUMN, SEARCH, RANK_SEARCH)
+# requests that change a table, executed once no offloaded request reads it
+WRITE_OPCODES = (INSERT, INSERT_MANY, CREATE_INDEX)
+
 
 class TcpProtocol(ExecuteQuery):
     """TCP protocol for handling client requests.
 
     This class extends the ExecuteQuery class and implements methods for handling client requests and creating a server.
-    The `handle_client_request` method reads data from the client, executes the query using the `execute_query` method,
-    and sends a response back to the client. The `create_server` method creates a TCP server and listens for client
-    requests.
+    The `handle_client_request` method keeps the connection open and reads pipelined request frames from the client,
+    executes them using the `execute_request` method, and sends the response frames back to the client. The
+    `create_server` method creates a TCP server and listens for client requests.
+
+    Point lookups and writes are cheap and executed on the event loop, while scans and searches are executed by a
+    `QueryScheduler`, so they do not stall the other connections.
 
     Args:
     ----
@@ -26,14 +61,33 @@ class TcpProtocol(ExecuteQuery):
     None
     """
 
+    def __init__(self) -> None:
+        """Initialize the TcpProtocol object.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        None
+        """
+        super().__init__()
+        self.scheduler = QueryScheduler()
+
     async def handle_client_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
-        """Handle a client request.
+        """Handle the requests of a client connection until it closes.
+
+        The connection stays open and request frames (see `wire_protocol`) are read in a loop, so a client can
+        pipeline many requests without waiting for their responses. Every request is answered by one or more
+        response frames with its request id, which is how the client matches them, since a request may finish
+        after a later one. A failed request gets a single frame flagged with FLAG_ERROR whose payload is the error
+        message. A frame that does not follow the protocol closes the connection. Once the client closes the
+        connection, its requests that have not been answered are cancelled.
 
-        This method reads data from the client using the provided `reader` object, decodes the data into a message,
-        and logs the received message and client address. It then executes the query using the `execute_query` method
-        of the instance. If an `InvalidQueryError` is raised, it logs the error, sends the error message back to the
-        client, and closes the connection. Otherwise, it sends an acknowledgement message to the client and closes the
-        connection.
+        Flow control: at most MAX_PIPELINED_REQUESTS requests of a connection are in flight, after which no more
+        frames are read, and responses wait in `writer.drain()` while more than HIGH_WATERMARK bytes are unsent,
+        until the client reads them down to LOW_WATERMARK.
 
         Args:
         ----
@@ -45,25 +99,132 @@ class TcpProtocol(ExecuteQuery):
         -------
         None
         """
-        data = await reader.read(100)
-        message = data.decode()
         addr = writer.get_extra_info("peername")
-        logger.info(f"Received {message} from {addr}")
+        writer.transport.set_write_buffer_limits(high=HIGH_WATERMARK, low=LOW_WATERMARK)
+        in_flight = asyncio.Semaphore(MAX_PIPELINED_REQUESTS)
+        tasks: set[asyncio.Task] = set()
+        # the query scheduler takes turns between the connections
+        current_client.set(writer)
+        logger.info(f"Connection from {addr}")
 
         try:
-            self.execute_query(message)
-        except InvalidQueryError as error:
-            logger.error(f"Invalid query: {error}")
-            msg = str(error)
-            writer.write(bytes(msg, "utf-8"))
-            await writer.drain()
+            while True:
+                await in_flight.acquire()
+                try:
+                    frame = await read_frame(reader)
+                except ProtocolError as error:
+                    logger.error(f"Invalid frame from {addr}: {error}")
+                    break
+                if frame is None:
+                    break
+
+                task = asyncio.create_task(self._respond(frame, writer, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError as error:
+            logger.info(f"Connection from {addr} lost: {error}")
+        finally:
+            for task in tasks:
+                task.cancel()
             writer.close()
-            return
+            logger.info(f"Closed connection from {addr}")
+
+    async def _respond(self, frame: Frame, writer: asyncio.StreamWriter, in_flight: asyncio.Semaphore) -> None:
+        try:
+            logger.debug(f"Received request {frame.request_id} with opcode {frame.opcode}")
+            # the frames of a response are written at once, so they are never interleaved with another response
+            writer.writelines(await self.get_response_frames(frame))
+            await writer.drain()
+        finally:
+            in_flight.release()
+
+    async def execute_frame(self, frame: Frame) -> object:
+        """Execute a request frame on the databases of this process.
+
+        Scans and searches, including SELECT and SEARCH queries and prepared statements, are executed by the query
+        scheduler, and writes wait until no scan or search of the scheduler reads their table.
+
+        Args:
+        ----
+        self: The instance of the class.
+        frame (Frame): The request frame.
+
+        Raises:
+        ------
+        InvalidQueryError: If the request is invalid or fails.
+
+        Returns:
+        -------
+        object: The result.
+        """
+        opcode, payload = frame.opcode, frame.payload
+        if opcode == QUERY and isinstance(payload, str):
+            return await self.execute_query_plan(self.plan_query(payload))
+        if opcode == EXECUTE and isinstance(payload, list) and payload and isinstance(payload[0], str):
+            statement = self._get_prepared_target(payload[0])
+            return await self._schedule(statement, self.execute_request, opcode, payload)
+
+        is_table_request = isinstance(payload, list) and len(payload) >= 2 and all(  # noqa: PLR2004
+            isinstance(name, str) for name in payload[:2]
+        )
+        if is_table_request and opcode in OFFLOADED_OPCODES:
+            return await self.scheduler.run(tuple(payload[:2]), self.execute_request, opcode, payload)
+        if is_table_request and opcode in WRITE_OPCODES:
+            return await self.scheduler.write(tuple(payload[:2]), self.execute_request, opcode, payload)
+        return self.execute_request(opcode, payload)
+
+    async def execute_query_plan(self, plan: QueryPlan) -> object:
+        """Execute the plan of a query, offloading SELECT and SEARCH, prepared or not, like scans of the wire protocol.
+
+        Args:
+        ----
+        self: The instance of the class.
+        plan (QueryPlan): The plan.
+
+        Raises:
+        ------
+        InvalidQueryError: If the query fails.
+
+        Returns:
+        -------
+        object: The result.
+        """
+        statement = plan.statement
+        if isinstance(statement, Execute):
+            statement = self._get_prepared_target(statement.name)
+        return await self._schedule(statement, self.execute_plan, plan)
+
+    def _get_prepared_target(self, name: str) -> Statement | None:
+        # an unknown statement is executed on the event loop, which fails right away
+        prepared_statement = self.prepared_statements.get(name)
+        return None if prepared_statement is None else prepared_statement.statement
+
+    async def _schedule(self, statement: Statement | None, func: Callable, *args: object) -> object:
+        if isinstance(statement, READ_STATEMENTS):
+            return await self.scheduler.run((statement.database, statement.table), func, *args)
+        if isinstance(statement, WRITE_STATEMENTS):
+            return await self.scheduler.write((statement.database, statement.table), func, *args)
+        return func(*args)
+
+    async def get_response_frames(self, frame: Frame) -> list[bytes]:
+        """Execute a request frame and encode its response frames.
+
+        Args:
+        ----
+        self: The instance of the class.
+        frame (Frame): The request frame.
 
-        logger.info("Send: ACK!")
-        writer.write(b"ACK!")
-        await writer.drain()
-        writer.close()
+        Returns:
+        -------
+        list[bytes]: The response frames.
+        """
+        try:
+            result = await self.execute_frame(frame)
+            return encode_response(frame.request_id, frame.opcode, result)
+        except (InvalidQueryError, CodecError, ProtocolError) as error:
+            logger.error(f"Invalid query: {error}")
+            message = error.message if isinstance(error, InvalidQueryError) else str(error)
+            return [encode_frame(frame.request_id, frame.opcode, message, FLAG_ERROR)]
 
     async def create_server(self) -> None:
         """Create a TCP server.
@@ -0,0 +1,647 @@
+import re
+from collections.abc import Callable
+from typing import NamedTuple
+
+from log import get_logger
+
+logger = get_logger(__file__)
+
+KEYWORDS = frozenset(
+    (
+        "AND", "ASC", "BETWEEN", "BY", "CREATE", "DATABASE", "DELETE", "DESC", "DROP", "FALSE", "FOR", "FROM",
+        "INDEX", "INSERT", "INTO", "INVERTED", "LIMIT", "NULL", "ON", "ORDER", "SEARCH", "SELECT", "SHUTDOWN",
+        "SORTED", "TABLE", "TRUE", "UNIQUE", "VALUES", "WHERE", "PREPARE", "AS", "EXECUTE", "DEALLOCATE", "SHOW",
+        "STATEMENTS", "EXPLAIN", "ANALYZE",
+    ),
+)
+
+# token kinds
+KEYWORD = "keyword"
+IDENTIFIER = "identifier"
+STRING = "string"
+NUMBER = "number"
+OPERATOR = "operator"
+PUNCTUATION = "punctuation"
+PARAMETER = "parameter"
+
+# comparison operators of WHERE conditions, "<>" is read as "!="
+COMPARISON_OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+
+# index kinds of CREATE [UNIQUE | SORTED | INVERTED] INDEX
+HASH_INDEX = "hash"
+UNIQUE_INDEX = "unique"
+SORTED_INDEX = "sorted"
+INVERTED_INDEX = "inverted"
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    |(?P<quoted_identifier>"(?:[^"]|"")*")
+    |(?P<parameter>\$\d+)
+    |(?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+    |(?P<operator><=|>=|!=|<>|=|<|>)
+    |(?P<punctuation>[(),.*;])
+    |(?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    """,
+    re.VERBOSE,
+)
+_WHITESPACE_PATTERN = re.compile(r"\s*")
+
+
+class Token(NamedTuple):
+    """A token of a query, with the text it has in the normalized query."""
+
+    kind: str
+    value: object
+    text: str
+
+
+class Parameter(NamedTuple):
+    """A placeholder for a value of a prepared statement, `$1` is the first value passed to EXECUTE."""
+
+    index: int
+
+
+class ColumnDefinition(NamedTuple):
+    """A column of CREATE TABLE, e.g. `age int NULL`."""
+
+    name: str
+    type_name: str
+    nullable: bool
+
+
+class Condition(NamedTuple):
+    """A WHERE condition comparing a column to a value."""
+
+    column: str
+    operator: str
+    value: object
+
+
+class OrderBy(NamedTuple):
+    """The ORDER BY clause of a SELECT."""
+
+    column: str
+    descending: bool
+
+
+class CreateDatabase(NamedTuple):
+    """CREATE DATABASE name."""
+
+    database: str
+
+
+class DeleteDatabase(NamedTuple):
+    """DELETE DATABASE name."""
+
+    database: str
+
+
+class CreateTable(NamedTuple):
+    """CREATE TABLE database.table (column type [NULL], ...)."""
+
+    database: str
+    table: str
+    columns: tuple[ColumnDefinition, ...]
+
+
+class DropTable(NamedTuple):
+    """DROP TABLE database.table."""
+
+    database: str
+    table: str
+
+
+class ShutdownTable(NamedTuple):
+    """SHUTDOWN TABLE database.table."""
+
+    database: str
+    table: str
+
+
+class Analyze(NamedTuple):
+    """ANALYZE database.table, builds the statistics of the columns again."""
+
+    database: str
+    table: str
+
+
+class Insert(NamedTuple):
+    """INSERT INTO database.table (column, ...) VALUES (value, ...), ..."""
+
+    database: str
+    table: str
+    columns: tuple[str, ...]
+    rows: tuple[tuple[object, ...], ...]
+
+
+class Select(NamedTuple):
+    """SELECT * | column, ... FROM database.table [WHERE ...] [ORDER BY column [ASC | DESC]] [LIMIT n].
+
+    `columns` is None for `*`, and the conditions are combined with AND.
+    """
+
+    database: str
+    table: str
+    columns: tuple[str, ...] | None
+    conditions: tuple[Condition, ...]
+    order_by: OrderBy | None
+    limit: int | None
+
+
+class Search(NamedTuple):
+    """SEARCH database.table (column) FOR 'text' [LIMIT n], the text may be a parameter."""
+
+    database: str
+    table: str
+    column: str
+    text: str | Parameter
+    limit: int
+
+
+class CreateIndex(NamedTuple):
+    """CREATE [UNIQUE | SORTED | INVERTED] INDEX ON database.table (column)."""
+
+    database: str
+    table: str
+    column: str
+    kind: str
+
+
+class Prepare(NamedTuple):
+    """PREPARE name AS statement, for an INSERT, SELECT or SEARCH with parameters `$1`, `$2`, ..."""
+
+    name: str
+    statement: "Insert | Select | Search"
+    query: str
+    parameter_count: int
+
+
+class Execute(NamedTuple):
+    """EXECUTE name[(value, ...)]."""
+
+    name: str
+    parameters: tuple[object, ...]
+
+
+class Deallocate(NamedTuple):
+    """DEALLOCATE name."""
+
+    name: str
+
+
+class ShowStatements(NamedTuple):
+    """SHOW STATEMENTS, the prepared statements and their execution stats."""
+
+
+class Explain(NamedTuple):
+    """EXPLAIN statement, for a SELECT or the EXECUTE of a prepared SELECT."""
+
+    statement: "Select | Execute"
+
+
+Statement = (
+    CreateDatabase | DeleteDatabase | CreateTable | DropTable | ShutdownTable | Insert | Select | Search | CreateIndex
+    | Prepare | Execute | Deallocate | ShowStatements | Explain | Analyze
+)
+# statements that can be prepared
+PREPARABLE_STATEMENTS = (Insert, Select, Search)
+
+DEFAULT_SEARCH_LIMIT = 10
+
+
+def tokenize_query(query: str) -> list[Token]:
+    """Split a query into tokens.
+
+    Keywords are case insensitive, identifiers that are keywords or not plain words are written in double quotes,
+    strings in single quotes and a quote inside either is written twice.
+
+    Args:
+    ----
+        query (str): The query text.
+
+    Raises:
+    ------
+        ValueError: If the query has a character that does not start a token, e.g. an unterminated string.
+
+    Returns:
+    -------
+        list[Token]: The tokens.
+    """
+    tokens = []
+    position = _WHITESPACE_PATTERN.match(query).end()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if match is None:
+            msg = f"Unexpected {query[position:position + 10]!r} in query."
+            raise ValueError(msg)
+
+        tokens.append(_to_token(match))
+        position = _WHITESPACE_PATTERN.match(query, match.end()).end()
+    return tokens
+
+
+def _to_token(match: re.Match) -> Token:  # noqa: PLR0911
+    text = match.group()
+    if match.lastgroup == "string":
+        return Token(STRING, text[1:-1].replace("''", "'"), text)
+    if match.lastgroup == "parameter":
+        return Token(PARAMETER, int(text[1:]), text)
+    if match.lastgroup == "quoted_identifier":
+        name = text[1:-1].replace('""', '"')
+        return Token(IDENTIFIER, name, format_identifier(name))
+    if match.lastgroup == "number":
+        value = float(text) if any(character in text for character in ".eE") else int(text)
+        return Token(NUMBER, value, repr(value))
+    if match.lastgroup == "operator":
+        operator = "!=" if text == "<>" else text
+        return Token(OPERATOR, operator, operator)
+    if match.lastgroup == "punctuation":
+        return Token(PUNCTUATION, text, text)
+    if text.upper() in KEYWORDS:
+        return Token(KEYWORD, text.upper(), text.upper())
+    return Token(IDENTIFIER, text, format_identifier(text))
+
+
+def normalize_query(tokens: list[Token]) -> str:
+    """Get the normalized text of a query, which is the same for queries that only differ in spacing or case.
+
+    Args:
+    ----
+        tokens (list[Token]): The tokens of the query.
+
+    Returns:
+    -------
+        str: The normalized text.
+    """
+    return " ".join(token.text for token in tokens)
+
+
+def parse_query(tokens: list[Token]) -> Statement:
+    """Parse the tokens of a query into a statement.
+
+    Args:
+    ----
+        tokens (list[Token]): The tokens of the query, see `tokenize_query`.
+
+    Raises:
+    ------
+        ValueError: If the query is empty or malformed, or has parameters but is not a PREPARE.
+
+    Returns:
+    -------
+        Statement: The statement.
+    """
+    if tokens and tokens[-1].value == ";" and tokens[-1].kind == PUNCTUATION:
+        tokens = tokens[:-1]
+    if not tokens:
+        msg = "Query must not be empty."
+        raise ValueError(msg)
+
+    parser = _Parser(tokens)
+    statement = parser.parse_statement()
+    if parser.position != len(tokens):
+        msg = f"Unexpected {tokens[parser.position].text!r} in query."
+        raise ValueError(msg)
+    if parser.parameters and not isinstance(statement, Prepare):
+        msg = "Parameters are only supported in PREPARE."
+        raise ValueError(msg)
+
+    return statement
+
+
+def format_literal(value: object) -> str:
+    """Get the query text of a literal value.
+
+    Args:
+    ----
+        value (object): A string, number, boolean, None or a Parameter.
+
+    Raises:
+    ------
+        ValueError: If the value can not be written in a query.
+
+    Returns:
+    -------
+        str: The literal.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, Parameter):
+        return f"${value.index}"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int | float):
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+
+    msg = f"Value {value!r} can not be written in a query."
+    raise ValueError(msg)
+
+
+def format_identifier(name: str) -> str:
+    """Get the query text of an identifier.
+
+    Args:
+    ----
+        name (str): The name of a database, table or column.
+
+    Returns:
+    -------
+        str: The quoted identifier.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def format_select(select: Select) -> str:
+    """Get the query text of a SELECT statement.
+
+    Args:
+    ----
+        select (Select): The statement.
+
+    Raises:
+    ------
+        ValueError: If a value of a condition can not be written in a query.
+
+    Returns:
+    -------
+        str: The query.
+    """
+    columns = "*" if select.columns is None else ", ".join(map(format_identifier, select.columns))
+    # every name and value is quoted, so the text parses back to the same statement
+    table = f"{format_identifier(select.database)}.{format_identifier(select.table)}"
+    parts = [f"SELECT {columns} FROM {table}"]  # noqa: S608
+    if select.conditions:
+        conditions = (
+            f"{format_identifier(condition.column)} {condition.operator} {format_literal(condition.value)}"
+            for condition in select.conditions
+        )
+        parts.append("WHERE " + " AND ".join(conditions))
+    if select.order_by is not None:
+        direction = "DESC" if select.order_by.descending else "ASC"
+        parts.append(f"ORDER BY {format_identifier(select.order_by.column)} {direction}")
+    if select.limit is not None:
+        parts.append(f"LIMIT {select.limit}")
+    return " ".join(parts)
+
+
+class _Parser:
+    def __init__(self, tokens: list[Token]) -> None:
+        self.tokens = tokens
+        self.position = 0
+        self.parameters: set[int] = set()
+
+    def peek(self) -> Token | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Token:
+        token = self.peek()
+        if token is None:
+            msg = "Query ended unexpectedly."
+            raise ValueError(msg)
+        self.position += 1
+        return token
+
+    def is_next(self, kind: str, value: object) -> bool:
+        token = self.peek()
+        return token is not None and token.kind == kind and token.value == value
+
+    def skip(self, kind: str, value: object) -> bool:
+        if self.is_next(kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value: object) -> None:
+        token = self.take()
+        if token.kind != kind or token.value != value:
+            msg = f"Expected {value!r} but got {token.text!r} in query."
+            raise ValueError(msg)
+
+    def expect_keyword(self, *keywords: str) -> None:
+        for keyword in keywords:
+            self.expect(KEYWORD, keyword)
+
+    def take_identifier(self) -> str:
+        token = self.take()
+        if token.kind != IDENTIFIER:
+            msg = f"Expected a name but got {token.text!r} in query, names that are keywords must be quoted."
+            raise ValueError(msg)
+        return token.value
+
+    def take_table(self) -> tuple[str, str]:
+        database = self.take_identifier()
+        self.expect(PUNCTUATION, ".")
+        return database, self.take_identifier()
+
+    def take_literal(self) -> object:
+        token = self.take()
+        if token.kind in (STRING, NUMBER):
+            return token.value
+        if token.kind == PARAMETER:
+            self.parameters.add(token.value)
+            return Parameter(token.value)
+        if token.kind == KEYWORD and token.value in ("NULL", "TRUE", "FALSE"):
+            return {"NULL": None, "TRUE": True, "FALSE": False}[token.value]
+
+        msg = f"Expected a value but got {token.text!r} in query."
+        raise ValueError(msg)
+
+    def take_count(self) -> int:
+        token = self.take()
+        if token.kind != NUMBER or not isinstance(token.value, int) or token.value <= 0:
+            msg = f"Expected a positive integer but got {token.text!r} in query."
+            raise ValueError(msg)
+        return token.value
+
+    def take_list(self, take_item: Callable[[], object]) -> tuple:
+        self.expect(PUNCTUATION, "(")
+        items = [take_item()]
+        while self.skip(PUNCTUATION, ","):
+            items.append(take_item())
+        self.expect(PUNCTUATION, ")")
+        return tuple(items)
+
+    def take_column(self) -> str:
+        self.expect(PUNCTUATION, "(")
+        column = self.take_identifier()
+        self.expect(PUNCTUATION, ")")
+        return column
+
+    def parse_statement(self) -> Statement:
+        token = self.take()
+        parse = {
+            "CREATE": self.parse_create,
+            "DELETE": self.parse_delete,
+            "DROP": self.parse_drop,
+            "SHUTDOWN": self.parse_shutdown,
+            "INSERT": self.parse_insert,
+            "SELECT": self.parse_select,
+            "SEARCH": self.parse_search,
+            "PREPARE": self.parse_prepare,
+            "EXECUTE": self.parse_execute,
+            "DEALLOCATE": self.parse_deallocate,
+            "SHOW": self.parse_show,
+            "EXPLAIN": self.parse_explain,
+            "ANALYZE": self.parse_analyze,
+        }.get(token.value) if token.kind == KEYWORD else None
+        if parse is None:
+            msg = f"Unexpected {token.text!r} at the start of query."
+            raise ValueError(msg)
+        return parse()
+
+    def parse_create(self) -> Statement:
+        if self.skip(KEYWORD, "DATABASE"):
+            return CreateDatabase(self.take_identifier())
+
+        if self.skip(KEYWORD, "TABLE"):
+            database, table = self.take_table()
+            return CreateTable(database, table, self.take_list(self.parse_column_definition))
+
+        kind = HASH_INDEX
+        for keyword, index_kind in (("UNIQUE", UNIQUE_INDEX), ("SORTED", SORTED_INDEX), ("INVERTED", INVERTED_INDEX)):
+            if self.skip(KEYWORD, keyword):
+                kind = index_kind
+                break
+        self.expect_keyword("INDEX", "ON")
+        database, table = self.take_table()
+        return CreateIndex(database, table, self.take_column(), kind)
+
+    def parse_column_definition(self) -> ColumnDefinition:
+        name = self.take_identifier()
+        type_name = self.take_identifier()
+        return ColumnDefinition(name, type_name, self.skip(KEYWORD, "NULL"))
+
+    def parse_delete(self) -> Statement:
+        self.expect_keyword("DATABASE")
+        return DeleteDatabase(self.take_identifier())
+
+    def parse_drop(self) -> Statement:
+        self.expect_keyword("TABLE")
+        return DropTable(*self.take_table())
+
+    def parse_shutdown(self) -> Statement:
+        self.expect_keyword("TABLE")
+        return ShutdownTable(*self.take_table())
+
+    def parse_analyze(self) -> Statement:
+        return Analyze(*self.take_table())
+
+    def parse_insert(self) -> Statement:
+        self.expect_keyword("INTO")
+        database, table = self.take_table()
+        columns = self.take_list(self.take_identifier)
+        if len(set(columns)) != len(columns):
+            msg = "Columns of INSERT must be distinct."
+            raise ValueError(msg)
+
+        self.expect_keyword("VALUES")
+        rows = [self.take_list(self.take_literal)]
+        while self.skip(PUNCTUATION, ","):
+            rows.append(self.take_list(self.take_literal))
+        for row in rows:
+            if len(row) != len(columns):
+                msg = f"INSERT has {len(columns)} columns but a row has {len(row)} values."
+                raise ValueError(msg)
+        return Insert(database, table, columns, tuple(rows))
+
+    def parse_select(self) -> Statement:
+        if self.skip(PUNCTUATION, "*"):
+            columns = None
+        else:
+            columns = [self.take_identifier()]
+            while self.skip(PUNCTUATION, ","):
+                columns.append(self.take_identifier())
+            columns = tuple(columns)
+
+        self.expect_keyword("FROM")
+        database, table = self.take_table()
+
+        conditions = []
+        if self.skip(KEYWORD, "WHERE"):
+            conditions.extend(self.parse_condition())
+            while self.skip(KEYWORD, "AND"):
+                conditions.extend(self.parse_condition())
+
+        order_by = None
+        if self.skip(KEYWORD, "ORDER"):
+            self.expect_keyword("BY")
+            column = self.take_identifier()
+            descending = self.skip(KEYWORD, "DESC")
+            if not descending:
+                self.skip(KEYWORD, "ASC")
+            order_by = OrderBy(column, descending)
+
+        limit = self.take_count() if self.skip(KEYWORD, "LIMIT") else None
+        return Select(database, table, columns, tuple(conditions), order_by, limit)
+
+    def parse_condition(self) -> list[Condition]:
+        column = self.take_identifier()
+        if self.skip(KEYWORD, "BETWEEN"):
+            low = self.take_literal()
+            self.expect_keyword("AND")
+            return [Condition(column, ">=", low), Condition(column, "<=", self.take_literal())]
+
+        token = self.take()
+        if token.kind != OPERATOR:
+            msg = f"Expected a comparison but got {token.text!r} in query."
+            raise ValueError(msg)
+        return [Condition(column, token.value, self.take_literal())]
+
+    def parse_search(self) -> Statement:
+        database, table = self.take_table()
+        column = self.take_column()
+        self.expect_keyword("FOR")
+        text = self.parse_search_text()
+        limit = self.take_count() if self.skip(KEYWORD, "LIMIT") else DEFAULT_SEARCH_LIMIT
+        return Search(database, table, column, text, limit)
+
+    def parse_search_text(self) -> object:
+        token = self.take()
+        if token.kind == STRING:
+            return token.value
+        if token.kind == PARAMETER:
+            self.parameters.add(token.value)
+            return Parameter(token.value)
+
+        msg = f"Expected the search text in quotes but got {token.text!r} in query."
+        raise ValueError(msg)
+
+    def parse_prepare(self) -> Statement:
+        name = self.take_identifier()
+        self.expect_keyword("AS")
+        start = self.position
+        statement = self.parse_statement()
+        if not isinstance(statement, PREPARABLE_STATEMENTS):
+            msg = "Only INSERT, SELECT and SEARCH can be prepared."
+            raise ValueError(msg)  # noqa: TRY004
+
+        parameter_count = len(self.parameters)
+        if self.parameters != set(range(1, parameter_count + 1)):
+            msg = f"Parameters of {name} must be numbered from $1 to ${parameter_count} without gaps."
+            raise ValueError(msg)
+        return Prepare(name, statement, normalize_query(self.tokens[start:]), parameter_count)
+
+    def parse_execute(self) -> Statement:
+        name = self.take_identifier()
+        parameters = self.take_list(self.take_literal) if self.is_next(PUNCTUATION, "(") else ()
+        if self.parameters:
+            msg = "EXECUTE takes values, not parameters."
+            raise ValueError(msg)
+        return Execute(name, parameters)
+
+    def parse_deallocate(self) -> Statement:
+        return Deallocate(self.take_identifier())
+
+    def parse_show(self) -> Statement:
+        self.expect_keyword("STATEMENTS")
+        return ShowStatements()
+
+    def parse_explain(self) -> Statement:
+        statement = self.parse_statement()
+        if not isinstance(statement, Select | Execute):
+            msg = "Only SELECT and EXECUTE can be explained."
+            raise ValueError(msg)  # noqa: TRY004
+        return Explain(statement)
@@ -0,0 +1,813 @@
+import heapq
+import math
+import operator
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from itertools import islice
+from threading import Lock
+from typing import Any, NamedTuple
+
+from column_statistics import DEFAULT_RANGE_SELECTIVITY, ColumnStatistics
+from database import Database
+from index_build import SCAN_INDEX_READ
+from internal_types import Record
+from log import get_logger
+from query_parser import (
+    HASH_INDEX,
+    INVERTED_INDEX,
+    SORTED_INDEX,
+    UNIQUE_INDEX,
+    Analyze,
+    Condition,
+    CreateDatabase,
+    CreateIndex,
+    CreateTable,
+    DeleteDatabase,
+    DropTable,
+    Explain,
+    Insert,
+    Parameter,
+    Search,
+    Select,
+    ShutdownTable,
+    Statement,
+    format_literal,
+    normalize_query,
+    parse_query,
+    tokenize_query,
+)
+from record_codec import UNION_SEPARATOR, decode_column_type
+from table import Table
+
+logger = get_logger(__file__)
+
+DEFAULT_PLAN_CACHE_SIZE = 1_024
+
+# how a SELECT reads its table
+LOOKUP_ACCESS = "lookup"
+RANGE_ACCESS = "range"
+SORTED_ACCESS = "sorted"
+SCAN_ACCESS = "scan"
+INTERSECT_ACCESS = "intersect"
+
+# estimated costs of the steps of reading a table, relative to reading a record
+_PROBE_COST = 2.0
+_READ_COST = 1.0
+_FILTER_COST = 0.2
+_ROW_ID_COST = 0.1
+_SORT_COST = 0.05
+
+# statements that read a table and may scan it
+READ_STATEMENTS = (Select, Search)
+# statements that change a table
+WRITE_STATEMENTS = (Insert, CreateIndex, DropTable, ShutdownTable, Analyze)
+
+_COMPARISONS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+_LOWER_BOUNDS = (">", ">=", "=")
+_UPPER_BOUNDS = ("<", "<=", "=")
+
+
+class QueryPlan(NamedTuple):
+    """A parsed query compiled into the function that executes it on the databases of a server.
+
+    `execute` is None for PREPARE, EXECUTE, DEALLOCATE, SHOW STATEMENTS and EXPLAIN EXECUTE, which the executor
+    handles itself.
+    """
+
+    statement: Statement
+    execute: Callable[[dict[str, Database]], object] | None
+
+
+class Access(NamedTuple):
+    """How a SELECT reads its table, see `choose_access`.
+
+    `low` is the position of the condition with the lower bound of a range or the value of a lookup, and `high`
+    the position of the condition with the upper bound of a range. `rows` is the estimated number of records
+    the access reads and `cost` the estimated cost of reading, filtering and ordering them. An intersection
+    reads the records whose row ids all of its `inputs` find.
+    """
+
+    kind: str
+    column: str | None = None
+    low: int | None = None
+    high: int | None = None
+    rows: float = 0.0
+    cost: float = 0.0
+    inputs: tuple["Access", ...] = ()
+
+
+def plan_statement(statement: Statement) -> QueryPlan:
+    """Compile a statement into a query plan.
+
+    Everything that only depends on the query text, e.g. the column types of CREATE TABLE, the records of INSERT
+    or the conditions of SELECT, is prepared once here, while the index a SELECT uses is chosen when it runs,
+    since indexes may be created after the plan.
+
+    Args:
+    ----
+        statement (Statement): The statement.
+
+    Raises:
+    ------
+        CodecError: If a column type of CREATE TABLE is not supported.
+
+    Returns:
+    -------
+        QueryPlan: The plan.
+    """
+    compile_statement = {
+        CreateDatabase: _compile_create_database,
+        DeleteDatabase: _compile_delete_database,
+        CreateTable: _compile_create_table,
+        DropTable: _compile_drop_table,
+        ShutdownTable: _compile_shutdown_table,
+        Insert: _compile_insert,
+        Select: _compile_select,
+        Search: _compile_search,
+        CreateIndex: _compile_create_index,
+        Analyze: _compile_analyze,
+    }.get(type(statement))
+    if isinstance(statement, Explain) and isinstance(statement.statement, Select):
+        compile_statement = _compile_explain
+    return QueryPlan(statement, None if compile_statement is None else compile_statement(statement))
+
+
+def _get_database(databases: dict[str, Database], name: str) -> Database:
+    database = databases.get(name)
+    if database is None:
+        msg = f"database {name} does not exist"
+        raise ValueError(msg)
+    return database
+
+
+def _compile_create_database(statement: CreateDatabase) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        if statement.database in databases:
+            msg = f"database {statement.database} already exists"
+            raise ValueError(msg)
+        databases[statement.database] = Database(statement.database)
+
+    return execute
+
+
+def _compile_delete_database(statement: DeleteDatabase) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        database = _get_database(databases, statement.database)
+        del databases[statement.database]
+        database.shutdown()
+
+    return execute
+
+
+def _compile_create_table(statement: CreateTable) -> Callable[[dict[str, Database]], None]:
+    columns = {
+        column.name: decode_column_type(
+            column.type_name + UNION_SEPARATOR + "NoneType" if column.nullable else column.type_name,
+        )
+        for column in statement.columns
+    }
+
+    def execute(databases: dict[str, Database]) -> None:
+        _get_database(databases, statement.database).create_table(statement.table, dict(columns))
+
+    return execute
+
+
+def _compile_drop_table(statement: DropTable) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        _get_database(databases, statement.database).drop_table(statement.table)
+
+    return execute
+
+
+def _compile_shutdown_table(statement: ShutdownTable) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        _get_database(databases, statement.database).shutdown_table(statement.table)
+
+    return execute
+
+
+def _compile_insert(statement: Insert) -> Callable[[dict[str, Database]], list[int]]:
+    def execute(databases: dict[str, Database]) -> list[int]:
+        database = _get_database(databases, statement.database)
+        validate_statement(database.get_table(statement.table), statement)
+        return database.insert_records_into_table(statement.table, build_records(statement))
+
+    return execute
+
+
+def _compile_search(statement: Search) -> Callable[[dict[str, Database]], list[Record]]:
+    def execute(databases: dict[str, Database]) -> list[Record]:
+        table = _get_database(databases, statement.database).get_table(statement.table)
+        return table.search(statement.column, statement.text, statement.limit)
+
+    return execute
+
+
+def _compile_create_index(statement: CreateIndex) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        table = _get_database(databases, statement.database).get_table(statement.table)
+        create_index = {
+            HASH_INDEX: table.create_index,
+            UNIQUE_INDEX: table.create_unique_index,
+            SORTED_INDEX: table.create_sorted_index,
+            INVERTED_INDEX: table.create_inverted_index,
+        }[statement.kind]
+        create_index(statement.column)
+
+    return execute
+
+
+def _compile_analyze(statement: Analyze) -> Callable[[dict[str, Database]], None]:
+    def execute(databases: dict[str, Database]) -> None:
+        _get_database(databases, statement.database).get_table(statement.table).analyze()
+
+    return execute
+
+
+def _compile_explain(statement: Explain) -> Callable[[dict[str, Database]], list[str]]:
+    select = statement.statement
+
+    def execute(databases: dict[str, Database]) -> list[str]:
+        table = _get_database(databases, select.database).get_table(select.table)
+        validate_statement(table, select)
+        return explain_select(select, choose_access(table, select))
+
+    return execute
+
+
+def resolve_value(value: object, parameters: tuple | list) -> object:
+    """Get the value of a literal or parameter of a statement.
+
+    Args:
+    ----
+        value (object): A literal value or a Parameter.
+        parameters (tuple | list): The values of the parameters.
+
+    Returns:
+    -------
+        object: The value.
+    """
+    return parameters[value.index - 1] if isinstance(value, Parameter) else value
+
+
+def build_records(statement: Insert, parameters: tuple | list = ()) -> list[Record]:
+    """Get the records of an INSERT, new dictionaries every time since tables keep the dictionaries they are given.
+
+    Args:
+    ----
+        statement (Insert): The statement.
+        parameters (tuple | list, optional): The values of the parameters. Defaults to none.
+
+    Returns:
+    -------
+        list[Record]: The records.
+    """
+    columns = statement.columns
+    return [
+        {column_name: resolve_value(value, parameters) for column_name, value in zip(columns, row, strict=True)}
+        for row in statement.rows
+    ]
+
+
+def validate_statement(table: Table, statement: Insert | Select | Search) -> None:
+    """Check that the columns of an INSERT, SELECT or SEARCH are the columns of its table.
+
+    Args:
+    ----
+        table (Table): The table of the statement.
+        statement (Insert | Select | Search): The statement.
+
+    Raises:
+    ------
+        ValueError: If a column does not exist, or an INSERT does not have a value for every column.
+
+    Returns:
+    -------
+        None
+    """
+    if isinstance(statement, Insert):
+        missing_columns = [column_name for column_name in table.columns if column_name not in statement.columns]
+        if missing_columns:
+            msg = f"INSERT must have a value for {', '.join(missing_columns)}."
+            raise ValueError(msg)
+        used_columns = statement.columns
+    elif isinstance(statement, Search):
+        used_columns = (statement.column,)
+    else:
+        used_columns = [condition.column for condition in statement.conditions] + list(statement.columns or ())
+        if statement.order_by is not None:
+            used_columns.append(statement.order_by.column)
+
+    for column_name in used_columns:
+        if column_name not in table.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+
+def choose_access(table: Table, statement: Select) -> Access:
+    """Choose the cheapest way for a SELECT to read its table, estimated from the statistics of its columns.
+
+    The candidates are a scan of the table, a lookup of an equality condition in a hash, unique or sorted index,
+    a range of the bounds on a column with a sorted index, an intersection of the row ids of several such
+    lookups and ranges, and, for ORDER BY a column with a sorted index, reading the records in order until the
+    LIMIT is reached. The cost of a candidate counts the records it reads and checks against the conditions it
+    does not answer, and sorting if it does not read the records in order. Conditions with a parameter are
+    estimated for an average value.
+
+    Args:
+    ----
+        table (Table): The table of the statement.
+        statement (Select): The statement.
+
+    Returns:
+    -------
+        Access: How the table is read.
+    """
+    row_count = table.statistics.row_count
+    conditions = statement.conditions
+    order_by, limit = statement.order_by, statement.limit
+    bounds = _find_bounds(conditions)
+    selectivities, range_selectivities = _estimate_selectivities(table.statistics.columns, conditions, bounds)
+    matching_rows = row_count * math.prod(selectivities)
+
+    def estimate_cost(read_rows: float, answered_count: int, is_ordered: bool) -> float:
+        cost = read_rows * (_READ_COST + _FILTER_COST * (len(conditions) - answered_count))
+        if order_by is not None and not is_ordered:
+            cost += matching_rows * math.log2(min(matching_rows, limit or matching_rows) + 2) * _SORT_COST
+        return cost
+
+    candidates = [Access(SCAN_ACCESS, rows=row_count, cost=estimate_cost(row_count, 0, False))]
+
+    index_accesses = _find_index_accesses(table, conditions, bounds, row_count, selectivities, range_selectivities)
+    for access in index_accesses.values():
+        answered_count = len(_get_answered_positions(access))
+        if _is_ordered_range(statement, access):
+            # the row ids of the range are in order, and their records are read until enough of them match
+            share = matching_rows / access.rows if access.rows else 1.0
+            read_rows = access.rows if limit is None else min(access.rows, limit / max(share, 1 / max(row_count, 1)))
+            cost = _PROBE_COST + access.rows * _ROW_ID_COST + estimate_cost(read_rows, answered_count, True)
+        else:
+            cost = _PROBE_COST + estimate_cost(access.rows, answered_count, False)
+        candidates.append(access._replace(cost=cost))
+
+    # intersecting the row ids of the most selective lookups and ranges reads only the records matching all
+    inputs = sorted(index_accesses.values(), key=lambda access: access.rows)
+    for input_count in range(2, len(inputs) + 1):
+        intersected = tuple(inputs[:input_count])
+        read_rows = row_count * math.prod(access.rows / max(row_count, 1) for access in intersected)
+        ids_cost = sum(_PROBE_COST + access.rows * _ROW_ID_COST for access in intersected)
+        answered_count = sum(len(_get_answered_positions(access)) for access in intersected)
+        cost = ids_cost + estimate_cost(read_rows, answered_count, False)
+        candidates.append(Access(INTERSECT_ACCESS, rows=read_rows, cost=cost, inputs=intersected))
+
+    if order_by is not None and order_by.column in table.sorted_indexes and order_by.column not in bounds:
+        # records are read in order until enough of them match, a range of the column is read in order instead
+        share = matching_rows / row_count if row_count else 1.0
+        read_rows = row_count if limit is None else min(row_count, limit / max(share, 1 / max(row_count, 1)))
+        cost = _PROBE_COST + estimate_cost(read_rows, 0, True)
+        candidates.append(Access(SORTED_ACCESS, order_by.column, rows=read_rows, cost=cost))
+
+    return min(candidates, key=lambda access: access.cost)
+
+
+def _find_bounds(conditions: tuple[Condition, ...]) -> dict[str, tuple[int | None, int | None]]:
+    """Get the positions of the first lower and upper bound of every column, which are read as one range."""
+    bounds: dict[str, tuple[int | None, int | None]] = {}
+    for position, condition in enumerate(conditions):
+        if condition.operator in ("<", "<=", ">", ">="):
+            low, high = bounds.get(condition.column, (None, None))
+            if condition.operator in _LOWER_BOUNDS and low is None:
+                low = position
+            elif condition.operator in _UPPER_BOUNDS and high is None:
+                high = position
+            bounds[condition.column] = (low, high)
+    return bounds
+
+
+def _estimate_selectivities(
+    statistics: dict[str, ColumnStatistics],
+    conditions: tuple[Condition, ...],
+    bounds: dict[str, tuple[int | None, int | None]],
+) -> tuple[list[float], dict[str, float]]:
+    """Estimate the share of the rows matching every condition, and the range of every column with bounds.
+
+    The conditions are assumed to be independent, except the two bounds of a range, which are estimated together
+    and counted on the position of the first one.
+    """
+    selectivities = [
+        _estimate_selectivity(statistics[condition.column], condition.operator, condition.value)
+        for condition in conditions
+    ]
+    range_selectivities = {}
+    for column_name, (low, high) in bounds.items():
+        range_selectivities[column_name] = _estimate_range(statistics[column_name], conditions, low, high)
+        positions = [position for position in (low, high) if position is not None]
+        for position in positions:
+            selectivities[position] = 1.0
+        selectivities[positions[0]] = range_selectivities[column_name]
+    return selectivities, range_selectivities
+
+
+def _find_index_accesses(  # noqa: PLR0913
+    table: Table,
+    conditions: tuple[Condition, ...],
+    bounds: dict[str, tuple[int | None, int | None]],
+    row_count: int,
+    selectivities: list[float],
+    range_selectivities: dict[str, float],
+) -> dict[str, Access]:
+    """Get the index lookups and ranges a SELECT can use, at most one per column and a lookup over a range."""
+    index_accesses: dict[str, Access] = {}
+    for position, condition in enumerate(conditions):
+        column_name = condition.column
+        if condition.operator == "=" and column_name not in index_accesses and _has_lookup_index(table, column_name):
+            rows = row_count * selectivities[position]
+            index_accesses[column_name] = Access(LOOKUP_ACCESS, column_name, position, rows=rows)
+    for column_name, (low, high) in bounds.items():
+        if column_name not in index_accesses and column_name in table.sorted_indexes:
+            rows = row_count * range_selectivities[column_name]
+            index_accesses[column_name] = Access(RANGE_ACCESS, column_name, low, high, rows=rows)
+    return index_accesses
+
+
+def _has_lookup_index(table: Table, column_name: str) -> bool:
+    # a hash index that is being built is read with a scan of the records it does not have yet, unless the table
+    # reads no index until it is built, like `get_records_by_column`
+    return (
+        column_name in table.unique_indexes
+        or column_name in table.sorted_indexes
+        or (
+            column_name in table.indexes
+            and (table.index_read_mode != SCAN_INDEX_READ or table.is_column_indexed(column_name))
+        )
+    )
+
+
+def _estimate_selectivity(statistics: ColumnStatistics, operator_name: str, value: object) -> float:
+    is_parameter = isinstance(value, Parameter)
+    if operator_name in ("=", "!="):
+        equal_selectivity = (
+            statistics.generic_equal_selectivity() if is_parameter else statistics.equal_selectivity(value)
+        )
+        return equal_selectivity if operator_name == "=" else 1.0 - equal_selectivity
+    if value is None:
+        return 0.0
+    if is_parameter:
+        return statistics.range_selectivity(None, None) * DEFAULT_RANGE_SELECTIVITY
+    if operator_name in _LOWER_BOUNDS:
+        return statistics.range_selectivity(value, None, (operator_name == ">=", True))
+    return statistics.range_selectivity(None, value, (True, operator_name == "<="))
+
+
+def _estimate_range(statistics: ColumnStatistics, conditions: tuple, low: int | None, high: int | None) -> float:
+    values = [None if position is None else conditions[position].value for position in (low, high)]
+    if any(value is None for value, position in zip(values, (low, high), strict=True) if position is not None):
+        return 0.0
+
+    parameter_count = sum(isinstance(value, Parameter) for value in values)
+    if parameter_count:
+        return statistics.range_selectivity(None, None) * DEFAULT_RANGE_SELECTIVITY**parameter_count
+    inclusive = (
+        low is None or conditions[low].operator != ">",
+        high is None or conditions[high].operator != "<",
+    )
+    return statistics.range_selectivity(*values, inclusive)
+
+
+def _get_answered_positions(access: Access) -> set[int]:
+    """Get the positions of the conditions that every record read by an access matches."""
+    if access.kind == INTERSECT_ACCESS:
+        return set().union(*(_get_answered_positions(access_input) for access_input in access.inputs))
+    if access.kind in (LOOKUP_ACCESS, RANGE_ACCESS):
+        return {position for position in (access.low, access.high) if position is not None}
+    return set()
+
+
+def execute_select(table: Table, statement: Select, access: Access, parameters: tuple | list = ()) -> list[Any]:
+    """Execute a SELECT on its table.
+
+    Args:
+    ----
+        table (Table): The table of the statement, whose columns have been validated.
+        statement (Select): The statement.
+        access (Access): How the table is read, see `choose_access`.
+        parameters (tuple | list, optional): The values of the parameters. Defaults to none.
+
+    Returns:
+    -------
+        list: The records, or dictionaries with the selected columns.
+    """
+    values = [resolve_value(condition.value, parameters) for condition in statement.conditions]
+    records, is_ordered = _read_access(table, statement, access, values)
+
+    answered_positions = _get_answered_positions(access)
+    conditions = [
+        _compile_condition(condition.column, condition.operator, value)
+        for position, (condition, value) in enumerate(zip(statement.conditions, values, strict=True))
+        if position not in answered_positions
+    ]
+    if conditions:
+        records = (record for record in records if all(condition(record) for condition in conditions))
+    if is_ordered and statement.limit is not None:
+        # records read in order stop at the limit
+        records = islice(records, statement.limit)
+    return finish_select(statement, records, is_ordered)
+
+
+def _read_access(  # noqa: PLR0911
+    table: Table, statement: Select, access: Access, values: list[object],
+) -> tuple[Iterable[Record], bool]:
+    """Get the records a SELECT has to filter and whether they are in the order of the statement."""
+    if access.kind == LOOKUP_ACCESS:
+        return table.get_records_by_column(access.column, values[access.low]), False
+
+    if access.kind == RANGE_ACCESS:
+        if not _is_ordered_range(statement, access):
+            return table.get_records_in_range(access.column, *_get_range(statement, access, values)), False
+        record_ids = table.sorted_indexes[access.column].range_record_ids(
+            *_get_range(statement, access, values), reverse=statement.order_by.descending,
+        )
+        return (record for record_id in record_ids if (record := table.records.get(record_id)) is not None), True
+
+    if access.kind == INTERSECT_ACCESS:
+        record_id_sets = []
+        for access_input in access.inputs:
+            if access_input.kind == LOOKUP_ACCESS:
+                record_ids = table.get_record_ids_by_column(access_input.column, values[access_input.low])
+            else:
+                sorted_index = table.sorted_indexes[access_input.column]
+                record_ids = set(sorted_index.range_record_ids(*_get_range(statement, access_input, values)))
+            record_id_sets.append(record_ids)
+        record_id_sets.sort(key=len)
+        record_ids = record_id_sets[0].intersection(*record_id_sets[1:])
+        return [record for record_id in record_ids if (record := table.records.get(record_id)) is not None], False
+
+    if access.kind == SORTED_ACCESS:
+        order_by = statement.order_by
+        if not statement.conditions:
+            return table.get_records_sorted(order_by.column, order_by.descending, statement.limit), True
+        record_ids = table.sorted_indexes[order_by.column].iter_record_ids(reverse=order_by.descending)
+        return (record for record_id in record_ids if (record := table.records.get(record_id)) is not None), True
+
+    return table.records.values(), False
+
+
+def _is_ordered_range(statement: Select, access: Access) -> bool:
+    order_by = statement.order_by
+    return access.kind == RANGE_ACCESS and order_by is not None and order_by.column == access.column
+
+
+def _get_range(
+    statement: Select, access: Access, values: list[object],
+) -> tuple[object, object, tuple[bool, bool]]:
+    conditions = statement.conditions
+    low = None if access.low is None else values[access.low]
+    high = None if access.high is None else values[access.high]
+    inclusive = (
+        access.low is None or conditions[access.low].operator != ">",
+        access.high is None or conditions[access.high].operator != "<",
+    )
+    return low, high, inclusive
+
+
+def explain_select(statement: Select, access: Access) -> list[str]:
+    """Describe how a SELECT is executed, one line per step, with the estimated cost and records read.
+
+    Args:
+    ----
+        statement (Select): The statement.
+        access (Access): How the table is read, see `choose_access`.
+
+    Returns:
+    -------
+        list[str]: The steps, each one executed on the records of the indented steps below it.
+    """
+    lines = [f"Select from {statement.database}.{statement.table} (cost={access.cost:.1f})"]
+    depth = 1
+    if statement.limit is not None:
+        lines.append(f"{'  ' * depth}-> Limit {statement.limit}")
+        depth += 1
+
+    order_by = statement.order_by
+    if order_by is not None and access.kind != SORTED_ACCESS and not _is_ordered_range(statement, access):
+        direction = " DESC" if order_by.descending else ""
+        lines.append(f"{'  ' * depth}-> Sort by {order_by.column}{direction}")
+        depth += 1
+
+    answered_positions = _get_answered_positions(access)
+    filtered = [
+        _format_condition(condition)
+        for position, condition in enumerate(statement.conditions)
+        if position not in answered_positions
+    ]
+    if filtered:
+        lines.append(f"{'  ' * depth}-> Filter {' AND '.join(filtered)}")
+        depth += 1
+
+    lines.extend(_explain_access(statement, access, depth))
+    return lines
+
+
+def _explain_access(statement: Select, access: Access, depth: int) -> list[str]:
+    prefix = f"{'  ' * depth}-> "
+    conditions = statement.conditions
+    if access.kind in (LOOKUP_ACCESS, RANGE_ACCESS):
+        kind = "Index Lookup" if access.kind == LOOKUP_ACCESS else "Index Range"
+        answered = " AND ".join(
+            _format_condition(conditions[position]) for position in (access.low, access.high) if position is not None
+        )
+        direction = " in order" if _is_ordered_range(statement, access) else ""
+        if direction and statement.order_by.descending:
+            direction += " DESC"
+        return [f"{prefix}{kind} on {answered}{direction} (rows={access.rows:.0f})"]
+    if access.kind == INTERSECT_ACCESS:
+        lines = [f"{prefix}Intersect Row Ids (rows={access.rows:.0f})"]
+        for access_input in access.inputs:
+            lines.extend(_explain_access(statement, access_input, depth + 1))
+        return lines
+    if access.kind == SORTED_ACCESS:
+        direction = " DESC" if statement.order_by.descending else ""
+        return [f"{prefix}Index Scan in order of {access.column}{direction} (rows={access.rows:.0f})"]
+    return [f"{prefix}Seq Scan (rows={access.rows:.0f})"]
+
+
+def _format_condition(condition: Condition) -> str:
+    return f"{condition.column} {condition.operator} {format_literal(condition.value)}"
+
+
+def _compile_condition(column: str, operator_name: str, value: object) -> Callable[[Record], bool]:
+    compare = _COMPARISONS[operator_name]
+    if operator_name in ("=", "!="):
+        return lambda record: compare(record[column], value)
+    if value is None:
+        return lambda _: False
+    # an ordering comparison with a missing value is false, like in SQL
+    return lambda record: (column_value := record[column]) is not None and compare(column_value, value)
+
+
+def _compile_select(statement: Select) -> Callable[[dict[str, Database]], list[Any]]:
+    def execute(databases: dict[str, Database]) -> list[Any]:
+        table = _get_database(databases, statement.database).get_table(statement.table)
+        validate_statement(table, statement)
+        return execute_select(table, statement, choose_access(table, statement))
+
+    return execute
+
+
+def finish_select(statement: Select, records: Iterable[Record], is_ordered: bool = False) -> list[Any]:
+    """Order, limit and project the records that match a SELECT.
+
+    Args:
+    ----
+        statement (Select): The statement.
+        records (Iterable[Record]): The matching records.
+        is_ordered (bool, optional): Whether the records already are in the order of the statement.
+            Defaults to False.
+
+    Returns:
+    -------
+        list: The records, or dictionaries with the selected columns.
+    """
+    order_by, limit = statement.order_by, statement.limit
+    records = list(records)
+    if order_by is not None and not is_ordered:
+        # missing values come last in either direction
+        values = [record for record in records if record[order_by.column] is not None]
+        missing = [record for record in records if record[order_by.column] is None]
+        sort_key = operator.itemgetter(order_by.column)
+        if limit is None:
+            values.sort(key=sort_key, reverse=order_by.descending)
+        else:
+            values = (heapq.nlargest if order_by.descending else heapq.nsmallest)(limit, values, key=sort_key)
+        records = values + missing
+
+    if limit is not None:
+        records = records[:limit]
+    if statement.columns is None:
+        return records
+    return [{column_name: record[column_name] for column_name in statement.columns} for record in records]
+
+
+class PlanCache:
+    """Least recently used cache of query plans.
+
+    Plans are looked up by the exact query text first, so a repeated query skips tokenizing as well as parsing,
+    and then by the normalized text, so queries that only differ in spacing or keyword case share a plan.
+
+    Args:
+    ----
+        max_size (int): The maximum number of cached query texts.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, max_size: int = DEFAULT_PLAN_CACHE_SIZE) -> None:
+        """Initialize an empty cache.
+
+        Args:
+        ----
+        self: The current object.
+        max_size (int): The maximum number of cached query texts.
+
+        Raises:
+        ------
+        ValueError: If the size is not positive.
+
+        Returns:
+        -------
+        None
+        """
+        if max_size <= 0:
+            msg = "Plan cache size must be positive."
+            raise ValueError(msg)
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._plans: OrderedDict[str, QueryPlan] = OrderedDict()
+        # queries are planned by the event loop and the query scheduler threads
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Get the number of cached query texts.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of cached query texts.
+        """
+        return len(self._plans)
+
+    def get_plan(self, query: str) -> QueryPlan:
+        """Get the plan of a query, parsing and compiling it if it is not cached.
+
+        Args:
+        ----
+        self: The current object.
+        query (str): The query text.
+
+        Raises:
+        ------
+        ValueError: If the query is malformed.
+        CodecError: If a column type of CREATE TABLE is not supported.
+
+        Returns:
+        -------
+        QueryPlan: The plan.
+        """
+        plan = self._get(query)
+        if plan is not None:
+            return plan
+
+        tokens = tokenize_query(query)
+        normalized_query = normalize_query(tokens)
+        plan = self._get(normalized_query)
+        if plan is None:
+            with self._lock:
+                self.misses += 1
+            plan = plan_statement(parse_query(tokens))
+            self._put(normalized_query, plan)
+        self._put(query, plan)
+        return plan
+
+    def _get(self, query: str) -> QueryPlan | None:
+        with self._lock:
+            plan = self._plans.get(query)
+            if plan is not None:
+                self._plans.move_to_end(query)
+                self.hits += 1
+            return plan
+
+    def _put(self, query: str, plan: QueryPlan) -> None:
+        with self._lock:
+            self._plans[query] = plan
+            self._plans.move_to_end(query)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every plan.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self._plans.clear()
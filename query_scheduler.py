@@ -0,0 +1,198 @@
+import asyncio
+from collections import Counter, OrderedDict, deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+
+from log import get_logger
+from write_ahead_log import defer_commits, wait_for_commits
+
+logger = get_logger(__file__)
+
+# the threads share the GIL, so more of them do not make queries faster, they only keep the event loop responsive
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_QUEUED = 1_024
+
+# the connection a request came from, set by the protocol for the tasks of a connection
+current_client: ContextVar[Hashable] = ContextVar("current_client", default=None)
+
+
+class QueryScheduler:
+    """Bounded thread pool for the expensive requests of an asyncio server, fair across clients.
+
+    Expensive reads, e.g. scans and searches, are queued per client and handed to the pool round-robin, so a
+    client with many queued requests does not delay the requests of the others. At most `max_queued` requests
+    are queued or running at once; `run` waits for a free place beyond that, which stops the protocol from
+    reading more requests. Cancelling `run`, e.g. because the client disconnected, drops a request that has
+    not started yet; a running one finishes and its result is discarded.
+
+    Writes run on the event loop, but only once no pooled read uses their table, since a read iterating the
+    records of a table must not see them change. While a write waits, no new read of its table is started.
+
+    Args:
+    ----
+        max_workers (int): The number of threads.
+        max_queued (int): The maximum number of requests queued or running.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queued: int = DEFAULT_MAX_QUEUED) -> None:
+        """Initialize the scheduler, the threads are started by the first requests.
+
+        Args:
+        ----
+        self: The instance of the class.
+        max_workers (int): The number of threads.
+        max_queued (int): The maximum number of requests queued or running.
+
+        Raises:
+        ------
+        ValueError: If the number of threads or queued requests is not positive.
+
+        Returns:
+        -------
+        None
+        """
+        if max_workers <= 0 or max_queued <= 0:
+            msg = "Max workers and max queued must be positive."
+            raise ValueError(msg)
+
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self._slots = asyncio.Semaphore(max_queued)
+        self._running = 0
+        # client -> jobs waiting for a thread, in the order the clients are served
+        self._queues: OrderedDict[Hashable, deque[tuple]] = OrderedDict()
+        # table -> pooled reads running on it, and writes waiting for them
+        self._table_readers: Counter[Hashable] = Counter()
+        self._waiting_writers: Counter[Hashable] = Counter()
+        self._idle_waiters: dict[Hashable, list[asyncio.Future]] = {}
+
+    async def run(self, table_key: Hashable, func: Callable, *args: object) -> object:
+        """Run an expensive read in the pool.
+
+        Args:
+        ----
+        self: The instance of the class.
+        table_key (Hashable): The table the read uses.
+        func (Callable): The read.
+        *args (object): The arguments of the read.
+
+        Returns:
+        -------
+        object: The result of the read.
+        """
+        async with self._slots:
+            future = asyncio.get_running_loop().create_future()
+            client = current_client.get()
+            job = (table_key, func, args, future)
+            self._queues.setdefault(client, deque()).append(job)
+            self._dispatch()
+            try:
+                return await future
+            except asyncio.CancelledError:
+                queue = self._queues.get(client)
+                if queue is not None and job in queue:
+                    queue.remove(job)
+                    if not queue:
+                        del self._queues[client]
+                raise
+
+    async def write(self, table_key: Hashable, func: Callable, *args: object) -> object:
+        """Run a write on the event loop once no pooled read uses its table.
+
+        The write does not block the loop until its changes are in the write-ahead log: it waits for them after
+        the table is released, and the writes of other clients that arrive meanwhile share the same fsync.
+
+        Args:
+        ----
+        self: The instance of the class.
+        table_key (Hashable): The table the write changes.
+        func (Callable): The write.
+        *args (object): The arguments of the write.
+
+        Returns:
+        -------
+        object: The result of the write.
+        """
+        if self._table_readers[table_key]:
+            self._waiting_writers[table_key] += 1
+            try:
+                while self._table_readers[table_key]:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._idle_waiters.setdefault(table_key, []).append(waiter)
+                    await waiter
+                with defer_commits() as deferred_commits:
+                    result = func(*args)
+            finally:
+                self._waiting_writers[table_key] -= 1
+                self._dispatch()
+        else:
+            with defer_commits() as deferred_commits:
+                result = func(*args)
+
+        await wait_for_commits(deferred_commits)
+        return result
+
+    def _next_job(self) -> tuple | None:
+        for client, queue in self._queues.items():
+            table_key = queue[0][0]
+            if self._waiting_writers[table_key]:
+                continue
+
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            return job
+        return None
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+
+            table_key, func, args, _ = job
+            self._running += 1
+            self._table_readers[table_key] += 1
+            executor_future = loop.run_in_executor(self._executor, func, *args)
+            executor_future.add_done_callback(partial(self._finish, job))
+
+    def _finish(self, job: tuple, executor_future: asyncio.Future) -> None:
+        table_key, _, _, future = job
+        self._running -= 1
+        self._table_readers[table_key] -= 1
+        if not self._table_readers[table_key]:
+            for waiter in self._idle_waiters.pop(table_key, []):
+                if not waiter.done():
+                    waiter.set_result(None)
+
+        # the future is cancelled if the client went away while the job was running
+        if not future.done():
+            if executor_future.cancelled():
+                future.cancel()
+            elif executor_future.exception() is not None:
+                future.set_exception(executor_future.exception())
+            else:
+                future.set_result(executor_future.result())
+        self._dispatch()
+
+    def shutdown(self) -> None:
+        """Stop the threads once the running requests are done.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        None
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,461 @@
+from collections.abc import Hashable, Iterable
+from threading import Condition, Lock
+from types import TracebackType
+
+DEFAULT_STRIPE_COUNT = 64
+
+
+class _Reader:
+    """Context manager that holds a `ReadWriteLock` shared."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, lock: "ReadWriteLock") -> None:
+        self._lock = lock
+
+    def __enter__(self) -> None:
+        self._lock.acquire_read()
+
+    def __exit__(
+        self, error_type: type[BaseException] | None, error: BaseException | None, traceback: TracebackType | None,
+    ) -> None:
+        self._lock.release_read()
+
+
+class _Writer:
+    """Context manager that holds a `ReadWriteLock` exclusively."""
+
+    __slots__ = ("_lock",)
+
+    def __init__(self, lock: "ReadWriteLock") -> None:
+        self._lock = lock
+
+    def __enter__(self) -> None:
+        self._lock.acquire_write()
+
+    def __exit__(
+        self, error_type: type[BaseException] | None, error: BaseException | None, traceback: TracebackType | None,
+    ) -> None:
+        self._lock.release_write()
+
+
+class ReadWriteLock:
+    """Lock that is either shared by any number of readers or held by a single writer.
+
+    Writers are preferred: once a writer waits, new readers wait until it is done, so a steady stream of readers
+    can not starve it. The lock is not reentrant, a thread that holds it must not acquire it again.
+
+    `with lock.reader:` and `with lock.writer:` hold it shared and exclusively.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self) -> None:
+        """Initialize a lock that is not held.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self._condition = Condition(Lock())
+        self._reader_count = 0
+        self._is_writing = False
+        self._waiting_writer_count = 0
+        self.reader = _Reader(self)
+        self.writer = _Writer(self)
+
+    def acquire_read(self) -> None:
+        """Hold the lock shared, waiting while a writer holds it or waits for it.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            while self._is_writing or self._waiting_writer_count:
+                self._condition.wait()
+            self._reader_count += 1
+
+    def release_read(self) -> None:
+        """Release the lock held shared.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            self._reader_count -= 1
+            if not self._reader_count and self._waiting_writer_count:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """Hold the lock exclusively, waiting until no reader or writer holds it.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            self._waiting_writer_count += 1
+            try:
+                while self._is_writing or self._reader_count:
+                    self._condition.wait()
+            finally:
+                self._waiting_writer_count -= 1
+            self._is_writing = True
+
+    def release_write(self) -> None:
+        """Release the lock held exclusively.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            self._is_writing = False
+            self._condition.notify_all()
+
+    def locked(self) -> bool:
+        """Check if the lock is held, shared or exclusively.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if the lock is held, False otherwise.
+        """
+        return self._is_writing or self._reader_count > 0
+
+
+class _Stripes:
+    """Context manager that holds stripes of a `StripedReadWriteLock` in ascending order."""
+
+    __slots__ = ("_is_writing", "_stripes")
+
+    def __init__(self, stripes: list[ReadWriteLock], is_writing: bool) -> None:
+        self._stripes = stripes
+        self._is_writing = is_writing
+
+    def __enter__(self) -> None:
+        acquired = []
+        try:
+            for stripe in self._stripes:
+                if self._is_writing:
+                    stripe.acquire_write()
+                else:
+                    stripe.acquire_read()
+                acquired.append(stripe)
+        except BaseException:
+            self._release(acquired)
+            raise
+
+    def __exit__(
+        self, error_type: type[BaseException] | None, error: BaseException | None, traceback: TracebackType | None,
+    ) -> None:
+        self._release(self._stripes)
+
+    def _release(self, stripes: list[ReadWriteLock]) -> None:
+        for stripe in reversed(stripes):
+            if self._is_writing:
+                stripe.release_write()
+            else:
+                stripe.release_read()
+
+
+class StripedReadWriteLock:
+    """Read-write locks for the values of an index, one of `stripe_count` stripes per value by its hash.
+
+    Lookups of values in different stripes never wait for each other or for writers of other values, and lookups
+    of the same value only wait for writers of it. Several stripes are always acquired in ascending order, so
+    threads that hold more than one can not deadlock.
+
+    Args:
+    ----
+        stripe_count (int): The number of stripes.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, stripe_count: int = DEFAULT_STRIPE_COUNT) -> None:
+        """Initialize the stripes.
+
+        Args:
+        ----
+        self: The current object.
+        stripe_count (int): The number of stripes.
+
+        Raises:
+        ------
+        ValueError: If the number of stripes is not positive.
+
+        Returns:
+        -------
+        None
+        """
+        if stripe_count <= 0:
+            msg = "Stripe count must be positive."
+            raise ValueError(msg)
+
+        self.stripes = [ReadWriteLock() for _ in range(stripe_count)]
+
+    def get_stripe(self, value: Hashable) -> ReadWriteLock:
+        """Get the stripe of a value.
+
+        Args:
+        ----
+        self: The current object.
+        value (Hashable): The value.
+
+        Returns:
+        -------
+        ReadWriteLock: The stripe.
+        """
+        return self.stripes[hash(value) % len(self.stripes)]
+
+    def read(self, value: Hashable) -> _Reader:
+        """Hold the stripe of a value shared, in a with statement.
+
+        Args:
+        ----
+        self: The current object.
+        value (Hashable): The value.
+
+        Returns:
+        -------
+        _Reader: The context manager.
+        """
+        return self.get_stripe(value).reader
+
+    def write(self, *values: Hashable) -> _Stripes:
+        """Hold the stripes of values exclusively in a with statement, e.g. of the old and new value of a record.
+
+        Args:
+        ----
+        self: The current object.
+        *values (Hashable): The values.
+
+        Returns:
+        -------
+        _Stripes: The context manager.
+        """
+        stripe_count = len(self.stripes)
+        positions = sorted({hash(value) % stripe_count for value in values})
+        return _Stripes([self.stripes[position] for position in positions], is_writing=True)
+
+    def read_all(self) -> _Stripes:
+        """Hold every stripe shared, e.g. to read the whole index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        _Stripes: The context manager.
+        """
+        return _Stripes(self.stripes, is_writing=False)
+
+    def write_all(self) -> _Stripes:
+        """Hold every stripe exclusively, e.g. to change the whole index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        _Stripes: The context manager.
+        """
+        return _Stripes(self.stripes, is_writing=True)
+
+    def group_by_stripe(self, items: Iterable[tuple]) -> dict[ReadWriteLock, list[tuple]]:
+        """Group items that start with a value by the stripe of the value, to write each stripe once.
+
+        Args:
+        ----
+        self: The current object.
+        items (Iterable[tuple]): The items, e.g. (value, row id) pairs.
+
+        Returns:
+        -------
+        dict[ReadWriteLock, list[tuple]]: The items of every stripe, in the order they were given.
+        """
+        stripes = self.stripes
+        stripe_count = len(stripes)
+        groups: dict[ReadWriteLock, list[tuple]] = {}
+        for item in items:
+            stripe = stripes[hash(item[0]) % stripe_count]
+            if (group := groups.get(stripe)) is None:
+                groups[stripe] = group = []
+            group.append(item)
+        return groups
+
+    def locked(self) -> bool:
+        """Check if any stripe is held.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if a stripe is held, False otherwise.
+        """
+        return any(stripe.locked() for stripe in self.stripes)
+
+
+class ColumnLock:
+    """One exclusive lock for the whole index of a column, with the interface of `StripedReadWriteLock`.
+
+    The whole index is a single stripe, so lookups wait for each other and for every writer of the column. It is
+    an opt-in fallback for a single core with the GIL, where lookups can not run in parallel anyway and a
+    lookup that takes a plain lock keeps up better with a writer indexing batches than the striped locks (see
+    experimental/index_lock_contention.py).
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self) -> None:
+        """Initialize a lock that is not held.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self.writer = Lock()
+
+    def read(self, value: Hashable) -> Lock:
+        """Hold the lock in a with statement to look up a value.
+
+        Args:
+        ----
+        self: The current object.
+        value (Hashable): The value.
+
+        Returns:
+        -------
+        Lock: The lock.
+        """
+        return self.writer
+
+    def write(self, *values: Hashable) -> Lock:
+        """Hold the lock in a with statement to change values.
+
+        Args:
+        ----
+        self: The current object.
+        *values (Hashable): The values.
+
+        Returns:
+        -------
+        Lock: The lock.
+        """
+        return self.writer
+
+    def read_all(self) -> Lock:
+        """Hold the lock in a with statement to read the whole index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Lock: The lock.
+        """
+        return self.writer
+
+    def write_all(self) -> Lock:
+        """Hold the lock in a with statement to change the whole index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Lock: The lock.
+        """
+        return self.writer
+
+    def group_by_stripe(self, items: Iterable[tuple]) -> dict["ColumnLock", list[tuple]]:
+        """Put every item in the single stripe, whose `writer` holds the lock.
+
+        Args:
+        ----
+        self: The current object.
+        items (Iterable[tuple]): The items, e.g. (value, row id) pairs.
+
+        Returns:
+        -------
+        dict[ColumnLock, list[tuple]]: The items in the order they were given, or nothing if there are none.
+        """
+        items = list(items)
+        return {self: items} if items else {}
+
+    def locked(self) -> bool:
+        """Check if the lock is held.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        bool: True if the lock is held, False otherwise.
+        """
+        return self.writer.locked()
+
+
+def create_column_lock(exclusive: bool = False) -> ColumnLock | StripedReadWriteLock:
+    """Create the lock of the index of a column.
+
+    Args:
+    ----
+        exclusive (bool): To use one exclusive lock for the whole index instead of striped read-write locks.
+
+    Returns:
+    -------
+        ColumnLock | StripedReadWriteLock: The lock.
+    """
+    return ColumnLock() if exclusive else StripedReadWriteLock()
@@ -0,0 +1,259 @@
+import struct
+from datetime import datetime
+from typing import Union
+
+from posting_list import encode_varint, read_varint
+
+# one byte tag in front of every encoded value
+NONE_TAG = 0
+FALSE_TAG = 1
+TRUE_TAG = 2
+INT_TAG = 3
+FLOAT_TAG = 4
+STR_TAG = 5
+BYTES_TAG = 6
+LIST_TAG = 7
+DICT_TAG = 8
+DATETIME_TAG = 9
+
+_FLOAT = struct.Struct("<d")
+
+# column types that can be stored on disk or sent over the wire, by name
+COLUMN_TYPES: dict[str, type] = {
+    column_type.__name__: column_type
+    for column_type in (str, int, float, bool, bytes, list, dict, datetime, type(None))
+}
+UNION_SEPARATOR = "|"
+
+
+class CodecError(ValueError):
+    """Raised when a value can not be encoded or a buffer does not hold a valid encoding."""
+
+
+def _encode_signed(value: int, output: bytearray) -> None:
+    # zigzag encoding keeps small negative numbers small
+    encode_varint(value * 2 if value >= 0 else -value * 2 - 1, output)
+
+
+def _decode_signed(data: bytes | bytearray | memoryview, offset: int) -> tuple[int, int]:
+    value, offset = read_varint(data, offset)
+    return (value >> 1 if not value & 1 else -(value >> 1) - 1), offset
+
+
+def _encode_text(text: str, output: bytearray) -> None:
+    encoded_text = text.encode()
+    encode_varint(len(encoded_text), output)
+    output += encoded_text
+
+
+def _decode_text(data: bytes | bytearray | memoryview, offset: int) -> tuple[str, int]:
+    length, offset = read_varint(data, offset)
+    return bytes(data[offset : offset + length]).decode(), offset + length
+
+
+def encode_value(value: object, output: bytearray) -> None:  # noqa: C901, PLR0912
+    """Append the compact binary encoding of a value to output.
+
+    Supported values are None, bool, int, float, str, bytes, datetime and lists and dictionaries with string keys of
+    those. Integers and lengths are varints, so small values take a single byte after their tag.
+
+    Args:
+    ----
+        value (object): The value to encode.
+        output (bytearray): The buffer to append to.
+
+    Raises:
+    ------
+        CodecError: If the value, or a value nested in it, is of an unsupported type.
+
+    Returns:
+    -------
+        None
+    """
+    if value is None:
+        output.append(NONE_TAG)
+    elif value is True:
+        output.append(TRUE_TAG)
+    elif value is False:
+        output.append(FALSE_TAG)
+    elif isinstance(value, int):
+        output.append(INT_TAG)
+        _encode_signed(value, output)
+    elif isinstance(value, float):
+        output.append(FLOAT_TAG)
+        output += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        output.append(STR_TAG)
+        _encode_text(value, output)
+    elif isinstance(value, bytes | bytearray | memoryview):
+        output.append(BYTES_TAG)
+        encode_varint(len(value), output)
+        output += value
+    elif isinstance(value, list | tuple):
+        output.append(LIST_TAG)
+        encode_varint(len(value), output)
+        for item in value:
+            encode_value(item, output)
+    elif isinstance(value, dict):
+        output.append(DICT_TAG)
+        encode_varint(len(value), output)
+        for key, item in value.items():
+            if not isinstance(key, str):
+                msg = f"Dictionary keys must be strings, not {type(key).__name__}."
+                raise CodecError(msg)
+            _encode_text(key, output)
+            encode_value(item, output)
+    elif isinstance(value, datetime):
+        output.append(DATETIME_TAG)
+        _encode_text(value.isoformat(), output)
+    else:
+        msg = f"Cannot encode a value of type {type(value).__name__}."
+        raise CodecError(msg)
+
+
+def decode_value(data: bytes | bytearray | memoryview, offset: int = 0) -> tuple[object, int]:  # noqa: C901, PLR0911, PLR0912
+    """Decode the value that starts at offset.
+
+    Args:
+    ----
+        data (bytes | bytearray | memoryview): The encoded values.
+        offset (int, optional): The offset of the tag of the value. Defaults to 0.
+
+    Raises:
+    ------
+        CodecError: If the tag is unknown or the buffer ends in the middle of the value.
+
+    Returns:
+    -------
+        tuple[object, int]: The value and the offset right after it.
+    """
+    try:
+        tag = data[offset]
+        offset += 1
+        if tag == NONE_TAG:
+            return None, offset
+        if tag in (FALSE_TAG, TRUE_TAG):
+            return tag == TRUE_TAG, offset
+        if tag == INT_TAG:
+            return _decode_signed(data, offset)
+        if tag == FLOAT_TAG:
+            return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+        if tag == STR_TAG:
+            return _decode_text(data, offset)
+        if tag == BYTES_TAG:
+            length, offset = read_varint(data, offset)
+            return bytes(data[offset : offset + length]), offset + length
+        if tag == LIST_TAG:
+            length, offset = read_varint(data, offset)
+            items = []
+            for _ in range(length):
+                item, offset = decode_value(data, offset)
+                items.append(item)
+            return items, offset
+        if tag == DICT_TAG:
+            length, offset = read_varint(data, offset)
+            mapping = {}
+            for _ in range(length):
+                key, offset = _decode_text(data, offset)
+                mapping[key], offset = decode_value(data, offset)
+            return mapping, offset
+        if tag == DATETIME_TAG:
+            text, offset = _decode_text(data, offset)
+            return datetime.fromisoformat(text), offset
+    except (IndexError, struct.error, UnicodeDecodeError) as error:
+        msg = "Truncated or corrupt encoded value."
+        raise CodecError(msg) from error
+
+    msg = f"Unknown value tag {tag}."
+    raise CodecError(msg)
+
+
+def encode(value: object) -> bytes:
+    """Encode a value into a new buffer, see `encode_value`.
+
+    Args:
+    ----
+        value (object): The value to encode.
+
+    Raises:
+    ------
+        CodecError: If the value is of an unsupported type.
+
+    Returns:
+    -------
+        bytes: The encoded value.
+    """
+    output = bytearray()
+    encode_value(value, output)
+    return bytes(output)
+
+
+def decode(data: bytes | bytearray | memoryview) -> object:
+    """Decode a buffer that holds exactly one value.
+
+    Args:
+    ----
+        data (bytes | bytearray | memoryview): The encoded value.
+
+    Raises:
+    ------
+        CodecError: If the buffer is not a single valid value.
+
+    Returns:
+    -------
+        object: The value.
+    """
+    value, offset = decode_value(data)
+    if offset != len(data):
+        msg = f"{len(data) - offset} unexpected bytes after the encoded value."
+        raise CodecError(msg)
+    return value
+
+
+def encode_column_type(column_type: object) -> str:
+    """Get the name of a column type, e.g. "str" or "datetime|NoneType" for a nullable datetime.
+
+    Args:
+    ----
+        column_type (object): A supported type or a Union of supported types.
+
+    Raises:
+    ------
+        CodecError: If the type is not supported.
+
+    Returns:
+    -------
+        str: The name of the type.
+    """
+    member_types = column_type.__args__ if getattr(column_type, "__origin__", None) is Union else (column_type,)
+    names = []
+    for member_type in member_types:
+        if COLUMN_TYPES.get(getattr(member_type, "__name__", None)) is not member_type:
+            msg = f"Column type {column_type} is not supported."
+            raise CodecError(msg)
+        names.append(member_type.__name__)
+    return UNION_SEPARATOR.join(names)
+
+
+def decode_column_type(name: str) -> object:
+    """Get the column type named by `encode_column_type`.
+
+    Args:
+    ----
+        name (str): The name of the type.
+
+    Raises:
+    ------
+        CodecError: If the name is not a supported type.
+
+    Returns:
+    -------
+        object: The type or Union of types.
+    """
+    member_names = name.split(UNION_SEPARATOR)
+    if any(member_name not in COLUMN_TYPES for member_name in member_names):
+        msg = f"Column type {name} is not supported."
+        raise CodecError(msg)
+
+    member_types = tuple(COLUMN_TYPES[member_name] for member_name in member_names)
+    return member_types[0] if len(member_types) == 1 else Union[member_types]
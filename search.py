@@ -0,0 +1,535 @@
+import heapq
+import math
+from array import array
+from collections.abc import Iterable, Iterator
+from itertools import groupby
+
+from boolean_query import (
+    AndQuery,
+    BooleanQuery,
+    NearQuery,
+    NotQuery,
+    OrQuery,
+    PhraseQuery,
+    TermQuery,
+    parse_boolean_query,
+)
+from indexes import Indexes
+from internal_types import ColumnName, Record, RowId
+from log import get_logger
+from posting_list import Cursor, IteratorCursor, PostingList, intersect_cursors, merge_postings, union_sorted
+
+logger = get_logger(__file__)
+
+# standard BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SEARCH_MODE_ANY = "any"
+SEARCH_MODE_ALL = "all"
+SEARCH_MODES = (SEARCH_MODE_ANY, SEARCH_MODE_ALL)
+
+# largest number of edits tolerated between a search word and an indexed word
+MAX_FUZZINESS = 2
+
+
+def _with_idf(posting_list: PostingList, idf: float) -> Iterator[tuple[RowId, int, float]]:
+    for record_id, frequency in posting_list.items():
+        yield record_id, frequency, idf
+
+
+class DocumentLengths:
+    """Number of indexed words per record of a text column, used to normalize BM25 scores.
+
+    Lengths are stored in an array indexed by row id, which costs 4 bytes per record.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty document lengths.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self.lengths = array("I")
+        self.document_count = 0
+        self.total_length = 0
+
+    def __getstate__(self) -> list:
+        """Get the lengths, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The raw length array, the number of records and their total length.
+        """
+        return [self.lengths.tobytes(), self.document_count, self.total_length]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the lengths returned by `__getstate__`.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        lengths, self.document_count, self.total_length = state
+        self.lengths = array("I", lengths)
+
+    def put(self, record_id: RowId, length: int) -> None:
+        """Set the length of a record. Records without any indexed word are not counted.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        length (int): The number of indexed words in the record.
+
+        Returns:
+        -------
+        None
+        """
+        missing = record_id + 1 - len(self.lengths)
+        if missing > 0:
+            self.lengths.extend(array("I", bytes(missing * self.lengths.itemsize)))
+
+        self.remove(record_id)
+        if not length:
+            return
+
+        self.lengths[record_id] = length
+        self.document_count += 1
+        self.total_length += length
+
+    def remove(self, record_id: RowId) -> None:
+        """Forget the length of a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        if record_id < len(self.lengths) and self.lengths[record_id]:
+            self.document_count -= 1
+            self.total_length -= self.lengths[record_id]
+            self.lengths[record_id] = 0
+
+    def get(self, record_id: RowId) -> int:
+        """Get the length of a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        int: The number of indexed words in the record.
+        """
+        return self.lengths[record_id] if record_id < len(self.lengths) else 0
+
+    @property
+    def average_length(self) -> float:
+        """Get the average number of indexed words per record.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        float: The average length.
+        """
+        return self.total_length / self.document_count if self.document_count else 0.0
+
+
+class Search(Indexes):
+    """Ranked full text search over inverted indexes."""
+
+    def search(  # noqa: PLR0913
+        self,
+        column_name: ColumnName,
+        search_text: str,
+        limit: int = 10,
+        mode: str = SEARCH_MODE_ANY,
+        fuzziness: int = 0,
+    ) -> list[Record]:
+        """Get the records that best match search_text, ranked by BM25.
+
+        The posting lists of the search words are merged by row id so every matching record is scored once, and
+        only the best `limit` records are kept in a bounded heap; the full set of matches is never built.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to search, which must have an inverted index.
+        search_text (str): The text to search for.
+        limit (int, optional): The maximum number of records to return. Defaults to 10.
+        mode (str, optional): "any" to match records with any of the words or "all" to only match records that
+            have every word. Defaults to "any".
+        fuzziness (int, optional): The number of typos (insertions, deletions or substitutions) tolerated per
+            word, 0, 1 or 2. A word then matches every indexed word within that many edits. Defaults to 0.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have an inverted index.
+        ValueError: If the limit is not positive, the mode is not supported or the fuzziness is out of range.
+
+        Returns:
+        -------
+        list: The records, best match first.
+        """
+        ranked_record_ids = self.rank_records(column_name, search_text, limit, mode, fuzziness)
+        return [record for record_id, _ in ranked_record_ids if (record := self.records.get(record_id)) is not None]
+
+    def rank_records(  # noqa: PLR0913
+        self,
+        column_name: ColumnName,
+        search_text: str,
+        limit: int = 10,
+        mode: str = SEARCH_MODE_ANY,
+        fuzziness: int = 0,
+    ) -> list[tuple[RowId, float]]:
+        """Get the row ids and BM25 scores of the records that best match search_text.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to search, which must have an inverted index.
+        search_text (str): The text to search for.
+        limit (int, optional): The maximum number of row ids to return. Defaults to 10.
+        mode (str, optional): "any" or "all", see `search`. Defaults to "any".
+        fuzziness (int, optional): The number of typos tolerated per word, see `search`. Defaults to 0.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have an inverted index.
+        ValueError: If the limit is not positive, the mode is not supported or the fuzziness is out of range.
+
+        Returns:
+        -------
+        list[tuple[RowId, float]]: The row ids and scores, best match first.
+        """
+        self._validate_search(column_name, limit, mode)
+        if fuzziness not in range(MAX_FUZZINESS + 1):
+            msg = f"Fuzziness must be between 0 and {MAX_FUZZINESS}."
+            raise ValueError(msg)
+
+        words = self.get_sanitized_words(search_text)
+        posting_lists = [
+            posting_list
+            for word in words
+            if (posting_list := self._get_word_posting_list(column_name, word, fuzziness)) is not None
+        ]
+        if not posting_lists or (mode == SEARCH_MODE_ALL and len(posting_lists) != len(words)):
+            return []
+
+        return self._rank_bm25(column_name, posting_lists, limit, require_all=mode == SEARCH_MODE_ALL)
+
+    def _get_word_posting_list(self, column_name: ColumnName, word: str, fuzziness: int) -> PostingList | None:
+        inverted_index = self.inverted_indexes[column_name]
+        term_dictionary = self.term_dictionaries.get(column_name)
+        if not fuzziness or term_dictionary is None:
+            return inverted_index.get(word)
+
+        # every indexed word within the edit distance counts as an occurrence of the search word
+        posting_lists = [
+            inverted_index[match]
+            for match, _ in term_dictionary.fuzzy_matches(word, fuzziness)
+            if match in inverted_index
+        ]
+        if len(posting_lists) <= 1:
+            return posting_lists[0] if posting_lists else None
+        return merge_postings(posting_lists)
+
+    def search_prefix(self, column_name: ColumnName, prefix: str, limit: int = 10) -> list[str]:
+        """Get the indexed words that start with prefix, most frequent first, for search-as-you-type.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column, which must have an inverted index.
+        prefix (str): The text typed so far. Case and punctuation are ignored.
+        limit (int, optional): The maximum number of words to return. Defaults to 10.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have an inverted index.
+        ValueError: If the limit is not positive.
+
+        Returns:
+        -------
+        list[str]: The completions, ordered by the number of records that contain them.
+        """
+        self._validate_search(column_name, limit, SEARCH_MODE_ANY)
+
+        prefix = self.tokenizer.normalize_prefix(prefix)
+        term_dictionary = self.term_dictionaries.get(column_name)
+        if not prefix or term_dictionary is None:
+            return []
+
+        return [word for word, _ in term_dictionary.complete(prefix, limit)]
+
+    def boolean_search(self, column_name: ColumnName, query: str) -> list[Record]:
+        """Get the records that match a boolean query, ordered by row id.
+
+        Queries combine words with AND, OR, NOT and parentheses, e.g. `python (numpy OR pandas) NOT java`. Quoted
+        phrases and `NEAR/n` operands need an inverted index created with `positional=True`. AND operands are
+        intersected smallest posting list first, seeking the larger lists with their skip pointers, and NOT
+        operands are excluded by seeking instead of being materialized.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to search, which must have an inverted index.
+        query (str): The boolean query.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have an inverted index.
+        ValueError: If the query is malformed or uses positions the index does not store.
+
+        Returns:
+        -------
+        list: The matching records.
+        """
+        return [
+            record
+            for record_id in self.boolean_search_record_ids(column_name, query)
+            if (record := self.records.get(record_id)) is not None
+        ]
+
+    def boolean_search_record_ids(self, column_name: ColumnName, query: str) -> list[RowId]:
+        """Get the row ids of the records that match a boolean query, see `boolean_search`.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to search, which must have an inverted index.
+        query (str): The boolean query.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have an inverted index.
+        ValueError: If the query is malformed or uses positions the index does not store.
+
+        Returns:
+        -------
+        list[RowId]: The sorted row ids.
+        """
+        self._validate_text_column(column_name)
+        root = parse_boolean_query(query)
+
+        evaluated = self._evaluate_boolean_query(column_name, root)
+        if evaluated is None:
+            return []
+
+        cursor, is_negated = evaluated
+        if is_negated:
+            cursor = self._exclude(self._all_records_cursor(), [cursor])
+        return list(cursor)
+
+    def _evaluate_boolean_query(self, column_name: ColumnName, node: BooleanQuery) -> tuple[Cursor, bool] | None:
+        # returns the cursor of the operand and whether it must be excluded, or None for operands made only of
+        # stop words, which do not restrict the match
+        if isinstance(node, TermQuery):
+            words = self.get_sanitized_words(node.word)
+            if not words:
+                return None
+            posting_list = self.inverted_indexes[column_name].get(words.pop())
+            return (posting_list.cursor() if posting_list else IteratorCursor((), 0)), False
+
+        if isinstance(node, PhraseQuery | NearQuery):
+            record_ids = self._get_positional_record_ids(column_name, node)
+            return None if record_ids is None else (IteratorCursor(record_ids, len(record_ids)), False)
+
+        if isinstance(node, NotQuery):
+            evaluated = self._evaluate_boolean_query(column_name, node.operand)
+            if evaluated is None:
+                return None
+            cursor, is_negated = evaluated
+            return cursor, not is_negated
+
+        return self._evaluate_compound_query(column_name, node)
+
+    def _evaluate_compound_query(self, column_name: ColumnName, node: AndQuery | OrQuery) -> tuple[Cursor, bool] | None:
+        operands = [
+            evaluated
+            for operand in node.operands
+            if (evaluated := self._evaluate_boolean_query(column_name, operand)) is not None
+        ]
+        if not operands:
+            return None
+
+        if isinstance(node, AndQuery):
+            included = [cursor for cursor, is_negated in operands if not is_negated]
+            excluded = [cursor for cursor, is_negated in operands if is_negated]
+            if not included:
+                # only negated operands: the match is the complement of their union
+                return IteratorCursor(union_sorted(excluded), sum(c.estimated_size for c in excluded)), True
+
+            matches = (record_id for record_id, _ in intersect_cursors(included))
+            cursor = IteratorCursor(matches, min(cursor.estimated_size for cursor in included))
+            return (self._exclude(cursor, excluded) if excluded else cursor), False
+
+        if isinstance(node, OrQuery):
+            cursors = [
+                self._exclude(self._all_records_cursor(), [cursor]) if is_negated else cursor
+                for cursor, is_negated in operands
+            ]
+            return IteratorCursor(union_sorted(cursors), sum(cursor.estimated_size for cursor in cursors)), False
+
+        msg = f"Unsupported boolean query {node!r}."
+        raise ValueError(msg)
+
+    def phrase_search(self, column_name: ColumnName, phrase: str) -> list[Record]:
+        """Get the records that contain the words of phrase next to each other and in order, ordered by row id.
+
+        Candidates are the records that contain every word, and they are checked against the stored token
+        positions, so the record text is never tokenized again.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column to search, which must have a positional inverted index.
+        phrase (str): The phrase to search for.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist, is not a string or does not have a positional inverted index.
+
+        Returns:
+        -------
+        list: The matching records.
+        """
+        self._validate_text_column(column_name)
+        record_ids = self._get_positional_record_ids(column_name, PhraseQuery(phrase)) or []
+        return [record for record_id in record_ids if (record := self.records.get(record_id)) is not None]
+
+    def _get_positional_record_ids(self, column_name: ColumnName, node: PhraseQuery | NearQuery) -> list[RowId] | None:
+        positional_index = self.positional_indexes.get(column_name)
+        if positional_index is None:
+            msg = f"Column {column_name} does not have a positional index."
+            raise ValueError(msg)
+
+        if isinstance(node, PhraseQuery):
+            # stop words are in the positional index, so they are matched like every other word of the phrase
+            word_positions = self.get_sanitized_word_positions(node.text, keep_stop_words=True)
+            terms = sorted((position, word) for word, positions in word_positions.items() for position in positions)
+            if not terms:
+                return None
+            return positional_index.phrase_record_ids([(word, position) for position, word in terms])
+
+        # stop words are not indexed, so their distance is added to the distance of the next word
+        words = []
+        distances = []
+        distance_to_previous = 0
+        for word, distance in zip(node.words, (0, *node.distances), strict=True):
+            distance_to_previous += distance
+            sanitized_words = self.get_sanitized_words(word)
+            if not sanitized_words:
+                continue
+            if words:
+                distances.append(distance_to_previous)
+            words.append(sanitized_words.pop())
+            distance_to_previous = 0
+
+        return positional_index.near_record_ids(words, distances) if words else None
+
+    def _all_records_cursor(self) -> IteratorCursor:
+        return IteratorCursor(sorted(self.records), len(self.records))
+
+    def _exclude(self, cursor: Cursor, excluded: list[Cursor]) -> IteratorCursor:
+        def remaining() -> Iterator[RowId]:
+            for record_id in cursor:
+                if all(excluded_cursor.seek(record_id) != record_id for excluded_cursor in excluded):
+                    yield record_id
+
+        return IteratorCursor(remaining(), cursor.estimated_size)
+
+    def _validate_text_column(self, column_name: ColumnName) -> None:
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        if self.columns[column_name] != str:
+            msg = f"Column {column_name} is not a string."
+            raise ValueError(msg)
+
+        if column_name not in self.inverted_indexes:
+            msg = f"Column {column_name} does not have an inverted index."
+            raise ValueError(msg)
+
+    def _validate_search(self, column_name: ColumnName, limit: int, mode: str) -> None:
+        self._validate_text_column(column_name)
+
+        if limit <= 0:
+            msg = "Limit must be positive."
+            raise ValueError(msg)
+
+        if mode not in SEARCH_MODES:
+            msg = f"Search mode {mode} is not supported, must be one of {', '.join(SEARCH_MODES)}."
+            raise ValueError(msg)
+
+    def _rank_bm25(
+        self, column_name: ColumnName, posting_lists: list[PostingList], limit: int, require_all: bool,
+    ) -> list[tuple[RowId, float]]:
+        document_lengths = self.document_lengths[column_name]
+        document_count = document_lengths.document_count
+        average_length = document_lengths.average_length or 1.0
+
+        idfs = []
+        for posting_list in posting_lists:
+            document_frequency = len(posting_list)
+            idfs.append(math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5)))
+
+        matches: Iterator[tuple[RowId, Iterable[tuple[int, float]]]]
+        if require_all:
+            # skip based intersection, so only the postings of the rarest word are decoded in full
+            cursors = [posting_list.cursor() for posting_list in posting_lists]
+            matches = (
+                (record_id, zip(frequencies, idfs, strict=True))
+                for record_id, frequencies in intersect_cursors(cursors)
+            )
+        else:
+            streams = [_with_idf(posting_list, idf) for posting_list, idf in zip(posting_lists, idfs, strict=True)]
+            matches = (
+                (record_id, [(frequency, idf) for _, frequency, idf in group])
+                for record_id, group in groupby(heapq.merge(*streams), key=lambda posting: posting[0])
+            )
+
+        # min heap of the best (score, -row id) pairs seen so far, so the worst kept match is popped first
+        top_matches: list[tuple[float, int]] = []
+        for record_id, postings in matches:
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * document_lengths.get(record_id) / average_length)
+            score = sum(idf * frequency * (BM25_K1 + 1) / (frequency + length_norm) for frequency, idf in postings)
+
+            if len(top_matches) < limit:
+                heapq.heappush(top_matches, (score, -record_id))
+            elif score > top_matches[0][0]:
+                heapq.heapreplace(top_matches, (score, -record_id))
+
+        return [(-negative_record_id, score) for score, negative_record_id in sorted(top_matches, reverse=True)]
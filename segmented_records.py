@@ -0,0 +1,685 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator, MutableMapping
+
+from columnar_records import ColumnarRecords, FixedWidthColumn, StringColumn
+from internal_types import ColumnName, Columns, Record, RowId
+from log import get_logger
+from record_codec import decode, encode
+
+logger = get_logger(__file__)
+
+SEGMENT_MAGIC = b"ATOMSEG1"
+# bumped on every incompatible change of the segment file layout
+SEGMENT_VERSION = 1
+# length of the encoded header that follows the magic
+HEADER_LENGTH = struct.Struct("<Q")
+# blocks start on a multiple of the widest array item, so they can be cast in place
+BLOCK_ALIGNMENT = 8
+
+LIVE_BLOCK = "live"
+BLOCK_SEPARATOR = ":"
+
+
+def _align(length: int) -> int:
+    return -(-length // BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+
+
+def _get_block_name(column_name: ColumnName, block: str) -> str:
+    return f"{column_name}{BLOCK_SEPARATOR}{block}"
+
+
+def _get_column_blocks(column_name: ColumnName, vector_type_name: str, vector_state: list) -> dict[str, bytes]:
+    blocks = {}
+    if vector_type_name == FixedWidthColumn.__name__:
+        _, values, validity = vector_state
+        blocks[_get_block_name(column_name, "values")] = values
+    elif vector_type_name == StringColumn.__name__:
+        data, offsets, lengths, validity = vector_state
+        blocks[_get_block_name(column_name, "data")] = data
+        blocks[_get_block_name(column_name, "offsets")] = offsets
+        blocks[_get_block_name(column_name, "lengths")] = lengths
+    else:
+        # values without a fixed width or string encoding are stored with the record codec
+        validity = None
+        data = bytearray()
+        offsets = array("q", [0])
+        for value in vector_state:
+            data += encode(value)
+            offsets.append(len(data))
+        blocks[_get_block_name(column_name, "data")] = bytes(data)
+        blocks[_get_block_name(column_name, "offsets")] = offsets.tobytes()
+
+    if validity is not None:
+        blocks[_get_block_name(column_name, "validity")] = validity
+    return blocks
+
+
+def encode_segment(
+    columns: Columns, first_record_id: RowId, last_record_id: RowId, records: Iterable[tuple[RowId, Record]],
+) -> list[bytes]:
+    """Encode records as an immutable segment.
+
+    The records are laid out like columnar storage, with a slot per row id of the range: typed arrays for fixed
+    width columns, a utf-8 buffer with per slot offsets and lengths for strings, record codec values with offsets
+    for everything else, and validity and live bitmaps. Every block is aligned so it can be read in place.
+
+    Args:
+    ----
+        columns (Columns): The columns of the table.
+        first_record_id (RowId): The first row id of the range.
+        last_record_id (RowId): The last row id of the range.
+        records (Iterable[tuple[RowId, Record]]): The row ids and records in the range, a later record replaces
+            an earlier one with the same row id.
+
+    Returns:
+    -------
+        list[bytes]: The chunks of the segment, to be written one after another at an aligned offset.
+    """
+    columnar_records = ColumnarRecords(columns)
+    for record_id, record in records:
+        columnar_records[record_id - first_record_id + 1] = record
+    columnar_records.compact()
+    _, live, count, vectors = columnar_records.__getstate__()
+
+    size = last_record_id - first_record_id + 1
+    # vectors only cover the slots up to the last record, slots after it are never live
+    blocks = {LIVE_BLOCK: live + bytes((size + 7) // 8 - len(live))}
+    column_types = {}
+    for column_name, (vector_type_name, vector_state) in vectors.items():
+        typecode = vector_state[0] if vector_type_name == FixedWidthColumn.__name__ else None
+        column_types[column_name] = [vector_type_name, typecode]
+        blocks.update(_get_column_blocks(column_name, vector_type_name, vector_state))
+
+    block_offsets = {}
+    offset = 0
+    for block_name, block in blocks.items():
+        block_offsets[block_name] = [offset, len(block)]
+        offset += _align(len(block))
+
+    header = encode({
+        "version": SEGMENT_VERSION,
+        "first_record_id": first_record_id,
+        "size": size,
+        "count": count,
+        "columns": column_types,
+        "blocks": block_offsets,
+    })
+    header_end = len(SEGMENT_MAGIC) + HEADER_LENGTH.size + len(header)
+    chunks = [SEGMENT_MAGIC, HEADER_LENGTH.pack(len(header)), header, bytes(_align(header_end) - header_end)]
+    for block in blocks.values():
+        chunks.append(block)
+        chunks.append(bytes(_align(len(block)) - len(block)))
+    return chunks
+
+
+def write_segment(
+    path: str, columns: Columns, first_record_id: RowId, last_record_id: RowId, records: Iterable[tuple[RowId, Record]],
+) -> None:
+    """Write records to an immutable segment file, see `encode_segment`.
+
+    Args:
+    ----
+        path (str): The path of the file, replaced atomically if it exists.
+        columns (Columns): The columns of the table.
+        first_record_id (RowId): The first row id of the range.
+        last_record_id (RowId): The last row id of the range.
+        records (Iterable[tuple[RowId, Record]]): The row ids and records in the range.
+
+    Returns:
+    -------
+        None
+    """
+    chunks = encode_segment(columns, first_record_id, last_record_id, records)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+class Segment:
+    """Read-only, memory-mapped records of a range of row ids, written by `write_segment`.
+
+    Values are read straight from the mapped file through memoryview casts, so the records take no memory
+    until they are read and only the pages that are read are loaded. Records deleted or updated after the
+    segment was written are hidden by tombstones kept in memory.
+
+    A segment can also be read from a view of a file mapped by its owner, e.g. the records of a checkpoint in
+    its table file, which the owner unmaps once `on_close` is called.
+
+    Args:
+    ----
+        path (str): The path of the segment file, or of the file the view is in.
+        view (memoryview, optional): The encoded segment, at an aligned offset of a mapped file.
+        on_close (Callable[[], None], optional): Called once the segment no longer reads the view.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(
+        self, path: str, view: memoryview | None = None, on_close: Callable[[], None] | None = None,
+    ) -> None:
+        """Map the segment file, or read the segment from a view.
+
+        Args:
+        ----
+        self: The current object.
+        path (str): The path of the segment file, or of the file the view is in.
+        view (memoryview, optional): The encoded segment. Defaults to mapping the whole file.
+        on_close (Callable[[], None], optional): Called once the segment no longer reads the view.
+
+        Raises:
+        ------
+        ValueError: If the file is not a segment of a supported version.
+
+        Returns:
+        -------
+        None
+        """
+        self.path = path
+        self._mapped_file: mmap.mmap | None = None
+        if view is None:
+            with open(path, "rb") as file:
+                self._mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._mapped_file)
+        self._view = view
+        self._on_close = on_close
+        self._views: list[memoryview] = []
+
+        magic_end = len(SEGMENT_MAGIC)
+        if self._view[:magic_end] != SEGMENT_MAGIC:
+            self.close()
+            msg = f"{path} is not a segment."
+            raise ValueError(msg)
+        (header_length,) = HEADER_LENGTH.unpack_from(self._view, magic_end)
+        header_start = magic_end + HEADER_LENGTH.size
+        header = decode(self._view[header_start : header_start + header_length])
+        if header["version"] != SEGMENT_VERSION:
+            self.close()
+            msg = f"{path} has segment version {header['version']}, expected {SEGMENT_VERSION}."
+            raise ValueError(msg)
+
+        self._blocks_start = _align(header_start + header_length)
+        self._block_offsets: dict[str, list[int]] = header["blocks"]
+        self.first_record_id: RowId = header["first_record_id"]
+        self.last_record_id: RowId = self.first_record_id + header["size"] - 1
+        self._count: int = header["count"]
+        self._live = self._get_block(LIVE_BLOCK)
+        self._readers: dict[ColumnName, Callable[[int], object]] = {
+            column_name: self._get_reader(column_name, vector_type_name, typecode)
+            for column_name, (vector_type_name, typecode) in header["columns"].items()
+        }
+        self.deleted: set[RowId] = set()
+
+    def __len__(self) -> int:
+        """Get the number of records that were not deleted.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of records.
+        """
+        return self._count - len(self.deleted)
+
+    def __contains__(self, record_id: object) -> bool:
+        """Check if a record is in the segment and was not deleted.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (object): The row id.
+
+        Returns:
+        -------
+        bool: True if the record exists, False otherwise.
+        """
+        if not isinstance(record_id, int) or not self.first_record_id <= record_id <= self.last_record_id:
+            return False
+        slot = record_id - self.first_record_id
+        return bool(self._live[slot >> 3] >> (slot & 7) & 1) and record_id not in self.deleted
+
+    def get(self, record_id: RowId) -> Record | None:
+        """Materialize a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        Record | None: The record, or None if it is not in the segment.
+        """
+        if record_id not in self:
+            return None
+        slot = record_id - self.first_record_id
+        return {column_name: reader(slot) for column_name, reader in self._readers.items()}
+
+    def delete(self, record_id: RowId) -> None:
+        """Hide a record, e.g. because it was deleted or updated.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        if record_id in self:
+            self.deleted.add(record_id)
+
+    def __iter__(self) -> Iterator[RowId]:
+        """Iterate over the row ids of the records in ascending order.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[RowId]: The row ids.
+        """
+        live = self._live
+        deleted = self.deleted
+        first_record_id = self.first_record_id
+        for slot in range(self.last_record_id - first_record_id + 1):
+            if live[slot >> 3] >> (slot & 7) & 1 and slot + first_record_id not in deleted:
+                yield slot + first_record_id
+
+    def iter_column(self, column_name: ColumnName) -> Iterator[tuple[RowId, object]]:
+        """Scan a single column without materializing records.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Returns:
+        -------
+        Iterator[tuple[RowId, object]]: The row id and column value of every record.
+        """
+        reader = self._readers[column_name]
+        first_record_id = self.first_record_id
+        return ((record_id, reader(record_id - first_record_id)) for record_id in self)
+
+    def close(self) -> None:
+        """Unmap the segment file, or stop reading the view.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        for view in self._views:
+            view.release()
+        self._view.release()
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+        if self._on_close is not None:
+            self._on_close()
+
+    def _get_block(self, block_name: str, typecode: str | None = None) -> memoryview | None:
+        if block_name not in self._block_offsets:
+            return None
+        offset, length = self._block_offsets[block_name]
+        start = self._blocks_start + offset
+        view = self._view[start : start + length]
+        if typecode is not None:
+            view = view.cast(typecode)
+        self._views.append(view)
+        return view
+
+    def _get_reader(
+        self, column_name: ColumnName, vector_type_name: str, typecode: str | None,
+    ) -> Callable[[int], object]:
+        validity = self._get_block(_get_block_name(column_name, "validity"))
+        if vector_type_name == FixedWidthColumn.__name__:
+            values = self._get_block(_get_block_name(column_name, "values"), typecode)
+            # bools are stored as signed chars
+            convert = bool if typecode == "b" else None
+
+            def read_value(slot: int) -> object:
+                value = values[slot]
+                return convert(value) if convert is not None else value
+        elif vector_type_name == StringColumn.__name__:
+            data = self._get_block(_get_block_name(column_name, "data"))
+            offsets = self._get_block(_get_block_name(column_name, "offsets"), "q")
+            lengths = self._get_block(_get_block_name(column_name, "lengths"), "q")
+
+            def read_value(slot: int) -> object:
+                offset = offsets[slot]
+                return str(data[offset : offset + lengths[slot]], "utf-8")
+        else:
+            data = self._get_block(_get_block_name(column_name, "data"))
+            offsets = self._get_block(_get_block_name(column_name, "offsets"), "q")
+
+            def read_value(slot: int) -> object:
+                return decode(data[offsets[slot] : offsets[slot + 1]])
+
+        if validity is None:
+            return read_value
+
+        def read_nullable_value(slot: int) -> object:
+            if not validity[slot >> 3] >> (slot & 7) & 1:
+                return None
+            return read_value(slot)
+
+        return read_nullable_value
+
+
+class SegmentedRecords(MutableMapping):
+    """Records of a table split between immutable segments for old row ids and a mutable dictionary.
+
+    Behaves like the `dict[RowId, Record]` of row storage. Older row id ranges are frozen into memory-mapped
+    segments, so they take no memory until they are read, while new records stay in the hot dictionary. Writing
+    to a frozen record moves it back to the hot dictionary and hides its old version in the segment.
+
+    The records of a table loaded from a checkpoint are read in place from the table file too, by a base segment
+    whose row ids may be anywhere, also in the frozen ranges, whose versions of them are hidden already. Writing
+    to them moves them to the hot dictionary the same way.
+
+    Args:
+    ----
+        hot_records (dict[RowId, Record]): The records that are not frozen.
+        base (Segment, optional): The records of the checkpoint the table was loaded from.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, hot_records: dict[RowId, Record], base: Segment | None = None) -> None:
+        """Initialize the records without any segment.
+
+        Args:
+        ----
+        self: The current object.
+        hot_records (dict[RowId, Record]): The records that are not frozen.
+        base (Segment, optional): The records of the checkpoint the table was loaded from.
+
+        Returns:
+        -------
+        None
+        """
+        self.hot_records = hot_records
+        self.base = base
+        # segments ordered by row id range, which do not overlap
+        self.segments: list[Segment] = []
+        self._segment_starts: list[RowId] = []
+
+    @property
+    def frozen_record_id(self) -> RowId:
+        """Get the last row id of the frozen ranges.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        RowId: The last frozen row id, 0 if nothing is frozen.
+        """
+        return self.segments[-1].last_record_id if self.segments else 0
+
+    def add_segment(self, segment: Segment) -> None:
+        """Attach a segment whose range starts after every other segment.
+
+        Args:
+        ----
+        self: The current object.
+        segment (Segment): The segment.
+
+        Raises:
+        ------
+        ValueError: If the segment overlaps the frozen ranges.
+
+        Returns:
+        -------
+        None
+        """
+        if segment.first_record_id <= self.frozen_record_id:
+            msg = f"Segment {segment.path} overlaps the records frozen up to {self.frozen_record_id}."
+            raise ValueError(msg)
+        self.segments.append(segment)
+        self._segment_starts.append(segment.first_record_id)
+
+    def freeze(self, columns: Columns, last_record_id: RowId, path: str) -> None:
+        """Move the hot records up to a row id into a new segment file.
+
+        Args:
+        ----
+        self: The current object.
+        columns (Columns): The columns of the table.
+        last_record_id (RowId): The last row id to freeze.
+        path (str): The path of the segment file.
+
+        Raises:
+        ------
+        ValueError: If the records up to the row id are already frozen.
+
+        Returns:
+        -------
+        None
+        """
+        first_record_id = self.frozen_record_id + 1
+        if last_record_id < first_record_id:
+            msg = f"Records up to {self.frozen_record_id} are already frozen."
+            raise ValueError(msg)
+
+        hot_records = self.hot_records
+        base = self.base
+        records = [
+            (record_id, record)
+            for record_id in range(first_record_id, last_record_id + 1)
+            if (record := hot_records.get(record_id)) is not None
+            or (base is not None and (record := base.get(record_id)) is not None)
+        ]
+        write_segment(path, columns, first_record_id, last_record_id, records)
+        segment = Segment(path)
+        self.add_segment(segment)
+
+        for record_id, record in records:
+            if hot_records.get(record_id) is record:
+                del hot_records[record_id]
+            elif base is not None and record_id in base and record_id not in hot_records:
+                base.delete(record_id)
+            else:
+                # updated or deleted while the segment was written, so the hot version wins
+                segment.delete(record_id)
+        logger.info(f"froze {len(records)} records up to {last_record_id} into {path}")
+
+    def close(self) -> None:
+        """Unmap every segment.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        for segment in self.segments:
+            segment.close()
+        if self.base is not None:
+            self.base.close()
+
+    def __len__(self) -> int:
+        """Get the number of records.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of records.
+        """
+        base_count = len(self.base) if self.base is not None else 0
+        return len(self.hot_records) + base_count + sum(len(segment) for segment in self.segments)
+
+    def __contains__(self, record_id: object) -> bool:
+        """Check if a record exists.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (object): The row id.
+
+        Returns:
+        -------
+        bool: True if the record exists, False otherwise.
+        """
+        if record_id in self.hot_records or (self.base is not None and record_id in self.base):
+            return True
+        segment = self._find_segment(record_id)
+        return segment is not None and record_id in segment
+
+    def __getitem__(self, record_id: RowId) -> Record:
+        """Get a record, materializing it if it is frozen.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Raises:
+        ------
+        KeyError: If the record does not exist.
+
+        Returns:
+        -------
+        Record: The record.
+        """
+        record = self.get(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+
+    def get(self, record_id: RowId, default: Record | None = None) -> Record | None:
+        """Get a record, materializing it if it is frozen, without raising if it does not exist.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        default (Record, optional): The value returned if the record does not exist.
+
+        Returns:
+        -------
+        Record | None: The record, or the default if it does not exist.
+        """
+        record = self.hot_records.get(record_id)
+        if record is not None:
+            return record
+        if self.base is not None and (record := self.base.get(record_id)) is not None:
+            return record
+        segment = self._find_segment(record_id)
+        if segment is None or (record := segment.get(record_id)) is None:
+            return default
+        return record
+
+    def __setitem__(self, record_id: RowId, record: Record) -> None:
+        """Store a record in the hot dictionary, hiding its frozen version if it has one.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+        record (Record): The record.
+
+        Returns:
+        -------
+        None
+        """
+        self.hot_records[record_id] = record
+        if self.base is not None:
+            self.base.delete(record_id)
+        segment = self._find_segment(record_id)
+        if segment is not None:
+            segment.delete(record_id)
+
+    def __delitem__(self, record_id: RowId) -> None:
+        """Delete a record.
+
+        Args:
+        ----
+        self: The current object.
+        record_id (RowId): The row id.
+
+        Raises:
+        ------
+        KeyError: If the record does not exist.
+
+        Returns:
+        -------
+        None
+        """
+        if self.hot_records.pop(record_id, None) is not None:
+            return
+        if self.base is not None and record_id in self.base:
+            self.base.delete(record_id)
+            return
+        segment = self._find_segment(record_id)
+        if segment is None or record_id not in segment:
+            raise KeyError(record_id)
+        segment.delete(record_id)
+
+    def __iter__(self) -> Iterator[RowId]:
+        """Iterate over the row ids of the frozen records in ascending order, then of the base and hot records.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[RowId]: The row ids.
+        """
+        for segment in self.segments:
+            yield from segment
+        if self.base is not None:
+            yield from self.base
+        yield from self.hot_records
+
+    def iter_column(self, column_name: ColumnName) -> Iterator[tuple[RowId, object]]:
+        """Scan a single column, reading the frozen values in place.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+
+        Returns:
+        -------
+        Iterator[tuple[RowId, object]]: The row id and column value of every record.
+        """
+        for segment in self.segments:
+            yield from segment.iter_column(column_name)
+        if self.base is not None:
+            yield from self.base.iter_column(column_name)
+        yield from ((record_id, record[column_name]) for record_id, record in list(self.hot_records.items()))
+
+    def _find_segment(self, record_id: object) -> Segment | None:
+        if not isinstance(record_id, int):
+            return None
+        position = bisect_right(self._segment_starts, record_id) - 1
+        if position < 0 or record_id > self.segments[position].last_record_id:
+            return None
+        return self.segments[position]
@@ -0,0 +1,494 @@
+import asyncio
+import heapq
+import multiprocessing
+import signal
+import sys
+import time
+
+from client import AtomLinkerClient
+from errors import InvalidQueryError
+from log import get_logger
+from prepared_statement import PreparedStatement
+from protocol import TcpProtocol
+from query_parser import (
+    Deallocate,
+    Execute,
+    Explain,
+    Insert,
+    Prepare,
+    Search,
+    Select,
+    ShowStatements,
+    format_identifier,
+    format_select,
+)
+from query_plan import finish_select, resolve_value
+from wire_protocol import (
+    CREATE_INDEX,
+    CREATE_TABLE,
+    EXECUTE,
+    GET,
+    GET_BY_COLUMN,
+    INSERT,
+    INSERT_MANY,
+    PREPARE,
+    QUERY,
+    RANK_SEARCH,
+    SEARCH,
+    Frame,
+)
+
+logger = get_logger(__file__)
+
+# requests that change the schema, which every shard has to apply
+BROADCAST_OPCODES = (CREATE_TABLE, CREATE_INDEX)
+# seconds a worker waits for the shard port of another worker to accept connections
+PEER_CONNECT_DELAY = 0.05
+PEER_CONNECT_ATTEMPTS = 10
+
+
+def to_global_record_id(local_record_id: int, shard_index: int, shard_count: int) -> int:
+    """Get the id a client sees for the id of a record in a shard.
+
+    The ids of the shards are interleaved, so the id of a record also says which shard owns it.
+
+    Args:
+    ----
+        local_record_id (int): The id of the record in its shard.
+        shard_index (int): The index of the shard.
+        shard_count (int): The number of shards.
+
+    Returns:
+    -------
+        int: The id of the record.
+    """
+    return (local_record_id - 1) * shard_count + shard_index + 1
+
+
+def to_local_record_id(record_id: int, shard_count: int) -> tuple[int, int]:
+    """Get the shard that owns a record and the id of the record in it.
+
+    Args:
+    ----
+        record_id (int): The id of the record.
+        shard_count (int): The number of shards.
+
+    Returns:
+    -------
+        tuple[int, int]: The index of the shard and the id of the record in it.
+    """
+    local_record_id, shard_index = divmod(record_id - 1, shard_count)
+    return shard_index, local_record_id + 1
+
+
+def _format_shard_select(statement: Select) -> str:
+    # every shard orders and limits its records, and the order column is kept to merge them
+    columns = statement.columns
+    if columns is not None and statement.order_by is not None and statement.order_by.column not in columns:
+        columns = (*columns, statement.order_by.column)
+    return format_select(statement._replace(columns=columns))
+
+
+def _merge_statement_stats(results: list[list[dict[str, object]]]) -> list[dict[str, object]]:
+    merged: dict[str, dict[str, object]] = {}
+    for shard_stats in results:
+        for stats in shard_stats:
+            total = merged.setdefault(stats["name"], {**stats, "executions": 0, "errors": 0, "rows": 0, "total_ms": 0})
+            for key in ("executions", "errors", "rows", "total_ms"):
+                total[key] += stats[key]
+            total["max_ms"] = max(total["max_ms"], stats["max_ms"])
+    for total in merged.values():
+        total["mean_ms"] = total["total_ms"] / total["executions"] if total["executions"] else 0.0
+    return [merged[name] for name in sorted(merged)]
+
+
+class ShardProtocol(TcpProtocol):
+    """The protocol of the shard port of a worker, which shares the databases of the worker's router.
+
+    A statement prepared on the shard port is prepared for the router as well, so every router can route the
+    executions of a statement prepared through any worker. The shard prepares a SELECT with its order column, so
+    the router can merge the records of the shards, and SHOW STATEMENTS gets the execution stats of the router.
+
+    Args:
+    ----
+        router (ShardRouter): The router of the worker.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, router: "ShardRouter") -> None:
+        """Initialize the protocol of the shard port.
+
+        Args:
+        ----
+        self: The instance of the class.
+        router (ShardRouter): The router of the worker.
+
+        Returns:
+        -------
+        None
+        """
+        super().__init__()
+        self.router = router
+        self.databases = router.databases
+
+    def prepare(self, statement: Prepare) -> PreparedStatement:
+        """Prepare a statement for the shard and the router.
+
+        Args:
+        ----
+        self: The instance of the class.
+        statement (Prepare): The parsed PREPARE.
+
+        Returns:
+        -------
+        PreparedStatement: The statement prepared for the shard.
+
+        Raises:
+        ------
+        InvalidQueryError: If another query is prepared under the name, or the statement does not fit its table.
+        """
+        self.router.prepare(statement)
+        if isinstance(statement.statement, Select):
+            shard_query = _format_shard_select(statement.statement)
+            statement = self.plan_query(f"PREPARE {format_identifier(statement.name)} AS {shard_query}").statement
+        return super().prepare(statement)
+
+    def deallocate(self, name: str) -> None:
+        """Remove a prepared statement from the shard and the router.
+
+        Args:
+        ----
+        self: The instance of the class.
+        name (str): The name of the statement.
+
+        Returns:
+        -------
+        None
+
+        Raises:
+        ------
+        InvalidQueryError: If no statement is prepared under the name.
+        """
+        super().deallocate(name)
+        self.router.prepared_statements.pop(name, None)
+
+    def show_statements(self) -> list[dict[str, object]]:
+        """Get the statements prepared for the router with the router's execution stats.
+
+        Args:
+        ----
+        self: The instance of the class.
+
+        Returns:
+        -------
+        list[dict[str, object]]: The stats of every prepared statement, ordered by name.
+        """
+        return self.router.show_statements()
+
+
+class ShardRouter(TcpProtocol):
+    """Server worker that owns one shard of every table and routes requests to the worker owning their records.
+
+    Every worker keeps its own databases and serves them on a private shard port, and every worker accepts
+    client connections on the shared public port, bound with SO_REUSEPORT so the kernel spreads the connections
+    over the workers. A request on the public port is executed where its records live:
+
+    - CREATE_TABLE, CREATE_INDEX and QUERY statements other than INSERT, SELECT and SEARCH are applied by every
+      shard.
+    - INSERT, INSERT_MANY and INSERT queries are applied by the shard of the worker that received them, so a
+      batch of records still succeeds or fails as a whole. The record ids are interleaved across shards, so an
+      id says which shard owns the record (see `to_global_record_id`).
+    - GET is sent to the shard that owns the record id.
+    - GET_BY_COLUMN, SEARCH and SELECT and SEARCH queries are sent to every shard and the results are gathered.
+      SELECT results are ordered and limited again, search results are merged by score, and every shard scores
+      with the statistics of its own records.
+    - PREPARE and DEALLOCATE are applied by every worker, and EXECUTE is routed like the statement it executes.
+      SHOW STATEMENTS adds up the execution stats of every worker.
+
+    Unique indexes are only enforced within a shard.
+
+    Args:
+    ----
+        shard_index (int): The index of the shard of this worker.
+        shard_count (int): The number of shards.
+        shard_base_port (int): The shard port of the first worker, worker i listens on shard_base_port + i.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, shard_index: int, shard_count: int, shard_base_port: int) -> None:
+        """Initialize the worker.
+
+        Args:
+        ----
+        self: The instance of the class.
+        shard_index (int): The index of the shard of this worker.
+        shard_count (int): The number of shards.
+        shard_base_port (int): The shard port of the first worker.
+
+        Returns:
+        -------
+        None
+        """
+        super().__init__()
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.shard_base_port = shard_base_port
+        self.peers: dict[int, AtomLinkerClient] = {}
+
+        # the shard port executes requests on this worker only
+        self.shard = ShardProtocol(self)
+
+    async def execute_frame(self, frame: Frame) -> object:  # noqa: C901, PLR0911
+        """Execute a request frame on the shards that own its records.
+
+        Args:
+        ----
+        self: The instance of the class.
+        frame (Frame): The request frame.
+
+        Raises:
+        ------
+        InvalidQueryError: If the request is invalid, fails on a shard or a shard can not be reached.
+
+        Returns:
+        -------
+        object: The result.
+        """
+        opcode, payload = frame.opcode, frame.payload
+        if opcode == QUERY and isinstance(payload, str):
+            return await self._execute_query(payload)
+        is_pair = isinstance(payload, list) and len(payload) == 2 and isinstance(payload[0], str)  # noqa: PLR2004
+        if opcode == PREPARE and is_pair and isinstance(payload[1], str):
+            name, query = payload
+            return await self._execute_query(f"PREPARE {format_identifier(name)} AS {query}")
+        if opcode == EXECUTE and is_pair and isinstance(payload[1], list):
+            return await self._execute_prepared(*payload)
+        if opcode in BROADCAST_OPCODES:
+            await self._execute_on_every_shard(opcode, payload)
+            return None
+
+        if opcode == INSERT:
+            return self._to_global(await self._execute_locally(opcode, payload))
+        if opcode == INSERT_MANY:
+            return [self._to_global(record_id) for record_id in await self._execute_locally(opcode, payload)]
+
+        if opcode == GET and isinstance(payload, list) and len(payload) == 3 and isinstance(payload[2], int):  # noqa: PLR2004
+            database_name, table_name, record_id = payload
+            if record_id < 1:
+                return None
+            shard_index, local_record_id = to_local_record_id(record_id, self.shard_count)
+            return await self._execute_on(shard_index, GET, [database_name, table_name, local_record_id])
+
+        if opcode == GET_BY_COLUMN:
+            results = await self._execute_on_every_shard(opcode, payload)
+            return [record for records in results for record in records]
+        if opcode == SEARCH and isinstance(payload, list) and len(payload) == 5:  # noqa: PLR2004
+            limit = payload[4]
+            results = await self._execute_on_every_shard(RANK_SEARCH, payload)
+            entries = (entry for shard_entries in results for entry in shard_entries)
+            ranked = heapq.nlargest(limit, entries, key=lambda entry: entry[1])
+            return [record for record, _ in ranked]
+
+        # malformed requests get the error of the local shard
+        return await self._execute_locally(opcode, payload)
+
+    async def _execute_query(self, query: str) -> object:  # noqa: PLR0911
+        statement = self.plan_query(query).statement
+        if isinstance(statement, Insert):
+            return [self._to_global(record_id) for record_id in await self._execute_locally(QUERY, query)]
+
+        if isinstance(statement, Select):
+            results = await self._execute_on_every_shard(QUERY, _format_shard_select(statement))
+            return finish_select(statement, [record for records in results for record in records])
+
+        if isinstance(statement, Search):
+            payload = [statement.database, statement.table, statement.column, statement.text, statement.limit]
+            return await self.execute_frame(Frame(0, SEARCH, 0, payload))
+
+        if isinstance(statement, Prepare):
+            # every shard prepares the statement for itself and its router, see `ShardProtocol`
+            await self._execute_on_every_shard(PREPARE, [statement.name, statement.query])
+            return None
+        if isinstance(statement, Execute):
+            return await self._execute_prepared(statement.name, statement.parameters)
+        if isinstance(statement, Deallocate):
+            self.get_prepared_statement(statement.name)
+        if isinstance(statement, ShowStatements):
+            return _merge_statement_stats(await self._execute_on_every_shard(QUERY, query))
+        if isinstance(statement, Explain):
+            # the shards hold similar records, so the plan of this shard stands for the others
+            return await self._execute_locally(QUERY, query)
+
+        await self._execute_on_every_shard(QUERY, query)
+        return None
+
+    async def _execute_prepared(self, name: str, parameters: tuple | list) -> object:
+        prepared_statement = self.get_prepared_statement(name)
+        statement = prepared_statement.statement
+        start = time.perf_counter()
+        result = None
+        try:
+            try:
+                prepared_statement.check_parameters(parameters)
+            except ValueError as error:
+                raise InvalidQueryError(str(error)) from error
+
+            payload = [name, list(parameters)]
+            if isinstance(statement, Insert):
+                local_record_ids = await self._execute_locally(EXECUTE, payload)
+                result = [self._to_global(record_id) for record_id in local_record_ids]
+            elif isinstance(statement, Select):
+                results = await self._execute_on_every_shard(EXECUTE, payload)
+                result = finish_select(statement, [record for records in results for record in records])
+            else:
+                text = resolve_value(statement.text, parameters)
+                search_payload = [statement.database, statement.table, statement.column, text, statement.limit]
+                result = await self.execute_frame(Frame(0, SEARCH, 0, search_payload))
+        finally:
+            prepared_statement.record_execution(
+                time.perf_counter() - start, 0 if result is None else len(result), result is None,
+            )
+        return result
+
+    def _to_global(self, local_record_id: int) -> int:
+        return to_global_record_id(local_record_id, self.shard_index, self.shard_count)
+
+    async def _execute_locally(self, opcode: int, payload: object) -> object:
+        # through the shard port's protocol, so scans are offloaded and writes wait for them like on the shard port
+        return await self.shard.execute_frame(Frame(0, opcode, 0, payload))
+
+    async def _execute_on(self, shard_index: int, opcode: int, payload: object) -> object:
+        if shard_index == self.shard_index:
+            return await self._execute_locally(opcode, payload)
+
+        try:
+            return await self.peers[shard_index].request(opcode, payload)
+        except ConnectionError as error:
+            msg = f"shard {shard_index} is unavailable: {error}"
+            raise InvalidQueryError(msg) from error
+
+    async def _execute_on_every_shard(self, opcode: int, payload: object) -> list[object]:
+        # the requests to the other shards are sent before this shard executes its part
+        shard_indexes = [*self.peers, self.shard_index]
+        results = await asyncio.gather(
+            *(self._execute_on(shard_index, opcode, payload) for shard_index in shard_indexes),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def serve(self, host: str, port: int) -> None:
+        """Serve the shard port and the public port until cancelled.
+
+        Args:
+        ----
+        self: The instance of the class.
+        host (str): The host of the public port.
+        port (int): The public port, shared by every worker.
+
+        Returns:
+        -------
+        None
+        """
+        shard_server = await asyncio.start_server(
+            self.shard.handle_client_request, "127.0.0.1", self.shard_base_port + self.shard_index,
+        )
+        self.peers = {
+            shard_index: AtomLinkerClient(
+                "127.0.0.1",
+                self.shard_base_port + shard_index,
+                batch_window=0,
+                connect_attempts=PEER_CONNECT_ATTEMPTS,
+                reconnect_delay=PEER_CONNECT_DELAY,
+            )
+            for shard_index in range(self.shard_count)
+            if shard_index != self.shard_index
+        }
+        server = await asyncio.start_server(self.handle_client_request, host, port, reuse_port=True)
+        logger.info(f"Shard {self.shard_index} of {self.shard_count} serving on {host}:{port}")
+
+        try:
+            async with shard_server, server:
+                await server.serve_forever()
+        finally:
+            await asyncio.gather(*(peer.close() for peer in self.peers.values()))
+            self.shard.scheduler.shutdown()
+            for database in self.databases.values():
+                database.shutdown()
+
+
+def run_worker(shard_index: int, shard_count: int, host: str, port: int, shard_base_port: int) -> None:
+    """Run the worker of a shard, the target of a worker process.
+
+    Args:
+    ----
+        shard_index (int): The index of the shard.
+        shard_count (int): The number of shards.
+        host (str): The host of the public port.
+        port (int): The public port.
+        shard_base_port (int): The shard port of the first worker.
+
+    Returns:
+    -------
+        None
+    """
+    router = ShardRouter(shard_index, shard_count, shard_base_port)
+    try:
+        asyncio.run(router.serve(host, port))
+    except KeyboardInterrupt:
+        logger.info(f"Shard {shard_index} stopped")
+
+
+def serve_sharded(worker_count: int, host: str = "0.0.0.0", port: int = 5432, shard_base_port: int = 15432) -> None:
+    """Fork one worker process per shard and wait for them.
+
+    Args:
+    ----
+        worker_count (int): The number of worker processes and shards.
+        host (str, optional): The host of the public port. Defaults to "0.0.0.0".
+        port (int, optional): The public port. Defaults to 5432.
+        shard_base_port (int, optional): The shard port of the first worker, the others use the following ports.
+            Defaults to 15432.
+
+    Raises:
+    ------
+        ValueError: If the number of workers is not positive.
+
+    Returns:
+    -------
+        None
+    """
+    if worker_count <= 0:
+        msg = "Worker count must be positive."
+        raise ValueError(msg)
+
+    # workers are spawned, so they do not inherit the threads or locks of this process
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(shard_index, worker_count, host, port, shard_base_port),
+            name=f"shard-{shard_index}",
+        )
+        for shard_index in range(worker_count)
+    ]
+    for worker in workers:
+        worker.start()
+    # stopping the parent, e.g. with `docker stop`, stops the workers
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    except (KeyboardInterrupt, SystemExit):
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
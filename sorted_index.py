@@ -0,0 +1,324 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from threading import Lock
+
+from internal_types import RowId
+
+
+class SortedIndex:
+    """Ordered index that maps column values to row ids.
+
+    The distinct values are kept in a bisect-maintained list next to a dictionary of value -> set of row ids, so
+    equality lookups stay O(1) while range lookups, min/max and ordered iteration only touch the values they
+    return. Values that only grow (ids, timestamps) are appended in O(1). None values are not ordered against
+    the other values and are kept apart in `null_record_ids`.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty sorted index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        self._keys: list[object] = []
+        self._record_ids: dict[object, set[RowId]] = {}
+        self.null_record_ids: set[RowId] = set()
+        self._lock = Lock()
+
+    def __getstate__(self) -> list:
+        """Get the values in order with their row ids packed in arrays, e.g. to write them to a checkpoint.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The sorted values, the number of row ids of every value, the row ids of every value in order and
+            the row ids of the None values, the last three as raw arrays.
+        """
+        with self._lock:
+            counts = array("q", (len(self._record_ids[key]) for key in self._keys))
+            record_ids = array("q")
+            for key in self._keys:
+                record_ids.extend(self._record_ids[key])
+            null_record_ids = array("q", self.null_record_ids)
+            return [list(self._keys), counts.tobytes(), record_ids.tobytes(), null_record_ids.tobytes()]
+
+    def __setstate__(self, state: list) -> None:
+        """Restore the index returned by `__getstate__` without sorting it again.
+
+        Args:
+        ----
+        self: The current object.
+        state (list): The state.
+
+        Returns:
+        -------
+        None
+        """
+        keys, counts, record_ids, null_record_ids = state
+        record_ids = array("q", record_ids)
+        self._keys = keys
+        self._record_ids = {}
+        start = 0
+        for key, count in zip(keys, array("q", counts), strict=True):
+            self._record_ids[key] = set(record_ids[start : start + count])
+            start += count
+        self.null_record_ids = set(array("q", null_record_ids))
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Get the number of distinct non null values in the index.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of distinct values.
+        """
+        return len(self._keys)
+
+    def add(self, value: object, record_id: RowId) -> None:
+        """Add a row id under a value.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The column value.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self._add(value, record_id)
+
+    def add_many(self, values: Iterable[object], record_ids: Iterable[RowId]) -> None:
+        """Add many row ids with a single sort of the new distinct values.
+
+        Args:
+        ----
+        self: The current object.
+        values (Iterable[object]): The column values.
+        record_ids (Iterable[RowId]): The row ids, in the same order as the values.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            new_keys = []
+            for value, record_id in zip(values, record_ids, strict=True):
+                if value is None:
+                    self.null_record_ids.add(record_id)
+                elif value in self._record_ids:
+                    self._record_ids[value].add(record_id)
+                else:
+                    self._record_ids[value] = {record_id}
+                    new_keys.append(value)
+
+            if not new_keys:
+                return
+
+            new_keys.sort()
+            is_appending = not self._keys or self._keys[-1] < new_keys[0]
+            self._keys.extend(new_keys)
+            if not is_appending:
+                # two sorted runs, which timsort merges in linear time
+                self._keys.sort()
+
+    def discard(self, value: object, record_id: RowId) -> None:
+        """Remove a row id from under a value if it is present.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The column value.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self._discard(value, record_id)
+
+    def replace(self, old_value: object, new_value: object, record_id: RowId) -> None:
+        """Move a row id from one value to another.
+
+        Args:
+        ----
+        self: The current object.
+        old_value (object): The previous column value.
+        new_value (object): The new column value.
+        record_id (RowId): The row id.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            self._discard(old_value, record_id)
+            self._add(new_value, record_id)
+
+    def get(self, value: object) -> set[RowId]:
+        """Get the row ids stored under a value.
+
+        Args:
+        ----
+        self: The current object.
+        value (object): The column value.
+
+        Returns:
+        -------
+        set[RowId]: A copy of the row ids for the value.
+        """
+        with self._lock:
+            if value is None:
+                return set(self.null_record_ids)
+            return set(self._record_ids.get(value, ()))
+
+    def range_record_ids(
+        self,
+        low: object = None,
+        high: object = None,
+        inclusive: tuple[bool, bool] = (True, True),
+        reverse: bool = False,
+    ) -> list[RowId]:
+        """Get the row ids whose values fall between low and high, ordered by value.
+
+        Args:
+        ----
+        self: The current object.
+        low (object, optional): The lower bound. Defaults to no lower bound.
+        high (object, optional): The upper bound. Defaults to no upper bound.
+        inclusive (tuple[bool, bool], optional): Whether the lower and upper bounds are included.
+        reverse (bool, optional): To order by descending value. Defaults to False.
+
+        Returns:
+        -------
+        list[RowId]: The matching row ids.
+        """
+        include_low, include_high = inclusive
+        with self._lock:
+            start = 0
+            if low is not None:
+                start = bisect_left(self._keys, low) if include_low else bisect_right(self._keys, low)
+
+            end = len(self._keys)
+            if high is not None:
+                end = bisect_right(self._keys, high) if include_high else bisect_left(self._keys, high)
+
+            keys = self._keys[start:end]
+            if reverse:
+                keys.reverse()
+
+            return [record_id for key in keys for record_id in self._record_ids[key]]
+
+    def iter_record_ids(self, reverse: bool = False) -> Iterator[RowId]:
+        """Iterate over every row id ordered by value, with None values last.
+
+        The values are snapshotted once and their row ids are looked up in chunks, so writers are not blocked for
+        the whole iteration.
+
+        Args:
+        ----
+        self: The current object.
+        reverse (bool, optional): To order by descending value. Defaults to False.
+
+        Returns:
+        -------
+        Iterator[RowId]: The row ids.
+        """
+        chunk_size = 1024
+        with self._lock:
+            keys = self._keys[::-1] if reverse else list(self._keys)
+
+        for start in range(0, len(keys), chunk_size):
+            with self._lock:
+                chunk = [
+                    record_id
+                    for key in keys[start : start + chunk_size]
+                    for record_id in self._record_ids.get(key, ())
+                ]
+            yield from chunk
+
+        with self._lock:
+            null_record_ids = list(self.null_record_ids)
+        yield from null_record_ids
+
+    def min_value(self) -> object:
+        """Get the smallest non null value.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        object: The smallest value, or None if the index is empty.
+        """
+        with self._lock:
+            return self._keys[0] if self._keys else None
+
+    def max_value(self) -> object:
+        """Get the largest non null value.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        object: The largest value, or None if the index is empty.
+        """
+        with self._lock:
+            return self._keys[-1] if self._keys else None
+
+    def _add(self, value: object, record_id: RowId) -> None:
+        if value is None:
+            self.null_record_ids.add(record_id)
+            return
+
+        record_ids = self._record_ids.get(value)
+        if record_ids is not None:
+            record_ids.add(record_id)
+            return
+
+        self._record_ids[value] = {record_id}
+        if not self._keys or self._keys[-1] < value:
+            self._keys.append(value)
+        else:
+            self._keys.insert(bisect_left(self._keys, value), value)
+
+    def _discard(self, value: object, record_id: RowId) -> None:
+        if value is None:
+            self.null_record_ids.discard(record_id)
+            return
+
+        record_ids = self._record_ids.get(value)
+        if record_ids is None:
+            return
+
+        record_ids.discard(record_id)
+        if not record_ids:
+            del self._record_ids[value]
+            del self._keys[bisect_left(self._keys, value)]
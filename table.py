@@ -1,25 +1,63 @@
 import os
 from collections import defaultdict
+from collections.abc import Callable, Iterable
 from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from threading import Lock
 from typing import Any
 
+from column_statistics import TableStatistics
+from columnar_records import ColumnarRecords
 from get_records import GetRecords
+from index_build import (
+    DEFAULT_INDEX_WAIT_TIMEOUT,
+    INDEX_BUILD_CHUNK_SIZE,
+    INDEX_READS,
+    PARTIAL_INDEX_READ,
+    SCAN_INDEX_READ,
+    WAIT_INDEX_READ,
+    IndexBuild,
+)
+from index_worker import DEFAULT_MAX_BATCH_LATENCY, DEFAULT_MAX_BATCH_SIZE, IndexWorker
 from indexes import Indexes
-from internal_types import ColumnName, Columns, Index, InvertedIndex, RowId
+from internal_types import ColumnName, Columns, Index, InvertedIndex, Record, RowId
 from log import get_logger
+from positional_index import PositionalIndex
+from posting_list import PostingList
+from read_write_lock import ColumnLock, StripedReadWriteLock, create_column_lock
+from search import DocumentLengths, Search
+from segmented_records import SegmentedRecords
+from sorted_index import SortedIndex
 from stats import Stats
 from stats_enums import StatsType
-from stop_words import STOP_WORDS
+from term_dictionary import TermDictionary
 from thread_stats import ThreadStats
+from tokenizer import Tokenizer
+from write_ahead_log import (
+    CREATE_FOREIGN_KEY,
+    CREATE_INDEX,
+    CREATE_INVERTED_INDEX,
+    CREATE_SORTED_INDEX,
+    CREATE_UNIQUE_INDEX,
+    DELETE,
+    FREEZE_RECORDS,
+    INSERT,
+    INSERT_MANY,
+    UPDATE,
+    WriteAheadLog,
+)
 
 logger = get_logger(__file__)
 
 num_cores = os.cpu_count()
 
+ROW_STORAGE = "row"
+COLUMNAR_STORAGE = "columnar"
+STORAGES = (ROW_STORAGE, COLUMNAR_STORAGE)
+
 
 # NOTE: might not need to inherit from Indexes since we are already inheriting from GetRecords
-class Table(GetRecords, Indexes):
+class Table(GetRecords, Search, Indexes):
     """Represents a table.
 
     Args:
@@ -32,7 +70,16 @@ class Table(GetRecords, Indexes):
         None
     """
 
-    def __init__(self, name: str, columns: Columns) -> None:
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        columns: Columns,
+        index_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        index_batch_latency: float = DEFAULT_MAX_BATCH_LATENCY,
+        storage: str = ROW_STORAGE,
+        tokenizer: Tokenizer | None = None,
+        exclusive_column_locks: bool = False,
+    ) -> None:
         """Initialize a new instance of the class.
 
         Args:
@@ -40,96 +87,205 @@ class Table(GetRecords, Indexes):
         self: The current object.
         name (str): The name of the instance.
         columns (dict): A dictionary representing the columns of the instance.
+        index_batch_size (int): The maximum number of inserted records indexed by the index worker at once.
+        index_batch_latency (float): The maximum number of seconds an inserted record waits to be indexed.
+        storage (str): How the records are stored, "row" for a dictionary per record or "columnar" for compact
+            per column arrays that materialize records only when they are read.
+        tokenizer (Tokenizer, optional): How the text columns are split into indexed and searched words.
+            Defaults to the shared default tokenizer.
+        exclusive_column_locks (bool): To guard the hash index of every column with one exclusive lock instead of
+            striped read-write locks, see `ColumnLock`. Defaults to False.
+
+        Raises:
+        ------
+        ValueError: If the storage is not supported.
 
         Returns:
         -------
         None
         """
+        if storage not in STORAGES:
+            msg = f"Storage {storage} is not supported, must be one of {', '.join(STORAGES)}."
+            raise ValueError(msg)
+
         self.name: str = name
         self.columns: Columns = columns
         self.count = 0
-        self.records = {}
+        self.storage = storage
+        if tokenizer is not None:
+            self.tokenizer = tokenizer
+        self.records: dict[RowId, Record] | ColumnarRecords | SegmentedRecords = (
+            {} if storage == ROW_STORAGE else ColumnarRecords(columns)
+        )
 
         # TODO: @apinanyogaratnam: need to remove all if conditions that checks wether
         # TODO: the item exists or not to create a new set
         self.indexes: Index = defaultdict(lambda: defaultdict(set))
-        # can get the column value from the record
-        self.records_to_index: dict[ColumnName, set[RowId]] = defaultdict(set)
-        self.records_to_index_lock = Lock()
         # need to make sure when columns are being CRUD, the lock is also being CRUD
-        self.column_locks: dict[ColumnName, Lock] = {}
-        self.undergoing_column_indexing: dict[ColumnName, int] = defaultdict(int)
-        self.undergoing_column_indexing_lock = Lock()
+        # lookups hold the stripe of their value shared, so only writers of the same value make them wait
+        self.exclusive_column_locks = exclusive_column_locks
+        self.column_locks: dict[ColumnName, ColumnLock | StripedReadWriteLock] = {}
+        # the row ids the index worker failed to add to the hash index of a column, in ascending order, they are
+        # retried with its next batch and lookups scan the records from the first of them on until then
+        self.failed_index_record_ids: dict[ColumnName, list[RowId]] = {}
+        # the jobs that add the existing records to new hash indexes, kept once done to report how they went
+        self.index_builds: dict[ColumnName, IndexBuild] = {}
+        # how lookups read a hash index that is being built, see `get_index_high_water`
+        self.index_read_mode = PARTIAL_INDEX_READ
+        self.index_wait_timeout = DEFAULT_INDEX_WAIT_TIMEOUT
         # NOTE: need to make this configurable or figure out how to dynamically set it based on resources
         # this is the pool of threads that will be used to create indexes
         # adjust max workers when dealing with io bound tasks
         # adjust max workers after testing speeds in real world situations and profiling
         # num cores is not a good number, need to find a better number
         self.index_executor = ThreadPoolExecutor(max_workers=num_cores)
+        # inserted records are indexed in batches by a single worker instead of one executor task per insert
+        self.index_worker = IndexWorker(
+            self._index_records,
+            name=f"{name}-index-worker",
+            max_batch_size=index_batch_size,
+            max_batch_latency=index_batch_latency,
+        )
 
         self.unique_indexes = {}
         self.unique_index_lock = Lock()
 
+        # ordered indexes for range queries, min/max and sorted reads
+        self.sorted_indexes: dict[ColumnName, SortedIndex] = {}
+
         # text search
         self.inverted_indexes: InvertedIndex = {}
         self.inverted_index_lock = Lock()
+        # number of indexed words per record, used to rank search results
+        self.document_lengths: dict[ColumnName, DocumentLengths] = {}
+        # opt-in token positions for phrase and proximity queries
+        self.positional_indexes: dict[ColumnName, PositionalIndex] = {}
+        # sorted vocabulary of every inverted index, for prefix completion
+        self.term_dictionaries: dict[ColumnName, TermDictionary] = {}
 
         self.foreign_keys = {}
 
         self.thread_stats = ThreadStats()
+        # estimates of the values of every column, for choosing how a query reads the table
+        self.statistics = TableStatistics(columns)
+
+        # set by the database when it is durable, every change is appended to it once applied
+        self.write_ahead_log: WriteAheadLog | None = None
+        # number of changes applied so far, a checkpoint reuses the file of a table whose count did not change
+        self.change_count = 0
 
         self._create_column_locks()
-        self._create_records_to_index_keys()
 
     def _create_column_locks(self) -> None:
         for column_name in self.columns:
-            self.column_locks[column_name] = Lock()
+            self.column_locks[column_name] = create_column_lock(self.exclusive_column_locks)
+
+    def _index_records(self, record_ids: list[RowId]) -> None:
+        for column_name in list(self.indexes.keys()):
+            failed_record_ids = self.failed_index_record_ids.get(column_name, [])
+            column_record_ids = failed_record_ids + record_ids
+            try:
+                self._index_column_records(column_name, column_record_ids)
+            except Exception:
+                logger.exception(
+                    f"failed to index {len(column_record_ids)} records of {column_name} from row id "
+                    f"{column_record_ids[0]}, retrying with the next batch",
+                )
+                # set before the worker stops counting the batch as pending, so lookups never trust the index
+                self.failed_index_record_ids[column_name] = column_record_ids
+            else:
+                if failed_record_ids:
+                    del self.failed_index_record_ids[column_name]
+
+    def _index_column_records(self, column_name: ColumnName, record_ids: list[RowId]) -> None:
+        records = self.records
+        column_index = self.indexes[column_name]
+        column_lock = self.column_locks[column_name]
+        values = (
+            (record[column_name], record_id)
+            for record_id in record_ids
+            if (record := records.get(record_id)) is not None
+        )
+        for stripe, stripe_values in column_lock.group_by_stripe(values).items():
+            with stripe.writer:
+                for column_value, record_id in stripe_values:
+                    # the record might have been deleted or updated, which changed the index itself, since
+                    # its value was read
+                    if (record := records.get(record_id)) is not None and record[column_name] == column_value:
+                        column_index[column_value].add(record_id)
 
-    def _create_records_to_index_keys(self) -> None:
-        for column_name in self.columns:
-            self.records_to_index[column_name] = set()
+    def is_column_indexed(self, column_name: str) -> bool:
+        """Check if a column has a hash index that every existing record was added to.
 
-    def _create_records_to_index_thread(self) -> None:
-        columns = self.records_to_index.keys()
-        with self.undergoing_column_indexing_lock:
-            for column_name in columns:
-                self.undergoing_column_indexing[column_name] += 1
+        Records inserted since may still be waiting for the index worker, lookups scan them (see
+        `get_index_high_water`). Records the index worker failed to add to the index are retried with its next
+        batch, the index is not complete until then.
 
-        for column_name, record_ids in self.records_to_index.items():
-            column_lock = self.column_locks[column_name]
+        Args:
+        ----
+        self: The current object.
+        column_name (str): The name of the column to check.
 
-            with self.records_to_index_lock:
-                for record_id in record_ids:
-                    column_value = self.records[record_id][column_name]
+        Returns:
+        -------
+        bool: True if the column is indexed, False if it has no hash index or it is still being built.
+        """
+        if column_name not in self.indexes:
+            return False
 
-                    with column_lock:
-                        self.indexes[column_name][column_value].add(record_id)
+        if column_name in self.failed_index_record_ids or self.index_worker.failed_count():
+            return False
 
-                self.records_to_index[column_name].clear()
+        build = self.index_builds.get(column_name)
+        return build is None or build.is_complete()
 
-        with self.undergoing_column_indexing_lock:
-            for column_name in columns:
-                self.undergoing_column_indexing[column_name] -= 1
+    def get_index_high_water(self, column_name: ColumnName, read_mode: str | None = None) -> RowId | None:
+        """Get the row id up to which every record is in the hash index of a column.
 
-    def is_column_indexed(self, column_name: str) -> bool:
-        """Check if a column is indexed.
+        The records after it are either not reached by the build of the index yet or still waiting for the index
+        worker, so a lookup reads the index and scans them. While the index is being built, the read mode decides
+        how it is read: "partial" reads it as it is, "wait" first waits for the build up to `index_wait_timeout`
+        seconds and then reads it as it is, and "scan" does not read it.
 
         Args:
         ----
         self: The current object.
-        column_name (str): The name of the column to check.
+        column_name (ColumnName): The name of the column.
+        read_mode (str, optional): "partial", "wait" or "scan". Defaults to the `index_read_mode` of the table.
+
+        Raises:
+        ------
+        ValueError: If the read mode is not supported.
 
         Returns:
         -------
-        bool: True if the column is indexed, False otherwise.
+        RowId | None: The row id, 0 if no record is in the index yet, or None if the index must not be read.
         """
-        if not self.is_column_locked(column_name):
-            return False
+        read_mode = read_mode or self.index_read_mode
+        if read_mode not in INDEX_READS:
+            msg = f"Index read mode {read_mode} is not supported, must be one of {', '.join(INDEX_READS)}."
+            raise ValueError(msg)
         if column_name not in self.indexes:
-            return False
-
-        with self.undergoing_column_indexing_lock:
-            return self.undergoing_column_indexing[column_name] == 0
+            return None
+
+        # read first, the records inserted after it are not expected in the index anyway
+        high_water_record_id = self.count
+        build = self.index_builds.get(column_name)
+        if build is not None and not build.is_complete():
+            if read_mode == SCAN_INDEX_READ:
+                return None
+            if read_mode == WAIT_INDEX_READ:
+                build.wait(self.index_wait_timeout)
+            high_water_record_id = min(high_water_record_id, build.high_water_record_id)
+
+        first_pending_record_id = self.index_worker.first_pending_record_id()
+        if first_pending_record_id is not None:
+            high_water_record_id = min(high_water_record_id, first_pending_record_id - 1)
+        # read after the worker, which keeps a failed batch pending until the failed row ids are set
+        failed_record_ids = self.failed_index_record_ids.get(column_name)
+        if failed_record_ids:
+            high_water_record_id = min(high_water_record_id, failed_record_ids[0] - 1)
+        return high_water_record_id
 
     def is_column_locked(self, column_name: str) -> bool:
         """Check if a column is locked.
@@ -167,6 +323,13 @@ class Table(GetRecords, Indexes):
         })
         self.index_executor.submit(func, *args, **kwargs)
 
+    def _log_operation(self, operation: str, *arguments: object) -> None:
+        # records are only changed once their change is in the log, so a change the log rejects, e.g. a value the
+        # codec can not encode or a failed write, is never visible and never missing from the log
+        if self.write_ahead_log is not None:
+            self.write_ahead_log.append([operation, self.name, *arguments])
+        self.change_count += 1
+
     def insert_record(self, record: dict[str, Any]) -> int:
         """Insert a record into the instance.
 
@@ -181,37 +344,132 @@ class Table(GetRecords, Indexes):
         TypeError: If the record is not a dictionary.
         ValueError: If the record does not have a value for a column.
         TypeError: If the record value for a column is not the correct type.
+        ValueError: If a value for a uniquely indexed column is not unique.
+        CodecError: If a value can not be written to the write-ahead log, the record is not inserted then.
 
         Returns:
         -------
         int: The id of the record.
         """
+        # like insert_records, a value that is not unique must not leave a record or a row id behind
+        for column_name, unique_index in self.unique_indexes.items():
+            if record[column_name] in unique_index:
+                msg = f"Value {record[column_name]} for column {column_name} is not unique."
+                raise ValueError(msg)
+
+        self._log_operation(INSERT, self.count + 1, record)
         self.count += 1
         self.records[self.count] = record
 
         for column_name, column_value in record.items():
-            if column_name in self.indexes:
-                with self.records_to_index_lock:
-                    self.records_to_index[column_name].add(self.count)
-
             if column_name in self.unique_indexes:
-                if column_value in self.unique_indexes[column_name]:
-                    msg = f"Value {column_value} for column {column_name} is not unique."
-                    raise ValueError(msg)
-
                 self.unique_indexes[column_name][column_value] = self.count
 
-            if column_name in self.inverted_indexes:
-                for word in set(column_value.split()).difference(STOP_WORDS):
-                    if word not in self.inverted_indexes[column_name]:
-                        self.inverted_indexes[column_name][word] = set()
+            if column_name in self.sorted_indexes:
+                self.sorted_indexes[column_name].add(column_value, self.count)
 
-                    self.inverted_indexes[column_name][word].add(self.count)
+            if column_name in self.inverted_indexes:
+                self._add_to_inverted_index(column_name, [self.count], [column_value])
 
-        self.submit_thread(self._create_records_to_index_thread)
+        if self.indexes:
+            self.index_worker.enqueue(self.count)
 
+        self.statistics.add_record(record)
         return self.count
 
+    def insert_records(self, records: list[dict[str, Any]]) -> list[int]:
+        """Insert a batch of records into the instance.
+
+        Like insert_record, the records are expected to have been validated already (see validate_records).
+        Unique values are checked for the whole batch before anything is inserted, the records get a contiguous
+        block of ids, and every index is updated with one pass per column instead of one pass per record.
+
+        Args:
+        ----
+        self: The current object.
+        records (list[dict]): The records to insert.
+
+        Raises:
+        ------
+        ValueError: If a value for a uniquely indexed column is not unique.
+        CodecError: If a value can not be written to the write-ahead log, no record is inserted then.
+
+        Returns:
+        -------
+        list[int]: The ids of the records, in the same order as the records.
+        """
+        column_values = {column_name: [record[column_name] for record in records] for column_name in self.columns}
+
+        for column_name, unique_index in self.unique_indexes.items():
+            values = column_values[column_name]
+            seen = set()
+            for value in values:
+                if value in seen or value in unique_index:
+                    msg = f"Value {value} for column {column_name} is not unique."
+                    raise ValueError(msg)
+                seen.add(value)
+
+        first_record_id = self.count + 1
+        self._log_operation(INSERT_MANY, first_record_id, records)
+        self.count += len(records)
+        record_ids = range(first_record_id, self.count + 1)
+        self.records.update(zip(record_ids, records, strict=True))
+
+        for column_name, unique_index in self.unique_indexes.items():
+            unique_index.update(zip(column_values[column_name], record_ids, strict=True))
+
+        for column_name, sorted_index in self.sorted_indexes.items():
+            sorted_index.add_many(column_values[column_name], record_ids)
+
+        for column_name in list(self.inverted_indexes):
+            self._add_to_inverted_index(column_name, record_ids, column_values[column_name])
+
+        if self.indexes:
+            self.index_worker.enqueue_many(record_ids)
+
+        self.statistics.add_column_values(column_values)
+        return list(record_ids)
+
+    def _add_to_inverted_index(self, column_name: ColumnName, record_ids: Iterable[RowId], values: list[str]) -> None:
+        document_lengths = self.document_lengths[column_name]
+        positional_index = self.positional_indexes.get(column_name)
+        words_to_postings = defaultdict(list)
+        for record_id, value in zip(record_ids, values, strict=True):
+            word_counts = self.get_sanitized_word_counts(value)
+            if positional_index is not None:
+                positional_index.add(record_id, self.get_sanitized_word_positions(value, keep_stop_words=True))
+            document_lengths.put(record_id, word_counts.total())
+            for word, frequency in word_counts.items():
+                words_to_postings[word].append((record_id, frequency))
+
+        inverted_index = self.inverted_indexes[column_name]
+        term_dictionary = self.term_dictionaries.get(column_name)
+        for word, postings in words_to_postings.items():
+            if word not in inverted_index:
+                inverted_index[word] = PostingList()
+
+            posting_list = inverted_index[word]
+            for record_id, frequency in postings:
+                posting_list.add(record_id, frequency)
+
+            if term_dictionary is not None:
+                term_dictionary.set_frequency(word, len(posting_list))
+
+    def _remove_from_inverted_index(self, column_name: ColumnName, record_id: RowId, value: str) -> None:
+        inverted_index = self.inverted_indexes[column_name]
+        term_dictionary = self.term_dictionaries.get(column_name)
+        words = self.get_sanitized_words(value)
+        for word in words:
+            if (posting_list := inverted_index.get(word)) is not None:
+                posting_list.discard(record_id)
+                if term_dictionary is not None:
+                    term_dictionary.set_frequency(word, len(posting_list))
+
+        self.document_lengths[column_name].remove(record_id)
+
+        if (positional_index := self.positional_indexes.get(column_name)) is not None:
+            positional_index.remove(record_id, self.get_sanitized_word_positions(value, keep_stop_words=True))
+
     def validate_update_record_by_id(self, record_id: int, record: dict[str, Any]) -> None:
         """Validate the arguments for the update_record_by_id method.
 
@@ -279,6 +537,48 @@ class Table(GetRecords, Indexes):
                 msg = f"Record value for {column_name} must be {column_type}."
                 raise TypeError(msg)
 
+    def validate_records(self, records: list[dict[str, Any]]) -> None:
+        """Validate a batch of records for the insert_records method.
+
+        Types are checked one column at a time across the whole batch.
+
+        Args:
+        ----
+        self: The current object.
+        records (list[dict]): The records to validate.
+
+        Raises:
+        ------
+        ValueError: If the records are empty.
+        TypeError: If the records are not a list of dictionaries.
+        ValueError: If a record is empty or does not have a value for a column.
+        TypeError: If a record value for a column is not the correct type.
+
+        Returns:
+        -------
+        None
+        """
+        if not records:
+            msg = "Records must have a value."
+            raise ValueError(msg)
+        if not isinstance(records, list):
+            msg = "Records must be a list."
+            raise TypeError(msg)
+        if not all(isinstance(record, dict) for record in records):
+            msg = "Record must be a dictionary."
+            raise TypeError(msg)
+        if not all(records):
+            msg = "Record must have a value."
+            raise ValueError(msg)
+
+        for column_name, column_type in self.columns.items():
+            if not all(column_name in record for record in records):
+                msg = f"Record must have a value for {column_name}."
+                raise ValueError(msg)
+            if not all(isinstance(record[column_name], column_type) for record in records):
+                msg = f"Record value for {column_name} must be {column_type}."
+                raise TypeError(msg)
+
     def update_record_by_id(self, record_id: int, record: dict[str, Any]) -> object:
         """Update a record in the instance by record_id.
 
@@ -297,6 +597,7 @@ class Table(GetRecords, Indexes):
         ValueError: If the record does not have a value for a column.
         TypeError: If the record value for a column is not the correct type.
         ValueError: If the record does not exist.
+        CodecError: If a value can not be written to the write-ahead log, the record is not updated then.
 
         Returns:
         -------
@@ -304,13 +605,18 @@ class Table(GetRecords, Indexes):
         """
         self.validate_update_record_by_id(record_id, record)
         old_record = self.records[record_id]
+        self._log_operation(UPDATE, record_id, record)
+        # replaced before the indexes, so the index worker does not add the old value after it was removed
+        self.records[record_id] = record
 
         for column_name, old_column_value in old_record.items():
             # Handle normal indexes
             if column_name in self.indexes:
                 new_column_value = record[column_name]
 
-                with self.column_locks[column_name]:
+                with self.column_locks[column_name].write(old_column_value, new_column_value):
+                    if (build := self.index_builds.get(column_name)) is not None:
+                        build.mark_changed(record_id)
                     if old_column_value in self.indexes[column_name]:
                         self.indexes[column_name][old_column_value].discard(record_id)
                     self.indexes[column_name][new_column_value].add(record_id)
@@ -319,7 +625,16 @@ class Table(GetRecords, Indexes):
             if column_name in self.unique_indexes:
                 self.unique_indexes[column_name].pop(old_column_value, None)
 
-        self.records[record_id] = record
+            # Handle sorted indexes
+            if column_name in self.sorted_indexes:
+                self.sorted_indexes[column_name].replace(old_column_value, record[column_name], record_id)
+
+            # Handle inverted indexes
+            if column_name in self.inverted_indexes:
+                self._remove_from_inverted_index(column_name, record_id, old_column_value)
+                self._add_to_inverted_index(column_name, [record_id], [record[column_name]])
+
+        self.statistics.replace_record(old_record, record)
         return self.records[record_id]
 
     def _validate_delete_record_by_id(self, record_id: int) -> None:
@@ -370,20 +685,30 @@ class Table(GetRecords, Indexes):
         None
         """
         self._validate_delete_record_by_id(record_id)
+        self._log_operation(DELETE, record_id)
         record = self.records.pop(record_id)
 
         for column_name, column_value in record.items():
             if column_name in self.indexes:
                 column_index = self.indexes.get(column_name, {})
-                if record_ids := column_index.get(column_value, set()):
-                    column_lock = self.column_locks[column_name]
-                    with column_lock:
+                with self.column_locks[column_name].write(column_value):
+                    if (build := self.index_builds.get(column_name)) is not None:
+                        build.mark_changed(record_id)
+                    if record_ids := column_index.get(column_value, set()):
                         record_ids.discard(record_id)
 
             if column_name in self.unique_indexes:
                 unique_index = self.unique_indexes.get(column_name, {})
                 unique_index.pop(column_value, None)
 
+            if column_name in self.sorted_indexes:
+                self.sorted_indexes[column_name].discard(column_value, record_id)
+
+            if column_name in self.inverted_indexes:
+                self._remove_from_inverted_index(column_name, record_id, column_value)
+
+        self.statistics.remove_record(record)
+
     def create_unique_index(self, column_name: str) -> None:
         """Create a unique index on a column.
 
@@ -406,26 +731,74 @@ class Table(GetRecords, Indexes):
 
         self.unique_indexes[column_name] = {}
 
-        for record_id, record in self.records.items():
-            value = record[column_name]
+        for record_id, value in self.iter_column_values(column_name):
             if value in self.unique_indexes[column_name]:
                 msg = f"Value {value} for column {column_name} is not unique."
                 raise ValueError(msg)
 
             self.unique_indexes[column_name][value] = record_id
 
-    def _create_index_thread(self, column_name: str) -> None:
-        with self.undergoing_column_indexing_lock:
-            self.undergoing_column_indexing[column_name] += 1
+        self._log_operation(CREATE_UNIQUE_INDEX, column_name)
 
-        for record_id, record in self.records.items():
-            column_lock = self.column_locks[column_name]
-            column_value = record[column_name]
-            with column_lock:
-                self.indexes[column_name][column_value].add(record_id)
+    def start_index_build(
+        self, column_name: ColumnName, build_index: Callable[..., None], *args: object,
+    ) -> IndexBuild:
+        """Register an empty hash index on a column and start the job that adds the existing records to it.
 
-        with self.undergoing_column_indexing_lock:
-            self.undergoing_column_indexing[column_name] -= 1
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+        build_index (Callable): The job, called with the build and the arguments on an index thread, which must
+            finish the build.
+        *args: The arguments to pass to the job.
+
+        Returns:
+        -------
+        IndexBuild: The build.
+        """
+        # the build is registered before the index, so the empty index is never taken for a built one
+        build = IndexBuild(column_name, self.count)
+        self.index_builds[column_name] = build
+        self.indexes[column_name] = defaultdict(set)
+        # the index worker adds the records inserted from now on, those inserted until now are left to the build
+        build.last_record_id = self.count
+
+        self.submit_thread(build_index, build, *args)
+        return build
+
+    def _create_index_thread(self, build: IndexBuild) -> None:
+        column_name = build.column_name
+        try:
+            if isinstance(self.records, dict):
+                # copied at once, since inserts would change the dictionary while it is being iterated
+                records = list(self.records.items())
+                column_values = [(record_id, record[column_name]) for record_id, record in records]
+            else:
+                column_values = list(self.iter_column_values(column_name))
+            column_values = [item for item in column_values if item[0] <= build.last_record_id]
+            # added in row id order, so the high-water row id tells which records are in the index
+            column_values.sort(key=itemgetter(0))
+            build.start(len(column_values))
+
+            column_index = self.indexes[column_name]
+            column_lock = self.column_locks[column_name]
+            for start in range(0, len(column_values), INDEX_BUILD_CHUNK_SIZE):
+                chunk = column_values[start : start + INDEX_BUILD_CHUNK_SIZE]
+                stripe_values = column_lock.group_by_stripe((value, record_id) for record_id, value in chunk)
+                for stripe, values in stripe_values.items():
+                    with stripe.writer:
+                        changed_record_ids = build.changed_record_ids
+                        for column_value, record_id in values:
+                            if record_id not in changed_record_ids:
+                                column_index[column_value].add(record_id)
+                build.advance(chunk[-1][0], len(chunk))
+        except Exception as error:
+            logger.exception(f"failed to build the index of {column_name}")
+            build.finish(error)
+        else:
+            logger.debug(f"built the index of {column_name} in {build.get_progress()['seconds']:.3f}s")
+            build.finish()
 
     def create_index(self, column_name: str) -> None:
         """Create an index on a column.
@@ -451,7 +824,51 @@ class Table(GetRecords, Indexes):
             msg = f"Index for column {column_name} already exists."
             raise ValueError(msg)
 
-        self.submit_thread(self._create_records_to_index_thread, column_name)
+        # the index is registered up front so the index worker picks up records inserted while it is being built
+        self.start_index_build(column_name, self._create_index_thread)
+        self._log_operation(CREATE_INDEX, column_name)
+
+    def create_sorted_index(self, column_name: str) -> None:
+        """Create a sorted index on a column.
+
+        A sorted index answers range queries, min/max and ordered reads without scanning or sorting the table.
+        It is kept up to date on every insert, update and delete.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (str): The name of the column to create a sorted index on.
+
+        Raises:
+        ------
+        ValueError: If the column does not exist.
+        ValueError: If the sorted index already exists.
+
+        Returns:
+        -------
+        None
+        """
+        if column_name not in self.columns:
+            msg = f"Column {column_name} does not exist."
+            raise ValueError(msg)
+
+        if column_name in self.sorted_indexes:
+            msg = f"Sorted index for column {column_name} already exists."
+            raise ValueError(msg)
+
+        sorted_index = SortedIndex()
+        last_record_id = self.count
+        column_values = list(self.iter_column_values(column_name))
+        sorted_index.add_many((value for _, value in column_values), (record_id for record_id, _ in column_values))
+
+        self.sorted_indexes[column_name] = sorted_index
+
+        # catch up on the records inserted while the index was being built
+        for record_id in range(last_record_id + 1, self.count + 1):
+            if (record := self.records.get(record_id)) is not None:
+                sorted_index.add(record[column_name], record_id)
+
+        self._log_operation(CREATE_SORTED_INDEX, column_name)
 
     def create_foreign_key_column(self, column_name: str, foreign_table: "Table") -> None:
         """Create a foreign key column.
@@ -472,31 +889,38 @@ class Table(GetRecords, Indexes):
         None
         """
         foreign_table_ids = set(foreign_table.records.keys())
-        table_column_values = {record[column_name] for record in self.records.values()}
+        table_column_values = {value for _, value in self.iter_column_values(column_name)}
 
         if not table_column_values.issubset(foreign_table_ids):
             msg = f"Cannot create foreign key on {column_name} because not all values exist in foreign table."
             raise ValueError(msg)
 
         self.foreign_keys[column_name] = foreign_table.name
+        self._log_operation(CREATE_FOREIGN_KEY, column_name, foreign_table.name)
 
     def _create_inverted_index_thread(self, column_name: str) -> None:
         # NOTE: need to rewrite this method
-        local_index = defaultdict(set)
-        for record_id, record in self.records.items():
-            for word in self.get_sanitized_words(record[column_name]):
-                local_index[word].add(record_id)
+        local_index = defaultdict(PostingList)
+        document_lengths = DocumentLengths()
+        for record_id, value in self.iter_column_values(column_name):
+            word_counts = self.get_sanitized_word_counts(value)
+            document_lengths.put(record_id, word_counts.total())
+            for word, frequency in word_counts.items():
+                local_index[word].add(record_id, frequency)
 
         with self.inverted_index_lock:
+            self.document_lengths[column_name] = document_lengths
             self.inverted_indexes[column_name] = local_index
 
-    def create_inverted_index(self, column_name: str) -> None:
+    def create_inverted_index(self, column_name: str, positional: bool = False) -> None:
         """Create an inverted index on a column.
 
         Args:
         ----
         self: The current object.
         column_name (str): The name of the column to create an inverted index on.
+        positional (bool, optional): To also store the token positions of every word, which phrase and NEAR
+            queries need. Defaults to False.
 
         Raises:
         ------
@@ -521,20 +945,84 @@ class Table(GetRecords, Indexes):
         # thread = Thread(target=self._create_inverted_index_thread, args=(column_name,))
         # thread.start()
 
-        for record_id, record in self.records.items():
-            if column_name not in self.inverted_indexes:
-                self.inverted_indexes[column_name] = {}
-
-            for word in self.get_sanitized_words(record[column_name]):
+        document_lengths = DocumentLengths()
+        positional_index = PositionalIndex() if positional else None
+        self.document_lengths[column_name] = document_lengths
+        if positional_index is not None:
+            self.positional_indexes[column_name] = positional_index
+        self.inverted_indexes[column_name] = {}
+
+        for record_id, value in self.iter_column_values(column_name):
+            word_counts = self.get_sanitized_word_counts(value)
+            if positional_index is not None:
+                positional_index.add(record_id, self.get_sanitized_word_positions(value, keep_stop_words=True))
+            document_lengths.put(record_id, word_counts.total())
+            for word, frequency in word_counts.items():
                 if word not in self.inverted_indexes[column_name]:
-                    self.inverted_indexes[column_name][word] = set()
+                    self.inverted_indexes[column_name][word] = PostingList()
+
+                self.inverted_indexes[column_name][word].add(record_id, frequency)
+
+        self.term_dictionaries[column_name] = TermDictionary(
+            {word: len(posting_list) for word, posting_list in self.inverted_indexes[column_name].items()},
+        )
+        self._log_operation(CREATE_INVERTED_INDEX, column_name, positional)
+
+    def wait_for_index(self, column_name: ColumnName, timeout: float | None = None) -> bool:
+        """Wait until the hash index of a column is built.
+
+        Args:
+        ----
+        self: The current object.
+        column_name (ColumnName): The name of the column.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Raises:
+        ------
+        ValueError: If the column has no hash index.
+
+        Returns:
+        -------
+        bool: True if every record was added to the index, False if the timeout expired first or the build failed.
+        """
+        if column_name not in self.indexes:
+            msg = f"Index for column {column_name} does not exist."
+            raise ValueError(msg)
 
-                self.inverted_indexes[column_name][word].add(record_id)
+        build = self.index_builds.get(column_name)
+        return build is None or build.wait(timeout)
+
+    def get_index_builds(self) -> list[dict[str, object]]:
+        """Get the progress of the builds of the hash indexes, see `IndexBuild.get_progress`.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list[dict[str, object]]: The progress of every build, finished ones included.
+        """
+        return [build.get_progress() for build in list(self.index_builds.values())]
+
+    def flush_indexes(self, timeout: float | None = None) -> bool:
+        """Wait until every inserted record has been added to the indexes.
+
+        Args:
+        ----
+        self: The instance of the class.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Returns:
+        -------
+        bool: True if all pending records were indexed, False if the timeout expired first.
+        """
+        return self.index_worker.flush(timeout)
 
     def close_index_executor(self) -> None:
         """Close the index executor.
 
-        Shuts down the index executor.
+        Drains and stops the index worker, then shuts down the index executor.
 
         Args:
         ----
@@ -544,8 +1032,58 @@ class Table(GetRecords, Indexes):
         -------
         None
         """
+        self.index_worker.shutdown()
         self.index_executor.shutdown()
 
+    def analyze(self) -> None:
+        """Build the statistics of every column again from the records.
+
+        The statistics are kept up to date on every change and stored in checkpoints, but values that were
+        deleted stay in the sample of the histograms.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        statistics = TableStatistics(self.columns)
+        for column_name, column_statistics in statistics.columns.items():
+            column_statistics.add_many(value for _, value in self.iter_column_values(column_name))
+        self.statistics = statistics
+
+    def freeze_records(self, last_record_id: RowId, path: str) -> None:
+        """Move the records up to a row id that are not frozen yet into an immutable, memory-mapped segment file.
+
+        Frozen records take no memory until they are read, and reads, scans and index lookups decode them in
+        place from the mapped file. They can still be updated and deleted, which moves them back to memory.
+
+        Args:
+        ----
+        self: The current object.
+        last_record_id (RowId): The last row id to freeze.
+        path (str): The path of the segment file.
+
+        Raises:
+        ------
+        ValueError: If the table does not use row storage.
+        ValueError: If the records up to the row id are already frozen.
+
+        Returns:
+        -------
+        None
+        """
+        if self.storage != ROW_STORAGE:
+            msg = "Only tables with row storage can freeze records."
+            raise ValueError(msg)
+
+        if not isinstance(self.records, SegmentedRecords):
+            self.records = SegmentedRecords(self.records)
+        self.records.freeze(self.columns, last_record_id, path)
+        self._log_operation(FREEZE_RECORDS, last_record_id, path)
+
     def shutdown_executors(self) -> None:
         """Shutdown the executors.
 
@@ -575,6 +1113,8 @@ class Table(GetRecords, Indexes):
         None
         """
         self.shutdown_executors()
+        if isinstance(self.records, SegmentedRecords):
+            self.records.close()
         # self.finish all threads and save all data to disk
 
     def delete(self) -> None:
@@ -0,0 +1,358 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+
+from internal_types import Word
+
+# prefixes up to this length match large parts of the vocabulary, so their best completions are kept
+MAX_CACHED_PREFIX_LENGTH = 3
+# number of best completions kept per cached prefix
+MAX_CACHED_COMPLETIONS = 100
+
+# marks the start and end of a word, so the first and last characters also form trigrams
+TRIGRAM_PADDING = "$"
+TRIGRAM_LENGTH = 3
+
+
+def get_trigrams(word: Word) -> set[str]:
+    """Get the distinct character trigrams of a word, including the trigrams of its padded boundaries.
+
+    Args:
+    ----
+        word (Word): The word.
+
+    Returns:
+    -------
+        set[str]: The trigrams.
+    """
+    padded_word = f"{TRIGRAM_PADDING}{word}{TRIGRAM_PADDING}"
+    return {padded_word[i : i + TRIGRAM_LENGTH] for i in range(len(padded_word) - TRIGRAM_LENGTH + 1)}
+
+
+def get_single_edits(word: Word, alphabet: set[str]) -> set[Word]:
+    """Get every string one insertion, deletion or substitution away from word.
+
+    Args:
+    ----
+        word (Word): The word.
+        alphabet (set[str]): The characters that can be inserted or substituted.
+
+    Returns:
+    -------
+        set[Word]: The edited strings.
+    """
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletions = {start + end[1:] for start, end in splits if end}
+    substitutions = {start + character + end[1:] for start, end in splits if end for character in alphabet}
+    insertions = {start + character + end for start, end in splits for character in alphabet}
+    return deletions | substitutions | insertions
+
+
+def bounded_levenshtein(first: str, second: str, max_distance: int) -> int | None:
+    """Get the Levenshtein distance between two strings if it is at most max_distance.
+
+    Stops as soon as a whole row of the distance matrix exceeds max_distance, so far apart strings are rejected
+    after a few characters.
+
+    Args:
+    ----
+        first (str): The first string.
+        second (str): The second string.
+        max_distance (int): The largest distance of interest.
+
+    Returns:
+    -------
+        int | None: The distance, or None if it is larger than max_distance.
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return None
+
+    previous_row = list(range(len(second) + 1))
+    for i, first_character in enumerate(first, 1):
+        current_row = [i]
+        for j, second_character in enumerate(second, 1):
+            current_row.append(
+                min(
+                    previous_row[j] + 1,
+                    current_row[j - 1] + 1,
+                    previous_row[j - 1] + (first_character != second_character),
+                ),
+            )
+        if min(current_row) > max_distance:
+            return None
+        previous_row = current_row
+
+    return previous_row[-1] if previous_row[-1] <= max_distance else None
+
+
+class TermDictionary:
+    """Sorted vocabulary of an inverted index with the document frequency of every word.
+
+    The words sharing a prefix are a contiguous range of the sorted list, found with two binary searches. Short
+    prefixes cover too many words to rank on every keystroke, so the best completions of every short prefix
+    that was asked for are kept and updated in place as frequencies grow. A completion list is only rebuilt
+    after one of its words becomes less frequent.
+
+    Fuzzy lookups use a trigram index over the vocabulary, built on the first fuzzy lookup and then kept up to
+    date, so only the words that share enough trigrams with the misspelled word are compared with it. Words too
+    short for trigrams to tell them apart are instead looked up by generating every edit of them. Both the build
+    of the index and the edits happen outside of the lock, so they never hold up changes of the vocabulary.
+
+    Args:
+    ----
+        frequencies (dict[Word, int], optional): The document frequency of every word.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(self, frequencies: dict[Word, int] | None = None) -> None:
+        """Initialize the term dictionary with a single sort of the vocabulary.
+
+        Args:
+        ----
+        self: The current object.
+        frequencies (dict[Word, int], optional): The document frequency of every word. Defaults to no words.
+
+        Returns:
+        -------
+        None
+        """
+        self._frequencies: dict[Word, int] = {
+            word: frequency for word, frequency in (frequencies or {}).items() if frequency
+        }
+        self._terms: list[Word] = sorted(self._frequencies)
+        # prefix -> its best completions, most frequent first
+        self._completions: dict[str, list[Word]] = {}
+        # trigram -> the words that contain it, None until the first fuzzy lookup
+        self._trigrams: dict[str, set[Word]] | None = None
+        # characters of the vocabulary, to generate the edits of short words
+        self._alphabet: set[str] = set()
+        # words added (True) or removed (False) while the trigram index is built, None when it is not built
+        self._trigram_changes: list[tuple[Word, bool]] | None = None
+        self._lock = Lock()
+        # held while the trigram index is built, so it is only built once
+        self._trigram_build_lock = Lock()
+
+    def __len__(self) -> int:
+        """Get the number of words.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        int: The number of words.
+        """
+        return len(self._terms)
+
+    def __contains__(self, word: object) -> bool:
+        """Check if a word is in the vocabulary.
+
+        Args:
+        ----
+        self: The current object.
+        word (object): The word.
+
+        Returns:
+        -------
+        bool: True if the word occurs in at least one record.
+        """
+        return word in self._frequencies
+
+    def frequency(self, word: Word) -> int:
+        """Get the number of records that contain a word.
+
+        Args:
+        ----
+        self: The current object.
+        word (Word): The word.
+
+        Returns:
+        -------
+        int: The document frequency.
+        """
+        return self._frequencies.get(word, 0)
+
+    def set_frequency(self, word: Word, frequency: int) -> None:
+        """Set the number of records that contain a word, adding or removing it from the vocabulary.
+
+        Args:
+        ----
+        self: The current object.
+        word (Word): The word.
+        frequency (int): The document frequency, 0 to remove the word.
+
+        Returns:
+        -------
+        None
+        """
+        with self._lock:
+            previous_frequency = self._frequencies.get(word, 0)
+            if frequency == previous_frequency:
+                return
+
+            if not frequency:
+                del self._frequencies[word]
+                del self._terms[bisect_left(self._terms, word)]
+                self._index_trigrams(word, is_added=False)
+            else:
+                self._frequencies[word] = frequency
+                if not previous_frequency:
+                    insort(self._terms, word)
+                    self._index_trigrams(word, is_added=True)
+
+            self._update_completions(word, frequency < previous_frequency)
+
+    def complete(self, prefix: str, limit: int = 10) -> list[tuple[Word, int]]:
+        """Get the most frequent words that start with prefix.
+
+        Args:
+        ----
+        self: The current object.
+        prefix (str): The prefix.
+        limit (int, optional): The maximum number of words to return. Defaults to 10.
+
+        Returns:
+        -------
+        list[tuple[Word, int]]: The words and their document frequencies, most frequent first.
+        """
+        with self._lock:
+            if len(prefix) <= MAX_CACHED_PREFIX_LENGTH and limit <= MAX_CACHED_COMPLETIONS:
+                completions = self._completions.get(prefix)
+                if completions is None:
+                    completions = self._rank_prefix(prefix, MAX_CACHED_COMPLETIONS)
+                    self._completions[prefix] = completions
+                words = completions[:limit]
+            else:
+                words = self._rank_prefix(prefix, limit)
+
+            return [(word, self._frequencies[word]) for word in words]
+
+    def fuzzy_matches(self, word: Word, max_distance: int) -> list[tuple[Word, int]]:
+        """Get the words within max_distance edits of word.
+
+        A word within k edits of another shares all but at most 3k of its distinct trigrams, so the candidates
+        are the words that share at least that many trigrams, which are then verified with a bounded Levenshtein
+        distance. Words too short for the trigram bound are matched by looking up every string within
+        max_distance edits of them instead.
+
+        Args:
+        ----
+        self: The current object.
+        word (Word): The possibly misspelled word.
+        max_distance (int): The maximum number of insertions, deletions and substitutions.
+
+        Returns:
+        -------
+        list[tuple[Word, int]]: The matching words and their distances, closest first.
+        """
+        trigrams = get_trigrams(word)
+        min_shared_trigrams = len(trigrams) - TRIGRAM_LENGTH * max_distance
+        if self._trigrams is None:
+            self._build_trigram_index()
+
+        if min_shared_trigrams <= 0:
+            with self._lock:
+                alphabet = set(self._alphabet)
+            edits = {word}
+            for _ in range(max_distance):
+                edits |= {edit for edited_word in edits for edit in get_single_edits(edited_word, alphabet)}
+            frequencies = self._frequencies
+            candidates = [edit for edit in edits if edit in frequencies]
+        else:
+            with self._lock:
+                trigram_index = self._trigrams
+                shared_trigrams = Counter(term for trigram in trigrams for term in trigram_index.get(trigram, ()))
+            candidates = [term for term, count in shared_trigrams.items() if count >= min_shared_trigrams]
+
+        matches = [
+            (candidate, distance)
+            for candidate in candidates
+            if (distance := bounded_levenshtein(word, candidate, max_distance)) is not None
+        ]
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+    def _build_trigram_index(self) -> None:
+        with self._trigram_build_lock:
+            if self._trigrams is not None:
+                return
+
+            with self._lock:
+                terms = list(self._terms)
+                self._trigram_changes = []
+
+            trigram_index: dict[str, set[Word]] = {}
+            alphabet: set[str] = set()
+            for term in terms:
+                alphabet.update(term)
+                for trigram in get_trigrams(term):
+                    trigram_index.setdefault(trigram, set()).add(term)
+
+            with self._lock:
+                self._trigrams, self._alphabet = trigram_index, alphabet
+                changes, self._trigram_changes = self._trigram_changes, None
+                for word, is_added in changes:
+                    self._index_trigrams(word, is_added)
+
+    def _index_trigrams(self, word: Word, is_added: bool) -> None:
+        # called with the lock held
+        if self._trigram_changes is not None:
+            self._trigram_changes.append((word, is_added))
+        elif self._trigrams is None:
+            return
+        elif is_added:
+            self._alphabet.update(word)
+            for trigram in get_trigrams(word):
+                self._trigrams.setdefault(trigram, set()).add(word)
+        else:
+            for trigram in get_trigrams(word):
+                self._trigrams[trigram].discard(word)
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        start = bisect_left(self._terms, prefix)
+        # every word that starts with prefix sorts before prefix followed by the largest code point
+        end = bisect_left(self._terms, prefix + chr(0x10FFFF), lo=start)
+        return start, end
+
+    def _rank_prefix(self, prefix: str, limit: int) -> list[Word]:
+        start, end = self._prefix_range(prefix)
+        frequencies = self._frequencies
+        # ties are broken alphabetically, which the range is already sorted by
+        return heapq.nsmallest(limit, self._terms[start:end], key=lambda word: -frequencies[word])
+
+    def _update_completions(self, word: Word, is_less_frequent: bool) -> None:
+        for length in range(1, min(len(word), MAX_CACHED_PREFIX_LENGTH) + 1):
+            completions = self._completions.get(word[:length])
+            if completions is None:
+                continue
+            if not is_less_frequent:
+                self._promote(completions, word)
+            elif word in completions:
+                # a word outside of the list may now rank higher
+                del self._completions[word[:length]]
+
+    def _promote(self, completions: list[Word], word: Word) -> None:
+        frequencies = self._frequencies
+        if word in completions:
+            index = completions.index(word)
+        elif len(completions) < MAX_CACHED_COMPLETIONS:
+            # the list holds every word of the prefix, so the new word belongs in it
+            completions.append(word)
+            index = len(completions) - 1
+        elif frequencies[word] > frequencies[completions[-1]]:
+            completions[-1] = word
+            index = len(completions) - 1
+        else:
+            return
+
+        while index and (
+            frequencies[completions[index - 1]] < frequencies[word]
+            or (frequencies[completions[index - 1]] == frequencies[word] and completions[index - 1] > word)
+        ):
+            completions[index - 1], completions[index] = completions[index], completions[index - 1]
+            index -= 1
@@ -1,12 +1,55 @@
+import asyncio
+import os
+import pickle
+import random
+import socket
+import string
+import tempfile
+import threading
 import time
 from datetime import datetime
 from typing import Union
 
+import pytest
 import pytz
 
+from checkpoint import load_table_file, write_table_file
+from client import AtomLinkerClient
+from column_statistics import ColumnStatistics
+from columnar_records import StringColumn
 from database import Database
+from errors import InvalidQueryError
+from execute_query import ExecuteQuery
+from index_build import IndexBuild
 from log import get_logger
+from parallel_scan import get_scan_executor, match_words, shutdown_scan_executor
+from posting_list import PostingList, decode_deltas, decode_varints, encode_varint
+from protocol import TcpProtocol
+from query_parser import Condition, OrderBy, Select, normalize_query, parse_query, tokenize_query
+from query_scheduler import QueryScheduler, current_client
+from read_write_lock import ColumnLock, StripedReadWriteLock
+from record_codec import CodecError
+from sharded_server import ShardRouter, to_global_record_id, to_local_record_id
 from stats_enums import StatsType
+from table import Table
+from term_dictionary import TermDictionary
+from tokenizer import Tokenizer
+from wire_protocol import (
+    FLAG_ERROR,
+    FLAG_MORE,
+    FRAME_HEADER,
+    GET,
+    GET_BY_COLUMN,
+    INSERT,
+    QUERY,
+    STREAM_CHUNK_SIZE,
+    ProtocolError,
+    encode_frame,
+    encode_response,
+    read_frame,
+    read_response,
+)
+from write_ahead_log import group_commit
 
 logger = get_logger(__file__)
 
@@ -418,6 +461,1442 @@ def test_index() -> None:
     db.shutdown()
 
 
+def test_index_worker_failed_batch() -> None:
+    """Checks that lookups scan the records of a batch the index worker failed to index until it is retried.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    users = Table("users", {"city": str}, index_batch_latency=0)
+    users.create_index("city")
+    users.wait_for_index("city")
+    users.insert_records([{"city": "Toronto"}, {"city": "Paris"}])
+    users.flush_indexes()
+
+    index_records = users.index_worker.index_records
+
+    def fail_to_index_records(record_ids: list[int]) -> None:
+        msg = "index is full"
+        raise RuntimeError(msg)
+
+    users.index_worker.index_records = fail_to_index_records
+    users.insert_records([{"city": "Toronto"}, {"city": "Oslo"}])
+    users.flush_indexes()
+
+    assert users.index_worker.failed_count() == 2
+    assert users.index_worker.first_pending_record_id() == 3
+    assert not users.is_column_indexed("city")
+    assert users.get_record_ids_by_column("city", "Toronto") == {1, 3}
+    assert users.get_record_ids_by_column("city", "Oslo") == {4}
+
+    # the failed row ids are retried with the next batch
+    users.index_worker.index_records = index_records
+    users.insert_record({"city": "Toronto"})
+    users.flush_indexes()
+
+    assert users.index_worker.failed_count() == 0
+    assert users.is_column_indexed("city")
+    assert users.indexes["city"]["Toronto"] == {1, 3, 5}
+    assert users.get_record_ids_by_column("city", "Oslo") == {4}
+
+    users.shutdown()
+
+
+def test_index_worker_failed_column() -> None:
+    """Checks that a column whose index failed to take a batch does not affect the indexes of other columns.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    users = Table("users", {"city": str, "name": str, "country": str}, index_batch_latency=0)
+    users.create_index("city")
+    users.create_index("name")
+    users.wait_for_index("city")
+    users.wait_for_index("name")
+
+    city_lock = users.column_locks["city"]
+
+    class FailingColumnLock:
+        def __getattr__(self, name: str) -> object:
+            return getattr(city_lock, name)
+
+        def group_by_stripe(self, items: list[tuple]) -> dict:
+            msg = "index is full"
+            raise RuntimeError(msg)
+
+    users.column_locks["city"] = FailingColumnLock()
+    users.insert_records([
+        {"city": "Toronto", "name": "Ada", "country": "CA"}, {"city": "Oslo", "name": "Bo", "country": "NO"},
+    ])
+    users.flush_indexes()
+
+    assert users.failed_index_record_ids == {"city": [1, 2]}
+    assert not users.is_column_indexed("city")
+    assert users.get_index_high_water("city") == 0
+    assert users.get_record_ids_by_column("city", "Oslo") == {2}
+    assert users.is_column_indexed("name")
+    assert users.get_index_high_water("name") == 2
+    assert users.indexes["name"]["Bo"] == {2}
+    # an index created afterwards is complete as well
+    users.create_index("country")
+    assert users.wait_for_index("country")
+    assert users.is_column_indexed("country")
+    assert users.get_record_ids_by_column("country", "NO") == {2}
+
+    users.column_locks["city"] = city_lock
+    users.insert_record({"city": "Toronto", "name": "Cy", "country": "CA"})
+    users.flush_indexes()
+
+    assert users.failed_index_record_ids == {}
+    assert users.is_column_indexed("city")
+    assert users.indexes["city"]["Toronto"] == {1, 3}
+    assert users.indexes["city"]["Oslo"] == {2}
+
+    users.shutdown()
+
+
+def test_insert_records() -> None:
+    """Inserts a batch of records and checks that a batch with a bad value inserts nothing.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    db = _create_database()
+    db.create_table("users", {"email": str})
+    db.create_table("posts", {"user_id": int, "title": str})
+    db.create_foreign_key("posts", "user_id", "users")
+    users = db.get_table("users")
+    users.create_unique_index("email")
+
+    assert db.insert_records_into_table("users", [{"email": "john@email.com"}, {"email": "jane@email.com"}]) == [1, 2]
+    assert db.insert_records_into_table("posts", [{"user_id": 1, "title": "a"}, {"user_id": 2, "title": "b"}]) == [1, 2]
+
+    with pytest.raises(ValueError, match="not unique"):
+        db.insert_records_into_table("users", [{"email": "kim@email.com"}, {"email": "john@email.com"}])
+    with pytest.raises(ValueError, match="does not exist in foreign table"):
+        db.insert_records_into_table("posts", [{"user_id": 1, "title": "c"}, {"user_id": 3, "title": "d"}])
+    with pytest.raises(TypeError):
+        db.insert_records_into_table("posts", [{"user_id": "1", "title": "e"}])
+
+    assert users.count == 2
+    assert users.get_record_ids_by_column("email", "kim@email.com") == set()
+    assert db.get_table("posts").count == 2
+
+    db.shutdown()
+
+
+def test_sorted_index() -> None:
+    """Checks that range, ordered and min/max reads return the same records with a sorted index as with a scan.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    indexed_users = Table("indexed_users", {"age": Union[int, None]})
+    users = Table("users", {"age": Union[int, None]})
+    indexed_users.create_sorted_index("age")
+    for table in (indexed_users, users):
+        table.insert_records([{"age": age} for age in (30, 20, None, 40, 20)])
+        table.insert_record({"age": 10})
+        table.update_record_by_id(4, {"age": 25})
+        table.delete_record_by_id(1)
+
+    for table in (indexed_users, users):
+        assert [record["age"] for record in table.get_records_in_range("age", 20, 30)] == [20, 20, 25]
+        assert [record["age"] for record in table.get_records_in_range("age", 20, 30, (False, True))] == [25]
+        assert [record["age"] for record in table.get_records_sorted("age")] == [10, 20, 20, 25, None]
+        assert [record["age"] for record in table.get_records_sorted("age", reverse=True, limit=2)] == [25, 20]
+        assert table.get_column_min("age") == 10
+        assert table.get_column_max("age") == 25
+        assert table.get_record_ids_by_column("age", 20) == {2, 5}
+
+    indexed_users.shutdown()
+    users.shutdown()
+
+
+def test_columnar_insert_during_scan() -> None:
+    """Inserts records into columnar tables while their columns are scanned and an index is built.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    users = Table("users", {"name": str, "age": int, "email": Union[str, None]}, storage="columnar")
+    users.insert_records([{"name": f"user {i}", "age": i, "email": None} for i in range(1, 1001)])
+
+    scanned_names = []
+    for record_id, name in users.iter_column_values("name"):
+        scanned_names.append(name)
+        if record_id % 100 == 0:
+            users.insert_record({"name": "new user", "age": 0, "email": "new@email.com"})
+    assert scanned_names == [f"user {i}" for i in range(1, 1001)]
+    assert users.count == len(users.records) == 1010
+
+    users.create_index("name")
+    for _ in range(2000):
+        users.insert_record({"name": "new user", "age": 0, "email": None})
+    assert users.wait_for_index("name")
+    users.flush_indexes()
+    assert users.count == len(users.records) == 3010
+    assert users.get_record_ids_by_column("name", "new user") == set(range(1001, 3011))
+    assert users.get_record_ids_by_column("name", "user 7") == {7}
+
+    users.shutdown()
+
+
+def test_columnar_string_compaction() -> None:
+    """Checks that overwritten strings of a columnar table are reclaimed without an explicit compaction.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    users = Table("users", {"bio": str}, storage="columnar")
+    users.insert_records([{"bio": "x" * 100} for _ in range(100)])
+    for i in range(10_000):
+        users.update_record_by_id(i % 100 + 1, {"bio": f"{i:0100}"})
+    users.delete_record_by_id(1)
+
+    bios = users.records.vectors["bio"]
+    assert len(bios.data) < 100 * 100 * 10
+    assert users.get_record_by_id(100)["bio"] == f"{9999:0100}"
+    assert [bio for _, bio in users.iter_column_values("bio")] == [f"{i:0100}" for i in range(9901, 10_000)]
+
+    users.shutdown()
+
+
+def test_string_column_put_order() -> None:
+    """Checks that a string is in the buffer before its slot points at it, so readers never see a cut string.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    column = StringColumn(is_nullable=False)
+    column.resize(1)
+    column.put(0, "tea")
+    values_while_appending = []
+
+    class RecordingBuffer(bytearray):
+        def __iadd__(self, data: bytes) -> "RecordingBuffer":
+            # the slot still holds the previous string while the new one is appended
+            values_while_appending.append(column.get(0))
+            return super().__iadd__(data)
+
+    column.data = RecordingBuffer(column.data)
+    column.put(0, "coffee")
+    assert values_while_appending == ["tea"]
+    assert column.get(0) == "coffee"
+
+
+def test_posting_list() -> None:
+    """Checks the varint codec and that a posting list behaves like a set of row ids with term frequencies.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    values = [0, 1, 127, 128, 300, 2**40]
+    encoded = bytearray()
+    for value in values:
+        encode_varint(value, encoded)
+    assert list(decode_varints(encoded)) == values
+    assert list(decode_deltas(encoded)) == [sum(values[: i + 1]) for i in range(len(values))]
+
+    rng = random.Random(0)
+    posting_list = PostingList()
+    frequencies = {}
+    for record_id in range(1, 2000):
+        if rng.random() < 0.5:
+            posting_list.add(record_id, record_id % 7 + 1)
+            frequencies[record_id] = record_id % 7 + 1
+    for _ in range(2000):
+        record_id = rng.randrange(1, 2500)
+        if rng.random() < 0.5:
+            posting_list.add(record_id, 3)
+            frequencies[record_id] = 3
+        else:
+            posting_list.discard(record_id)
+            frequencies.pop(record_id, None)
+
+        assert record_id in posting_list if record_id in frequencies else record_id not in posting_list
+        assert posting_list.frequency(record_id) == frequencies.get(record_id, 0)
+
+    assert len(posting_list) == len(frequencies)
+    assert list(posting_list.items()) == sorted(frequencies.items())
+
+    restored = PostingList.__new__(PostingList)
+    restored.__setstate__(posting_list.__getstate__())
+    assert list(restored.items()) == sorted(frequencies.items())
+    assert all(restored.frequency(record_id) == frequency for record_id, frequency in frequencies.items())
+
+    other = PostingList(range(1, 2500, 3))
+    assert list(posting_list.intersection(other)) == sorted(frequencies.keys() & set(range(1, 2500, 3)))
+    assert list(posting_list.union(other)) == sorted(frequencies.keys() | set(range(1, 2500, 3)))
+    assert list(PostingList([5])) == [5]
+    assert not PostingList()
+
+
+def _create_articles_table(positional: bool = False) -> Table:
+    """Create a table named "articles" with an inverted index on its body.
+
+    Args:
+    ----
+        positional (bool, optional): To create a positional inverted index. Defaults to False.
+
+    Returns:
+    -------
+        Table: The table.
+    """
+    articles = Table("articles", {"body": str})
+    articles.insert_records(
+        [
+            {"body": "Python tips: python decorators and python generators"},
+            {"body": "A long guide to cooking pasta, with a short note on python at the very end of it"},
+            {"body": "Cooking rice"},
+            {"body": "Gardening in spring"},
+        ],
+    )
+    articles.create_inverted_index("body", positional=positional)
+    return articles
+
+
+def test_ranked_search() -> None:
+    """Checks that search ranks records by BM25 and keeps only the best ones.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    articles = _create_articles_table()
+
+    assert [record["body"] for record in articles.search("body", "python")] == [
+        "Python tips: python decorators and python generators",
+        "A long guide to cooking pasta, with a short note on python at the very end of it",
+    ]
+    assert [record_id for record_id, _ in articles.rank_records("body", "cooking")] == [3, 2]
+    assert [record_id for record_id, _ in articles.rank_records("body", "python cooking", limit=2)] == [2, 1]
+    scores = [score for _, score in articles.rank_records("body", "python cooking gardening")]
+    assert scores == sorted(scores, reverse=True)
+    assert len(scores) == 4
+
+    articles.update_record_by_id(1, {"body": "Gardening tools"})
+    assert [record_id for record_id, _ in articles.rank_records("body", "python")] == [2]
+    assert articles.search("body", "the and") == []
+    with pytest.raises(ValueError, match="positive"):
+        articles.search("body", "python", limit=0)
+
+    articles.shutdown()
+
+
+def test_boolean_search() -> None:
+    """Checks AND mode search and boolean queries against the words of every record.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    articles = _create_articles_table()
+
+    assert [record_id for record_id, _ in articles.rank_records("body", "python cooking", mode="all")] == [2]
+    assert articles.rank_records("body", "python knitting", mode="all") == []
+    assert articles.boolean_search_record_ids("body", "python AND cooking") == [2]
+    assert articles.boolean_search_record_ids("body", "python OR rice") == [1, 2, 3]
+    assert articles.boolean_search_record_ids("body", "cooking NOT python") == [3]
+    assert articles.boolean_search_record_ids("body", "NOT cooking") == [1, 4]
+    assert articles.boolean_search_record_ids("body", "(rice OR pasta) AND NOT python") == [3]
+    with pytest.raises(ValueError, match="ended unexpectedly"):
+        articles.boolean_search_record_ids("body", "python AND (cooking")
+
+    rng = random.Random(0)
+    words = ["red", "green", "blue", "black"]
+    colors = Table("colors", {"body": str})
+    colors.insert_records([{"body": " ".join(rng.sample(words, 2))} for _ in range(1000)])
+    colors.create_inverted_index("body")
+    bodies = {record_id: set(record["body"].split()) for record_id, record in colors.records.items()}
+    assert colors.boolean_search_record_ids("body", "red AND blue") == [
+        record_id for record_id, body in bodies.items() if {"red", "blue"} <= body
+    ]
+
+    articles.shutdown()
+    colors.shutdown()
+
+
+def test_phrase_search() -> None:
+    """Checks that phrases match their words in order, stop words included, and NEAR queries their distance.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    cities = Table("cities", {"body": str})
+    cities.create_inverted_index("body", positional=True)
+    cities.insert_records(
+        [
+            {"body": "I love New York in the spring"},
+            {"body": "york new"},
+            {"body": "I love new pizza in york"},
+            {"body": "The bank of america and the bank in america"},
+            {"body": "The bank and america"},
+        ],
+    )
+
+    assert [record["body"] for record in cities.phrase_search("body", "new york")] == ["I love New York in the spring"]
+    assert cities.boolean_search_record_ids("body", '"new york" OR "york new"') == [1, 2]
+    assert cities.boolean_search_record_ids("body", '"bank of america"') == [4]
+    assert cities.boolean_search_record_ids("body", '"in the spring"') == [1]
+    assert cities.boolean_search_record_ids("body", "love NEAR/4 york") == [1, 3]
+    assert cities.boolean_search_record_ids("body", "love NEAR/2 york") == [1]
+
+    cities.update_record_by_id(1, {"body": "New Yorkers"})
+    cities.delete_record_by_id(4)
+    assert cities.phrase_search("body", "new york") == []
+    assert cities.boolean_search_record_ids("body", '"bank of america"') == []
+    assert cities.search("body", "new") == []
+
+    cities.shutdown()
+
+
+def test_search_prefix() -> None:
+    """Checks that completions of a prefix are ranked by document frequency as records change.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    products = Table("products", {"name": str})
+    products.insert_records(
+        [{"name": "pancakes"}, {"name": "pandas"}, {"name": "pancakes panel"}, {"name": "pasta"}, {"name": "pan"}],
+    )
+    products.create_inverted_index("name")
+
+    assert products.search_prefix("name", "pa") == ["pancakes", "pan", "pandas", "panel", "pasta"]
+    assert products.search_prefix("name", "Pan", limit=2) == ["pancakes", "pan"]
+    assert products.search_prefix("name", "panc") == ["pancakes"]
+    assert products.search_prefix("name", "x") == []
+
+    products.insert_records([{"name": "pandas"}, {"name": "pandas"}])
+    assert products.search_prefix("name", "pa", limit=1) == ["pandas"]
+
+    products.delete_record_by_id(6)
+    products.delete_record_by_id(7)
+    products.update_record_by_id(3, {"name": "pasta"})
+    assert products.search_prefix("name", "pa") == ["pasta", "pan", "pancakes", "pandas"]
+
+    products.shutdown()
+
+
+def test_fuzzy_search() -> None:
+    """Checks typo tolerant search, and that words added while the trigram index is built are matched.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    articles = _create_articles_table()
+    assert [record["body"] for record in articles.search("body", "pyhton", fuzziness=1)] == []
+    assert [record_id for record_id, _ in articles.rank_records("body", "pyhton", fuzziness=2)] == [1, 2]
+    assert [record_id for record_id, _ in articles.rank_records("body", "cookng rce", fuzziness=1)] == [3, 2]
+    assert [record_id for record_id, _ in articles.rank_records("body", "rise", fuzziness=1)] == [3]
+    articles.shutdown()
+
+    rng = random.Random(0)
+    words = {"".join(rng.choices(string.ascii_lowercase, k=8)): 1 for _ in range(50_000)}
+    term_dictionary = TermDictionary(words)
+    build = threading.Thread(target=term_dictionary.fuzzy_matches, args=("abcdefgh", 1))
+    build.start()
+    for i in range(200):
+        term_dictionary.set_frequency(f"zebra{i:03}", 1)
+    build.join()
+
+    assert all(term_dictionary.fuzzy_matches(f"zebrz{i:03}", 1) == [(f"zebra{i:03}", 1)] for i in range(200))
+    term_dictionary.set_frequency("zebra042", 0)
+    assert term_dictionary.fuzzy_matches("zebrz042", 1) == []
+
+
+def test_broad_search() -> None:
+    """Checks that broad search finds the same records with and without an inverted index.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    db = _create_database()
+    db.create_table("posts", {"body": str})
+    db.insert_records_into_table(
+        "posts",
+        [{"body": "Python, Rust!"}, {"body": "the rust guitar"}, {"body": "python pasta"}, {"body": "the"}],
+    )
+    posts = db.get_table("posts")
+
+    search_texts = ("RUST", "python unknown", "the", "unknown")
+    unindexed = [posts.get_records_by_broad_search("body", search_text) for search_text in search_texts]
+    posts.create_inverted_index("body")
+    indexed = [posts.get_records_by_broad_search("body", search_text) for search_text in search_texts]
+    assert unindexed == indexed
+    assert [len(records) for records in indexed] == [2, 2, 0, 0]
+    assert match_words(["the pasta", "guitar!", "rust"], frozenset({"guitar"}), posts.tokenizer) == [1]
+
+    scan_executor = get_scan_executor()
+    db.shutdown()
+    with pytest.raises(RuntimeError, match="shutdown"):
+        scan_executor.submit(len, "")
+    assert get_scan_executor() is not scan_executor
+    shutdown_scan_executor()
+
+
+def test_tokenizer() -> None:
+    """Checks that indexed and searched text go through the same tokenizer, with folding and stemming.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    tokenizer = Tokenizer(stop_words={"the", "a"}, fold_diacritics=True, stem=True, cache_size=2)
+    assert tokenizer.words("The Cafés, a café!") == {"cafe"}
+    assert tokenizer.word_counts("Indexes indexed INDEXING index") == {"index": 4}
+    assert tokenizer.word_positions("the cat and the hats") == {"cat": [1], "and": [2], "hat": [4]}
+    assert tokenizer.word_positions("the cat", keep_stop_words=True) == {"the": [0], "cat": [1]}
+    assert tokenizer.normalize_prefix(" Caf") == "caf"
+
+    restored = pickle.loads(pickle.dumps(tokenizer))  # noqa: S301
+    assert restored.get_config() == tokenizer.get_config()
+    assert restored.words("Cafés") == {"cafe"}
+
+    places = Table("places", {"name": str}, tokenizer=tokenizer)
+    places.insert_record({"name": "Crêpes and cafés"})
+    places.create_inverted_index("name")
+    assert [record["name"] for record in places.search("name", "CREPE cafe")] == ["Crêpes and cafés"]
+    assert places.search_prefix("name", "cré") == ["crepe"]
+    places.shutdown()
+
+
+def test_insert_record_unique_violation() -> None:
+    """Checks that a value that is not unique leaves no record, row id or index entry behind.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    users = Table("users", {"email": str, "age": int})
+    users.create_unique_index("email")
+    users.create_sorted_index("age")
+    users.insert_record({"email": "ada@example.com", "age": 36})
+
+    with pytest.raises(ValueError, match="not unique"):
+        users.insert_record({"email": "ada@example.com", "age": 41})
+
+    assert users.count == 1
+    assert list(users.records) == [1]
+    assert users.sorted_indexes["age"].get(41) == set()
+    assert users.insert_record({"email": "grace@example.com", "age": 41}) == 2
+    users.shutdown()
+
+
+def test_write_ahead_log_recovery() -> None:
+    """Checks that the changes of a database are replayed from its write-ahead log when it is opened again.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shop.wal")
+        database = Database("shop", write_ahead_log_path=path)
+        database.create_table("products", {"name": str, "price": int})
+        products = database.get_table("products")
+        products.create_unique_index("name")
+        database.insert_record_into_table("products", {"name": "kettle", "price": 30})
+        database.insert_records_into_table("products", [{"name": "toaster", "price": 45}, {"name": "mug", "price": 8}])
+        database.update_record_by_id_into_table("products", 1, {"name": "kettle", "price": 25})
+        products.delete_record_by_id(3)
+        database.shutdown()
+
+        database = Database("shop", write_ahead_log_path=path)
+        products = database.get_table("products")
+        assert products.count == 3
+        assert dict(products.records) == {1: {"name": "kettle", "price": 25}, 2: {"name": "toaster", "price": 45}}
+        with pytest.raises(ValueError, match="not unique"):
+            products.insert_record({"name": "toaster", "price": 50})
+        assert database.insert_record_into_table("products", {"name": "mug", "price": 9}) == 4
+        database.shutdown()
+
+
+def test_write_ahead_log_rejected_change() -> None:
+    """Checks that a change the write-ahead log rejects is not applied, so memory never differs from the log.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shop.wal")
+        database = Database("shop", write_ahead_log_path=path)
+        database.create_table("products", {"name": str, "details": dict})
+        products = database.get_table("products")
+        products.create_index("name")
+        products.create_sorted_index("name")
+        database.insert_record_into_table("products", {"name": "kettle", "details": {"watts": 2000}})
+
+        # a set passes the dict type check but can not be encoded
+        with pytest.raises(CodecError):
+            database.insert_record_into_table("products", {"name": "mug", "details": {"colors": {"red"}}})
+        with pytest.raises(CodecError):
+            products.insert_records([{"name": "cup", "details": {}}, {"name": "jug", "details": {"sizes": {1}}}])
+        with pytest.raises(CodecError):
+            products.update_record_by_id(1, {"name": "pot", "details": {"colors": {"red"}}})
+
+        assert products.count == 1
+        assert dict(products.records) == {1: {"name": "kettle", "details": {"watts": 2000}}}
+        assert products.statistics.row_count == 1
+        assert products.sorted_indexes["name"].get("pot") == set()
+        assert products.get_record_ids_by_column("name", "pot") == set()
+        change_count = products.change_count
+
+        # a log that can not be written anymore rejects every change
+        database.write_ahead_log.close()
+        with pytest.raises(ValueError, match="closed"):
+            products.delete_record_by_id(1)
+        assert 1 in products.records
+        assert products.change_count == change_count
+        database.shutdown()
+
+        database = Database("shop", write_ahead_log_path=path)
+        assert dict(database.get_table("products").records) == {1: {"name": "kettle", "details": {"watts": 2000}}}
+        database.shutdown()
+
+
+def test_write_ahead_log_group_commit() -> None:
+    """Checks that concurrent writes of a server share fsyncs and do not block the event loop while they wait.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    fsync = os.fsync
+    fsync_count = 0
+
+    def count_fsync(fd: int) -> None:
+        nonlocal fsync_count
+        fsync_count += 1
+        fsync(fd)
+
+    async def insert_concurrently(database: Database, scheduler: QueryScheduler) -> list[int]:
+        return await asyncio.gather(
+            *(
+                scheduler.write("notes", database.insert_record_into_table, "notes", {"text": f"note {number}"})
+                for number in range(100)
+            ),
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = Database("notes", write_ahead_log_path=os.path.join(directory, "notes.wal"))
+        database.create_table("notes", {"text": str})
+        scheduler = QueryScheduler()
+        os.fsync = count_fsync
+        try:
+            record_ids = asyncio.run(insert_concurrently(database, scheduler))
+        finally:
+            os.fsync = fsync
+
+        assert record_ids == list(range(1, 101))
+        assert fsync_count < 10
+        assert database.write_ahead_log.durable_offset == os.path.getsize(database.write_ahead_log.path)
+        database.shutdown()
+
+
+def test_write_ahead_log_sequential_commit() -> None:
+    """Checks that sequential single-record inserts pay one fsync per record, but share them in group_commit.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    fsync = os.fsync
+    fsync_count = 0
+
+    def count_fsync(fd: int) -> None:
+        nonlocal fsync_count
+        fsync_count += 1
+        fsync(fd)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "notes.wal")
+        database = Database("notes", write_ahead_log_path=path)
+        database.create_table("notes", {"text": str})
+        notes = database.get_table("notes")
+        os.fsync = count_fsync
+        try:
+            for number in range(50):
+                notes.insert_record({"text": f"note {number}"})
+            assert fsync_count == 50
+
+            fsync_count = 0
+            with group_commit():
+                for number in range(50, 500):
+                    notes.insert_record({"text": f"note {number}"})
+            assert fsync_count < 10
+        finally:
+            os.fsync = fsync
+
+        assert database.write_ahead_log.durable_offset == os.path.getsize(path)
+        database.shutdown()
+
+        database = Database("notes", write_ahead_log_path=path)
+        assert database.get_table("notes").count == 500
+        database.shutdown()
+
+
+def test_checkpoint_recovery() -> None:
+    """Checks that a database is the same after it is loaded from checkpoints and its write-ahead log.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    cities = ["oslo", "lima", "pune"]
+    with tempfile.TemporaryDirectory() as directory:
+        arguments = ("shop", os.path.join(directory, "shop.wal"), 0.01, True, os.path.join(directory, "checkpoints"))
+        database = Database(*arguments)
+        for storage in ("row", "columnar"):
+            database.create_table(storage, {"name": str, "city": str, "stock": int}, storage=storage)
+            table = database.get_table(storage)
+            table.create_unique_index("name")
+            table.create_index("city")
+            database.insert_records_into_table(
+                storage,
+                [{"name": f"item {number}", "city": cities[number % 3], "stock": number} for number in range(1, 61)],
+            )
+        database.checkpoint()
+        for storage in ("row", "columnar"):
+            database.update_record_by_id_into_table(storage, 2, {"name": "item 2", "city": "oslo", "stock": 0})
+            database.get_table(storage).delete_record_by_id(3)
+        expected = {storage: dict(database.get_table(storage).records.items()) for storage in ("row", "columnar")}
+        database.shutdown()
+
+        database = Database(*arguments)
+        for storage in ("row", "columnar"):
+            table = database.get_table(storage)
+            table.wait_for_index("city")
+            assert dict(table.records.items()) == expected[storage]
+            assert table.statistics.row_count == 59
+            assert table.get_record_ids_by_column("city", "oslo") == {2, 6, *range(9, 61, 3)}
+            with pytest.raises(ValueError, match="not unique"):
+                table.insert_record({"name": "item 1", "city": "lima", "stock": 1})
+
+        # the row records are read from the first table file, which the second checkpoint removes
+        row_table = database.get_table("row")
+        database.update_record_by_id_into_table("row", 4, {"name": "item 4", "city": "pune", "stock": 40})
+        row_table.delete_record_by_id(5)
+        database.checkpoint()
+        database.insert_record_into_table("row", {"name": "item 61", "city": "lima", "stock": 61})
+        row_table.freeze_records(10, os.path.join(directory, "row-1.segment"))
+        assert row_table.records[6] == {"name": "item 6", "city": "oslo", "stock": 6}
+        assert 5 not in row_table.records
+        expected = dict(row_table.records.items())
+        database.shutdown()
+
+        database = Database(*arguments)
+        assert dict(database.get_table("row").records.items()) == expected
+        database.shutdown()
+
+
+def test_checkpoint_index_load_after_file_removal() -> None:
+    """Checks that a hash index still loads from a table file that is removed before its build runs.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "people.table")
+        people = Table("people", {"name": str, "team": str})
+        people.insert_records([{"name": f"person {number}", "team": f"team {number % 7}"} for number in range(700)])
+        people.create_index("team")
+        people.wait_for_index("team")
+        write_table_file(people, path)
+        people.shutdown()
+
+        people = load_table_file(path)
+        os.remove(path)
+        assert people.wait_for_index("team")
+        assert len(people.get_record_ids_by_column("team", "team 3")) == 100
+        assert people.records[700] == {"name": "person 699", "team": "team 6"}
+        people.shutdown()
+
+
+def test_frozen_records() -> None:
+    """Checks that frozen records read, scan, change and index like the records in memory.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        events = Table("events", {"kind": str, "size": int, "note": Union[str, None]})
+        events.insert_records([
+            {"kind": f"kind {number % 4}", "size": number, "note": None if number % 5 else "x"}
+            for number in range(1, 101)
+        ])
+        events.freeze_records(60, os.path.join(directory, "events-1.segment"))
+        with pytest.raises(ValueError, match="already frozen"):
+            events.freeze_records(40, os.path.join(directory, "events-2.segment"))
+
+        assert len(events.records) == 100
+        assert events.records[10] == {"kind": "kind 2", "size": 10, "note": "x"}
+        assert events.records[11] == {"kind": "kind 3", "size": 11, "note": None}
+        assert [value for _, value in events.iter_column_values("size")] == list(range(1, 101))
+
+        events.update_record_by_id(20, {"kind": "kind 9", "size": 2_000, "note": None})
+        events.delete_record_by_id(30)
+        assert 30 not in events.records
+        assert events.records[20]["size"] == 2_000
+        assert len(events.records) == 99
+
+        events.create_index("kind")
+        events.wait_for_index("kind")
+        assert events.get_record_ids_by_column("kind", "kind 9") == {20}
+        assert len(events.get_record_ids_by_column("kind", "kind 1")) == 25
+        events.shutdown()
+
+
+def test_wire_protocol() -> None:
+    """Checks that frames and streamed responses survive a round trip and that broken frames are rejected.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+
+    async def read_all(data: bytes, read: object) -> object:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read(reader)
+
+    records = [{"id": number, "name": f"name {number}"} for number in range(2 * STREAM_CHUNK_SIZE + 1)]
+    frames = encode_response(7, GET, records)
+    assert len(frames) == 3
+    assert asyncio.run(read_all(frames[0], read_frame)).flags == FLAG_MORE
+    assert asyncio.run(read_all(b"".join(frames), read_response)) == (7, records)
+    assert asyncio.run(read_all(b"".join(encode_response(8, GET, records[:2])), read_response)) == (8, records[:2])
+
+    frame = asyncio.run(read_all(encode_frame(9, INSERT, ["users", {"name": "ada"}]), read_frame))
+    assert (frame.request_id, frame.opcode, frame.flags, frame.payload) == (9, INSERT, 0, ["users", {"name": "ada"}])
+    error_frame = encode_frame(10, GET, "Table users does not exist.", FLAG_ERROR)
+    request_id, error = asyncio.run(read_all(error_frame, read_response))
+    assert request_id == 10
+    assert str(error).endswith("Table users does not exist.")
+
+    assert asyncio.run(read_all(b"", read_frame)) is None
+    with pytest.raises(ProtocolError, match="middle of a frame"):
+        asyncio.run(read_all(encode_frame(11, GET, "users")[:-1], read_frame))
+    with pytest.raises(ProtocolError, match="before the response was complete"):
+        asyncio.run(read_all(frames[0], read_response))
+
+
+def test_pipelined_requests() -> None:
+    """Checks that requests pipelined on one connection are all answered with their request ids.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+
+    async def pipeline() -> tuple[dict[int, object], bytes]:
+        protocol = TcpProtocol()
+        server = await asyncio.start_server(protocol.handle_client_request, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        requests = [
+            (QUERY, "CREATE DATABASE shop"),
+            (QUERY, "CREATE TABLE shop.items (name str, city str)"),
+            *(
+                (INSERT, ["shop", "items", {"name": f"item {number}", "city": cities[number % 2]}])
+                for number in range(20)
+            ),
+            (GET, ["shop", "items", 3]),
+            (GET_BY_COLUMN, ["shop", "items", "city", "oslo"]),
+            (GET, ["shop", "missing", 1]),
+        ]
+        # every request is written before any response is read
+        writer.write(b"".join(encode_frame(request_id, *request) for request_id, request in enumerate(requests)))
+        responses = dict([await read_response(reader) for _ in requests])
+
+        # a frame longer than the protocol allows closes the connection
+        writer.write(FRAME_HEADER.pack(0xFFFFFFFF, len(requests), GET, 0))
+        rest = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        protocol.scheduler.shutdown()
+        return responses, rest
+
+    cities = ["oslo", "lima"]
+    responses, rest = asyncio.run(pipeline())
+    assert len(responses) == 25
+    assert [responses[request_id] for request_id in range(2, 22)] == list(range(1, 21))
+    assert responses[22] == {"name": "item 2", "city": "oslo"}
+    assert [record["name"] for record in responses[23]] == [f"item {number}" for number in range(0, 20, 2)]
+    assert "missing" in str(responses[24])
+    assert rest == b""
+
+
+def test_async_client() -> None:
+    """Checks that the client batches concurrent inserts, fails only the bad ones and pools its connections.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+
+    async def use_client() -> None:
+        protocol = TcpProtocol()
+        server = await asyncio.start_server(protocol.handle_client_request, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with AtomLinkerClient("127.0.0.1", port, pool_size=2, batch_window=0.01) as client:
+            await client.create_database("crm")
+            await client.create_table("crm", "users", {"email": str, "team": str})
+            await client.query("CREATE UNIQUE INDEX ON crm.users (email)")
+            inserts = [
+                client.insert("crm", "users", {"email": f"user{number}@example.com", "team": "red"})
+                for number in range(30)
+            ]
+            inserts.append(client.insert("crm", "users", {"email": "user7@example.com", "team": "blue"}))
+            results = await asyncio.gather(*inserts, return_exceptions=True)
+            assert sorted(results[:30]) == list(range(1, 31))
+            assert isinstance(results[30], InvalidQueryError)
+
+            await client.create_index("crm", "users", "team")
+            assert await client.get("crm", "users", results[7]) == {"email": "user7@example.com", "team": "red"}
+            assert len(await client.get_by_column("crm", "users", "team", "red")) == 30
+            assert await client.insert_many("crm", "users", [{"email": "ada@example.com", "team": "blue"}]) == [31]
+            assert len(client._connections) <= 2  # noqa: SLF001
+        server.close()
+        await server.wait_closed()
+        protocol.scheduler.shutdown()
+
+    asyncio.run(use_client())
+
+
+def _get_free_port_pair() -> int:
+    # the shard ports of the workers are consecutive
+    while True:
+        with socket.socket() as first_socket, socket.socket() as second_socket:
+            first_socket.bind(("127.0.0.1", 0))
+            port = first_socket.getsockname()[1]
+            try:
+                second_socket.bind(("127.0.0.1", port + 1))
+            except OSError:
+                continue
+            return port
+
+
+def test_sharded_server() -> None:
+    """Checks that shard workers interleave record ids and route reads to the shards that own the records.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    assert to_local_record_id(to_global_record_id(5, 1, 3), 3) == (1, 5)
+    assert [to_global_record_id(local_record_id, 0, 2) for local_record_id in (1, 2, 3)] == [1, 3, 5]
+
+    async def use_shards() -> None:
+        shard_base_port, public_port = _get_free_port_pair(), _get_free_port_pair()
+        routers = [ShardRouter(shard_index, 2, shard_base_port) for shard_index in range(2)]
+        serving = [
+            asyncio.create_task(router.serve("127.0.0.1", public_port + router.shard_index)) for router in routers
+        ]
+        # connected to a different worker each
+        clients = [
+            AtomLinkerClient("127.0.0.1", public_port + shard_index, batch_window=0, reconnect_delay=0.05)
+            for shard_index in range(2)
+        ]
+        try:
+            await clients[0].query("CREATE DATABASE geo")
+            await clients[0].query("CREATE TABLE geo.cities (name str, size int)")
+            first_cities = [{"name": name, "size": 1} for name in ("oslo", "lima", "pune")]
+            second_cities = [{"name": name, "size": 2} for name in ("kyiv", "rome")]
+            first_record_ids = await clients[0].insert_many("geo", "cities", first_cities)
+            second_record_ids = await clients[1].insert_many("geo", "cities", second_cities)
+            assert first_record_ids == [1, 3, 5]
+            assert second_record_ids == [2, 4]
+
+            assert await clients[0].get("geo", "cities", 4) == {"name": "rome", "size": 2}
+            assert len(await clients[0].get_by_column("geo", "cities", "size", 2)) == 2
+            rows = await clients[1].query("SELECT name FROM geo.cities ORDER BY name LIMIT 3")
+            assert [row["name"] for row in rows] == ["kyiv", "lima", "oslo"]
+        finally:
+            for client in clients:
+                await client.close()
+            for task in serving:
+                task.cancel()
+            await asyncio.gather(*serving, return_exceptions=True)
+
+    asyncio.run(use_shards())
+
+
+def test_query_scheduler() -> None:
+    """Checks that pooled reads take turns between clients and that a write waits for the reads of its table.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+
+    async def schedule() -> list[str]:
+        scheduler = QueryScheduler(max_workers=1)
+        order = []
+        release = threading.Event()
+
+        def read(name: str) -> str:
+            if name == "blocker":
+                release.wait(5)
+            order.append(name)
+            return name
+
+        async def read_as(client: str, name: str) -> str:
+            current_client.set(client)
+            return await scheduler.run("notes", read, name)
+
+        blocker = asyncio.create_task(read_as("a", "blocker"))
+        await asyncio.sleep(0)
+        reads = [asyncio.create_task(read_as(client, name)) for client, name in (("a", "a1"), ("a", "a2"), ("a", "a3"))]
+        reads.append(asyncio.create_task(read_as("b", "b1")))
+        dropped = asyncio.create_task(read_as("c", "c1"))
+        await asyncio.sleep(0)
+        # waits for the running read, and the queued reads of the table wait for it
+        write = asyncio.create_task(scheduler.write("notes", order.append, "write"))
+        dropped.cancel()
+        await asyncio.sleep(0.01)
+        assert order == []
+        release.set()
+
+        assert await asyncio.gather(blocker, *reads) == ["blocker", "a1", "a2", "a3", "b1"]
+        await write
+        with pytest.raises(asyncio.CancelledError):
+            await dropped
+        scheduler.shutdown()
+        return order
+
+    assert asyncio.run(schedule()) == ["blocker", "write", "a1", "b1", "a2", "a3"]
+    with pytest.raises(ValueError, match="positive"):
+        QueryScheduler(max_workers=0)
+
+
+def test_query_language() -> None:
+    """Checks that queries are parsed into statements, executed on the databases and planned once per normalized text.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    tokens = tokenize_query("select name from shop.items where price between 3 and 5 order by name desc limit 2;")
+    assert normalize_query(tokens) == normalize_query(
+        tokenize_query("SELECT  name FROM shop.items WHERE price BETWEEN 3 AND 5 ORDER BY name DESC LIMIT 2;"),
+    )
+    assert parse_query(tokens) == Select(
+        "shop", "items", ("name",), (Condition("price", ">=", 3), Condition("price", "<=", 5)), OrderBy("name", True),
+        2,
+    )
+
+    executor = ExecuteQuery()
+    assert executor.execute_query("CREATE DATABASE shop") is None
+    assert executor.execute_query("CREATE TABLE shop.items (name str, price int, note str NULL)") is None
+    assert executor.execute_query(
+        "INSERT INTO shop.items (name, price, note) "
+        "VALUES ('pen', 3, NULL), ('ink', 9, 'it''s blue'), ('pad', 5, NULL)",
+    ) == [1, 2, 3]
+    assert executor.execute_query("SELECT name FROM shop.items WHERE price >= 4 ORDER BY price DESC LIMIT 1") == [
+        {"name": "ink"},
+    ]
+    assert executor.execute_query("SELECT * FROM shop.items WHERE price <> 3 AND price < 9") == [
+        {"name": "pad", "price": 5, "note": None},
+    ]
+    assert executor.execute_query("SELECT note FROM shop.items WHERE name = 'ink'") == [{"note": "it's blue"}]
+
+    query = "SELECT name FROM shop.items WHERE price BETWEEN 3 AND 5 ORDER BY name"
+    plan = executor.plan_query(query)
+    misses = executor.plan_cache.misses
+    assert executor.plan_query(query) is plan
+    assert executor.plan_query("select name  from shop.items where price between 3 and 5 order by name") is plan
+    assert executor.plan_cache.misses == misses
+    assert executor.execute_plan(plan) == [{"name": "pad"}, {"name": "pen"}]
+
+    for invalid_query in (
+        "",
+        "SELECT FROM shop.items",
+        "SELECT * FROM shop.items WHERE name = 'pen",
+        "SELECT * FROM shop.items WHERE price = $1",
+        "INSERT INTO shop.items (name, price) VALUES ('cap')",
+        "SELECT * FROM shop.missing",
+        "SELECT * FROM other.items",
+    ):
+        with pytest.raises(InvalidQueryError):
+            executor.execute_query(invalid_query)
+
+
+def test_prepared_statements() -> None:
+    """Checks that prepared statements are executed with parameters, counted and removed again.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    executor = ExecuteQuery()
+    executor.execute_query("CREATE DATABASE shop")
+    executor.execute_query("CREATE TABLE shop.items (name str, price int)")
+
+    assert executor.execute_query("PREPARE add_item AS INSERT INTO shop.items (name, price) VALUES ($1, $2)") is None
+    assert executor.execute_query("EXECUTE add_item('pen', 3)") == [1]
+    assert executor.execute_query("EXECUTE add_item('ink', 9)") == [2]
+    assert executor.execute_prepared("add_item", ["pad", 5]) == [3]
+
+    query = "SELECT name FROM shop.items WHERE price < $1 ORDER BY name"
+    executor.execute_query(f"PREPARE cheap AS {query}")
+    # preparing the same query under the same name again does nothing
+    assert executor.prepare_query("cheap", query) is executor.get_prepared_statement("cheap")
+    assert executor.execute_query("EXECUTE cheap(6)") == [{"name": "pad"}, {"name": "pen"}]
+    assert executor.execute_prepared("cheap", [4]) == [{"name": "pen"}]
+
+    stats = executor.execute_query("SHOW STATEMENTS")
+    assert [statement_stats["name"] for statement_stats in stats] == ["add_item", "cheap"]
+    assert [(statement_stats["executions"], statement_stats["rows"]) for statement_stats in stats] == [(3, 3), (2, 3)]
+
+    for invalid_query in (
+        "EXECUTE cheap(1, 2)",
+        "EXECUTE missing(1)",
+        "PREPARE cheap AS SELECT * FROM shop.items",
+        "PREPARE by_note AS SELECT * FROM shop.items WHERE note = $1",
+        "PREPARE drop_items AS DROP TABLE shop.items",
+        "DEALLOCATE missing",
+    ):
+        with pytest.raises(InvalidQueryError):
+            executor.execute_query(invalid_query)
+
+    assert executor.execute_query("DEALLOCATE cheap") is None
+    assert [statement_stats["name"] for statement_stats in executor.show_statements()] == ["add_item"]
+    with pytest.raises(InvalidQueryError, match="does not exist"):
+        executor.execute_query("EXECUTE cheap(6)")
+
+
+def test_query_statistics() -> None:
+    """Checks the statistics of columns and that EXPLAIN shows the access a SELECT chooses by them.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    statistics = ColumnStatistics()
+    statistics.add_many([1, 2, 2, None, 3, 3, 3])
+    assert (statistics.row_count, statistics.null_count, statistics.distinct_count) == (7, 1, 3)
+    assert statistics.most_common_values() == [(3, 3)]
+    assert statistics.histogram() == [1, 2, 2, 3, 3, 3, 3]
+    assert statistics.equal_selectivity(None) == 1 / 7
+    assert statistics.equal_selectivity(3) == 3 / 7
+    assert statistics.range_selectivity(2, 3) == 5 / 7
+    statistics.remove(3)
+    assert statistics.row_count == 6
+    assert statistics.most_common_values() == [(2, 2), (3, 2)]
+
+    executor = ExecuteQuery()
+    executor.execute_query("CREATE DATABASE shop")
+    executor.execute_query("CREATE TABLE shop.users (status str, age int, name str)")
+    rng = random.Random(0)
+    rows = ", ".join(
+        f"('{'banned' if position % 100 == 0 else 'active'}', {rng.randrange(100)}, 'user{position}')"
+        for position in range(2_000)
+    )
+    executor.execute_query(f"INSERT INTO shop.users (status, age, name) VALUES {rows}")  # noqa: S608
+    executor.execute_query("CREATE INDEX ON shop.users (status)")
+    executor.execute_query("CREATE SORTED INDEX ON shop.users (age)")
+
+    users = executor.databases["shop"].get_table("users")
+    assert users.statistics.columns["status"].most_common_values() == [("active", 1_980)]
+    assert users.statistics.columns["status"].equal_selectivity("banned") == 0.01
+
+    def explain(clauses: str) -> list[str]:
+        lines = executor.execute_query(f"EXPLAIN SELECT * FROM shop.users {clauses}")  # noqa: S608
+        return [line.strip() for line in lines[1:]]
+
+    assert explain("WHERE name = 'user4'") == ["-> Filter name = 'user4'", "-> Seq Scan (rows=2000)"]
+    assert explain("WHERE status = 'banned' AND age > 5") == [
+        "-> Filter age > 5", "-> Index Lookup on status = 'banned' (rows=20)",
+    ]
+    assert explain("WHERE age BETWEEN 10 AND 12")[-1].startswith("-> Index Range on age >= 10 AND age <= 12")
+    assert explain("WHERE age = 7 AND status = 'banned'")[0].startswith("-> Intersect Row Ids")
+    assert explain("ORDER BY age LIMIT 5") == ["-> Limit 5", "-> Index Scan in order of age (rows=5)"]
+
+    # the chosen accesses find the same records as a scan
+    for clauses, is_match in (
+        ("WHERE status = 'banned' AND age > 5", lambda record: record["status"] == "banned" and record["age"] > 5),
+        ("WHERE age BETWEEN 10 AND 12", lambda record: 10 <= record["age"] <= 12),
+        ("WHERE age = 7 AND status = 'banned'", lambda record: record["age"] == 7 and record["status"] == "banned"),
+    ):
+        selected = executor.execute_query(f"SELECT * FROM shop.users {clauses}")  # noqa: S608
+        assert sorted(record["name"] for record in selected) == sorted(
+            record["name"] for record in users.records.values() if is_match(record)
+        )
+    assert [record["age"] for record in executor.execute_query("SELECT age FROM shop.users ORDER BY age LIMIT 5")] == (
+        sorted(record["age"] for record in users.records.values())[:5]
+    )
+
+    # deleted values stay in the sample of the histogram until the table is analyzed
+    for record_id, record in list(users.records.items()):
+        if record["age"] < 50:
+            users.delete_record_by_id(record_id)
+    assert executor.execute_query("ANALYZE shop.users") is None
+    assert users.statistics.columns["age"].histogram()[0] >= 50
+    assert users.statistics.row_count == len(users.records)
+
+
+def test_index_build_reads() -> None:
+    """Checks that lookups find the same records as a scan while a hash index is built and records change.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    advance = IndexBuild.advance
+
+    def slow_advance(build: IndexBuild, *args: object) -> None:
+        time.sleep(0.05)
+        advance(build, *args)
+
+    cities = [f"city{position}" for position in range(50)]
+    rng = random.Random(0)
+    table = Table("people", {"city": str})
+    table.insert_records([{"city": rng.choice(cities)} for _ in range(20_000)])
+
+    def scan(city: str) -> set[int]:
+        return {record_id for record_id, value in table.iter_column_values("city") if value == city}
+
+    IndexBuild.advance = slow_advance
+    try:
+        table.create_index("city")
+        lookup_count = 0
+        while not table.index_builds["city"].is_done():
+            assert table.get_index_high_water("city", "scan") is None
+            assert table.get_index_high_water("city", "partial") <= table.index_builds["city"].last_record_id
+            for read_mode in ("partial", "scan"):
+                assert table.get_record_ids_by_column("city", "city7", read_mode) == scan("city7")
+                lookup_count += 1
+
+            # records the build has not reached yet change under it
+            record_id = rng.randrange(1, table.count + 1)
+            if record_id in table.records:
+                table.update_record_by_id(record_id, {"city": "city7"})
+            record_id = rng.randrange(1, table.count + 1)
+            if record_id in table.records:
+                table.delete_record_by_id(record_id)
+            table.insert_record({"city": "city7"})
+        assert lookup_count > 0
+    finally:
+        IndexBuild.advance = advance
+
+    assert table.get_record_ids_by_column("city", "city7", "wait") == scan("city7")
+    assert table.wait_for_index("city")
+    assert table.flush_indexes()
+    assert table.is_column_indexed("city")
+    (progress,) = table.get_index_builds()
+    assert progress["column"] == "city"
+    assert progress["state"] == "done"
+    assert progress["high_water_record_id"] == progress["last_record_id"] == 20_000
+    for city in cities:
+        assert table.get_record_ids_by_column("city", city) == scan(city)
+    with pytest.raises(ValueError, match="not supported"):
+        table.get_record_ids_by_column("city", "city7", "eventually")
+    table.shutdown()
+
+
+def test_column_locks() -> None:
+    """Checks that tables use striped column locks unless exclusive ones are asked for, and that both work.
+
+    Args:
+    ----
+    None
+
+    Returns:
+    -------
+    None
+    """
+    column_lock = ColumnLock()
+    assert column_lock.group_by_stripe([]) == {}
+    assert column_lock.group_by_stripe(iter([("a", 1), ("b", 2)])) == {column_lock: [("a", 1), ("b", 2)]}
+    with column_lock.write("a", "b"):
+        assert column_lock.locked()
+        assert column_lock.read("c").locked()
+    assert not column_lock.locked()
+
+    striped_lock = StripedReadWriteLock(stripe_count=4)
+    acquired = threading.Event()
+
+    def write() -> None:
+        with striped_lock.write("a"):
+            acquired.set()
+
+    # readers share a stripe while a writer of it waits for them
+    with striped_lock.read("a"), striped_lock.read("a"):
+        writer = threading.Thread(target=write)
+        writer.start()
+        assert not acquired.wait(0.05)
+    writer.join()
+    assert acquired.is_set()
+    assert not striped_lock.locked()
+    with pytest.raises(ValueError, match="positive"):
+        StripedReadWriteLock(stripe_count=0)
+
+    table = Table("people", {"city": str})
+    assert isinstance(table.column_locks["city"], StripedReadWriteLock)
+    table.shutdown()
+    table = Table("people", {"city": str}, exclusive_column_locks=True)
+    assert isinstance(table.column_locks["city"], ColumnLock)
+    table.shutdown()
+    for lock in (ColumnLock(), StripedReadWriteLock()):
+        table = Table("people", {"city": str})
+        table.column_locks["city"] = lock
+        table.insert_records([{"city": "paris"}, {"city": "oslo"}, {"city": "paris"}])
+        table.create_index("city")
+        assert table.flush_indexes()
+        table.update_record_by_id(1, {"city": "oslo"})
+        table.delete_record_by_id(2)
+        assert table.get_record_ids_by_column("city", "oslo") == {1}
+        assert table.get_record_ids_by_column("city", "paris") == {3}
+        assert not table.is_column_locked("city")
+        table.shutdown()
+
+
 if __name__ == "__main__":
     # main()
     # test_inverted_index()
@@ -0,0 +1,247 @@
+import string
+import unicodedata
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+
+from stop_words import STOP_WORDS
+
+# number of distinct raw tokens whose normalized form is remembered
+DEFAULT_CACHE_SIZE = 65_536
+
+# light English suffix stripping, tried in order: (suffix, replacement, minimum word length)
+STEMMING_RULES = (
+    ("sses", "ss", 5),
+    ("ches", "ch", 6),
+    ("shes", "sh", 6),
+    ("xes", "x", 5),
+    ("ies", "y", 5),
+    ("ss", "ss", 2),
+    ("ing", "", 6),
+    ("ed", "", 5),
+    ("s", "", 4),
+)
+
+
+def remove_diacritics(word: str) -> str:
+    """Remove the accents and other combining marks of a word, e.g. "café" -> "cafe".
+
+    Args:
+    ----
+        word (str): The word.
+
+    Returns:
+    -------
+        str: The word without diacritics.
+    """
+    if word.isascii():
+        return word
+    decomposed_word = unicodedata.normalize("NFKD", word)
+    return "".join(character for character in decomposed_word if not unicodedata.combining(character))
+
+
+def stem_word(word: str) -> str:
+    """Strip common English inflection suffixes so that e.g. "indexes", "indexed" and "indexing" match.
+
+    Args:
+    ----
+        word (str): The lower case word.
+
+    Returns:
+    -------
+        str: The stem.
+    """
+    for suffix, replacement, min_length in STEMMING_RULES:
+        if len(word) >= min_length and word.endswith(suffix):
+            return word[: -len(suffix)] + replacement
+    return word
+
+
+class Tokenizer:
+    """Turns text into the words stored in and looked up from inverted indexes.
+
+    A token is a whitespace separated piece of text. It is lower cased, dropped if it is a stop word, stripped
+    of punctuation with a translation table built once, and optionally folded to ASCII and stemmed. The
+    normalized form of the most recent distinct tokens is cached, since natural text repeats the same words.
+
+    Args:
+    ----
+        stop_words (Iterable[str]): The lower case words that are never indexed.
+        fold_diacritics (bool): To remove accents, so "café" and "cafe" are the same word.
+        stem (bool): To strip common English suffixes, so "index" also matches "indexes".
+        cache_size (int): The number of distinct tokens whose normalized form is cached.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(
+        self,
+        stop_words: Iterable[str] = STOP_WORDS,
+        fold_diacritics: bool = False,
+        stem: bool = False,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        """Initialize the tokenizer.
+
+        Args:
+        ----
+        self: The current object.
+        stop_words (Iterable[str]): The lower case words that are never indexed.
+        fold_diacritics (bool): To remove accents, so "café" and "cafe" are the same word.
+        stem (bool): To strip common English suffixes, so "index" also matches "indexes".
+        cache_size (int): The number of distinct tokens whose normalized form is cached.
+
+        Returns:
+        -------
+        None
+        """
+        self.stop_words = frozenset(stop_words)
+        self.fold_diacritics = fold_diacritics
+        self.stem = stem
+        self.cache_size = cache_size
+        self._translation = str.maketrans("", "", string.punctuation)
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def __reduce__(self) -> tuple:
+        """Pickle the configuration only, so tokenizers can be sent to worker processes.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        tuple: The class and its constructor arguments.
+        """
+        return Tokenizer, tuple(self.get_config())
+
+    def get_config(self) -> list:
+        """Get the constructor arguments of the tokenizer, e.g. to store them with a table.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        list: The sorted stop words, diacritic folding, stemming and cache size.
+        """
+        return [sorted(self.stop_words), self.fold_diacritics, self.stem, self.cache_size]
+
+    def iter_tokens(self, text: str, keep_stop_words: bool = False) -> Iterator[tuple[int, str]]:
+        """Iterate over the words of text with their token positions.
+
+        Positions count every whitespace separated token, including stop words, so the gaps between words are
+        kept.
+
+        Args:
+        ----
+        self: The current object.
+        text (str): The text.
+        keep_stop_words (bool, optional): To also yield the stop words, normalized like any other word.
+            Defaults to False.
+
+        Returns:
+        -------
+        Iterator[tuple[int, str]]: The positions and normalized words.
+        """
+        normalize = self.normalize
+        for position, token in enumerate(text.split()):
+            if word := normalize(token, keep_stop_words):
+                yield position, word
+
+    def words(self, text: str) -> set[str]:
+        """Get the distinct words of text.
+
+        Args:
+        ----
+        self: The current object.
+        text (str): The text.
+
+        Returns:
+        -------
+        set[str]: The normalized words.
+        """
+        normalize = self.normalize
+        return {word for token in text.split() if (word := normalize(token))}
+
+    def word_counts(self, text: str) -> Counter[str]:
+        """Get the words of text with the number of times each one occurs.
+
+        Args:
+        ----
+        self: The current object.
+        text (str): The text.
+
+        Returns:
+        -------
+        Counter[str]: The number of occurrences of every normalized word.
+        """
+        normalize = self.normalize
+        return Counter(word for token in text.split() if (word := normalize(token)))
+
+    def word_positions(self, text: str, keep_stop_words: bool = False) -> dict[str, list[int]]:
+        """Get the words of text with their token positions.
+
+        Args:
+        ----
+        self: The current object.
+        text (str): The text.
+        keep_stop_words (bool, optional): To also get the positions of the stop words. Defaults to False.
+
+        Returns:
+        -------
+        dict[str, list[int]]: The sorted positions of every normalized word.
+        """
+        positions = defaultdict(list)
+        for position, word in self.iter_tokens(text, keep_stop_words):
+            positions[word].append(position)
+        return dict(positions)
+
+    def contains_any(self, text: str, words: frozenset[str]) -> bool:
+        """Check if text contains any of words, stopping at the first match.
+
+        Args:
+        ----
+        self: The current object.
+        text (str): The text.
+        words (frozenset[str]): The normalized words to look for.
+
+        Returns:
+        -------
+        bool: True if one of the words is in the text.
+        """
+        normalize = self.normalize
+        return any(normalize(token) in words for token in text.split())
+
+    def normalize_prefix(self, prefix: str) -> str:
+        """Normalize the start of a word being typed, which is neither a stop word nor stemmed.
+
+        Args:
+        ----
+        self: The current object.
+        prefix (str): The prefix.
+
+        Returns:
+        -------
+        str: The normalized prefix.
+        """
+        normalized_prefix = prefix.lower().strip().translate(self._translation)
+        return remove_diacritics(normalized_prefix) if self.fold_diacritics else normalized_prefix
+
+    def _normalize(self, token: str, keep_stop_words: bool = False) -> str:
+        lowered_token = token.lower()
+        if lowered_token in self.stop_words and not keep_stop_words:
+            return ""
+
+        word = lowered_token.translate(self._translation)
+        if self.fold_diacritics:
+            word = remove_diacritics(word)
+        if self.stem:
+            word = stem_word(word)
+        return word
+
+
+DEFAULT_TOKENIZER = Tokenizer()
@@ -0,0 +1,192 @@
+import asyncio
+import struct
+from typing import NamedTuple
+
+from errors import InvalidQueryError
+from record_codec import CodecError, decode, encode
+
+# every frame starts with the length of the rest of the frame, then the request id, opcode and flags
+FRAME_HEADER = struct.Struct("<IIBB")
+# length of the request id, opcode and flags, which the length prefix covers
+FRAME_HEADER_BODY_SIZE = FRAME_HEADER.size - 4
+MAX_FRAME_SIZE = 64 << 20
+
+# records sent in a single result frame of a streamed response
+STREAM_CHUNK_SIZE = 1_000
+
+# request opcodes, a response carries the opcode of its request
+QUERY = 1
+CREATE_TABLE = 2
+INSERT = 3
+INSERT_MANY = 4
+GET = 5
+GET_BY_COLUMN = 6
+SEARCH = 7
+CREATE_INDEX = 8
+# like SEARCH, but every record comes with its score, which is how the results of several shards are merged
+RANK_SEARCH = 9
+# prepared statements, PREPARE takes [name, query] and EXECUTE [name, parameters]
+PREPARE = 10
+EXECUTE = 11
+OPCODES = (
+    QUERY, CREATE_TABLE, INSERT, INSERT_MANY, GET, GET_BY_COLUMN, SEARCH, CREATE_INDEX, RANK_SEARCH, PREPARE, EXECUTE,
+)
+
+# response flags
+FLAG_MORE = 0x01
+FLAG_ERROR = 0x02
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a frame that does not follow the wire protocol."""
+
+
+class Frame(NamedTuple):
+    """A request or response frame.
+
+    Args:
+    ----
+        request_id (int): The id the client chose for the request, echoed by every response frame.
+        opcode (int): The operation.
+        flags (int): FLAG_MORE on every frame of a streamed response but the last, FLAG_ERROR on errors.
+        payload (object): The arguments of a request or the result of a response, encoded with the record codec.
+
+    Returns:
+    -------
+        None
+    """
+
+    request_id: int
+    opcode: int
+    flags: int
+    payload: object
+
+
+def encode_frame(request_id: int, opcode: int, payload: object, flags: int = 0) -> bytes:
+    """Encode a frame.
+
+    Args:
+    ----
+        request_id (int): The request id.
+        opcode (int): The opcode.
+        payload (object): The payload, any value supported by the record codec.
+        flags (int, optional): The flags. Defaults to none.
+
+    Raises:
+    ------
+        CodecError: If the payload can not be encoded.
+        ProtocolError: If the frame is larger than MAX_FRAME_SIZE.
+
+    Returns:
+    -------
+        bytes: The frame.
+    """
+    encoded_payload = encode(payload)
+    length = FRAME_HEADER_BODY_SIZE + len(encoded_payload)
+    if length > MAX_FRAME_SIZE:
+        msg = f"Frame of {length} bytes is larger than {MAX_FRAME_SIZE} bytes."
+        raise ProtocolError(msg)
+    return FRAME_HEADER.pack(length, request_id, opcode, flags) + encoded_payload
+
+
+def encode_response(request_id: int, opcode: int, result: object) -> list[bytes]:
+    """Encode the response frames of a result, streaming lists of records in chunks.
+
+    Args:
+    ----
+        request_id (int): The request id.
+        opcode (int): The opcode of the request.
+        result (object): The result.
+
+    Raises:
+    ------
+        CodecError: If the result can not be encoded.
+
+    Returns:
+    -------
+        list[bytes]: The frames, every one but the last flagged with FLAG_MORE.
+    """
+    if not isinstance(result, list) or len(result) <= STREAM_CHUNK_SIZE:
+        return [encode_frame(request_id, opcode, result)]
+
+    chunk_starts = range(0, len(result), STREAM_CHUNK_SIZE)
+    return [
+        encode_frame(
+            request_id,
+            opcode,
+            result[start : start + STREAM_CHUNK_SIZE],
+            FLAG_MORE if start + STREAM_CHUNK_SIZE < len(result) else 0,
+        )
+        for start in chunk_starts
+    ]
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Frame | None:
+    """Read the next frame from a stream.
+
+    Args:
+    ----
+        reader (asyncio.StreamReader): The stream.
+
+    Raises:
+    ------
+        ProtocolError: If the frame is too large, truncated or its payload is not a valid encoding.
+
+    Returns:
+    -------
+        Frame | None: The frame, or None if the stream ended between two frames.
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as error:
+        if not error.partial:
+            return None
+        msg = "Connection closed in the middle of a frame header."
+        raise ProtocolError(msg) from error
+
+    length, request_id, opcode, flags = FRAME_HEADER.unpack(header)
+    if not FRAME_HEADER_BODY_SIZE < length <= MAX_FRAME_SIZE:
+        msg = f"Invalid frame length {length}."
+        raise ProtocolError(msg)
+
+    try:
+        encoded_payload = await reader.readexactly(length - FRAME_HEADER_BODY_SIZE)
+        payload = decode(encoded_payload)
+    except asyncio.IncompleteReadError as error:
+        msg = "Connection closed in the middle of a frame."
+        raise ProtocolError(msg) from error
+    except CodecError as error:
+        msg = f"Invalid payload: {error}"
+        raise ProtocolError(msg) from error
+
+    return Frame(request_id, opcode, flags, payload)
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, object]:
+    """Read every frame of the next response, joining streamed results.
+
+    Args:
+    ----
+        reader (asyncio.StreamReader): The stream.
+
+    Raises:
+    ------
+        ProtocolError: If the connection closes before the response is complete.
+
+    Returns:
+    -------
+        tuple[int, object]: The request id and the result, or an InvalidQueryError for an error response.
+    """
+    chunks = []
+    while True:
+        frame = await read_frame(reader)
+        if frame is None:
+            msg = "Connection closed before the response was complete."
+            raise ProtocolError(msg)
+        if frame.flags & FLAG_ERROR:
+            return frame.request_id, InvalidQueryError(str(frame.payload))
+        if not frame.flags & FLAG_MORE and not chunks:
+            return frame.request_id, frame.payload
+        chunks.extend(frame.payload)
+        if not frame.flags & FLAG_MORE:
+            return frame.request_id, chunks
@@ -0,0 +1,482 @@
+import asyncio
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Condition, Thread
+from time import monotonic
+
+from log import get_logger
+from record_codec import CodecError, decode, encode
+
+logger = get_logger(__file__)
+
+WAL_MAGIC = b"ATOMWAL1"
+# every entry is framed by its payload length and the crc32 of the payload
+FRAME_HEADER = struct.Struct("<II")
+
+DEFAULT_FLUSH_INTERVAL = 0.01
+# seconds an entry a writer waits for stays in the buffer, so the appends of other writers share its fsync
+DEFAULT_COMMIT_DELAY = 0.002
+# buffered bytes that trigger a write without waiting for the flush interval
+MAX_BUFFER_SIZE = 1 << 20
+
+# operations recorded in the log
+CREATE_TABLE = "create_table"
+DROP_TABLE = "drop_table"
+INSERT = "insert"
+INSERT_MANY = "insert_many"
+UPDATE = "update"
+DELETE = "delete"
+CREATE_INDEX = "create_index"
+CREATE_UNIQUE_INDEX = "create_unique_index"
+CREATE_SORTED_INDEX = "create_sorted_index"
+CREATE_INVERTED_INDEX = "create_inverted_index"
+CREATE_FOREIGN_KEY = "create_foreign_key"
+FREEZE_RECORDS = "freeze_records"
+
+
+# the last log sequence number appended to every log by the current context, set by `defer_commits`
+_deferred_commits: ContextVar[dict["WriteAheadLog", int] | None] = ContextVar("deferred_commits", default=None)
+
+
+@contextmanager
+def defer_commits() -> Iterator[dict["WriteAheadLog", int]]:
+    """Make the synchronous appends of a with block return without waiting for their entries to be on disk.
+
+    The appends are recorded instead, so an asyncio server can make its writes wait for them with
+    `wait_for_commits` without blocking the event loop, and the writes of other clients are appended meanwhile
+    and share the fsync.
+
+    Args:
+    ----
+        None
+
+    Returns:
+    -------
+        Iterator[dict[WriteAheadLog, int]]: The last log sequence number appended to every log in the block.
+    """
+    deferred_commits: dict[WriteAheadLog, int] = {}
+    token = _deferred_commits.set(deferred_commits)
+    try:
+        yield deferred_commits
+    finally:
+        _deferred_commits.reset(token)
+
+
+async def wait_for_commits(deferred_commits: dict["WriteAheadLog", int]) -> None:
+    """Wait until the appends recorded by `defer_commits` are on disk.
+
+    Args:
+    ----
+        deferred_commits (dict[WriteAheadLog, int]): The last log sequence number appended to every log.
+
+    Raises:
+    ------
+        OSError: If a log could not be written.
+
+    Returns:
+    -------
+        None
+    """
+    for write_ahead_log, lsn in deferred_commits.items():
+        await write_ahead_log.wait_for_async(lsn)
+
+
+@contextmanager
+def group_commit() -> Iterator[None]:
+    """Make the synchronous appends of a with block share fsyncs and wait for all of them at its end.
+
+    With synchronous commit every append waits for its own fsync, so a loop that changes one record at a time,
+    e.g. calling `Table.insert_record` per row, pays one fsync per row. Inside the block the appends only wait
+    for the flush interval and the writer thread commits whatever is buffered at once, so the loop pays a few
+    fsyncs in total. Nothing changed in the block is durable before the block ends, and the block raises if the
+    log could not be written. `Table.insert_records` shares one fsync for a whole batch without it.
+
+    Args:
+    ----
+        None
+
+    Raises:
+    ------
+        OSError: If a log could not be written.
+
+    Returns:
+    -------
+        Iterator[None]: Nothing.
+    """
+    with defer_commits() as deferred_commits:
+        yield
+    for write_ahead_log, lsn in deferred_commits.items():
+        write_ahead_log.wait_for(lsn)
+
+
+def read_entries(path: str, start_offset: int = 0) -> Iterator[tuple[list, int]]:
+    """Read the entries of a log file, stopping at the first torn or corrupt entry.
+
+    Args:
+    ----
+        path (str): The path of the log file.
+        start_offset (int, optional): The offset of the first entry to read, e.g. the end of the entries covered
+            by a checkpoint. Defaults to the first entry of the file.
+
+    Raises:
+    ------
+        ValueError: If the file is not a write-ahead log.
+
+    Returns:
+    -------
+        Iterator[tuple[list, int]]: Every entry with the offset right after it in the file.
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+
+    with open(path, "rb") as file:
+        if file.read(len(WAL_MAGIC)) != WAL_MAGIC:
+            msg = f"{path} is not a write-ahead log."
+            raise ValueError(msg)
+
+        offset = max(start_offset, len(WAL_MAGIC))
+        file.seek(offset)
+        while len(header := file.read(FRAME_HEADER.size)) == FRAME_HEADER.size:
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            try:
+                entry = decode(payload)
+            except CodecError:
+                return
+            offset += FRAME_HEADER.size + length
+            yield entry, offset
+
+
+class WriteAheadLog:
+    """Append-only log of the operations applied to a database, made durable with group commit.
+
+    Entries are encoded with the compact binary record codec and framed by their length and crc32. `append` only
+    copies the frame into a buffer; a single writer thread writes everything buffered and fsyncs it at once, so
+    many appends share one fsync. With synchronous commit, `append` returns once its entry is on disk: the
+    buffer is written `commit_delay` seconds after its first entry, so appends of other threads in that window
+    and appends that arrive while an fsync is running are committed together. Without it, `append` returns
+    immediately and the buffer is written every `flush_interval` seconds, so at most that much work is lost on
+    a crash.
+
+    Writers that change one record at a time in a single thread should use `group_commit` (or `defer_commits`
+    in an asyncio server), otherwise synchronous commit costs them one fsync per record.
+
+    Args:
+    ----
+        path (str): The path of the log file, created if it does not exist.
+        flush_interval (float): The maximum number of seconds an entry waits in the buffer without synchronous
+            commit.
+        synchronous_commit (bool): To wait for every appended entry to be on disk.
+        commit_delay (float): The number of seconds an entry that is waited for stays in the buffer.
+
+    Returns:
+    -------
+        None
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        path: str,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        synchronous_commit: bool = True,
+        start_offset: int = 0,
+        commit_delay: float = DEFAULT_COMMIT_DELAY,
+    ) -> None:
+        """Open the log for appending and start its writer thread.
+
+        A torn entry at the end of the file, left by a crash in the middle of a write, is cut off first.
+
+        Args:
+        ----
+        self: The current object.
+        path (str): The path of the log file, created if it does not exist.
+        flush_interval (float): The maximum number of seconds an entry waits in the buffer without synchronous
+            commit.
+        synchronous_commit (bool): To wait for every appended entry to be on disk.
+        start_offset (int): The offset up to which the entries are known to be valid, so only the entries after
+            it are checked for a torn tail.
+        commit_delay (float): The number of seconds an entry that is waited for stays in the buffer.
+
+        Raises:
+        ------
+        ValueError: If the flush interval or commit delay is negative or the file is not a write-ahead log.
+
+        Returns:
+        -------
+        None
+        """
+        if flush_interval < 0 or commit_delay < 0:
+            msg = "Flush interval and commit delay must not be negative."
+            raise ValueError(msg)
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.synchronous_commit = synchronous_commit
+        self.commit_delay = commit_delay
+
+        valid_size = max(start_offset, len(WAL_MAGIC))
+        for _, valid_size in read_entries(path, start_offset):  # noqa: B007
+            pass
+
+        self._file = open(path, "ab")  # noqa: SIM115
+        if self._file.tell() == 0:
+            self._file.write(WAL_MAGIC)
+        elif self._file.tell() > valid_size:
+            logger.warning(f"truncating {self._file.tell() - valid_size} torn bytes at the end of {path}")
+            self._file.truncate(valid_size)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        # size of the file once every durable entry is written, where a checkpoint resumes reading the log
+        self.durable_offset = self._file.tell()
+
+        self._buffer = bytearray()
+        self._first_buffered_at = 0.0
+        # when the writer thread writes the buffer, sooner once an entry of it is waited for
+        self._write_at = 0.0
+        # (log sequence number, event loop, future) of the coroutines waiting in `wait_for_async`
+        self._async_waiters: list[tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        # log sequence numbers: every append gets the next one, and entries up to durable_lsn are on disk
+        self._appended_lsn = 0
+        self._durable_lsn = 0
+        self._is_running = True
+        self._error: OSError | None = None
+        self._condition = Condition()
+
+        self._thread = Thread(target=self._run, name="write-ahead-log", daemon=True)
+        self._thread.start()
+
+    def append(self, entry: list) -> int:
+        """Append an entry to the log.
+
+        Args:
+        ----
+        self: The current object.
+        entry (list): The operation name followed by its arguments, all encodable by the record codec.
+
+        Raises:
+        ------
+        ValueError: If the log is closed.
+        CodecError: If the entry holds a value that can not be encoded.
+
+        Returns:
+        -------
+        int: The log sequence number of the entry.
+        """
+        payload = encode(entry)
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._condition:
+            if self._error is not None:
+                raise self._error
+            if not self._is_running:
+                msg = f"Write-ahead log {self.path} is closed."
+                raise ValueError(msg)
+
+            if not self._buffer:
+                self._first_buffered_at = monotonic()
+                self._write_at = self._first_buffered_at + self.flush_interval
+                self._condition.notify_all()
+            self._buffer += frame
+            self._appended_lsn += 1
+            lsn = self._appended_lsn
+            if len(self._buffer) >= MAX_BUFFER_SIZE:
+                self._condition.notify_all()
+
+        if self.synchronous_commit:
+            deferred_commits = _deferred_commits.get()
+            if deferred_commits is None:
+                self.wait_for(lsn)
+            else:
+                deferred_commits[self] = lsn
+        return lsn
+
+    def wait_for(self, lsn: int, timeout: float | None = None) -> bool:
+        """Wait until the entry with a log sequence number is on disk.
+
+        Args:
+        ----
+        self: The current object.
+        lsn (int): The log sequence number returned by `append`.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Raises:
+        ------
+        OSError: If the log could not be written.
+
+        Returns:
+        -------
+        bool: True if the entry is durable, False if the timeout expired first.
+        """
+        with self._condition:
+            self._commit_soon()
+            is_durable = self._condition.wait_for(lambda: self._durable_lsn >= lsn or self._error, timeout)
+            if self._error is not None:
+                raise self._error
+            return is_durable
+
+    async def wait_for_async(self, lsn: int) -> None:
+        """Wait until the entry with a log sequence number is on disk, without blocking the event loop.
+
+        Args:
+        ----
+        self: The current object.
+        lsn (int): The log sequence number returned by `append`.
+
+        Raises:
+        ------
+        OSError: If the log could not be written.
+
+        Returns:
+        -------
+        None
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            if self._error is not None:
+                raise self._error
+            if self._durable_lsn >= lsn:
+                return
+            self._async_waiters.append((lsn, loop, future))
+            self._commit_soon()
+        await future
+
+    def _commit_soon(self) -> None:
+        # called with the condition held: a writer waiting for its entry does not wait for the flush interval,
+        # only for the commit delay, during which the entries of other writers join the same fsync
+        if self._buffer:
+            self._write_at = min(self._write_at, self._first_buffered_at + self.commit_delay)
+        self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Write and fsync every appended entry.
+
+        Args:
+        ----
+        self: The current object.
+        timeout (float, optional): The maximum number of seconds to wait. Defaults to waiting forever.
+
+        Raises:
+        ------
+        OSError: If the log could not be written.
+
+        Returns:
+        -------
+        bool: True if every entry is durable, False if the timeout expired first.
+        """
+        with self._condition:
+            lsn = self._appended_lsn
+        return self.wait_for(lsn, timeout)
+
+    def close(self) -> None:
+        """Flush the remaining entries, stop the writer thread and close the file.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        None
+        """
+        with self._condition:
+            if not self._is_running:
+                return
+            self._is_running = False
+            self._condition.notify_all()
+
+        self._thread.join()
+        self._file.close()
+
+    def __iter__(self) -> Iterator[list]:
+        """Iterate over the entries that are on disk, in the order they were appended.
+
+        Args:
+        ----
+        self: The current object.
+
+        Returns:
+        -------
+        Iterator[list]: The entries.
+        """
+        return self.iter_entries()
+
+    def iter_entries(self, start_offset: int = 0) -> Iterator[list]:
+        """Iterate over the entries that are on disk from an offset, in the order they were appended.
+
+        Args:
+        ----
+        self: The current object.
+        start_offset (int, optional): The offset of the first entry, e.g. `durable_offset` when a checkpoint was
+            taken. Defaults to the first entry of the log.
+
+        Returns:
+        -------
+        Iterator[list]: The entries.
+        """
+        for entry, _ in read_entries(self.path, start_offset):
+            yield entry
+
+    def _take_buffer(self) -> tuple[bytes, int]:
+        with self._condition:
+            while True:
+                if not self._buffer:
+                    if not self._is_running:
+                        return b"", self._appended_lsn
+                    self._condition.wait()
+                    continue
+
+                remaining = self._write_at - monotonic()
+                if remaining > 0 and len(self._buffer) < MAX_BUFFER_SIZE and self._is_running:
+                    self._condition.wait(remaining)
+                    continue
+
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                return data, self._appended_lsn
+
+    def _run(self) -> None:
+        while True:
+            data, lsn = self._take_buffer()
+            if not data:
+                return
+
+            try:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as error:
+                logger.exception(f"failed to write {len(data)} bytes to {self.path}")
+                with self._condition:
+                    self._error = error
+                    self._is_running = False
+                    self._condition.notify_all()
+                    async_waiters, self._async_waiters = self._async_waiters, []
+                for _, loop, future in async_waiters:
+                    loop.call_soon_threadsafe(_resolve_future, future, error)
+                return
+
+            with self._condition:
+                self.durable_offset += len(data)
+                self._durable_lsn = lsn
+                self._condition.notify_all()
+                async_waiters = [waiter for waiter in self._async_waiters if waiter[0] <= lsn]
+                self._async_waiters = [waiter for waiter in self._async_waiters if waiter[0] > lsn]
+            for _, loop, future in async_waiters:
+                loop.call_soon_threadsafe(_resolve_future, future, None)
+
+
+def _resolve_future(future: asyncio.Future, error: BaseException | None) -> None:
+    # the waiting request may have been cancelled, e.g. because its client went away
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)